@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 import traceback
-from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Type
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Type
 from typing_extensions import Final
 
 from bemani.common import (
@@ -13,7 +13,8 @@ from bemani.common import (
     Time,
     cache,
 )
-from bemani.data import Config, Data, Arcade, Machine, UserID, RemoteUser
+from bemani.data import Config, Data, Arcade, Machine, Score, UserID, RemoteUser
+from bemani.protocol import Node
 
 
 class ProfileCreationException(Exception):
@@ -133,6 +134,7 @@ class Base(ABC):
 
     __registered_games: Dict[str, Type[Factory]] = {}
     __registered_handlers: Set[Type[Factory]] = set()
+    __static_nodes: Dict[Tuple[Any, ...], Node] = {}
 
     """
     Override this in your subclass.
@@ -149,6 +151,19 @@ class Base(ABC):
     """
     name: str
 
+    """
+    Override this in your subclass with any top-level profile keys that the game looks
+    users up by, so they can be found with get_profiles_by_attribute instead of scanning
+    every profile.
+    """
+    indexed_profile_attributes: List[str] = []
+
+    """
+    Override this in your subclass to True if the game looks up daily points with
+    get_daily_points, so that every attempt saved also updates the daily aggregates.
+    """
+    daily_points: bool = False
+
     @property
     def extra_services(self) -> List[str]:
         """
@@ -240,6 +255,10 @@ class Base(ABC):
         """
         cls.__registered_games[gamecode] = handler
         cls.__registered_handlers.add(handler)
+        for game in handler.MANAGED_CLASSES:
+            Data.register_indexed_attributes(game.game, game.version, game.indexed_profile_attributes)
+            if game.daily_points:
+                Data.register_daily_points(game.game, game.version)
 
     @classmethod
     def run_scheduled_work(cls, data: Data, config: Config) -> List[Tuple[str, Dict[str, Any]]]:
@@ -275,6 +294,29 @@ class Base(ABC):
             for game in factory.MANAGED_CLASSES:
                 yield (game.game, game.version, game.get_settings())
 
+    def static_node(self, name: str, builder: Callable[[], Node], *key: Any) -> Node:
+        """
+        Return a response subtree that is identical for every request, building it only the
+        first time it is asked for in this process. The subtree is frozen and shared between
+        every response it is added to, so the encoders only ever encode it once as well.
+
+        Parameters:
+            name - A name for the subtree, unique within this game and version.
+            builder - A callable returning the subtree.
+            key - Anything else that the contents of the subtree depend on, such as whether
+                  this is an omnimix request or relevant server settings.
+
+        Returns:
+            A frozen Node which must not be modified.
+        """
+        fullkey = (self.game, self.version, name, *key)
+        node = Base.__static_nodes.get(fullkey)
+        if node is None:
+            # Racing builds are harmless, whichever finishes last is kept.
+            node = builder().freeze()
+            Base.__static_nodes[fullkey] = node
+        return node
+
     def bind_profile(self, userid: UserID) -> None:
         """
         Handling binding the user's profile to this version on this server.
@@ -356,6 +398,145 @@ class Base(ABC):
             for (userid, profile) in profiles
         ]
 
+    def get_snapshot(self, version: int, name: str) -> Optional[ValidatedDict]:
+        """
+        Look up a snapshot that the scheduler stored with put_snapshot, so long as it is
+        newer than the configured staleness bound.
+
+        Parameters:
+            version - The version the snapshot was stored under, usually the music version.
+            name - The name of the snapshot.
+
+        Returns:
+            The snapshot contents, or None if there is no fresh enough snapshot and the
+            caller should compute the data itself.
+        """
+        staleness = self.config.snapshot_staleness
+        if staleness <= 0:
+            return None
+        snapshot = self.data.local.game.get_snapshot(self.game, version, name)
+        if snapshot is None:
+            return None
+        timestamp, contents = snapshot
+        if timestamp < Time.now() - staleness:
+            return None
+        return contents
+
+    def has_snapshot(self, version: int, name: str) -> bool:
+        """
+        Returns whether get_snapshot would find a fresh enough snapshot, without loading it.
+        """
+        staleness = self.config.snapshot_staleness
+        if staleness <= 0:
+            return False
+        timestamp = self.data.local.game.get_snapshot_timestamp(self.game, version, name)
+        return timestamp is not None and timestamp >= Time.now() - staleness
+
+    @classmethod
+    def snapshot_due(cls, data: Data, config: Config, version: int, name: str) -> bool:
+        """
+        Returns whether the scheduler should refresh a snapshot, because snapshots are
+        enabled and the snapshot is missing or at least half as old as the staleness bound.
+        """
+        staleness = config.snapshot_staleness
+        if staleness <= 0:
+            return False
+        timestamp = data.local.game.get_snapshot_timestamp(cls.game, version, name)
+        return timestamp is None or timestamp <= Time.now() - (staleness // 2)
+
+    @classmethod
+    def put_snapshot(cls, data: Data, version: int, name: str, contents: Dict[str, Any]) -> None:
+        """
+        Store a snapshot for game requests to look up with get_snapshot.
+        """
+        data.local.game.put_snapshot(cls.game, version, name, contents)
+
+    @classmethod
+    def snapshot_records(
+        cls,
+        records: List[Tuple[UserID, Score]],
+        profiles: Dict[UserID, Profile],
+        score_keys: List[str] = [],
+        profile_keys: List[str] = ["name"],
+    ) -> Dict[str, Any]:
+        """
+        Flatten a list of records and the profiles of the users holding them into a
+        snapshot, keeping only the score and profile data that the game displays.
+        """
+        userids = {userid for (userid, _) in records}
+        return {
+            "records": [
+                [
+                    userid,
+                    score.key,
+                    score.id,
+                    score.chart,
+                    score.points,
+                    score.timestamp,
+                    score.update,
+                    score.location,
+                    score.plays,
+                    {key: score.data[key] for key in score_keys if key in score.data},
+                ]
+                for (userid, score) in records
+            ],
+            "profiles": [
+                [
+                    userid,
+                    profile.extid,
+                    {key: profile[key] for key in profile_keys if key in profile},
+                ]
+                for (userid, profile) in profiles.items()
+                if userid in userids
+            ],
+        }
+
+    def records_from_snapshot(
+        self, snapshot: Dict[str, Any]
+    ) -> Tuple[List[Tuple[UserID, Score]], Dict[UserID, Profile]]:
+        """
+        The reverse of snapshot_records, returning the records and the profiles of the
+        users holding them.
+        """
+        records = [
+            (UserID(userid), Score(key, songid, chart, points, timestamp, update, location, plays, data))
+            for (userid, key, songid, chart, points, timestamp, update, location, plays, data) in snapshot["records"]
+        ]
+        profiles = {
+            UserID(userid): Profile(self.game, self.version, "", extid, data)
+            for (userid, extid, data) in snapshot["profiles"]
+        }
+        return records, profiles
+
+    @classmethod
+    def snapshot_chart_stats(cls, stats: Dict[int, Dict[int, Dict[str, int]]]) -> Dict[str, Any]:
+        """
+        Flatten per-chart statistics such as clear rates, keyed by song ID and chart,
+        into a snapshot. This is needed because JSON can only key objects by string.
+        """
+        return {"charts": [[songid, chart, stats[songid][chart]] for songid in stats for chart in stats[songid]]}
+
+    @classmethod
+    def chart_stats_from_snapshot(cls, snapshot: Dict[str, Any]) -> Dict[int, Dict[int, Dict[str, int]]]:
+        """
+        The reverse of snapshot_chart_stats.
+        """
+        stats: Dict[int, Dict[int, Dict[str, int]]] = {}
+        for songid, chart, values in snapshot["charts"]:
+            stats.setdefault(songid, {})[chart] = values
+        return stats
+
+    @classmethod
+    def get_any_profiles_for(cls, data: Data, userids: List[UserID]) -> Dict[UserID, Profile]:
+        """
+        The same as get_any_profiles, for use in scheduled work where there is no game
+        instance to call it on.
+        """
+        return {
+            userid: profile if profile is not None else Profile(cls.game, cls.version, "", 0)
+            for (userid, profile) in data.remote.user.get_any_profiles(cls.game, cls.version, list(set(userids)))
+        }
+
     def put_profile(self, userid: UserID, profile: Profile) -> None:
         """
         Save a new profile for this user given a game/version.
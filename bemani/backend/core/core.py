@@ -75,23 +75,28 @@ class CoreHandler(Base):
         """
         Handle a PCBEvent request. We do nothing for this aside from logging the event.
         """
+        entries = []
         for item in request.children:
             if item.name == "item":
                 name = item.child_value("name")
                 value = item.child_value("value")
                 timestamp = item.child_value("time")
-                self.data.local.network.put_event(
-                    "pcbevent",
-                    {
-                        "name": name,
-                        "value": value,
-                        "model": str(self.model),
-                        "pcbid": self.config.machine.pcbid,
-                        "ip": self.config.client.address,
-                    },
-                    timestamp=timestamp,
+                entries.append(
+                    (
+                        {
+                            "name": name,
+                            "value": value,
+                            "model": str(self.model),
+                            "pcbid": self.config.machine.pcbid,
+                            "ip": self.config.client.address,
+                        },
+                        timestamp,
+                    )
                 )
 
+        # Games tend to send these in bursts, so write them all at once.
+        self.data.local.network.put_events("pcbevent", entries)
+
         return Node.void("pcbevent")
 
     def handle_package_list_request(self, request: Node) -> Node:
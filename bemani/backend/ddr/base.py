@@ -1,5 +1,5 @@
 # vim: set fileencoding=utf-8
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 from typing_extensions import Final
 
 from bemani.backend.base import Base
@@ -77,6 +77,113 @@ class DDRBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
             return DBConstants.OMNIMIX_VERSION_BUMP + self.version
         return self.version
 
+    @classmethod
+    def hiscore_groups(cls, data: Data) -> Dict[str, List[UserID]]:
+        """
+        Group local users for update_hiscore_snapshots to snapshot the records of, keyed
+        by snapshot name. By default this groups users by area for get_area_hiscores.
+        Override this in versions that show the records of a different set of users.
+        """
+        # Users who never picked an area are shown in the area of the machine asking,
+        # so they are snapshotted as their own group.
+        area_users: Dict[str, List[UserID]] = {}
+        for userid, profile in data.local.user.get_all_profiles(cls.game, cls.version):
+            area = profile.get_int("area") if "area" in profile else "none"
+            area_users.setdefault(f"area_hiscore:{area}", []).append(userid)
+        return area_users
+
+    @classmethod
+    def update_hiscore_snapshots(cls, data: Data, config: Config, areas: bool = True) -> None:
+        """
+        Snapshot the network records and, if asked for, the records of every group of
+        users returned by hiscore_groups, for get_hiscores and get_area_hiscores to serve from.
+        """
+        versions = [
+            version
+            for version in [cls.version, cls.version + DBConstants.OMNIMIX_VERSION_BUMP]
+            if cls.snapshot_due(data, config, version, "hiscore")
+        ]
+        if not versions:
+            return
+
+        groups = cls.hiscore_groups(data) if areas else {}
+
+        for version in versions:
+            global_records = data.remote.music.get_all_records(cls.game, version)
+            group_records = {
+                name: data.local.music.get_all_records(cls.game, version, userlist=list(userids))
+                for name, userids in groups.items()
+            }
+            users = cls.get_any_profiles_for(
+                data,
+                [userid for (userid, _) in global_records]
+                + [userid for records in group_records.values() for (userid, _) in records],
+            )
+
+            for name, records in group_records.items():
+                cls.put_snapshot(
+                    data,
+                    version,
+                    name,
+                    cls.snapshot_records(records, users, ["rank", "halo"], ["name", "area"]),
+                )
+
+            # Written last, since its age decides when all of the above is refreshed.
+            cls.put_snapshot(
+                data,
+                version,
+                "hiscore",
+                cls.snapshot_records(global_records, users, ["rank", "halo"], ["name", "area"]),
+            )
+
+    def get_hiscores(self) -> Tuple[List[Tuple[UserID, Score]], Dict[UserID, Profile]]:
+        """
+        Returns the network records and the profile of every user holding one. These come
+        from the scheduler's snapshot when there is a fresh one, and are looked up otherwise.
+        """
+        snapshot = self.get_snapshot(self.music_version, "hiscore")
+        if snapshot is not None:
+            return self.records_from_snapshot(snapshot)
+
+        records = self.data.remote.music.get_all_records(self.game, self.music_version)
+        users = {userid: profile for (userid, profile) in self.get_any_profiles([userid for (userid, _) in records])}
+        return records, users
+
+    def get_area_hiscores(self, shop_area: int) -> Tuple[List[Tuple[UserID, Score]], Dict[UserID, Profile]]:
+        """
+        Returns the records of users in an area and the profile of every user holding one.
+        Users who never picked an area count as being in the area of the machine asking.
+        These come from the scheduler's snapshot when there is a fresh one, and are looked
+        up otherwise.
+        """
+        if self.has_snapshot(self.music_version, "hiscore"):
+            groups = [str(shop_area)]
+            if shop_area == self.get_machine_region():
+                groups.append("none")
+
+            best: Dict[Tuple[int, int], Tuple[UserID, Score]] = {}
+            users: Dict[UserID, Profile] = {}
+            for group in groups:
+                snapshot = self.get_snapshot(self.music_version, f"area_hiscore:{group}")
+                if snapshot is None:
+                    # Nobody was in this area as of the snapshot.
+                    continue
+                records, profiles = self.records_from_snapshot(snapshot)
+                users.update(profiles)
+                for userid, score in records:
+                    key = (score.id, score.chart)
+                    if key not in best or score.points > best[key][1].points:
+                        best[key] = (userid, score)
+            return list(best.values()), users
+
+        users = {
+            uid: prof
+            for (uid, prof) in self.data.local.user.get_all_profiles(self.game, self.version)
+            if prof.get_int("area", self.get_machine_region()) == shop_area
+        }
+        records = self.data.local.music.get_all_records(self.game, self.music_version, userlist=list(users.keys()))
+        return records, users
+
     def game_to_db_rank(self, game_rank: int) -> int:
         """
         Given a game's rank constant, return the rank as defined above.
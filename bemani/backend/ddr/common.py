@@ -1,8 +1,8 @@
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from bemani.backend.ddr.base import DDRBase
 from bemani.common import Profile, intish
-from bemani.data import Score, UserID
+from bemani.data import Config, Data, Score, UserID
 from bemani.protocol import Node
 
 
@@ -53,17 +53,22 @@ class DDRGameRecorderHandler(DDRBase):
 
 
 class DDRGameHiscoreHandler(DDRBase):
+    @classmethod
+    def run_scheduled_work(cls, data: Data, config: Config) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Refresh the hiscore snapshots so that hiscore requests don't have to compute them.
+        """
+        cls.update_hiscore_snapshots(data, config)
+        return []
+
     def handle_game_hiscore_request(self, request: Node) -> Node:
-        records = self.data.remote.music.get_all_records(self.game, self.music_version)
+        records, users = self.get_hiscores()
 
         sortedrecords: Dict[int, Dict[int, Tuple[UserID, Score]]] = {}
-        missing_profiles = []
         for userid, score in records:
             if score.id not in sortedrecords:
                 sortedrecords[score.id] = {}
             sortedrecords[score.id][score.chart] = (userid, score)
-            missing_profiles.append(userid)
-        users = {userid: profile for (userid, profile) in self.get_any_profiles(missing_profiles)}
 
         game = Node.void("game")
         for song in sortedrecords:
@@ -99,15 +104,8 @@ class DDRGameAreaHiscoreHandler(DDRBase):
     def handle_game_area_hiscore_request(self, request: Node) -> Node:
         shop_area = int(request.attribute("shop_area"))
 
-        # First, get all users that are in the current shop's area
-        area_users = {
-            uid: prof
-            for (uid, prof) in self.data.local.user.get_all_profiles(self.game, self.version)
-            if prof.get_int("area", self.get_machine_region()) == shop_area
-        }
-
-        # Second, look up records belonging only to those users
-        records = self.data.local.music.get_all_records(self.game, self.music_version, userlist=list(area_users.keys()))
+        # Look up records belonging only to users in the current shop's area
+        records, area_users = self.get_area_hiscores(shop_area)
 
         # Now, do the same lazy thing as 'hiscore' because I don't want
         # to think about how to change this knowing that we only pulled
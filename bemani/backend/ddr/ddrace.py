@@ -15,7 +15,7 @@ from bemani.common import (
     ID,
     intish,
 )
-from bemani.data import Data, Achievement, Machine, Score, UserID
+from bemani.data import Config, Data, Achievement, Machine, Score, UserID
 from bemani.protocol import Node
 
 
@@ -113,7 +113,37 @@ class DDRAce(
         return DDR2014(self.data, self.config, self.model)
 
     @classmethod
-    def run_scheduled_work(cls, data: Data, config: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    def rival_area(cls, machine: Machine) -> str:
+        """
+        Returns the name of the snapshot holding area rival records for a machine. Area
+        rivals are users who last played in the same arcade, or on the same machine if
+        it isn't in an arcade.
+        """
+        if machine.arcade is not None:
+            return f"arcade_hiscore:{machine.arcade}"
+        return f"machine_hiscore:{machine.id}"
+
+    @classmethod
+    def hiscore_groups(cls, data: Data) -> Dict[str, List[UserID]]:
+        machines: Dict[int, Optional[Machine]] = {}
+        groups: Dict[str, List[UserID]] = {}
+        for userid, profile in data.local.user.get_all_profiles(cls.game, cls.version):
+            lid = profile.get_int("lid")
+            if lid not in machines:
+                pcbid = data.local.machine.from_machine_id(lid)
+                machines[lid] = data.local.machine.get_machine(pcbid) if pcbid is not None else None
+            machine = machines[lid]
+            if machine is None:
+                # Nobody can be in the same area as a machine that doesn't exist.
+                continue
+            groups.setdefault(cls.rival_area(machine), []).append(userid)
+        return groups
+
+    @classmethod
+    def run_scheduled_work(cls, data: Data, config: Config) -> List[Tuple[str, Dict[str, Any]]]:
+        # Refresh the world and area rival snapshots so that rival loads don't have to compute them.
+        cls.update_hiscore_snapshots(data, config)
+
         # DDR Ace has a weird bug where it sends a profile save for a blank
         # profile before reading it back when creating a new profile. If there
         # is no profile on read-back, it errors out, and it also uses the name
@@ -537,34 +567,43 @@ class DDRAce(
             return machines_by_id[lid]
 
         if loadkind == self.GAME_RIVAL_TYPE_WORLD:
-            # Just load all scores for this network
-            scores = self.data.remote.music.get_all_records(self.game, self.music_version)
+            # Load all scores for this network, from the scheduler's snapshot if there is one
+            scores, profiles_by_userid = self.get_hiscores()
         elif loadkind == self.GAME_RIVAL_TYPE_AREA:
-            if thismachine.arcade is not None:
-                match_arcade = thismachine.arcade
-                match_machine = None
+            if self.has_snapshot(self.music_version, "hiscore"):
+                # The scheduler snapshots every area along with the network records. If there
+                # is nothing for ours, nobody was in this area as of the snapshot.
+                snapshot = self.get_snapshot(self.music_version, self.rival_area(thismachine))
+                if snapshot is not None:
+                    scores, profiles_by_userid = self.records_from_snapshot(snapshot)
+                else:
+                    scores = []
             else:
-                match_arcade = None
-                match_machine = thismachine.id
-
-            # Load up all scores by any user registered on a machine in the same arcade
-            profiles = self.data.local.user.get_all_profiles(self.game, self.version)
-            userids: List[UserID] = []
-            for userid, profiledata in profiles:
-                profiles_by_userid[userid] = profiledata
-
-                # If we have an arcade to match, see if this user's location matches the arcade.
-                # If we don't, just match lid directly
-                if match_arcade is not None:
-                    theirmachine = get_machine(profiledata.get_int("lid"))
-                    if theirmachine is not None and theirmachine.arcade == match_arcade:
-                        userids.append(userid)
-                elif match_machine is not None:
-                    if profiledata.get_int("lid") == match_machine:
-                        userids.append(userid)
-
-            # Load all scores for users in the area
-            scores = self.data.local.music.get_all_records(self.game, self.music_version, userlist=userids)
+                if thismachine.arcade is not None:
+                    match_arcade = thismachine.arcade
+                    match_machine = None
+                else:
+                    match_arcade = None
+                    match_machine = thismachine.id
+
+                # Load up all scores by any user registered on a machine in the same arcade
+                profiles = self.data.local.user.get_all_profiles(self.game, self.version)
+                userids: List[UserID] = []
+                for userid, profiledata in profiles:
+                    profiles_by_userid[userid] = profiledata
+
+                    # If we have an arcade to match, see if this user's location matches the arcade.
+                    # If we don't, just match lid directly
+                    if match_arcade is not None:
+                        theirmachine = get_machine(profiledata.get_int("lid"))
+                        if theirmachine is not None and theirmachine.arcade == match_arcade:
+                            userids.append(userid)
+                    elif match_machine is not None:
+                        if profiledata.get_int("lid") == match_machine:
+                            userids.append(userid)
+
+                # Load all scores for users in the area
+                scores = self.data.local.music.get_all_records(self.game, self.music_version, userlist=userids)
         elif loadkind == self.GAME_RIVAL_TYPE_MACHINE:
             # Load up all scores and filter them by those earned at this location
             scores = self.data.local.music.get_all_records(self.game, self.music_version, locationlist=[thismachine.id])
@@ -1,5 +1,5 @@
 # vim: set fileencoding=utf-8
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from typing_extensions import Final
 
 from bemani.backend.ddr.base import DDRBase
@@ -21,7 +21,7 @@ from bemani.backend.ddr.common import (
     DDRGameTraceHandler,
 )
 from bemani.common import Time, VersionConstants, Profile, intish
-from bemani.data import Score, UserID
+from bemani.data import Config, Data, Score, UserID
 from bemani.protocol import Node
 
 
@@ -74,6 +74,15 @@ class DDRX2(
 
     GAME_MAX_SONGS: Final[int] = 600
 
+    @classmethod
+    def run_scheduled_work(cls, data: Data, config: Config) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Refresh the hiscore snapshot so that hiscore requests don't have to compute it.
+        X2 has no area hiscores, so those are left out.
+        """
+        cls.update_hiscore_snapshots(data, config, areas=False)
+        return []
+
     def previous_version(self) -> Optional[DDRBase]:
         return DDRX(self.data, self.config, self.model)
 
@@ -169,16 +178,13 @@ class DDRX2(
         # This is almost identical to X3 and above, except X3 added a 'code' field
         # that isn't present here. In the interest of correctness, keep a separate
         # implementation here.
-        records = self.data.remote.music.get_all_records(self.game, self.music_version)
+        records, users = self.get_hiscores()
 
         sortedrecords: Dict[int, Dict[int, Tuple[UserID, Score]]] = {}
-        missing_profiles = []
         for userid, score in records:
             if score.id not in sortedrecords:
                 sortedrecords[score.id] = {}
             sortedrecords[score.id][score.chart] = (userid, score)
-            missing_profiles.append(userid)
-        users = {userid: profile for (userid, profile) in self.get_any_profiles(missing_profiles)}
 
         game = Node.void("game")
         for song in sortedrecords:
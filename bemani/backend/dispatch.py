@@ -1,4 +1,5 @@
-from typing import Optional, Any
+import time
+from typing import Dict, Optional, Any
 
 from bemani.backend.base import Base, Status
 from bemani.common import Model
@@ -33,6 +34,11 @@ class Dispatch:
         self.__data = data
         self.__config = config
 
+        # Seconds spent looking up the PCBID and running the game handler for the last
+        # request, and labels describing which game, version, service and method it was.
+        self.timings: Dict[str, float] = {}
+        self.labels: Dict[str, str] = {}
+
     def log(self, msg: str, *args: Any, **kwargs: Any) -> None:
         """
         Given a message, format it and print it.
@@ -60,6 +66,8 @@ class Dispatch:
             we had a problem parsing or generating a response.
         """
         self.log("Received request:\n{}", tree)
+        self.timings = {}
+        self.labels = {}
 
         if tree.name != "call":
             # Invalid request
@@ -76,6 +84,7 @@ class Dispatch:
         pcbid = tree.attribute("srcid")
 
         # If we are enforcing, bail out if we don't recognize thie ID
+        start = time.perf_counter()
         pcb = self.__data.local.machine.get_machine(pcbid)
         if self.__config.server.enforce_pcbid and pcb is None:
             self.log("Unrecognized PCBID {}", pcbid)
@@ -103,10 +112,23 @@ class Dispatch:
                 if arcade.data.get_bool("mask_services_url"):
                     # Mask the address, no matter what the server settings are
                     config["server"]["uri"] = None
+        self.timings["pcbid"] = time.perf_counter() - start
 
         game = Base.create(self.__data, config, model)
         method = request.attribute("method")
         response = None
+        # Every distinct set of labels is kept for the life of the process, so only label with
+        # what the client sent once we know it names a registered game and a handler we have.
+        self.labels = {
+            "game": "unknown",
+            "version": "unknown",
+            "service": "unknown",
+            "method": "unknown",
+        }
+        if hasattr(game, "version"):
+            self.labels["game"] = model.gamecode
+            self.labels["version"] = str(game.version)
+        self.__data.stats.context = f"{model.gamecode} {self.labels['version']} {request.name}.{method}"
 
         # If we are enforcing, make sure the PCBID isn't specified to be
         # game-specific
@@ -142,12 +164,16 @@ class Dispatch:
                     raise UnrecognizedPCBIDException(pcbid, modelstring, config.client.address)
 
         # First, try to handle with specific service/method function
+        start = time.perf_counter()
         try:
             handler = getattr(game, f"handle_{request.name}_{method}_request")
         except AttributeError:
             handler = None
         if handler is not None:
             response = handler(request)
+            if response is not None:
+                self.labels["service"] = request.name
+                self.labels["method"] = method
 
         if response is None:
             # Now, try to pass it off to a generic service handler
@@ -157,6 +183,9 @@ class Dispatch:
                 handler = None
             if handler is not None:
                 response = handler(request)
+                if response is not None:
+                    # Generic handlers answer any method, so the method stays unlabeled.
+                    self.labels["service"] = request.name
         
         if response is None:
             # hotfix for plural mismatch
@@ -166,6 +195,10 @@ class Dispatch:
                 handler = None
             if handler is not None:
                 response = handler(request)
+                if response is not None:
+                    self.labels["service"] = request.name
+
+        self.timings["handler"] = time.perf_counter() - start
 
         if response is None:
             # Unrecognized handler
@@ -668,22 +668,26 @@ class GitadoraFuzzUp(
         else:
             all_songs = MUSICLIST_FUZZUP
 
-        musicinfo = Node.void("musicinfo")
-        root.add_child(musicinfo)
-        musicinfo.set_attribute("nr", str(len(all_songs)))
-        for music_item in all_songs:
-            music = Node.void("music")
-            musicinfo.add_child(music)
-            music.add_child(Node.s32("id", music_item[0]))
-            music.add_child(Node.bool("cont_gf", True))
-            music.add_child(Node.bool("cont_dm", True))
-            music.add_child(Node.bool("is_secret", False))  # unlock all
-            if music_item[1] == 1:
-                music.add_child(Node.bool("is_hot", True))
-            else:
-                music.add_child(Node.bool("is_hot", False))
-            music.add_child(Node.s32("data_ver", music_item[2]))
-            music.add_child(Node.u16_array("diff", music_item[3]))
+        # The music list is the same for every cabinet, so only build it once.
+        def build_musicinfo() -> Node:
+            musicinfo = Node.void("musicinfo")
+            musicinfo.set_attribute("nr", str(len(all_songs)))
+            for music_item in all_songs:
+                music = Node.void("music")
+                musicinfo.add_child(music)
+                music.add_child(Node.s32("id", music_item[0]))
+                music.add_child(Node.bool("cont_gf", True))
+                music.add_child(Node.bool("cont_dm", True))
+                music.add_child(Node.bool("is_secret", False))  # unlock all
+                if music_item[1] == 1:
+                    music.add_child(Node.bool("is_hot", True))
+                else:
+                    music.add_child(Node.bool("is_hot", False))
+                music.add_child(Node.s32("data_ver", music_item[2]))
+                music.add_child(Node.u16_array("diff", music_item[3]))
+            return musicinfo
+
+        root.add_child(self.static_node("musicinfo", build_musicinfo, self.omnimix))
 
         return root
 
@@ -12,8 +12,9 @@ from bemani.common import (
     GameConstants,
     DBConstants,
     Parallel,
+    Time,
 )
-from bemani.data import Config, Data, Score, Machine, UserID
+from bemani.data import ArcadeID, Config, Data, Score, Machine, UserID
 from bemani.protocol import Node
 
 
@@ -72,6 +73,9 @@ class IIDXBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
     DAN_RANKING_SINGLE: Final[str] = "sgrade"
     DAN_RANKING_DOUBLE: Final[str] = "dgrade"
 
+    # Dan ghosts look up every user at the requester's dan rank, see get_ghost.
+    indexed_profile_attributes: List[str] = [DAN_RANKING_SINGLE, DAN_RANKING_DOUBLE]
+
     GHOST_TYPE_NONE: Final[int] = 0
     GHOST_TYPE_RIVAL: Final[int] = 100
     GHOST_TYPE_GLOBAL_TOP: Final[int] = 200
@@ -83,6 +87,15 @@ class IIDXBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
     GHOST_TYPE_RIVAL_TOP: Final[int] = 800
     GHOST_TYPE_RIVAL_AVERAGE: Final[int] = 900
 
+    # Cohorts that the scheduler precomputes ghosts for. Arcade cohorts are suffixed with the
+    # arcade ID and dan cohorts with the dan ranking and rank they were computed for.
+    GHOST_COHORT_GLOBAL_TOP: Final[str] = "global_top"
+    GHOST_COHORT_GLOBAL_AVERAGE: Final[str] = "global_average"
+    GHOST_COHORT_LOCAL_TOP: Final[str] = "arcade_top"
+    GHOST_COHORT_LOCAL_AVERAGE: Final[str] = "arcade_average"
+    GHOST_COHORT_DAN_TOP: Final[str] = "dan_top"
+    GHOST_COHORT_DAN_AVERAGE: Final[str] = "dan_average"
+
     # Return the local2 service so that Copula and above will send certain packets.
     extra_services: List[str] = [
         "local2",
@@ -590,41 +603,35 @@ class IIDXBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
 
         return scorelist
 
+    @classmethod
     def delta_score(
-        self,
+        cls,
         scores: List[Score],
         ghost_length: int,
     ) -> Tuple[Optional[int], Optional[bytes]]:
         if len(scores) == 0:
             return None, None
 
-        total_ghost = [0] * ghost_length
-        count = 0
-
-        # Sum up for each bucket
-        for score in scores:
-            ghost = score.data.get_bytes("ghost")
-            for i in range(len(ghost)):
-                total_ghost[i] = total_ghost[i] + ghost[i]
-            count = count + 1
+        # Sum up each bucket across every ghost at once. Zipping the ghosts together walks
+        # them in C rather than in a python loop per byte, which matters for the scheduler
+        # averaging tens of thousands of ghosts per chart.
+        ghosts = [score.data.get_bytes("ghost")[:ghost_length].ljust(ghost_length, b"\0") for score in scores]
+        count = len(ghosts)
 
         # Calculate average for each bucket
-        total_ghost = [int(b / count) for b in total_ghost]
+        total_ghost = [sum(bucket) // count for bucket in zip(*ghosts)]
 
         # Grab the ex score for this new ghost, being sure to reverse the scaling rate
         new_ex_score = sum(total_ghost)
 
-        # Spread out into even buckets so we can compute deltas
-        reference_ghost = [int(new_ex_score / ghost_length)] * ghost_length
-
-        added_bucket = 0
-        try:
-            jump = max(1, int(ghost_length / (new_ex_score - sum(reference_ghost))))
-        except ZeroDivisionError:
-            jump = 1
-        while sum(reference_ghost) != new_ex_score:
-            reference_ghost[added_bucket] = reference_ghost[added_bucket] + 1
-            added_bucket = added_bucket + jump
+        # Spread out into even buckets so we can compute deltas, spacing the leftover
+        # points out evenly from the start of the ghost
+        reference_ghost = [new_ex_score // ghost_length] * ghost_length
+        leftover = new_ex_score - sum(reference_ghost)
+        if leftover > 0:
+            jump = max(1, ghost_length // leftover)
+            for i in range(leftover):
+                reference_ghost[i * jump] += 1
 
         # Calculate delta ghost
         delta_ghost = [total_ghost[i] - reference_ghost[i] for i in range(ghost_length)]
@@ -632,6 +639,237 @@ class IIDXBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
         # Return averages
         return new_ex_score, struct.pack("b" * ghost_length, *delta_ghost)
 
+    @classmethod
+    def ghost_cohort(cls, prefix: str, *qualifiers: object) -> str:
+        """
+        Build the name of a precomputed ghost cohort, such as "arcade_top:5" for the top
+        ghost amongst users who joined arcade 5 or "dan_average:sgrade:12" for the average
+        ghost of users at single dan rank 12.
+        """
+        return ":".join([prefix, *["none" if q is None else str(q) for q in qualifiers]])
+
+    @classmethod
+    def __top_ghost(
+        cls,
+        scores: List[Tuple[UserID, Score]],
+        profiles: Dict[UserID, Profile],
+    ) -> Optional[Dict[str, Any]]:
+        # The best score whose owner we have a profile for, since a ghost needs a name.
+        for top_userid, top_score in scores:
+            top_profile = profiles.get(top_userid)
+            if top_profile is None:
+                continue
+            return {
+                "score": top_score.points,
+                "ghost": top_score.data.get_bytes("ghost"),
+                "name": top_profile.get_str("name"),
+                "pid": top_profile.get_int("pid"),
+                "extid": top_profile.extid,
+            }
+        return None
+
+    @classmethod
+    def __average_ghost(
+        cls,
+        scores: List[Tuple[UserID, Score]],
+        ghost_length: int,
+    ) -> Optional[Dict[str, Any]]:
+        average_score, delta_ghost = cls.delta_score([score[1] for score in scores], ghost_length)
+        if average_score is None or delta_ghost is None:
+            return None
+        return {
+            "score": average_score,
+            "ghost": bytes([0] * ghost_length),
+        }
+
+    @classmethod
+    def compute_ghost_cohorts(
+        cls,
+        chart: int,
+        local_scores: List[Tuple[UserID, Score]],
+        global_scores: List[Tuple[UserID, Score]],
+        arcades: Dict[UserID, Optional[ArcadeID]],
+        dan_profiles: Dict[UserID, Profile],
+        profiles: Dict[UserID, Profile],
+        ghost_length: int,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Compute the top and average ghosts for every cohort that a user could ask for on a
+        single chart, exactly as get_ghost would compute them live.
+
+        Parameters:
+            chart - The chart the scores are for, used to pick single or double dan ranks.
+            local_scores - Every score on this network for the chart.
+            global_scores - Every score on this network and any connected network for the chart.
+            arcades - Mapping of user ID to the arcade of the machine they joined, for users
+                      who have joined a machine that still exists.
+            dan_profiles - Mapping of user ID to their profile for this exact game version.
+            profiles - Mapping of user ID to any profile, used for naming top ghosts.
+            ghost_length - The length of the ghost for this game version.
+
+        Returns:
+            A dictionary keyed by cohort name, suitable for put_score_cohorts.
+        """
+        local_scores = sorted(local_scores, key=lambda s: s[1].points, reverse=True)
+        global_scores = sorted(global_scores, key=lambda s: s[1].points, reverse=True)
+
+        cohorts: Dict[str, Dict[str, Any]] = {}
+
+        def add(name: str, ghost: Optional[Dict[str, Any]]) -> None:
+            if ghost is not None:
+                cohorts[name] = ghost
+
+        add(cls.GHOST_COHORT_GLOBAL_TOP, cls.__top_ghost(global_scores, profiles))
+        add(cls.GHOST_COHORT_GLOBAL_AVERAGE, cls.__average_ghost(global_scores, ghost_length))
+
+        # Bucket every local score by the arcade its owner joined and by their dan rank in
+        # a single pass, keeping each bucket in descending score order.
+        by_arcade: Dict[Optional[ArcadeID], List[Tuple[UserID, Score]]] = {}
+        by_dan: Dict[int, List[Tuple[UserID, Score]]] = {}
+        if chart in [cls.CHART_TYPE_N7, cls.CHART_TYPE_H7, cls.CHART_TYPE_A7]:
+            dan_key = cls.DAN_RANKING_SINGLE
+        else:
+            dan_key = cls.DAN_RANKING_DOUBLE
+        for score in local_scores:
+            if score[0] in arcades:
+                by_arcade.setdefault(arcades[score[0]], []).append(score)
+            if score[0] in dan_profiles:
+                by_dan.setdefault(dan_profiles[score[0]].get_int(dan_key), []).append(score)
+
+        for arcade, scores in by_arcade.items():
+            add(cls.ghost_cohort(cls.GHOST_COHORT_LOCAL_TOP, arcade), cls.__top_ghost(scores, profiles))
+            add(cls.ghost_cohort(cls.GHOST_COHORT_LOCAL_AVERAGE, arcade), cls.__average_ghost(scores, ghost_length))
+        for dan_rank, scores in by_dan.items():
+            add(cls.ghost_cohort(cls.GHOST_COHORT_DAN_TOP, dan_key, dan_rank), cls.__top_ghost(scores, profiles))
+            add(
+                cls.ghost_cohort(cls.GHOST_COHORT_DAN_AVERAGE, dan_key, dan_rank),
+                cls.__average_ghost(scores, ghost_length),
+            )
+
+        return cohorts
+
+    @classmethod
+    def update_ghost_cohorts(cls, data: Data, ghost_length: int) -> None:
+        """
+        Precompute ghost cohorts for every chart that has had a new score since the last
+        run. Once a day every chart is rebuilt, so that users moving arcades or dan ranks
+        and scores arriving from connected networks are eventually picked up.
+        """
+        rebuild = data.local.network.should_schedule(cls.game, cls.version, "ghost_cohorts", "daily")
+        machines = {machine.id: machine for machine in data.local.machine.get_all_machines()}
+        dan_profiles = {
+            userid: profile for (userid, profile) in data.local.user.get_all_profiles(cls.game, cls.version)
+        }
+
+        for music_version in [cls.version, cls.version + DBConstants.OMNIMIX_VERSION_BUMP]:
+            # Grab the time before reading scores, so anything landing while we work is
+            # picked up again next run instead of being missed.
+            now = Time.now()
+            watermark = None if rebuild else data.local.music.get_score_cohort_watermark(cls.game, music_version)
+            if watermark is not None:
+                changed = {
+                    (score.id, score.chart)
+                    for (_, score) in data.local.music.get_all_scores(cls.game, music_version, since=watermark)
+                }
+                if not changed:
+                    continue
+
+            charts: Dict[Tuple[int, int], List[Tuple[UserID, Score]]] = {}
+            for userid, score in data.local.music.get_all_scores(cls.game, music_version):
+                charts.setdefault((score.id, score.chart), []).append((userid, score))
+            if watermark is None:
+                changed = set(charts.keys())
+
+            userids = list({userid for scores in charts.values() for (userid, _) in scores})
+            profiles = {
+                userid: profile
+                for (userid, profile) in data.remote.user.get_any_profiles(cls.game, cls.version, userids)
+                if profile is not None
+            }
+            arcades: Dict[UserID, Optional[ArcadeID]] = {}
+            for userid, profile in profiles.items():
+                machine = machines.get(profile.get_int("shop_location")) if "shop_location" in profile else None
+                if machine is not None:
+                    arcades[userid] = machine.arcade
+
+            for songid, chart in changed:
+                local_scores = charts.get((songid, chart), [])
+                if data.remote.music.clients:
+                    global_scores = data.remote.music.get_all_scores(
+                        cls.game, music_version, songid=songid, songchart=chart
+                    )
+                    # Look up remote users from the top down until one has a profile, since
+                    # that is the score the global top ghost will be built from.
+                    for top_userid, _ in sorted(global_scores, key=lambda s: s[1].points, reverse=True):
+                        if top_userid in profiles:
+                            break
+                        top_profile = data.remote.user.get_any_profile(cls.game, cls.version, top_userid)
+                        if top_profile is not None:
+                            profiles[top_userid] = top_profile
+                            break
+                else:
+                    global_scores = local_scores
+
+                data.local.music.put_score_cohorts(
+                    cls.game,
+                    music_version,
+                    songid,
+                    chart,
+                    cls.compute_ghost_cohorts(
+                        chart,
+                        local_scores,
+                        global_scores,
+                        arcades,
+                        dan_profiles,
+                        profiles,
+                        ghost_length,
+                    ),
+                    now,
+                )
+
+        if rebuild:
+            data.local.network.mark_scheduled(cls.game, cls.version, "ghost_cohorts", "daily")
+
+    def __get_ghost_cohort(self, ghost_type: int, chart: int, userid: UserID) -> Optional[str]:
+        """
+        Resolve the precomputed cohort a requesting user would see for a ghost type, or
+        None if the user belongs to no cohort and so gets no ghost.
+        """
+        if ghost_type == self.GHOST_TYPE_GLOBAL_TOP:
+            return self.GHOST_COHORT_GLOBAL_TOP
+        if ghost_type == self.GHOST_TYPE_GLOBAL_AVERAGE:
+            return self.GHOST_COHORT_GLOBAL_AVERAGE
+
+        my_profile = self.get_profile(userid)
+        if my_profile is None:
+            my_profile = Profile(
+                self.game,
+                self.version,
+                "",
+                0,
+            )
+
+        if ghost_type == self.GHOST_TYPE_LOCAL_TOP or ghost_type == self.GHOST_TYPE_LOCAL_AVERAGE:
+            if "shop_location" not in my_profile:
+                return None
+            machine = self.get_machine_by_id(my_profile.get_int("shop_location"))
+            if machine is None:
+                return None
+            if ghost_type == self.GHOST_TYPE_LOCAL_TOP:
+                return self.ghost_cohort(self.GHOST_COHORT_LOCAL_TOP, machine.arcade)
+            return self.ghost_cohort(self.GHOST_COHORT_LOCAL_AVERAGE, machine.arcade)
+
+        if chart in [self.CHART_TYPE_N7, self.CHART_TYPE_H7, self.CHART_TYPE_A7]:
+            dan_key = self.DAN_RANKING_SINGLE
+        else:
+            dan_key = self.DAN_RANKING_DOUBLE
+        dan_rank = my_profile.get_int(dan_key, -1)
+        if dan_rank == -1:
+            return None
+        if ghost_type == self.GHOST_TYPE_DAN_TOP:
+            return self.ghost_cohort(self.GHOST_COHORT_DAN_TOP, dan_key, dan_rank)
+        return self.ghost_cohort(self.GHOST_COHORT_DAN_AVERAGE, dan_key, dan_rank)
+
     def user_joined_arcade(self, machine: Machine, profile: Optional[Profile]) -> bool:
         if profile is None:
             return False
@@ -663,6 +901,28 @@ class IIDXBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
     ) -> Optional[Dict[str, Any]]:
         ghost_score: Dict[str, Any] = None
 
+        if ghost_type in [
+            self.GHOST_TYPE_GLOBAL_TOP,
+            self.GHOST_TYPE_GLOBAL_AVERAGE,
+            self.GHOST_TYPE_LOCAL_TOP,
+            self.GHOST_TYPE_LOCAL_AVERAGE,
+            self.GHOST_TYPE_DAN_TOP,
+            self.GHOST_TYPE_DAN_AVERAGE,
+        ]:
+            # Serve precomputed cohorts where the scheduler has gotten to this chart. Every
+            # computed chart has a global top, so its absence means we need to fall back to
+            # building the ghost ourselves.
+            cohort = self.__get_ghost_cohort(ghost_type, chart, userid)
+            cohorts = self.data.local.music.get_score_cohorts(
+                self.game,
+                self.music_version,
+                musicid,
+                chart,
+                [self.GHOST_COHORT_GLOBAL_TOP] + ([cohort] if cohort is not None else []),
+            )
+            if self.GHOST_COHORT_GLOBAL_TOP in cohorts:
+                return cohorts.get(cohort) if cohort is not None else None
+
         if ghost_type == self.GHOST_TYPE_RIVAL:
             rival_extid = int(parameter)
             rival_userid = self.data.remote.user.from_extid(self.game, self.version, rival_extid)
@@ -788,11 +1048,14 @@ class IIDXBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
                     key=lambda s: s[1].points,
                     reverse=True,
                 )
-                all_profiles = self.data.local.user.get_all_profiles(self.game, self.version)
                 relevant_userids = {
                     profile[0]
-                    for profile in all_profiles
-                    if profile[1].get_int(self.DAN_RANKING_DOUBLE if is_dp else self.DAN_RANKING_SINGLE) == dan_rank
+                    for profile in self.data.local.user.get_profiles_by_attribute(
+                        self.game,
+                        self.version,
+                        self.DAN_RANKING_DOUBLE if is_dp else self.DAN_RANKING_SINGLE,
+                        [dan_rank],
+                    )
                 }
                 relevant_scores = [score for score in all_scores if score[0] in relevant_userids]
                 if ghost_type == self.GHOST_TYPE_DAN_TOP:
@@ -140,6 +140,10 @@ class IIDXCannonBallers(IIDXCourse, IIDXBase):
 
                 # Mark that we did some actual work here.
                 data.local.network.mark_scheduled(cls.game, cls.version, "daily_charts", "daily")
+
+        # Precompute ghosts for charts that have been played since the last run.
+        cls.update_ghost_cohorts(data, cls.GAME_GHOST_LENGTH)
+
         return events
 
     @classmethod
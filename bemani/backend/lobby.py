@@ -0,0 +1,193 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing_extensions import Final
+
+from bemani.common import GameConstants, Profile, Time, ValidatedDict, cache
+from bemani.data import Data, UserID
+
+
+class LobbyIndex:
+    """
+    An index of the open lobbies for a single game version, grouped by the lobby field that
+    games match on, alongside the profile and play session fields of the player that owns
+    each lobby. Matchmaking can then find candidates and everything it needs to send back
+    about them in one lookup instead of going to the DB for each candidate.
+
+    The index lives in the cache, which is in-process by default and shared between
+    processes when memcached or a filesystem cache is configured. The DB is the source of
+    truth. The index is never modified in place, since two processes doing that at once
+    would overwrite each other's changes. Instead every change goes to the DB and drops
+    the cached index, and the next lookup rebuilds it. It is also rebuilt from the DB every
+    REBUILD_INTERVAL seconds so that changes made by processes that don't share a cache
+    show up shortly after.
+    """
+
+    # Number of seconds an index is trusted before it is rebuilt from the DB.
+    REBUILD_INTERVAL: Final[int] = 10
+
+    # Lobbies older than this are dead, matching what the lobby table itself prunes.
+    MAX_AGE: Final[int] = Time.SECONDS_IN_HOUR
+
+    def __init__(
+        self,
+        data: Data,
+        game: GameConstants,
+        version: int,
+        key: Optional[str] = None,
+        profile_keys: Sequence[str] = (),
+        session_keys: Sequence[str] = (),
+    ) -> None:
+        """
+        Initialize the index.
+
+        Parameters:
+            data - Data singleton to read and write lobbies with.
+            game - Enum value identifying a game series.
+            version - Integer identifying the version of the game in the series.
+            key - Lobby field to group lobbies by for lookup, or None to keep one group.
+            profile_keys - Fields of the owner's profile to keep with each lobby. When
+                           this is empty, profiles are not looked up at all.
+            session_keys - Fields of the owner's play session to keep with each lobby. The
+                           session's 'id' and 'time' are always kept when there is one.
+        """
+        self.data = data
+        self.game = game
+        self.version = version
+        self.key = key
+        self.profile_keys = list(profile_keys)
+        self.session_keys = list(session_keys)
+
+    def __cache_key(self) -> str:
+        return f"LobbyIndex.{self.game.value}.{self.version}"
+
+    def __group(self, lobby: Dict[str, Any]) -> Any:
+        return lobby.get(self.key) if self.key is not None else None
+
+    def __entry(
+        self,
+        userid: UserID,
+        lobby: Dict[str, Any],
+        profile: Optional[Profile],
+        session: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        return {
+            "userid": userid,
+            "lobby": dict(lobby),
+            "extid": profile.extid if profile is not None else None,
+            "profile": {k: profile[k] for k in self.profile_keys if k in profile} if profile is not None else None,
+            "session": (
+                {k: session[k] for k in ["id", "time", *self.session_keys] if k in session}
+                if session is not None
+                else None
+            ),
+        }
+
+    def __rebuild(self) -> Dict[str, Any]:
+        lobbies = self.data.local.lobby.get_all_lobbies(self.game, self.version, max_age=self.MAX_AGE)
+        sessions: Dict[UserID, ValidatedDict] = {}
+        if lobbies:
+            sessions = dict(self.data.local.lobby.get_all_play_session_infos(self.game, self.version))
+        profiles: Dict[UserID, Optional[Profile]] = {}
+        if lobbies and self.profile_keys:
+            profiles = dict(
+                self.data.remote.user.get_any_profiles(self.game, self.version, [userid for userid, _ in lobbies])
+            )
+
+        groups: Dict[Any, Dict[UserID, Dict[str, Any]]] = {}
+        for userid, lobby in lobbies:
+            profile = profiles.get(userid)
+            if self.profile_keys and profile is None:
+                # Lobbies are only ever created by players with profiles.
+                continue
+            groups.setdefault(self.__group(lobby), {})[userid] = self.__entry(
+                userid, lobby, profile, sessions.get(userid)
+            )
+
+        return {"built": Time.now(), "groups": groups}
+
+    def __load(self) -> Dict[str, Any]:
+        index = cache.get(self.__cache_key())
+        if index is None:
+            index = self.__rebuild()
+            self.__store(index)
+        return index
+
+    def __store(self, index: Dict[str, Any]) -> None:
+        # Expire the cached copy when it is due for a rebuild, so the next lookup rebuilds it.
+        timeout = max(index["built"] + self.REBUILD_INTERVAL - Time.now(), 1)
+        cache.set(self.__cache_key(), index, timeout=timeout)
+
+    def refresh(self) -> None:
+        """
+        Rebuild the index from the DB right away, for when a caller expected to find a lobby
+        that another process may have created since the index was last rebuilt.
+        """
+        self.__store(self.__rebuild())
+
+    def lookup(
+        self,
+        value: Any = None,
+        max_age: int = MAX_AGE,
+    ) -> List[Tuple[UserID, ValidatedDict, Optional[Profile], Optional[ValidatedDict]]]:
+        """
+        Look up open lobbies.
+
+        Parameters:
+            value - Value of the key field to match lobbies on. Ignored if the index has no key.
+            max_age - Lobbies older than this many seconds are not returned.
+
+        Returns:
+            A list of tuples of the owner's UserID, the lobby as get_lobby would return it,
+            a profile containing the owner's extid and indexed profile fields (or None if
+            profiles are not indexed) and the owner's indexed play session fields (or None
+            if they had no play session when the lobby was indexed), oldest lobby first.
+        """
+        index = self.__load()
+        if self.key is not None:
+            groups = [index["groups"].get(value, {})]
+        else:
+            groups = list(index["groups"].values())
+
+        oldest = Time.now() - max_age
+        entries = sorted(
+            (entry for group in groups for entry in group.values() if entry["lobby"]["time"] > oldest),
+            key=lambda entry: entry["lobby"]["id"],
+        )
+        return [
+            (
+                UserID(entry["userid"]),
+                ValidatedDict(entry["lobby"]),
+                (
+                    Profile(self.game, self.version, "", entry["extid"], entry["profile"])
+                    if entry["profile"] is not None
+                    else None
+                ),
+                ValidatedDict(entry["session"]) if entry["session"] is not None else None,
+            )
+            for entry in entries
+        ]
+
+    def put(self, userid: UserID, data: Dict[str, Any]) -> ValidatedDict:
+        """
+        Create or update the lobby owned by a user, and drop the index so it is rebuilt
+        with the change on the next lookup.
+
+        Parameters:
+            userid - Integer identifying the user who owns the lobby.
+            data - A dictionary of lobby information to store.
+
+        Returns:
+            The lobby as get_lobby would return it after saving.
+        """
+        self.data.local.lobby.put_lobby(self.game, self.version, userid, data)
+        cache.delete(self.__cache_key())
+        return self.data.local.lobby.get_lobby(self.game, self.version, userid)
+
+    def destroy(self, lobbyid: int) -> None:
+        """
+        Destroy a lobby, and drop the index so it is rebuilt without it on the next lookup.
+
+        Parameters:
+            lobbyid - Integer identifying a lobby, as found in the lobby's 'id' field.
+        """
+        self.data.local.lobby.destroy_lobby(lobbyid)
+        cache.delete(self.__cache_key())
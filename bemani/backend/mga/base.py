@@ -3,6 +3,7 @@ from typing import Optional
 
 from bemani.backend.base import Base
 from bemani.backend.core import CoreHandler, CardManagerHandler, PASELIHandler
+from bemani.backend.lobby import LobbyIndex
 from bemani.common import GameConstants
 
 
@@ -19,3 +20,15 @@ class MetalGearArcadeBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
         be overridden.
         """
         return None
+
+    def get_lobby_index(self) -> LobbyIndex:
+        """
+        Returns the index of open matching lobbies for this version, along with
+        the connection details of the host of each lobby.
+        """
+        return LobbyIndex(
+            self.data,
+            self.game,
+            self.version,
+            session_keys=["joinip", "joinport", "localip", "localport", "pcbid"],
+        )
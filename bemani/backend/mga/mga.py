@@ -158,13 +158,18 @@ class MetalGearArcade(
         # Look up active lobbies, see if there was a previous one for us.
         # Matchmaking takes at most 60 seconds, so assume any lobbies older
         # than this are dead.
-        lobbies = self.data.local.lobby.get_all_lobbies(self.game, self.version, max_age=wait_time)
-        previous_hosted_lobbies = [True for uid, _ in lobbies if uid == userid]
-        previous_joined_lobbies = [(uid, lobby) for uid, lobby in lobbies if userid in lobby["participants"]]
+        lobby_index = self.get_lobby_index()
+        lobbies = [
+            (uid, lobby, host_info)
+            for uid, lobby, _, host_info in lobby_index.lookup(max_age=wait_time)
+            if host_info is not None
+        ]
+        previous_hosted_lobbies = [True for uid, _, _ in lobbies if uid == userid]
+        previous_joined_lobbies = [entry for entry in lobbies if userid in entry[1]["participants"]]
 
         # See if there's a random lobby we can be slotted into. Don't choose potentially
         # our old one, since it will be overwritten by a new entry, if we were ever a host.
-        nonfull_lobbies = [(uid, lobby) for uid, lobby in lobbies if len(lobby["participants"]) < lobby["lobbysize"]]
+        nonfull_lobbies = [entry for entry in lobbies if len(entry[1]["participants"]) < entry[1]["lobbysize"]]
 
         # Make sure to put our session information somewhere that we can find again.
         self.data.local.lobby.put_play_session_info(
@@ -189,35 +194,36 @@ class MetalGearArcade(
         if (nonfull_lobbies or previous_joined_lobbies) and not previous_hosted_lobbies:
             if previous_joined_lobbies:
                 # If we're already "in" a lobby, we should go back to that one.
-                uid, lobby = previous_joined_lobbies[0]
+                uid, lobby, host_play_session_info = previous_joined_lobbies[0]
             else:
                 # Pick a random one, assign ourselves to it.
-                uid, lobby = random.choice(nonfull_lobbies)
-
-            # Look up the host's information.
-            host_play_session_info = self.data.local.lobby.get_play_session_info(
-                self.game,
-                self.version,
-                uid,
-            )
-
-            # Join this lobby.
-            participants = set(lobby["participants"])
-            participants.add(userid)
-            lobby["participants"] = list(participants)
-            self.data.local.lobby.put_lobby(self.game, self.version, uid, lobby)
-
-            # Now that we've joined the lobby, tell the game about our host ID.
-            root = Node.void("matching")
-            root.add_child(
-                Node.s32("result", 1)
-            )  # Setting this to 1 makes the client consider itself a guest and join a host.
-            root.add_child(Node.s64("hostid", lobby.get_int("id")))
-            root.add_child(Node.string("hostip_g", host_play_session_info.get_str("joinip")))
-            root.add_child(Node.s32("hostport_g", host_play_session_info.get_int("joinport")))
-            root.add_child(Node.string("hostip_l", host_play_session_info.get_str("localip")))
-            root.add_child(Node.s32("hostport_l", host_play_session_info.get_int("localport")))
-            return root
+                uid, lobby, host_play_session_info = random.choice(nonfull_lobbies)
+
+            # The index can be behind joins made by other processes, so join the lobby as
+            # it is in the DB right now. If it filled up or went away, host our own instead.
+            current = self.data.local.lobby.get_lobby(self.game, self.version, uid)
+            if (
+                current is not None
+                and current.get_int("id") == lobby.get_int("id")
+                and (userid in current["participants"] or len(current["participants"]) < current["lobbysize"])
+            ):
+                # Join this lobby.
+                participants = set(current["participants"])
+                participants.add(userid)
+                current["participants"] = list(participants)
+                lobby = lobby_index.put(uid, current)
+
+                # Now that we've joined the lobby, tell the game about our host ID.
+                root = Node.void("matching")
+                root.add_child(
+                    Node.s32("result", 1)
+                )  # Setting this to 1 makes the client consider itself a guest and join a host.
+                root.add_child(Node.s64("hostid", lobby.get_int("id")))
+                root.add_child(Node.string("hostip_g", host_play_session_info.get_str("joinip")))
+                root.add_child(Node.s32("hostport_g", host_play_session_info.get_int("joinport")))
+                root.add_child(Node.string("hostip_l", host_play_session_info.get_str("localip")))
+                root.add_child(Node.s32("hostport_l", host_play_session_info.get_int("localport")))
+                return root
 
         # The game does weird things if you let it wait as long as its own countdown,
         # so subtract a bit of wiggle-room from the wait time as reported by the game.
@@ -225,9 +231,7 @@ class MetalGearArcade(
 
         # Create a lobby with this player as the "host", since there are no non-full lobbies
         # or we were previously a host and want to be one again.
-        self.data.local.lobby.put_lobby(
-            self.game,
-            self.version,
+        lobby = lobby_index.put(
             userid,
             {
                 "matchgrp": request.child_value("data/matchgrp"),
@@ -237,11 +241,6 @@ class MetalGearArcade(
                 "participants": [userid],
             },
         )
-        lobby = self.data.local.lobby.get_lobby(
-            self.game,
-            self.version,
-            userid,
-        )
 
         # Now that we've created a lobby for ourselves, tell the game about our host ID.
         root = Node.void("matching")
@@ -259,13 +258,19 @@ class MetalGearArcade(
         host_id = request.child_value("data/hostid")
 
         # List all lobbies out, find the one that we're either a host or a guest of.
-        lobbies = self.data.local.lobby.get_all_lobbies(self.game, self.version)
+        lobby_index = self.get_lobby_index()
         info_by_uid = {
             uid: data for uid, data in self.data.local.lobby.get_all_play_session_infos(self.game, self.version)
         }
 
-        # We should be able to filter by host_id that the game gave us.
-        joined_lobby = [(uid, lobby) for uid, lobby in lobbies if lobby.get_int("id") == host_id]
+        # We should be able to filter by host_id that the game gave us. If we can't, the lobby
+        # might have been created by another process since our index was last rebuilt.
+        joined_lobby = [(uid, lobby) for uid, lobby, _, _ in lobby_index.lookup() if lobby.get_int("id") == host_id]
+        if len(joined_lobby) != 1:
+            lobby_index.refresh()
+            joined_lobby = [
+                (uid, lobby) for uid, lobby, _, _ in lobby_index.lookup() if lobby.get_int("id") == host_id
+            ]
         if len(joined_lobby) != 1:
             # This shouldn't happen.
             root = Node.void("matching")
@@ -33,8 +33,7 @@ class MusecaGameHiscoreHandler(MusecaBase):
             info.add_child(Node.u32("cnt", count))
 
         # Now, grab user records
-        records = self.data.remote.music.get_all_records(self.game, self.version)
-        users = {uid: prof for (uid, prof) in self.get_any_profiles([r[0] for r in records])}
+        records, area_records, users = self.get_hiscores(locid)
 
         hiscore_allover = Node.void("hiscore_allover")
         game.add_child(hiscore_allover)
@@ -56,22 +55,12 @@ class MusecaGameHiscoreHandler(MusecaBase):
             # Add to global scores
             hiscore_allover.add_child(info)
 
-        # Now, grab local records
-        area_users = [
-            uid
-            for (uid, prof) in self.data.local.user.get_all_profiles(self.game, self.version)
-            if prof.get_int("loc", -1) == locid
-        ]
-        records = self.data.local.music.get_all_records(self.game, self.version, userlist=area_users)
-        missing_players = [uid for (uid, _) in records if uid not in users]
-        for uid, prof in self.get_any_profiles(missing_players):
-            users[uid] = prof
-
+        # Now, output local records
         hiscore_location = Node.void("hiscore_location")
         game.add_child(hiscore_location)
 
         # Output records
-        for userid, score in records:
+        for userid, score in area_records:
             info = Node.void("info")
 
             if userid not in users:
@@ -4,6 +4,7 @@ from typing_extensions import Final
 
 from bemani.backend.base import Base
 from bemani.backend.core import CoreHandler, CardManagerHandler, PASELIHandler
+from bemani.backend.lobby import LobbyIndex
 from bemani.common import Profile, ValidatedDict, GameConstants, DBConstants, Time
 from bemani.data import Machine, ScoreSaveException, UserID
 from bemani.protocol import Node
@@ -15,6 +16,7 @@ class ReflecBeatBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
     """
 
     game: GameConstants = GameConstants.REFLEC_BEAT
+    indexed_profile_attributes: List[str] = ["lid"]
 
     # Chart types, as stored in the DB
     CHART_TYPE_BASIC: Final[int] = 0
@@ -42,6 +44,9 @@ class ReflecBeatBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
         "lobby2",
     ]
 
+    # Lobby field that lobby reads match other players on, for versions that send one.
+    lobby_match_key: Optional[str] = None
+
     def previous_version(self) -> Optional["ReflecBeatBase"]:
         """
         Returns the previous version of the game, based on this game. Should
@@ -104,6 +109,19 @@ class ReflecBeatBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
         else:
             return oldprofile
 
+    def get_lobby_index(self) -> LobbyIndex:
+        """
+        Returns the index of open lobbies for this version, along with the profile
+        and play session fields that lobby entries and reads send back.
+        """
+        return LobbyIndex(
+            self.data,
+            self.game,
+            self.version,
+            key=self.lobby_match_key,
+            profile_keys=["name", "uattr", "exp", "mg"],
+        )
+
     def get_machine_by_id(self, shop_id: int) -> Optional[Machine]:
         pcbid = self.data.local.machine.from_machine_id(shop_id)
         if pcbid is not None:
@@ -12,6 +12,7 @@ from bemani.protocol import Node
 class ReflecBeatColette(ReflecBeatBase):
     name: str = "REFLEC BEAT colette"
     version: int = VersionConstants.REFLEC_BEAT_COLETTE
+    lobby_match_key: Optional[str] = "ver"
 
     # Clear types according to the game
     GAME_CLEAR_TYPE_NO_PLAY: Final[int] = 0
@@ -352,9 +353,7 @@ class ReflecBeatColette(ReflecBeatBase):
         userid = self.data.remote.user.from_extid(self.game, self.version, extid)
         if userid is not None:
             profile = self.get_profile(userid)
-            self.data.local.lobby.put_lobby(
-                self.game,
-                self.version,
+            lobby = self.get_lobby_index().put(
                 userid,
                 {
                     "mid": request.child_value("e/mid"),
@@ -375,11 +374,6 @@ class ReflecBeatColette(ReflecBeatBase):
                     "ver": request.child_value("e/ver"),
                 },
             )
-            lobby = self.data.local.lobby.get_lobby(
-                self.game,
-                self.version,
-                userid,
-            )
             root.add_child(Node.s32("eid", lobby.get_int("id")))
             e = Node.void("e")
             root.add_child(e)
@@ -419,19 +413,15 @@ class ReflecBeatColette(ReflecBeatBase):
         limit = request.child_value("max")
         userid = self.data.remote.user.from_extid(self.game, self.version, extid)
         if userid is not None:
-            lobbies = self.data.local.lobby.get_all_lobbies(self.game, self.version)
-            for user, lobby in lobbies:
+            lobbies = self.get_lobby_index().lookup(ver)
+            for user, lobby, profile, _ in lobbies:
                 if limit <= 0:
                     break
 
                 if user == userid:
                     # If we have our own lobby, don't return it
                     continue
-                if ver != lobby.get_int("ver"):
-                    # Don't return lobby data for different versions
-                    continue
 
-                profile = self.get_profile(user)
                 if profile is None:
                     # No profile info, don't return this lobby
                     continue
@@ -466,7 +456,7 @@ class ReflecBeatColette(ReflecBeatBase):
 
     def handle_lobby_delete_request(self, request: Node) -> Node:
         eid = request.child_value("eid")
-        self.data.local.lobby.destroy_lobby(eid)
+        self.get_lobby_index().destroy(eid)
         return Node.void("lobby")
 
     def handle_player_start_request(self, request: Node) -> Node:
@@ -611,7 +601,7 @@ class ReflecBeatColette(ReflecBeatBase):
                 userid,
             )
             if lobby is not None:
-                self.data.local.lobby.destroy_lobby(lobby.get_int("id"))
+                self.get_lobby_index().destroy(lobby.get_int("id"))
             self.data.local.lobby.destroy_play_session_info(self.game, self.version, userid)
 
         return Node.void("player")
@@ -333,9 +333,7 @@ class ReflecBeatLimelight(ReflecBeatBase):
         userid = self.data.remote.user.from_extid(self.game, self.version, extid)
         if userid is not None:
             profile = self.get_profile(userid)
-            self.data.local.lobby.put_lobby(
-                self.game,
-                self.version,
+            lobby = self.get_lobby_index().put(
                 userid,
                 {
                     "mid": request.child_value("e/mid"),
@@ -355,11 +353,6 @@ class ReflecBeatLimelight(ReflecBeatBase):
                     "la": request.child_value("e/la"),
                 },
             )
-            lobby = self.data.local.lobby.get_lobby(
-                self.game,
-                self.version,
-                userid,
-            )
             root.add_child(Node.s32("eid", lobby.get_int("id")))
             e = Node.void("e")
             root.add_child(e)
@@ -397,8 +390,8 @@ class ReflecBeatLimelight(ReflecBeatBase):
         limit = request.child_value("max")
         userid = self.data.remote.user.from_extid(self.game, self.version, extid)
         if userid is not None:
-            lobbies = self.data.local.lobby.get_all_lobbies(self.game, self.version)
-            for user, lobby in lobbies:
+            lobbies = self.get_lobby_index().lookup()
+            for user, lobby, profile, _ in lobbies:
                 if limit <= 0:
                     break
 
@@ -406,7 +399,6 @@ class ReflecBeatLimelight(ReflecBeatBase):
                     # If we have our own lobby, don't return it
                     continue
 
-                profile = self.get_profile(user)
                 if profile is None:
                     # No profile info, don't return this lobby
                     continue
@@ -440,7 +432,7 @@ class ReflecBeatLimelight(ReflecBeatBase):
 
     def handle_lobby_delete_request(self, request: Node) -> Node:
         eid = request.child_value("eid")
-        self.data.local.lobby.destroy_lobby(eid)
+        self.get_lobby_index().destroy(eid)
         return Node.void("lobby")
 
     def handle_player_start_request(self, request: Node) -> Node:
@@ -513,7 +505,7 @@ class ReflecBeatLimelight(ReflecBeatBase):
                 userid,
             )
             if lobby is not None:
-                self.data.local.lobby.destroy_lobby(lobby.get_int("id"))
+                self.get_lobby_index().destroy(lobby.get_int("id"))
             self.data.local.lobby.destroy_play_session_info(self.game, self.version, userid)
 
         return Node.void("player")
@@ -1,14 +1,17 @@
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from typing_extensions import Final
 
 from bemani.backend.reflec.base import ReflecBeatBase
 
 from bemani.common import ID, Time, Profile
-from bemani.data import Attempt, UserID
+from bemani.data import UserID
 from bemani.protocol import Node
 
 
 class ReflecBeatVolzzaBase(ReflecBeatBase):
+    lobby_match_key: Optional[str] = "ver"
+    daily_points: bool = True
+
     # Clear types according to the game
     GAME_CLEAR_TYPE_NO_PLAY: Final[int] = 0
     GAME_CLEAR_TYPE_EARLY_FAILED: Final[int] = 1
@@ -79,56 +82,25 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
         yesterday = Node.void("yesterday")
         shop_score.add_child(yesterday)
 
-        all_profiles = self.data.local.user.get_all_profiles(self.game, self.version)
-        all_attempts = self.data.local.music.get_all_attempts(
-            self.game,
-            self.version,
-            timelimit=(Time.beginning_of_today() - Time.SECONDS_IN_DAY),
-        )
         machine = self.data.local.machine.get_machine(self.config.machine.pcbid)
         if machine.arcade is not None:
             lids = [machine.id for machine in self.data.local.machine.get_all_machines(machine.arcade)]
         else:
             lids = [machine.id]
 
-        relevant_profiles = [profile for profile in all_profiles if profile[1].get_int("lid", -1) in lids]
+        relevant_profiles = self.data.local.user.get_profiles_by_attribute(self.game, self.version, "lid", lids)
 
         for rootnode, timeoffset in [
             (today, 0),
             (yesterday, Time.SECONDS_IN_DAY),
         ]:
-            # Grab all attempts made in the relevant day
-            relevant_attempts = [
-                attempt
-                for attempt in all_attempts
-                if (
-                    attempt[1].timestamp >= (Time.beginning_of_today() - timeoffset)
-                    and attempt[1].timestamp <= (Time.end_of_today() - timeoffset)
-                )
-            ]
-
-            # Calculate scores based on attempt
-            scores_by_user: Dict[UserID, Dict[int, Dict[int, Attempt]]] = {}
-            for userid, attempt in relevant_attempts:
-                if userid not in scores_by_user:
-                    scores_by_user[userid] = {}
-                if attempt.id not in scores_by_user[userid]:
-                    scores_by_user[userid][attempt.id] = {}
-                if attempt.chart not in scores_by_user[userid][attempt.id]:
-                    # No high score for this yet, just use this attempt
-                    scores_by_user[userid][attempt.id][attempt.chart] = attempt
-                else:
-                    # If this attempt is better than the stored one, replace it
-                    if scores_by_user[userid][attempt.id][attempt.chart].points < attempt.points:
-                        scores_by_user[userid][attempt.id][attempt.chart] = attempt
-
-            # Calculate points earned by user in the day
-            points_by_user: Dict[UserID, int] = {}
-            for userid in scores_by_user:
-                points_by_user[userid] = 0
-                for mid in scores_by_user[userid]:
-                    for chart in scores_by_user[userid][mid]:
-                        points_by_user[userid] = points_by_user[userid] + scores_by_user[userid][mid][chart].points
+            # Grab points earned by each user in the relevant day
+            points_by_user = self.data.local.music.get_daily_points(
+                self.game,
+                self.version,
+                (Time.beginning_of_today() - timeoffset) // Time.SECONDS_IN_DAY,
+                [userid for userid, _ in relevant_profiles],
+            )
 
             # Output that day's earned points
             for userid, profile in relevant_profiles:
@@ -266,9 +238,7 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
             if profile is None or info is None:
                 return root
 
-            self.data.local.lobby.put_lobby(
-                self.game,
-                self.version,
+            lobby = self.get_lobby_index().put(
                 userid,
                 {
                     "mid": request.child_value("e/mid"),
@@ -286,11 +256,6 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
                     "ver": request.child_value("e/ver"),
                 },
             )
-            lobby = self.data.local.lobby.get_lobby(
-                self.game,
-                self.version,
-                userid,
-            )
             root.add_child(Node.s32("eid", lobby.get_int("id")))
             e = Node.void("e")
             root.add_child(e)
@@ -328,23 +293,18 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
         limit = request.child_value("max")
         userid = self.data.remote.user.from_extid(self.game, self.version, extid)
         if userid is not None:
-            lobbies = self.data.local.lobby.get_all_lobbies(self.game, self.version)
-            for user, lobby in lobbies:
+            lobbies = self.get_lobby_index().lookup(ver)
+            for user, lobby, profile, info in lobbies:
                 if limit <= 0:
                     break
 
                 if user == userid:
                     # If we have our own lobby, don't return it
                     continue
-                if ver != lobby.get_int("ver"):
-                    # Don't return lobby data for different versions
-                    continue
 
-                profile = self.get_profile(user)
-                info = self.data.local.lobby.get_play_session_info(self.game, self.version, userid)
                 if profile is None or info is None:
-                    # No profile info, don't return this lobby
-                    return root
+                    # No profile or play session info, don't return this lobby
+                    continue
 
                 e = Node.void("e")
                 root.add_child(e)
@@ -374,7 +334,7 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
 
     def handle_lobby_rb5_lobby_delete_entry_request(self, request: Node) -> Node:
         eid = request.child_value("eid")
-        self.data.local.lobby.destroy_lobby(eid)
+        self.get_lobby_index().destroy(eid)
         return Node.void("lobby")
 
     def handle_pcb_rb5_pcb_boot_request(self, request: Node) -> Node:
@@ -471,7 +431,7 @@ class ReflecBeatVolzzaBase(ReflecBeatBase):
                 userid,
             )
             if lobby is not None:
-                self.data.local.lobby.destroy_lobby(lobby.get_int("id"))
+                self.get_lobby_index().destroy(lobby.get_int("id"))
             self.data.local.lobby.destroy_play_session_info(self.game, self.version, userid)
 
         return Node.void("player")
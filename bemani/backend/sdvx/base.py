@@ -1,11 +1,11 @@
 # vim: set fileencoding=utf-8
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from typing_extensions import Final
 
 from bemani.backend.base import Base
 from bemani.backend.core import CoreHandler, CardManagerHandler, PASELIHandler
 from bemani.common import Profile, ValidatedDict, GameConstants, DBConstants, Parallel
-from bemani.data import UserID
+from bemani.data import Config, Data, Score, UserID
 from bemani.protocol import Node
 
 
@@ -15,6 +15,7 @@ class SoundVoltexBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
     """
 
     game: GameConstants = GameConstants.SDVX
+    indexed_profile_attributes: List[str] = ["loc"]
 
     CLEAR_TYPE_NO_PLAY: Final[int] = DBConstants.SDVX_CLEAR_TYPE_NO_PLAY
     CLEAR_TYPE_FAILED: Final[int] = DBConstants.SDVX_CLEAR_TYPE_FAILED
@@ -107,6 +108,81 @@ class SoundVoltexBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
         """
         return oldprofile
 
+    @classmethod
+    def run_scheduled_work(cls, data: Data, config: Config) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Refresh the hiscore snapshots so that hiscore requests don't have to compute them.
+        """
+        cls.update_hiscore_snapshots(data, config)
+        return []
+
+    @classmethod
+    def update_hiscore_snapshots(cls, data: Data, config: Config) -> None:
+        """
+        Snapshot the network records, the records of users at every location and the clear
+        rates, for get_hiscores and get_clear_rates to serve from.
+        """
+        if not cls.snapshot_due(data, config, cls.version, "hiscore"):
+            return
+
+        global_records = data.remote.music.get_all_records(cls.game, cls.version)
+        area_users: Dict[int, List[UserID]] = {}
+        for userid, profile in data.local.user.get_all_profiles(cls.game, cls.version):
+            if "loc" in profile:
+                area_users.setdefault(profile.get_int("loc"), []).append(userid)
+        area_records = {
+            locid: data.local.music.get_all_records(cls.game, cls.version, userlist=userids)
+            for locid, userids in area_users.items()
+        }
+        users = cls.get_any_profiles_for(
+            data,
+            [userid for (userid, _) in global_records]
+            + [userid for records in area_records.values() for (userid, _) in records],
+        )
+
+        cls.put_snapshot(data, cls.version, "clear_rates", cls.snapshot_chart_stats(cls.compute_clear_rates(data)))
+        for locid, records in area_records.items():
+            cls.put_snapshot(data, cls.version, f"hiscore:{locid}", cls.snapshot_records(records, users))
+
+        # Written last, since its age decides when all of the above is refreshed.
+        cls.put_snapshot(data, cls.version, "hiscore", cls.snapshot_records(global_records, users))
+
+    def get_hiscores(
+        self, locid: Optional[int]
+    ) -> Tuple[List[Tuple[UserID, Score]], List[Tuple[UserID, Score]], Dict[UserID, Profile]]:
+        """
+        Returns the network records, the records of users who last played at the given
+        location and the profile of every user holding one of those records. These come
+        from the scheduler's snapshot when there is a fresh one, and are looked up otherwise.
+        Games without location records can pass None for the location to skip them.
+        """
+        snapshot = self.get_snapshot(self.version, "hiscore")
+        if snapshot is not None:
+            global_records, users = self.records_from_snapshot(snapshot)
+            area_snapshot = self.get_snapshot(self.version, f"hiscore:{locid}") if locid is not None else None
+            if area_snapshot is None:
+                # Nobody had played at this location as of the snapshot.
+                return global_records, [], users
+            area_records, area_users = self.records_from_snapshot(area_snapshot)
+            return global_records, area_records, {**users, **area_users}
+
+        global_records = self.data.remote.music.get_all_records(self.game, self.version)
+        if locid is not None:
+            users = {
+                uid: prof
+                for (uid, prof) in self.data.local.user.get_profiles_by_attribute(
+                    self.game, self.version, "loc", [locid]
+                )
+            }
+            area_records = self.data.local.music.get_all_records(self.game, self.version, userlist=list(users.keys()))
+        else:
+            users = {}
+            area_records = []
+        missing_users = [userid for (userid, _) in global_records + area_records if userid not in users]
+        for userid, profile in self.get_any_profiles(missing_users):
+            users[userid] = profile
+        return global_records, area_records, users
+
     def get_clear_rates(self) -> Dict[int, Dict[int, Dict[str, int]]]:
         """
         Returns a dictionary similar to the following:
@@ -120,16 +196,28 @@ class SoundVoltexBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
                 },
             },
         }
+
+        This comes from the scheduler's snapshot when there is a fresh one.
+        """
+        snapshot = self.get_snapshot(self.version, "clear_rates")
+        if snapshot is not None:
+            return self.chart_stats_from_snapshot(snapshot)
+        return self.compute_clear_rates(self.data)
+
+    @classmethod
+    def compute_clear_rates(cls, data: Data) -> Dict[int, Dict[int, Dict[str, int]]]:
+        """
+        Computes the clear rates returned by get_clear_rates.
         """
         all_attempts, remote_attempts = Parallel.execute(
             [
-                lambda: self.data.local.music.get_all_attempts(
-                    game=self.game,
-                    version=self.version,
+                lambda: data.local.music.get_all_attempts(
+                    game=cls.game,
+                    version=cls.version,
                 ),
-                lambda: self.data.remote.music.get_clear_rates(
-                    game=self.game,
-                    version=self.version,
+                lambda: data.remote.music.get_clear_rates(
+                    game=cls.game,
+                    version=cls.version,
                 ),
             ]
         )
@@ -155,9 +243,9 @@ class SoundVoltexBase(CoreHandler, CardManagerHandler, PASELIHandler, Base):
             )
             attempts[attempt.id][attempt.chart]["total"] += 1
 
-            if attempt.data.get_int("clear_type", self.CLEAR_TYPE_NO_PLAY) in [
-                self.CLEAR_TYPE_NO_PLAY,
-                self.CLEAR_TYPE_FAILED,
+            if attempt.data.get_int("clear_type", cls.CLEAR_TYPE_NO_PLAY) in [
+                cls.CLEAR_TYPE_NO_PLAY,
+                cls.CLEAR_TYPE_FAILED,
             ]:
                 # This attempt was a failure, so don't count it against clears of full combos
                 continue
@@ -214,20 +214,16 @@ class SoundVoltexBooth(
         game.add_child(hiscore)
         hiscore.set_attribute("type", "1")
 
-        records = self.data.remote.music.get_all_records(self.game, self.version)
+        records, _, users = self.get_hiscores(None)
 
         # Organize by song->chart
         records_by_id: Dict[int, Dict[int, Tuple[UserID, Score]]] = {}
-        missing_users = []
         for record in records:
             userid, score = record
             if score.id not in records_by_id:
                 records_by_id[score.id] = {}
 
             records_by_id[score.id][score.chart] = record
-            missing_users.append(userid)
-
-        users = {userid: profile for (userid, profile) in self.get_any_profiles(missing_users)}
 
         # Output records
         for songid in records_by_id:
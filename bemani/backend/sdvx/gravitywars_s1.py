@@ -3061,9 +3061,7 @@ class SoundVoltexGravityWarsSeason1(
             info.add_child(Node.u32("cnt", count))
 
         # Now, grab user records
-        records = self.data.remote.music.get_all_records(self.game, self.version)
-        missing_users = [userid for (userid, _) in records]
-        users = {userid: profile for (userid, profile) in self.get_any_profiles(missing_users)}
+        records, area_records, users = self.get_hiscores(locid)
 
         hiscore_allover = Node.void("hiscore_allover")
         game.add_child(hiscore_allover)
@@ -3085,22 +3083,12 @@ class SoundVoltexGravityWarsSeason1(
             # Add to global scores
             hiscore_allover.add_child(info)
 
-        # Now, grab local records
-        area_users = [
-            uid
-            for (uid, prof) in self.data.local.user.get_all_profiles(self.game, self.version)
-            if prof.get_int("loc", -1) == locid
-        ]
-        records = self.data.local.music.get_all_records(self.game, self.version, userlist=area_users)
-        missing_users = [userid for (userid, _) in records if userid not in users]
-        for userid, profile in self.get_any_profiles(missing_users):
-            users[userid] = profile
-
+        # Now, output local records
         hiscore_location = Node.void("hiscore_location")
         game.add_child(hiscore_location)
 
         # Output records
-        for userid, score in records:
+        for userid, score in area_records:
             info = Node.void("info")
 
             if userid not in users:
@@ -3443,19 +3443,10 @@ class SoundVoltexHeavenlyHaven(
         game = Node.void("game")
 
         # Now, grab global and local scores as well as clear rates
-        global_records = self.data.remote.music.get_all_records(self.game, self.version)
-        users = {uid: prof for (uid, prof) in self.data.local.user.get_all_profiles(self.game, self.version)}
-        area_users = [uid for uid in users if users[uid].get_int("loc", -1) == locid]
-        area_records = self.data.local.music.get_all_records(self.game, self.version, userlist=area_users)
+        global_records, area_records, users = self.get_hiscores(locid)
         clears = self.get_clear_rates()
         records: Dict[int, Dict[int, Dict[str, Tuple[UserID, Score]]]] = {}
 
-        missing_users = [userid for (userid, _) in global_records if userid not in users] + [
-            userid for (userid, _) in area_records if userid not in users
-        ]
-        for userid, profile in self.get_any_profiles(missing_users):
-            users[userid] = profile
-
         for userid, score in global_records:
             if userid not in users:
                 raise Exception("Logic error, missing profile for user!")
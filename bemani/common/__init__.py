@@ -14,6 +14,7 @@ from bemani.common.id import ID
 from bemani.common.aes import AESCipher
 from bemani.common.time import Time
 from bemani.common.parallel import Parallel
+from bemani.common.metrics import Histogram, MetricsRegistry
 from bemani.common.pe import PEFile, InvalidOffsetException
 from bemani.common.cache import cache
 
@@ -36,6 +37,8 @@ __all__ = [
     "AESCipher",
     "Time",
     "Parallel",
+    "Histogram",
+    "MetricsRegistry",
     "intish",
     "PEFile",
     "InvalidOffsetException",
@@ -0,0 +1,202 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+from typing_extensions import Final
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram, in the style of a Prometheus histogram. Observing a value
+    only bumps a couple of counters, so these are cheap enough to leave on all the time.
+    Quantiles are estimated from the buckets, so they are only as accurate as the buckets
+    are fine.
+    """
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        """
+        Initialize the histogram.
+
+        Parameters:
+            buckets - A sorted list of bucket upper bounds. Anything larger than
+                      the last bound lands in an implicit infinite bucket.
+        """
+        self.buckets: Final[List[float]] = list(buckets)
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Record a single value.
+        """
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate the value below which the given fraction (0.0-1.0) of observations fall,
+        interpolating linearly inside the bucket the quantile lands in.
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            if seen + self.counts[i] >= rank:
+                if self.counts[i] == 0:
+                    return bound
+                return lower + (bound - lower) * ((rank - seen) / self.counts[i])
+            seen += self.counts[i]
+            lower = bound
+
+        # It's in the infinite bucket, so the best we can say is that it's past the last bound.
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """
+    A thread-safe collection of named histograms, each of which can be split up by a set of
+    labels such as game and version. The registry can render itself in the Prometheus text
+    exposition format for scraping, or as a human-readable summary for logging.
+    """
+
+    # Upper bounds for histograms measured in seconds, from half a millisecond to ten seconds.
+    SECONDS_BUCKETS: Final[List[float]] = [
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+    ]
+
+    # Upper bounds for histograms counting things, such as queries per request.
+    COUNT_BUCKETS: Final[List[float]] = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__help: Dict[str, str] = {}
+        self.__buckets: Dict[str, List[float]] = {}
+        self.__histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], Histogram]] = {}
+
+    def register(self, name: str, description: str, buckets: Optional[Sequence[float]] = None) -> None:
+        """
+        Register a histogram so it can be observed.
+
+        Parameters:
+            name - The metric name, such as "bemani_handler_seconds".
+            description - A one-line description of what the metric measures.
+            buckets - Bucket upper bounds. Defaults to SECONDS_BUCKETS.
+        """
+        with self.__lock:
+            self.__help[name] = description
+            self.__buckets[name] = list(buckets if buckets is not None else MetricsRegistry.SECONDS_BUCKETS)
+            self.__histograms.setdefault(name, {})
+
+    def observe(self, name: str, value: float, **labels: object) -> None:
+        """
+        Record a value against a registered histogram and the given labels.
+        """
+        key = tuple(sorted((label, str(val)) for label, val in labels.items()))
+        with self.__lock:
+            histograms = self.__histograms[name]
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(self.__buckets[name])
+                histograms[key] = histogram
+            histogram.observe(value)
+
+    def histograms(self, name: str) -> Dict[Tuple[Tuple[str, str], ...], Histogram]:
+        """
+        Return every histogram recorded for a metric, keyed by sorted label pairs.
+        """
+        with self.__lock:
+            return dict(self.__histograms.get(name, {}))
+
+    @staticmethod
+    def __format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+        if not labels:
+            return ""
+        escaped = [(label, value.replace("\\", "\\\\").replace('"', '\\"')) for label, value in labels]
+        return "{" + ",".join(f'{label}="{value}"' for label, value in escaped) + "}"
+
+    @staticmethod
+    def render_samples(
+        name: str,
+        kind: str,
+        description: str,
+        samples: Sequence[Tuple[Dict[str, str], float]],
+    ) -> str:
+        """
+        Render a metric that is tracked somewhere other than a histogram, such as a counter
+        kept by another module, in the Prometheus text exposition format.
+
+        Parameters:
+            name - The metric name, such as "bemani_remote_requests_total".
+            kind - The Prometheus metric type, such as "counter" or "gauge".
+            description - A one-line description of what the metric measures.
+            samples - A list of tuples of a label dictionary and the value for those labels.
+        """
+        lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        for labels, value in samples:
+            lines.append(f"{name}{MetricsRegistry.__format_labels(sorted(labels.items()))} {value!r}")
+        return "\n".join(lines) + "\n"
+
+    def render(self) -> str:
+        """
+        Render every histogram in the Prometheus text exposition format.
+        """
+        lines: List[str] = []
+        with self.__lock:
+            for name in sorted(self.__histograms):
+                lines.append(f"# HELP {name} {self.__help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key in sorted(self.__histograms[name]):
+                    histogram = self.__histograms[name][key]
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        labels = MetricsRegistry.__format_labels([*key, ("le", repr(float(bound)))])
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    labels = MetricsRegistry.__format_labels([*key, ("le", "+Inf")])
+                    lines.append(f"{name}_bucket{labels} {histogram.count}")
+                    labels = MetricsRegistry.__format_labels(key)
+                    lines.append(f"{name}_sum{labels} {histogram.sum!r}")
+                    lines.append(f"{name}_count{labels} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """
+        Render every histogram as one line of count, mean, p50 and p99, worst p99 first
+        within each metric, so the slowest handlers are easy to spot in a log.
+        """
+        lines: List[str] = []
+        with self.__lock:
+            for name in sorted(self.__histograms):
+                histograms = sorted(
+                    self.__histograms[name].items(),
+                    key=lambda item: item[1].quantile(0.99),
+                    reverse=True,
+                )
+                for key, histogram in histograms:
+                    lines.append(
+                        f"{name}{MetricsRegistry.__format_labels(key)} count={histogram.count} "
+                        f"mean={histogram.sum / histogram.count:.4f} "
+                        f"p50={histogram.quantile(0.5):.4f} p99={histogram.quantile(0.99):.4f}"
+                    )
+        return "\n".join(lines)
@@ -74,6 +74,30 @@ class Parallel:
 
             return [r[0] for r in sorted(results, key=lambda r: r[1])]
 
+    @staticmethod
+    def call_with_deadline(
+        lambdas: "List[Callable[..., Any]]",
+        *params: Any,
+        deadline: float,
+        default: Any,
+    ) -> List[Any]:
+        """
+        Identical to call, except that any callable which has not returned within
+        deadline seconds has its return replaced with default, so that a single slow
+        callable can't hold up the rest. Callables that miss the deadline are left to
+        finish in the background and their returns are discarded.
+        """
+
+        if len(lambdas) == 0:
+            return []
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(lambdas))
+        try:
+            futures = [executor.submit(lam, *params) for lam in lambdas]
+            concurrent.futures.wait(futures, timeout=deadline)
+            return [future.result() if future.done() else default for future in futures]
+        finally:
+            executor.shutdown(wait=False)
+
     @staticmethod
     def flatten(lists: List[List[Any]]) -> List[Any]:
         """
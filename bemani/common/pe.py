@@ -1,3 +1,4 @@
+import bisect
 import pefile  # type: ignore
 import struct
 import sys
@@ -8,41 +9,116 @@ from iced_x86 import (
     FormatterSyntax,
     FormatMnemonicOptions,
 )
-from typing import Any, List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional, Tuple
+from typing_extensions import Final
 
 
 class Memory:
+    """
+    Emulated memory. Sections of the PE file are kept as contiguous regions which are read
+    and written in bulk. Anything outside of those is backed by zero-initialized pages which
+    are created on first write and remember which bytes were written, so that they can be
+    saved back to the PE file after emulation.
+    """
+
+    PAGE_SIZE: Final[int] = 4096
+
     def __init__(self) -> None:
-        self.values: Dict[int, int] = {}
-        self.defaults: Dict[int, bytes] = {}
+        # Regions sorted by starting virtual address, and whether each was written to.
+        self.__starts: List[int] = []
+        self.__regions: List[bytearray] = []
+        self.__dirty: List[bool] = []
+
+        # Pages outside of any region keyed by page number, and a mask of written bytes.
+        self.__pages: Dict[int, bytearray] = {}
+        self.__written: Dict[int, bytearray] = {}
+
+    def add_region(self, offset: int, data: bytes) -> None:
+        index = bisect.bisect_right(self.__starts, offset)
+        self.__starts.insert(index, offset)
+        self.__regions.insert(index, bytearray(data))
+        self.__dirty.insert(index, False)
+
+    def __region(self, offset: int, length: int) -> Optional[int]:
+        # Find the region that holds the entire span, if there is one.
+        index = bisect.bisect_right(self.__starts, offset) - 1
+        if index >= 0 and offset + length <= self.__starts[index] + len(self.__regions[index]):
+            return index
+        return None
 
     def init(self, min_offset: int, max_offset: int) -> None:
-        for i in range(min_offset + 1, max_offset + 1):
-            self.store(i, self.load(i, 1))
+        self.store(min_offset + 1, self.load(min_offset + 1, max_offset - min_offset))
 
     def store(self, offset: int, data: bytes) -> None:
+        index = self.__region(offset, len(data))
+        if index is not None:
+            start = offset - self.__starts[index]
+            self.__regions[index][start : (start + len(data))] = data
+            self.__dirty[index] = True
+            return
+
         for i, b in enumerate(data):
-            self.values[i + offset] = b
+            address = offset + i
+            index = self.__region(address, 1)
+            if index is not None:
+                self.__regions[index][address - self.__starts[index]] = b
+                self.__dirty[index] = True
+                continue
+
+            page, pos = divmod(address, self.PAGE_SIZE)
+            if page not in self.__pages:
+                self.__pages[page] = bytearray(self.PAGE_SIZE)
+                self.__written[page] = bytearray(self.PAGE_SIZE)
+            self.__pages[page][pos] = b
+            self.__written[page][pos] = 1
 
     def load(self, offset: int, length: int) -> bytes:
-        data: List[int] = []
-
-        for i in range(offset, offset + length):
-            if i in self.values:
-                # Return modified value.
-                data.append(self.values[i])
-            else:
-                # Attempt to return the default.
-                for virtual_start in self.defaults:
-                    if i >= virtual_start and i < (virtual_start + len(self.defaults[virtual_start])):
-                        data.append(self.defaults[virtual_start][i - virtual_start])
-                        break
-                else:
-                    # Nothing here, return initialized RAM.
-                    data.append(0)
+        index = self.__region(offset, length)
+        if index is not None:
+            start = offset - self.__starts[index]
+            return bytes(self.__regions[index][start : (start + length)])
+
+        data = bytearray(length)
+        for i in range(length):
+            address = offset + i
+            index = self.__region(address, 1)
+            if index is not None:
+                data[i] = self.__regions[index][address - self.__starts[index]]
+                continue
+
+            # Bytes in pages that were never written are still zero, which is what
+            # uninitialized RAM reads as, so there's no need to check the mask.
+            page, pos = divmod(address, self.PAGE_SIZE)
+            if page in self.__pages:
+                data[i] = self.__pages[page][pos]
 
         return bytes(data)
 
+    def regions(self) -> List[Tuple[int, bytes]]:
+        """
+        Returns the starting offset and contents of every region that was written to.
+        """
+        return [
+            (start, bytes(region))
+            for start, region, dirty in zip(self.__starts, self.__regions, self.__dirty)
+            if dirty
+        ]
+
+    def written(self) -> List[Tuple[int, int]]:
+        """
+        Returns the offset and value of every byte written outside of a region, in order.
+        """
+        values: List[Tuple[int, int]] = []
+        for page in sorted(self.__pages):
+            data = self.__pages[page]
+            mask = self.__written[page]
+            base = page * self.PAGE_SIZE
+            pos = mask.find(1)
+            while pos != -1:
+                values.append((base + pos, data[pos]))
+                pos = mask.find(1, pos + 1)
+        return values
+
 
 class Registers:
     def __init__(self, stack: int) -> None:
@@ -81,6 +157,121 @@ class InvalidPhysicalOffsetException(InvalidOffsetException):
     pass
 
 
+class Operand:
+    """
+    An operand as formatted by the iced-x86 operand formatter, along with everything we
+    need to know about it to load from or store to it. This is parsed once per decoded
+    instruction so that instructions which execute many times, such as those in a loop,
+    don't need to be formatted and parsed again on every execution.
+    """
+
+    # Register-based indirect modes, and the mask to apply to the register's value.
+    INDIRECT_REGISTERS: Final[Dict[str, Tuple[str, int]]] = {
+        "rsp": ("rsp", 0xFFFFFFFFFFFFFFFF),
+        "esp": ("rsp", 0xFFFFFFFF),
+        "sp": ("rsp", 0xFFFF),
+        "spl": ("rsp", 0xFF),
+        "rbp": ("rbp", 0xFFFFFFFFFFFFFFFF),
+        "ebp": ("rbp", 0xFFFFFFFF),
+        "bp": ("rbp", 0xFFFF),
+        "rsi": ("rsi", 0xFFFFFFFFFFFFFFFF),
+        "esi": ("rsi", 0xFFFFFFFF),
+        "si": ("rsi", 0xFFFF),
+        "rdi": ("rdi", 0xFFFFFFFFFFFFFFFF),
+        "edi": ("rdi", 0xFFFFFFFF),
+        "di": ("rdi", 0xFFFF),
+    }
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.size = get_size(text)
+        self.immediate = get_value(text)
+
+        # Indirect references are parsed the first time they are resolved, so that
+        # any problem with them only surfaces if the instruction actually executes.
+        self.__parsed = False
+        self.__indirect = False
+        self.__register: Optional[str] = None
+        self.__adjust = 0
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __parse(self) -> None:
+        indirect = sanitize(self.text)
+
+        if indirect[0] == "[" and indirect[-1] == "]":
+            indirect = sanitize(indirect[1:-1])
+
+            adjust = 0
+            if "+" in indirect:
+                indirect, const = indirect.split("+", 1)
+                indirect = sanitize(indirect)
+                const = sanitize(const)
+
+                if const[-1] == "h":
+                    adjust = int(const[:-1], 16)
+                else:
+                    adjust = int(const, 10)
+            elif "-" in indirect:
+                indirect, const = indirect.split("-", 1)
+                indirect = sanitize(indirect)
+                const = sanitize(const)
+
+                if const[-1] == "h":
+                    adjust = -int(const[:-1], 16)
+                else:
+                    adjust = -int(const, 10)
+
+            if indirect[-1] == "h":
+                adjust = int(indirect[:-1], 16) + adjust
+            elif indirect in self.INDIRECT_REGISTERS:
+                self.__register = indirect
+            else:
+                raise Exception(f"Unsupported indirect address {indirect}!")
+
+            self.__indirect = True
+            self.__adjust = adjust
+
+        self.__parsed = True
+
+    def address(self, registers: Registers) -> Optional[int]:
+        """
+        Resolve this operand, if it is an indirect reference, to an actual address that we
+        should load from or store to. This optionally supports indirect register address
+        format so that we can conveniently specify fetches and stores from the stack. If
+        the operand is not actually an indirect reference, return None.
+        """
+        if not self.__parsed:
+            self.__parse()
+        if not self.__indirect:
+            return None
+        if self.__register is None:
+            return self.__adjust
+
+        register, mask = self.INDIRECT_REGISTERS[self.__register]
+        return (getattr(registers, register) & mask) + self.__adjust
+
+
+class Operation:
+    """
+    A decoded instruction, formatted once so that it can be executed repeatedly without
+    going back through the formatter.
+    """
+
+    def __init__(self, formatter: Formatter, instruction: Instruction) -> None:
+        self.ip: int = instruction.ip
+        self.next_ip: int = instruction.next_ip
+        self.mnemonic: str = formatter.format_mnemonic(instruction, FormatMnemonicOptions.NO_PREFIXES)
+        self.operands: List[Operand] = [
+            Operand(formatter.format_operand(instruction, i)) for i in range(formatter.operand_count(instruction))
+        ]
+
+
+# The longest an x86 instruction can be, so we only hand the decoder as much as it could need.
+MAX_INSTRUCTION_LENGTH: Final[int] = 15
+
+
 class PEFile:
     def __init__(self, data: bytes) -> None:
         self.data = data
@@ -140,7 +331,8 @@ class PEFile:
             self.data[start:end],
             ip=self.physical_to_virtual(start),
         )
-        self.__emulate_chunk(registers, memory, [i for i in decoder], verbose)
+        formatter = Formatter(FormatterSyntax.NASM)
+        self.__emulate_chunk(registers, memory, [Operation(formatter, i) for i in decoder], verbose)
 
         # Replace memory that we care about.
         self.__update(memory)
@@ -153,28 +345,36 @@ class PEFile:
         registers = Registers(0xFFFFFFFFFFFFFFFF if self.is_64bit() else 0xFFFFFFFF)
         memory = self.__to_memory()
 
-        # Need to fetch one at a time, emulating until we get a ret.
+        # Need to fetch one at a time, emulating until we get a ret. Instructions are only
+        # decoded and formatted the first time we reach them, so that loops don't pay for it
+        # again on every pass.
+        vprint = self.__printer(verbose)
+        formatter = Formatter(FormatterSyntax.NASM)
+        operations: Dict[int, Operation] = {}
         loc = start
-        end = len(self.data)
         while True:
-            decoder = Decoder(
-                64 if self.is_64bit() else 32,
-                self.data[loc:end],
-                ip=self.physical_to_virtual(loc),
-            )
-            chunk = [decoder.decode()]
+            operation = operations.get(loc)
+            if operation is None:
+                decoder = Decoder(
+                    64 if self.is_64bit() else 32,
+                    self.data[loc : (loc + MAX_INSTRUCTION_LENGTH)],
+                    ip=self.physical_to_virtual(loc),
+                )
+                operation = Operation(formatter, decoder.decode())
+                operations[loc] = operation
 
             try:
-                # First attempt to just run the instruction as normal.
-                self.__emulate_chunk(registers, memory, chunk, verbose)
-                loc = self.virtual_to_physical(chunk[0].next_ip)
-            except JumpException as jmp:
-                # We need to jump elsewhere.
-                loc = self.virtual_to_physical(jmp.address)
+                destination = self.__execute(registers, memory, operation, vprint)
             except RetException:
                 # We're done!
                 break
 
+            if destination is None:
+                loc = self.virtual_to_physical(operation.next_ip)
+            else:
+                # We need to jump elsewhere.
+                loc = self.virtual_to_physical(destination)
+
         # Replace memory that we care about.
         self.__update(memory)
 
@@ -185,37 +385,36 @@ class PEFile:
             virtual = section.VirtualAddress + self.__pe.OPTIONAL_HEADER.ImageBase
             length = section.SizeOfRawData
             physical = self.virtual_to_physical(virtual)
-            memory.defaults[virtual] = self.data[physical : (physical + length)]
+            memory.add_region(virtual, self.data[physical : (physical + length)])
 
         for virtual, physical in self.__adhoc_mapping.items():
-            memory.values[virtual] = self.data[physical]
+            memory.store(virtual, self.data[physical : (physical + 1)])
 
         return memory
 
     def __update(self, memory: Memory) -> None:
-        newdata = [x for x in self.data]
-        for virtual in sorted(memory.values):
+        newdata = bytearray(self.data)
+        for virtual, region in memory.regions():
+            physical = self.virtual_to_physical(virtual)
+            newdata[physical : (physical + len(region))] = region
+
+        for virtual, value in memory.written():
             try:
                 physical = self.virtual_to_physical(virtual)
-                newdata[physical] = memory.values[virtual]
+                newdata[physical] = value
             except Exception:
                 # This is outside of the data we are tracking. Its really not ideal
                 # that we are just shoving this at the end of the data, but it should
                 # work for what we care about.
                 physical = len(newdata)
                 self.__adhoc_mapping[virtual] = physical
-                newdata.append(memory.values[virtual])
+                newdata.append(value)
 
+        # Emulation only ever writes to section contents or past the end of the file,
+        # so the headers are unchanged and there is no need to parse the file again.
         self.data = bytes(newdata)
-        self.__pe = pefile.PE(data=self.data, fast_load=True)
 
-    def __emulate_chunk(
-        self,
-        registers: Registers,
-        memory: Memory,
-        chunk: List[Instruction],
-        verbose: bool,
-    ) -> None:
+    def __printer(self, verbose: bool) -> Callable[..., None]:
         if verbose:
 
             def vprint(*args: Any, **kwargs: Any) -> None:
@@ -226,19 +425,31 @@ class PEFile:
             def vprint(*args: Any, **kwargs: Any) -> None:
                 pass
 
-        # Stuck here so that jump can bind to it.
-        loc: int = 0
+        return vprint
 
-        def jump(destination: int) -> None:
-            nonlocal loc
+    def __emulate_chunk(
+        self,
+        registers: Registers,
+        memory: Memory,
+        chunk: List[Operation],
+        verbose: bool,
+    ) -> None:
+        vprint = self.__printer(verbose)
+
+        # Index the chunk by address so that jumps don't have to search for their destination.
+        index = {operation.ip: i for i, operation in enumerate(chunk)}
+
+        loc = 0
+        while loc < len(chunk):
+            operation = chunk[loc]
+            loc = loc + 1
 
-            for i in range(len(chunk)):
-                if chunk[i].ip == destination:
+            destination = self.__execute(registers, memory, operation, vprint)
+            if destination is not None:
+                if destination in index:
                     # Jump to this instruction.
-                    loc = i
-                    break
-            else:
-                if destination == chunk[-1].next_ip:
+                    loc = index[destination]
+                elif destination == chunk[-1].next_ip:
                     # Jump to the end, we're done.
                     loc = len(chunk)
                 else:
@@ -247,261 +458,261 @@ class PEFile:
                         f"Jumping to {hex(destination)} which is outside of our evaluation range!",
                     )
 
-        formatter = Formatter(FormatterSyntax.NASM)
-
-        while loc < len(chunk):
-            inst = chunk[loc]
-            loc = loc + 1
-            mnemonic = formatter.format_mnemonic(inst, FormatMnemonicOptions.NO_PREFIXES)
-
-            if mnemonic == "mov":
-                dest = formatter.format_operand(inst, 0)
-                src = formatter.format_operand(inst, 1)
-
-                vprint(f"mov {dest}, {src}")
-
-                size = get_size(src) or get_size(dest)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-                result = fetch(registers, memory, size, src)
+    def __execute(
+        self,
+        registers: Registers,
+        memory: Memory,
+        operation: Operation,
+        vprint: Callable[..., None],
+    ) -> Optional[int]:
+        """
+        Execute a single decoded instruction against the registers and memory of our emulator.
+        Returns the virtual address to continue from if the instruction jumped, or None if
+        execution should continue with the following instruction.
+        """
+        mnemonic = operation.mnemonic
+        operands = operation.operands
+
+        if mnemonic == "mov":
+            dest, src = operands[0], operands[1]
+
+            vprint(f"mov {dest}, {src}")
+
+            size = src.size or dest.size
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+            result = fetch(registers, memory, size, src)
+            assign(registers, memory, size, dest, result)
+
+        elif mnemonic == "movzx":
+            dest, src = operands[0], operands[1]
+
+            vprint(f"movzx {dest}, {src}")
+
+            srcsize = src.size
+            dstsize = dest.size
+            if srcsize is None or dstsize is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+            result = fetch(registers, memory, srcsize, src)
+            assign(registers, memory, dstsize, dest, result)
+
+        elif mnemonic == "add":
+            dest, amt = operands[0], operands[1]
+
+            vprint(f"add {dest}, {amt}")
+
+            size = amt.size or dest.size
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+
+            # Special case for adjusting ESP, to make sure our memory contains zeros for reading
+            # out the stack later.
+            if dest.text == "esp":
+                before = fetch(registers, memory, size, dest)
+                after = before + fetch(registers, memory, size, amt)
+                memory.init(min(before, after), max(before, after))
+                assign(registers, memory, size, dest, after)
+            else:
+                result = fetch(registers, memory, size, dest) + fetch(registers, memory, size, amt)
                 assign(registers, memory, size, dest, result)
 
-            elif mnemonic == "movzx":
-                dest = formatter.format_operand(inst, 0)
-                src = formatter.format_operand(inst, 1)
-
-                vprint(f"movzx {dest}, {src}")
-
-                srcsize = get_size(src)
-                dstsize = get_size(dest)
-                if srcsize is None or dstsize is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-                result = fetch(registers, memory, srcsize, src)
-                assign(registers, memory, dstsize, dest, result)
-
-            elif mnemonic == "add":
-                dest = formatter.format_operand(inst, 0)
-                amt = formatter.format_operand(inst, 1)
+        elif mnemonic == "sub":
+            dest, amt = operands[0], operands[1]
 
-                vprint(f"add {dest}, {amt}")
+            vprint(f"sub {dest}, {amt}")
 
-                size = get_size(amt) or get_size(dest)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
+            size = amt.size or dest.size
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
 
-                # Special case for adjusting ESP, to make sure our memory contains zeros for reading
-                # out the stack later.
-                if dest == "esp":
-                    before = fetch(registers, memory, size, dest)
-                    after = before + fetch(registers, memory, size, amt)
-                    memory.init(min(before, after), max(before, after))
-                    assign(registers, memory, size, dest, after)
-                else:
-                    result = fetch(registers, memory, size, dest) + fetch(registers, memory, size, amt)
-                    assign(registers, memory, size, dest, result)
-
-            elif mnemonic == "sub":
-                dest = formatter.format_operand(inst, 0)
-                amt = formatter.format_operand(inst, 1)
-
-                vprint(f"sub {dest}, {amt}")
-
-                size = get_size(amt) or get_size(dest)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-
-                # Special case for adjusting ESP, to make sure our memory contains zeros for reading
-                # out the stack later.
-                if dest == "esp":
-                    before = fetch(registers, memory, size, dest)
-                    after = before - fetch(registers, memory, size, amt)
-                    memory.init(min(before, after), max(before, after))
-                    assign(registers, memory, size, dest, after)
-                else:
-                    result = fetch(registers, memory, size, dest) - fetch(registers, memory, size, amt)
-                    assign(registers, memory, size, dest, result)
-
-            elif mnemonic == "imul":
-                dest = formatter.format_operand(inst, 0)
-                mult = formatter.format_operand(inst, 1)
-                try:
-                    const = formatter.format_operand(inst, 2)
-                    vprint(f"imul {dest}, {mult}, {const}")
-                except Exception:
-                    const = None
-                    vprint(f"imul {dest}, {mult}")
-
-                size = get_size(mult) or get_size(dest) or (get_size(const) if const is not None else None)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-                if const is None:
-                    result = fetch(registers, memory, size, dest) * fetch(registers, memory, size, mult)
-                else:
-                    result = fetch(registers, memory, size, mult) * get_value(const)
+            # Special case for adjusting ESP, to make sure our memory contains zeros for reading
+            # out the stack later.
+            if dest.text == "esp":
+                before = fetch(registers, memory, size, dest)
+                after = before - fetch(registers, memory, size, amt)
+                memory.init(min(before, after), max(before, after))
+                assign(registers, memory, size, dest, after)
+            else:
+                result = fetch(registers, memory, size, dest) - fetch(registers, memory, size, amt)
                 assign(registers, memory, size, dest, result)
 
-            elif mnemonic == "push":
-                src = formatter.format_operand(inst, 0)
-
-                vprint(f"push {src}")
-
-                size = get_size(src)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-                result = fetch(registers, memory, size, src)
-                registers.rsp -= size
-                assign(
-                    registers,
-                    memory,
-                    size,
-                    "[rsp]" if self.is_64bit() else "[esp]",
-                    result,
-                )
+        elif mnemonic == "imul":
+            dest, mult = operands[0], operands[1]
+            if len(operands) > 2:
+                const: Optional[Operand] = operands[2]
+                vprint(f"imul {dest}, {mult}, {const}")
+            else:
+                const = None
+                vprint(f"imul {dest}, {mult}")
+
+            size = mult.size or dest.size or (const.size if const is not None else None)
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+            if const is None:
+                result = fetch(registers, memory, size, dest) * fetch(registers, memory, size, mult)
+            else:
+                result = fetch(registers, memory, size, mult) * const.immediate
+            assign(registers, memory, size, dest, result)
+
+        elif mnemonic == "push":
+            src = operands[0]
+
+            vprint(f"push {src}")
+
+            size = src.size
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+            result = fetch(registers, memory, size, src)
+            registers.rsp -= size
+            assign(
+                registers,
+                memory,
+                size,
+                STACK_64 if self.is_64bit() else STACK_32,
+                result,
+            )
 
-            elif mnemonic == "pop":
-                dest = formatter.format_operand(inst, 0)
+        elif mnemonic == "pop":
+            dest = operands[0]
 
-                vprint(f"pop {dest}")
+            vprint(f"pop {dest}")
 
-                size = get_size(dest)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-                result = fetch(registers, memory, size, "[rsp]" if self.is_64bit() else "[esp]")
-                assign(registers, memory, size, dest, result)
-                registers.rsp += size
+            size = dest.size
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+            result = fetch(registers, memory, size, STACK_64 if self.is_64bit() else STACK_32)
+            assign(registers, memory, size, dest, result)
+            registers.rsp += size
+
+        elif mnemonic == "test":
+            op1, op2 = operands[0], operands[1]
 
-            elif mnemonic == "test":
-                op1 = formatter.format_operand(inst, 0)
-                op2 = formatter.format_operand(inst, 1)
+            vprint(f"test {op1}, {op2}")
 
-                vprint(f"test {op1}, {op2}")
+            size = op1.size or op2.size
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+            result = fetch(registers, memory, size, op1) & fetch(registers, memory, size, op2)
 
-                size = get_size(op1) or get_size(op2)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-                result = fetch(registers, memory, size, op1) & fetch(registers, memory, size, op2)
+            registers.zf = result == 0
+            if size == 1:
+                registers.sf = (result & 0x80) != 0
+            if size == 2:
+                registers.sf = (result & 0x8000) != 0
+            if size == 4:
+                registers.sf = (result & 0x80000000) != 0
+            if size == 8:
+                registers.sf = (result & 0x8000000000000000) != 0
 
-                registers.zf = result == 0
-                if size == 1:
-                    registers.sf = (result & 0x80) != 0
-                if size == 2:
-                    registers.sf = (result & 0x8000) != 0
-                if size == 4:
-                    registers.sf = (result & 0x80000000) != 0
-                if size == 8:
-                    registers.sf = (result & 0x8000000000000000) != 0
+        elif mnemonic == "jne":
+            dest = operands[0]
 
-            elif mnemonic == "jne":
-                dest = formatter.format_operand(inst, 0)
+            vprint(f"jnz {dest}")
 
-                vprint(f"jnz {dest}")
+            if not registers.zf:
+                destination = dest.immediate
+                if destination is None:
+                    raise Exception(f"Jumping to unsupported destination {dest}")
+                return destination
 
-                if not registers.zf:
-                    destination = get_value(dest)
-                    if destination is None:
-                        raise Exception(f"Jumping to unsupported destination {dest}")
-                    jump(destination)
+        elif mnemonic == "je":
+            dest = operands[0]
 
-            elif mnemonic == "je":
-                dest = formatter.format_operand(inst, 0)
+            vprint(f"jz {dest}")
 
-                vprint(f"jz {dest}")
+            if registers.zf:
+                destination = dest.immediate
+                if destination is None:
+                    raise Exception(f"Jumping to unsupported destination {dest}")
+                return destination
 
-                if registers.zf:
-                    destination = get_value(dest)
-                    if destination is None:
-                        raise Exception(f"Jumping to unsupported destination {dest}")
-                    jump(destination)
+        elif mnemonic == "jns":
+            dest = operands[0]
 
-            elif mnemonic == "jns":
-                dest = formatter.format_operand(inst, 0)
+            vprint(f"jns {dest}")
 
-                vprint(f"jns {dest}")
+            if not registers.sf:
+                destination = dest.immediate
+                if destination is None:
+                    raise Exception(f"Jumping to unsupported destination {dest}")
+                return destination
 
-                if not registers.sf:
-                    destination = get_value(dest)
-                    if destination is None:
-                        raise Exception(f"Jumping to unsupported destination {dest}")
-                    jump(destination)
+        elif mnemonic == "js":
+            dest = operands[0]
 
-            elif mnemonic == "js":
-                dest = formatter.format_operand(inst, 0)
+            vprint(f"js {dest}")
 
-                vprint(f"js {dest}")
+            if registers.sf:
+                destination = dest.immediate
+                if destination is None:
+                    raise Exception(f"Jumping to unsupported destination {dest}")
+                return destination
 
-                if registers.sf:
-                    destination = get_value(dest)
-                    if destination is None:
-                        raise Exception(f"Jumping to unsupported destination {dest}")
-                    jump(destination)
+        elif mnemonic == "jmp":
+            dest = operands[0]
 
-            elif mnemonic == "jmp":
-                dest = formatter.format_operand(inst, 0)
+            vprint(f"jmp {dest}")
 
-                vprint(f"jmp {dest}")
+            destination = dest.immediate
+            if destination is None:
+                raise Exception(f"Jumping to unsupported destination {dest}")
+            return destination
 
-                destination = get_value(dest)
-                if destination is None:
-                    raise Exception(f"Jumping to unsupported destination {dest}")
-                jump(destination)
+        elif mnemonic == "and":
+            dest, src = operands[0], operands[1]
 
-            elif mnemonic == "and":
-                dest = formatter.format_operand(inst, 0)
-                src = formatter.format_operand(inst, 1)
+            vprint(f"and {dest}, {src}")
 
-                vprint(f"and {dest}, {src}")
+            size = src.size or dest.size
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+            result = fetch(registers, memory, size, dest) & fetch(registers, memory, size, src)
+            assign(registers, memory, size, dest, result)
 
-                size = get_size(src) or get_size(dest)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-                result = fetch(registers, memory, size, dest) & fetch(registers, memory, size, src)
-                assign(registers, memory, size, dest, result)
+        elif mnemonic == "or":
+            dest, src = operands[0], operands[1]
 
-            elif mnemonic == "or":
-                dest = formatter.format_operand(inst, 0)
-                src = formatter.format_operand(inst, 1)
+            vprint(f"or {dest}, {src}")
 
-                vprint(f"or {dest}, {src}")
+            size = src.size or dest.size
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+            result = fetch(registers, memory, size, dest) | fetch(registers, memory, size, src)
+            assign(registers, memory, size, dest, result)
 
-                size = get_size(src) or get_size(dest)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-                result = fetch(registers, memory, size, dest) | fetch(registers, memory, size, src)
-                assign(registers, memory, size, dest, result)
+        elif mnemonic == "xor":
+            dest, src = operands[0], operands[1]
 
-            elif mnemonic == "xor":
-                dest = formatter.format_operand(inst, 0)
-                src = formatter.format_operand(inst, 1)
+            vprint(f"xor {dest}, {src}")
 
-                vprint(f"xor {dest}, {src}")
+            size = src.size or dest.size
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+            result = fetch(registers, memory, size, dest) ^ fetch(registers, memory, size, src)
+            assign(registers, memory, size, dest, result)
 
-                size = get_size(src) or get_size(dest)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-                result = fetch(registers, memory, size, dest) ^ fetch(registers, memory, size, src)
-                assign(registers, memory, size, dest, result)
+        elif mnemonic == "lea":
+            dest, src = operands[0], operands[1]
 
-            elif mnemonic == "lea":
-                dest = formatter.format_operand(inst, 0)
-                src = formatter.format_operand(inst, 1)
+            vprint(f"lea {dest}, {src}")
 
-                vprint(f"lea {dest}, {src}")
+            size = src.size or dest.size
+            if size is None:
+                raise Exception(f"Could not determine size of {mnemonic} operation!")
+            address = src.address(registers)
+            if address is None:
+                raise Exception(f"Could not compute effective address for {mnemonic} operation!")
+            assign(registers, memory, size, dest, address)
 
-                size = get_size(src) or get_size(dest)
-                if size is None:
-                    raise Exception(f"Could not determine size of {mnemonic} operation!")
-                result = get_address(registers, src)
-                if result is None:
-                    raise Exception(f"Could not compute effective address for {mnemonic} operation!")
-                assign(registers, memory, size, dest, result)
+        elif mnemonic == "ret":
+            vprint("ret")
 
-            elif mnemonic == "ret":
-                vprint("ret")
+            raise RetException("Encountered {mnemonic} instruction but we aren't in function context!")
 
-                raise RetException("Encountered {mnemonic} instruction but we aren't in function context!")
+        else:
+            raise Exception(f"Unsupported mnemonic {mnemonic}!")
 
-            else:
-                raise Exception(f"Unsupported mnemonic {mnemonic}!")
+        return None
 
 
 def sanitize(indirect: str) -> str:
@@ -534,81 +745,6 @@ def sanitize(indirect: str) -> str:
     return indirect
 
 
-def get_address(registers: Registers, indirect: str) -> Optional[int]:
-    """
-    Given an indirect reference as formatted by the iced-x86 operand formatter,
-    resolve it to an actual 32-bit address that we should load from or store to.
-    This optionally supports indirect register address format so that we can
-    conveniently specify fetches and stores from the stack. If the value we
-    receive is not actually an indirect reference, return None.
-    """
-
-    indirect = sanitize(indirect)
-
-    if indirect[0] == "[" and indirect[-1] == "]":
-        indirect = sanitize(indirect[1:-1])
-
-        adjust = 0
-        if "+" in indirect:
-            indirect, const = indirect.split("+", 1)
-            indirect = sanitize(indirect)
-            const = sanitize(const)
-
-            if const[-1] == "h":
-                adjust = int(const[:-1], 16)
-            else:
-                adjust = int(const, 10)
-        elif "-" in indirect:
-            indirect, const = indirect.split("-", 1)
-            indirect = sanitize(indirect)
-            const = sanitize(const)
-
-            if const[-1] == "h":
-                adjust = -int(const[:-1], 16)
-            else:
-                adjust = -int(const, 10)
-
-        if indirect[-1] == "h":
-            return int(indirect[:-1], 16) + adjust
-
-        # Register-based indirect modes.
-        if indirect == "rsp":
-            return registers.rsp + adjust
-        if indirect == "esp":
-            return (registers.rsp & 0xFFFFFFFF) + adjust
-        if indirect == "sp":
-            return (registers.rsp & 0xFFFF) + adjust
-        if indirect == "spl":
-            return (registers.rsp & 0xFF) + adjust
-        if indirect == "rbp":
-            return registers.rbp + adjust
-        if indirect == "ebp":
-            return (registers.rbp & 0xFFFFFFFF) + adjust
-        if indirect == "bp":
-            return (registers.rbp & 0xFFFF) + adjust
-        if indirect == "bp":
-            return (registers.rbp & 0xFF) + adjust
-        if indirect == "rsi":
-            return registers.rsi + adjust
-        if indirect == "esi":
-            return (registers.rsi & 0xFFFFFFFF) + adjust
-        if indirect == "si":
-            return (registers.rsi & 0xFFFF) + adjust
-        if indirect == "si":
-            return (registers.rsi & 0xFF) + adjust
-        if indirect == "rdi":
-            return registers.rdi + adjust
-        if indirect == "edi":
-            return (registers.rdi & 0xFFFFFFFF) + adjust
-        if indirect == "di":
-            return (registers.rdi & 0xFFFF) + adjust
-        if indirect == "di":
-            return (registers.rdi & 0xFF) + adjust
-
-        raise Exception(f"Unsupported indirect address {indirect}!")
-    return None
-
-
 def get_value(immediate: str) -> Optional[int]:
     """
     Given an immediate value as formatted by the iced-x86 operand formatter,
@@ -675,14 +811,19 @@ def get_size(operand: str) -> Optional[int]:
     return None
 
 
-def assign(registers: Registers, memory: Memory, size: int, loc: str, value: int) -> None:
+# Indirect references to the top of the stack, for push and pop.
+STACK_32: Final[Operand] = Operand("[esp]")
+STACK_64: Final[Operand] = Operand("[rsp]")
+
+
+def assign(registers: Registers, memory: Memory, size: int, operand: Operand, value: int) -> None:
     """
     Given the registers and memory of our emulator, the size of the operation
     performed, the location to assign to and the value we should assign,
     compute where the assignment should happen and then execute it.
     """
 
-    address = get_address(registers, loc)
+    address = operand.address(registers)
     if address is not None:
         if size == 1:
             data = struct.pack("<B", value)
@@ -697,6 +838,7 @@ def assign(registers: Registers, memory: Memory, size: int, loc: str, value: int
         memory.store(address, data)
         return
 
+    loc = operand.text
     if loc == "rax":
         registers.rax = value
         return
@@ -844,14 +986,14 @@ def assign(registers: Registers, memory: Memory, size: int, loc: str, value: int
     raise Exception(f"Unsupported destination {loc} for assign!")
 
 
-def fetch(registers: Registers, memory: Memory, size: int, loc: str) -> int:
+def fetch(registers: Registers, memory: Memory, size: int, operand: Operand) -> int:
     """
     Given the registers and memory of our emulator, the size of the operation
     performed and the location to fetch from, compute where the fetch should
     happen and then execute it, returning the results of the fetch.
     """
 
-    address = get_address(registers, loc)
+    address = operand.address(registers)
     if address is not None:
         if size == 1:
             return struct.unpack("<B", memory.load(address, size))[0]
@@ -864,7 +1006,7 @@ def fetch(registers: Registers, memory: Memory, size: int, loc: str) -> int:
         else:
             raise Exception(f"Unsupported size {size} for memory fetch!")
 
-    immediate = get_value(loc)
+    immediate = operand.immediate
     if immediate is not None:
         if size == 1:
             return immediate & 0xFF
@@ -876,6 +1018,7 @@ def fetch(registers: Registers, memory: Memory, size: int, loc: str) -> int:
             return immediate
         raise Exception(f"Unsupported size {size} for immediate fetch!")
 
+    loc = operand.text
     if loc == "rax":
         return registers.rax
 
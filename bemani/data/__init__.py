@@ -1,6 +1,6 @@
 from bemani.data.config import Config
 from bemani.data.data import Data, DBCreateException
-from bemani.data.exceptions import ScoreSaveException
+from bemani.data.exceptions import ScoreSaveException, QueryBudgetException
 from bemani.data.types import (
     User,
     Achievement,
@@ -26,6 +26,7 @@ __all__ = [
     "Data",
     "DBCreateException",
     "ScoreSaveException",
+    "QueryBudgetException",
     "User",
     "Achievement",
     "Machine",
@@ -1,20 +1,34 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
+from typing_extensions import Final
 
 from bemani.data.api.client import APIClient
 from bemani.data.interfaces import APIProviderInterface
 
 
 class BaseGlobalData:
+    # Number of seconds we wait on remote servers when querying all of them at once
+    # before giving up on the slow ones and returning what we have.
+    REMOTE_DEADLINE: Final[float] = 5.0
+
     def __init__(self, api: APIProviderInterface) -> None:
         self.__localapi = api
-        self.__apiclients: Optional[List[APIClient]] = None
+        self.__apiclients: Optional[Dict[int, APIClient]] = None
 
     @property
-    def clients(self) -> List[APIClient]:
+    def localapi(self) -> APIProviderInterface:
+        return self.__localapi
+
+    @property
+    def clients_by_server(self) -> Dict[int, APIClient]:
         if self.__apiclients is None:
             servers = self.__localapi.get_all_servers()
-            self.__apiclients = [
-                APIClient(server.uri, server.token, server.allow_stats, server.allow_scores) for server in servers
-            ]
+            self.__apiclients = {
+                server.id: APIClient(server.uri, server.token, server.allow_stats, server.allow_scores)
+                for server in servers
+            }
 
         return self.__apiclients
+
+    @property
+    def clients(self) -> List[APIClient]:
+        return list(self.clients_by_server.values())
@@ -1,6 +1,10 @@
+import hashlib
 import json
 import requests
-from typing import Tuple, Dict, List, Any, Optional
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from typing import Callable, Tuple, Dict, List, Any, Optional
 from typing_extensions import Final
 
 from bemani.common import (
@@ -38,6 +42,10 @@ class RemoteServerErrorAPIException(APIException):
     pass
 
 
+class UnreachableAPIException(APIException):
+    pass
+
+
 class APIClient:
     """
     A client that fully speaks BEMAPI and can pull information from a remote server.
@@ -45,12 +53,76 @@ class APIClient:
 
     API_VERSION: Final[str] = "v1"
 
+    # Number of seconds to wait on a remote server before giving up.
+    REQUEST_TIMEOUT: Final[int] = 10
+
+    # Maximum number of simultaneous keep-alive connections kept open to a single remote server.
+    MAX_CONNECTIONS: Final[int] = 16
+
+    # Number of seconds we keep serving a cached response after it goes stale, while
+    # it is being refreshed in the background or while the remote server is down.
+    STALE_TIMEOUT: Final[int] = Time.SECONDS_IN_DAY
+
+    # Number of seconds we stop talking to a remote server for after it fails to respond.
+    DOWN_TIMEOUT: Final[int] = Time.SECONDS_IN_MINUTE * 1
+
+    # Number of seconds since a game last asked for a network's records or statistics
+    # for a version that we will still keep them warm from the scheduler.
+    HOT_TIMEOUT: Final[int] = Time.SECONDS_IN_DAY
+
+    # Sessions and request statistics are shared by every client talking to the same
+    # remote server, since clients are created fresh for every local request.
+    __sessions: Dict[str, requests.Session] = {}
+    __statistics: Dict[str, Dict[str, Any]] = {}
+    __hot_marked: Dict[str, int] = {}
+    __lock = threading.Lock()
+
     def __init__(self, base_uri: str, token: str, allow_stats: bool, allow_scores: bool) -> None:
         self.base_uri = base_uri
         self.token = token
         self.allow_stats = allow_stats
         self.allow_scores = allow_scores
 
+    @staticmethod
+    def get_statistics_by_server() -> Dict[str, Dict[str, Any]]:
+        """
+        Return request statistics for every remote server this process has talked to,
+        keyed by the server's base URI. Each entry includes the number of requests made,
+        the number of those which failed, and the total and worst latency in seconds.
+        """
+        with APIClient.__lock:
+            return {uri: dict(stats) for uri, stats in APIClient.__statistics.items()}
+
+    def __session(self) -> requests.Session:
+        with APIClient.__lock:
+            session = APIClient.__sessions.get(self.base_uri)
+            if session is None:
+                # Keep connections alive between requests so we only pay for connection
+                # setup and TLS negotiation once per connection instead of once per request.
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.MAX_CONNECTIONS)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                APIClient.__sessions[self.base_uri] = session
+            return session
+
+    def __record_request(self, duration: float, success: bool) -> None:
+        with APIClient.__lock:
+            stats = APIClient.__statistics.setdefault(
+                self.base_uri,
+                {
+                    "requests": 0,
+                    "errors": 0,
+                    "total_latency": 0.0,
+                    "max_latency": 0.0,
+                },
+            )
+            stats["requests"] += 1
+            if not success:
+                stats["errors"] += 1
+            stats["total_latency"] += duration
+            stats["max_latency"] = max(stats["max_latency"], duration)
+
     def __repr__(self) -> str:
         # Specifically defined so that two different instances of the same API client
         # cache under the same key, as we want to share results from a given server
@@ -85,7 +157,112 @@ class APIClient:
                     return True
         return False
 
-    def __exchange_data(self, request_uri: str, request_args: Dict[str, Any]) -> Dict[str, Any]:
+    def __cache_key(self, *parts: Any) -> str:
+        # Hashed since the arguments can get long, and memcached limits key lengths.
+        digest = hashlib.sha1(json.dumps([repr(self), *parts]).encode("utf-8")).hexdigest()
+        return f"APIClient.{parts[0]}.{digest}"
+
+    def __is_down(self) -> bool:
+        return bool(cache.get(self.__cache_key("down")))
+
+    def __exchange_data(
+        self, request_uri: str, request_args: Dict[str, Any], skip_if_down: bool = True
+    ) -> Dict[str, Any]:
+        if skip_if_down and self.__is_down():
+            # Don't make every request wait out a timeout talking to a server that just failed.
+            raise UnreachableAPIException("Remote server recently failed to respond, not querying it!")
+
+        start = time.time()
+        success = False
+        try:
+            retval = self.__exchange_data_impl(request_uri, request_args)
+            success = True
+            return retval
+        except (UnreachableAPIException, RemoteServerErrorAPIException):
+            cache.set(self.__cache_key("down"), True, timeout=self.DOWN_TIMEOUT)
+            raise
+        finally:
+            self.__record_request(time.time() - start, success)
+
+    def __stale_while_revalidate(
+        self,
+        key: str,
+        timeout: int,
+        fetch: Callable[[], List[Dict[str, Any]]],
+        refresh: bool = False,
+    ) -> List[Dict[str, Any]]:
+        # Serve anything fresh from the cache. Serve anything stale as well, but kick off a
+        # background refresh so the next request gets fresh data. Only when we have nothing
+        # at all cached do we make the caller wait for the remote server.
+        entry = None if refresh else cache.get(key)
+        if entry is not None:
+            if entry["expires"] > time.time():
+                return entry["value"]
+            if cache.add(f"{key}.refreshing", True, timeout=self.REQUEST_TIMEOUT * 2):
+
+                def background_refresh() -> None:
+                    try:
+                        self.__stale_while_revalidate(key, timeout, fetch, refresh=True)
+                    finally:
+                        cache.delete(f"{key}.refreshing")
+
+                threading.Thread(target=background_refresh, name="APIClient refresh", daemon=True).start()
+            return entry["value"]
+
+        try:
+            value = fetch()
+        except APIException:
+            # Couldn't talk to server, keep serving what we had or assume empty.
+            entry = cache.get(key)
+            return entry["value"] if entry is not None else []
+
+        cache.set(
+            key,
+            {"value": value, "expires": time.time() + timeout},
+            timeout=timeout + self.STALE_TIMEOUT,
+        )
+        return value
+
+    @staticmethod
+    def mark_hot(game: GameConstants, version: int) -> None:
+        """
+        Remember that a game asked for network-wide data for a version, so that the
+        scheduler keeps it warm.
+
+        Each game and version gets its own cache key that expires on its own, so marking
+        one never overwrites another. The scheduler finds those keys through a shared
+        index. Two processes adding to the index at once can lose one of the additions,
+        but the loser notices it is missing the next time it marks the version, so a hot
+        version is at most a minute late to be picked up.
+        """
+        now = Time.now()
+        hotkey = f"{game.value}:{version}"
+        with APIClient.__lock:
+            if APIClient.__hot_marked.get(hotkey, 0) >= now - Time.SECONDS_IN_MINUTE:
+                return
+            APIClient.__hot_marked[hotkey] = now
+
+        cache.set(f"APIClient.hot.{hotkey}", True, timeout=APIClient.HOT_TIMEOUT)
+        index = cache.get("APIClient.hot") or []
+        if hotkey not in index:
+            cache.set("APIClient.hot", [*index, hotkey], timeout=APIClient.HOT_TIMEOUT)
+
+    @staticmethod
+    def get_hot_versions() -> List[Tuple[GameConstants, int]]:
+        """
+        Return the game and version pairs that games have recently asked for network-wide
+        records or statistics for.
+        """
+        index = cache.get("APIClient.hot") or []
+        retval: List[Tuple[GameConstants, int]] = []
+        for hotkey in index:
+            if not cache.get(f"APIClient.hot.{hotkey}"):
+                continue
+            game, version = hotkey.rsplit(":", 1)
+            retval.append((GameConstants(game), int(version)))
+        return retval
+
+    def __exchange_data_impl(self, request_uri: str, request_args: Dict[str, Any]) -> Dict[str, Any]:
         if self.base_uri[-1:] != "/":
             uri = f"{self.base_uri}/{request_uri}"
         else:
@@ -98,16 +275,16 @@ class APIClient:
         data = json.dumps(request_args).encode("utf8")
 
         try:
-            r = requests.request(
+            r = self.__session().request(
                 "GET",
                 uri,
                 headers=headers,
                 data=data,
                 allow_redirects=False,
-                timeout=10,
+                timeout=self.REQUEST_TIMEOUT,
             )
         except Exception:
-            raise APIException("Failed to query remote server!")
+            raise UnreachableAPIException("Failed to query remote server!")
 
         # Verify that content type is in the form of "application/json; charset=utf-8".
         if not self._content_type_valid(r.headers["content-type"]):
@@ -231,7 +408,7 @@ class APIClient:
     # Not caching this, as it is only hit when looking at the admin panel, and we want this to
     # always be up-to-date.
     def get_server_info(self) -> ValidatedDict:
-        resp = self.__exchange_data("", {})
+        resp = self.__exchange_data("", {}, skip_if_down=False)
         return ValidatedDict(
             {
                 "name": resp["name"],
@@ -265,7 +442,6 @@ class APIClient:
             # Couldn't talk to server, assume empty profiles
             return []
 
-    @cache.memoize(Time.SECONDS_IN_MINUTE * 1)
     def get_records(
         self,
         game: GameConstants,
@@ -274,12 +450,13 @@ class APIClient:
         ids: List[str],
         since: Optional[int] = None,
         until: Optional[int] = None,
+        refresh: bool = False,
     ) -> List[Dict[str, Any]]:
         # Allow remote servers to be disabled
         if not self.allow_scores:
             return []
 
-        try:
+        def fetch() -> List[Dict[str, Any]]:
             servergame, serverversion = self.__translate(game, version)
             data: Dict[str, Any] = {
                 "ids": ids,
@@ -295,19 +472,54 @@ class APIClient:
                 data,
             )
             return resp["records"]
-        except APIException:
-            # Couldn't talk to server, assume empty records
+
+        if idtype == APIConstants.ID_TYPE_SERVER and since is None and until is None and not refresh:
+            self.mark_hot(game, version)
+        return self.__stale_while_revalidate(
+            self.__cache_key("records", game.value, version, idtype.value, ids, since, until),
+            Time.SECONDS_IN_MINUTE * 1,
+            fetch,
+            refresh=refresh,
+        )
+
+    def get_records_since(self, game: GameConstants, version: int, since: Optional[int]) -> List[Dict[str, Any]]:
+        """
+        Fetch every network-wide record on this remote server for a game and version that
+        was updated since a timestamp, or all of them if since is None. Unlike get_records,
+        this is never cached and raises an APIException if the remote server fails, so that
+        callers mirroring records can tell an empty response apart from a failure.
+        """
+        # Allow remote servers to be disabled
+        if not self.allow_scores:
             return []
 
-    @cache.memoize(Time.SECONDS_IN_MINUTE * 5)
+        servergame, serverversion = self.__translate(game, version)
+        data: Dict[str, Any] = {
+            "ids": [],
+            "type": APIConstants.ID_TYPE_SERVER.value,
+            "objects": ["records"],
+        }
+        if since is not None:
+            data["since"] = since
+        resp = self.__exchange_data(
+            f"{self.API_VERSION}/{servergame}/{serverversion}",
+            data,
+        )
+        return resp["records"]
+
     def get_statistics(
-        self, game: GameConstants, version: int, idtype: APIConstants, ids: List[str]
+        self,
+        game: GameConstants,
+        version: int,
+        idtype: APIConstants,
+        ids: List[str],
+        refresh: bool = False,
     ) -> List[Dict[str, Any]]:
         # Allow remote servers to be disabled
         if not self.allow_stats:
             return []
 
-        try:
+        def fetch() -> List[Dict[str, Any]]:
             servergame, serverversion = self.__translate(game, version)
             resp = self.__exchange_data(
                 f"{self.API_VERSION}/{servergame}/{serverversion}",
@@ -318,9 +530,25 @@ class APIClient:
                 },
             )
             return resp["statistics"]
-        except APIException:
-            # Couldn't talk to server, assume empty statistics
-            return []
+
+        if idtype == APIConstants.ID_TYPE_SERVER and not refresh:
+            self.mark_hot(game, version)
+        return self.__stale_while_revalidate(
+            self.__cache_key("statistics", game.value, version, idtype.value, ids),
+            Time.SECONDS_IN_MINUTE * 5,
+            fetch,
+            refresh=refresh,
+        )
+
+    def warm(self, game: GameConstants, version: int, records: bool = True) -> None:
+        """
+        Refresh the cached network-wide records and statistics for a game and version,
+        so that games asking for them never have to wait on this remote server. Records
+        can be skipped for callers that keep them mirrored locally instead.
+        """
+        if records:
+            self.get_records(game, version, APIConstants.ID_TYPE_SERVER, [], refresh=True)
+        self.get_statistics(game, version, APIConstants.ID_TYPE_SERVER, [], refresh=True)
 
     @cache.memoize(Time.SECONDS_IN_HOUR * 1)
     def get_catalog(self, game: GameConstants, version: int) -> Dict[str, List[Dict[str, Any]]]:
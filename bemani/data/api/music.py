@@ -1,4 +1,5 @@
 from typing import List, Optional, Dict, Any, Tuple, Set
+from typing_extensions import Final
 
 from bemani.common import (
     APIConstants,
@@ -6,9 +7,11 @@ from bemani.common import (
     VersionConstants,
     DBConstants,
     Parallel,
+    Time,
 )
 from bemani.data.interfaces import APIProviderInterface
 from bemani.data.api.base import BaseGlobalData
+from bemani.data.api.client import APIClient, APIException
 from bemani.data.mysql.user import UserData
 from bemani.data.mysql.music import MusicData
 from bemani.data.remoteuser import RemoteUser
@@ -16,11 +19,83 @@ from bemani.data.types import UserID, Score, Song
 
 
 class GlobalMusicData(BaseGlobalData):
+    # Number of seconds that incremental record syncs reach back past the previous sync,
+    # to cover clock skew between us and the remote server and records that were being
+    # written while the previous sync ran.
+    SYNC_OVERLAP: Final[int] = Time.SECONDS_IN_MINUTE * 5
+
+    # Number of seconds since a remote server's records were last synced that we will
+    # still serve network-wide records from the local mirror instead of asking it.
+    MIRROR_TIMEOUT: Final[int] = Time.SECONDS_IN_MINUTE * 30
+
     def __init__(self, api: APIProviderInterface, user: UserData, music: MusicData) -> None:
         super().__init__(api)
         self.user = user
         self.music = music
 
+    def warm_remote_caches(self) -> None:
+        """
+        Refresh cached network-wide records and statistics from every remote server
+        for any game and version that games have recently asked for, so that game
+        requests are served from the cache instead of waiting on remote servers.
+        """
+        hot = APIClient.get_hot_versions()
+        if not hot:
+            return
+
+        def warm(client: APIClient) -> None:
+            for game, version in hot:
+                client.warm(game, version, records=False)
+
+        Parallel.map(warm, self.clients)
+
+        # Records are mirrored locally instead of cached, so bring them up to date.
+        for game, version in hot:
+            self.sync_remote_records(game, version)
+
+    def sync_remote_records(self, game: GameConstants, version: int, full: bool = False) -> None:
+        """
+        Bring the local mirror of network-wide records for a game and version up to date
+        with every remote server. By default, only records updated since the previous
+        sync are fetched. A full sync fetches and replaces everything, which cleans up
+        records that were removed on the remote server.
+
+        Parameters:
+            game - Enum value identifying a game series.
+            version - Integer identifying the version of the game in the series.
+            full - Whether to fetch everything instead of just what changed.
+        """
+        watermarks = self.localapi.get_remote_watermarks(game, version)
+
+        def sync(serverid: int, client: APIClient) -> None:
+            if not client.allow_scores:
+                return
+
+            # Grab the new watermark before asking, so anything written while we wait
+            # gets picked up next time.
+            now = Time.now()
+            since = None if full else watermarks.get(serverid)
+            try:
+                records = client.get_records_since(
+                    game,
+                    version,
+                    None if since is None else since - self.SYNC_OVERLAP,
+                )
+            except APIException:
+                # Try again next time from the same watermark.
+                return
+
+            self.localapi.put_remote_records(
+                game,
+                version,
+                serverid,
+                records,
+                now,
+                replace=since is None,
+            )
+
+        Parallel.map(lambda item: sync(*item), list(self.clients_by_server.items()))
+
     def __get_cardids(self, userid: UserID) -> List[str]:
         if RemoteUser.is_remote(userid):
             return [RemoteUser.userid_to_card(userid)]
@@ -527,12 +602,14 @@ class GlobalMusicData(BaseGlobalData):
         # Helper function so we can iterate over all servers for a single card
         def get_scores_for_card(cardid: str) -> List[Score]:
             return Parallel.flatten(
-                Parallel.call(
+                Parallel.call_with_deadline(
                     [client.get_records for client in self.clients],
                     game,
                     version,
                     APIConstants.ID_TYPE_INSTANCE,
                     [songid, songchart, cardid],
+                    deadline=self.REMOTE_DEADLINE,
+                    default=[],
                 )
             )
 
@@ -590,7 +667,7 @@ class GlobalMusicData(BaseGlobalData):
         if RemoteUser.is_remote(userid):
             # No need to look up local score for this user
             scores = Parallel.flatten(
-                Parallel.call(
+                Parallel.call_with_deadline(
                     [client.get_records for client in self.clients],
                     game,
                     version,
@@ -598,6 +675,8 @@ class GlobalMusicData(BaseGlobalData):
                     relevant_cards,
                     since,
                     until,
+                    deadline=self.REMOTE_DEADLINE,
+                    default=[],
                 )
             )
             localscores: List[Score] = []
@@ -606,7 +685,7 @@ class GlobalMusicData(BaseGlobalData):
                 [
                     lambda: self.music.get_scores(game, version, userid, since, until),
                     lambda: Parallel.flatten(
-                        Parallel.call(
+                        Parallel.call_with_deadline(
                             [client.get_records for client in self.clients],
                             game,
                             version,
@@ -614,6 +693,8 @@ class GlobalMusicData(BaseGlobalData):
                             relevant_cards,
                             since,
                             until,
+                            deadline=self.REMOTE_DEADLINE,
+                            default=[],
                         )
                     ),
                 ]
@@ -737,7 +818,7 @@ class GlobalMusicData(BaseGlobalData):
                 self.user.get_all_cards,
                 lambda: self.music.get_all_scores(game, version, userid, songid, songchart, since, until),
                 lambda: Parallel.flatten(
-                    Parallel.call(
+                    Parallel.call_with_deadline(
                         [client.get_records for client in self.clients],
                         game,
                         version,
@@ -745,6 +826,8 @@ class GlobalMusicData(BaseGlobalData):
                         songkey,
                         since,
                         until,
+                        deadline=self.REMOTE_DEADLINE,
+                        default=[],
                     )
                 ),
             ]
@@ -824,24 +907,42 @@ class GlobalMusicData(BaseGlobalData):
         if version is None or userlist is not None or locationlist is not None:
             return self.music.get_all_records(game, version, userlist, locationlist)
 
+        # Serve records from any remote server we've mirrored recently locally, and only
+        # ask the rest directly.
+        APIClient.mark_hot(game, version)
+        cutoff = Time.now() - self.MIRROR_TIMEOUT
+        watermarks = self.localapi.get_remote_watermarks(game, version)
+        mirrored: List[int] = []
+        live: List[APIClient] = []
+        for serverid, client in self.clients_by_server.items():
+            if not client.allow_scores:
+                continue
+            if watermarks.get(serverid, 0) >= cutoff:
+                mirrored.append(serverid)
+            else:
+                live.append(client)
+
         # Now, fetch all records remotely and locally
-        localcards, localscores, remotescores = Parallel.execute(
+        localcards, localscores, mirroredscores, remotescores = Parallel.execute(
             [
                 self.user.get_all_cards,
                 lambda: self.music.get_all_records(game, version, userlist, locationlist),
+                lambda: self.localapi.get_remote_records(game, version, mirrored),
                 lambda: Parallel.flatten(
-                    Parallel.call(
-                        [client.get_records for client in self.clients],
+                    Parallel.call_with_deadline(
+                        [client.get_records for client in live],
                         game,
                         version,
                         APIConstants.ID_TYPE_SERVER,
                         [],
+                        deadline=self.REMOTE_DEADLINE,
+                        default=[],
                     )
                 ),
             ]
         )
 
-        return self.__merge_global_records(game, version, localcards, localscores, remotescores)
+        return self.__merge_global_records(game, version, localcards, localscores, mirroredscores + remotescores)
 
     def get_clear_rates(
         self,
@@ -873,12 +974,14 @@ class GlobalMusicData(BaseGlobalData):
 
         if songid is None and songchart is None:
             statistics = Parallel.flatten(
-                Parallel.call(
+                Parallel.call_with_deadline(
                     [client.get_statistics for client in self.clients],
                     game,
                     version,
                     APIConstants.ID_TYPE_SERVER,
                     [],
+                    deadline=self.REMOTE_DEADLINE,
+                    default=[],
                 )
             )
         elif songid is not None:
@@ -887,12 +990,14 @@ class GlobalMusicData(BaseGlobalData):
             else:
                 ids = [songid, songchart]
             statistics = Parallel.flatten(
-                Parallel.call(
+                Parallel.call_with_deadline(
                     [client.get_statistics for client in self.clients],
                     game,
                     version,
                     APIConstants.ID_TYPE_SONG,
                     ids,
+                    deadline=self.REMOTE_DEADLINE,
+                    default=[],
                 )
             )
         else:
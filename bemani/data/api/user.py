@@ -96,12 +96,14 @@ class GlobalUserData(BaseGlobalData):
         extid = self.user.get_extid(game, version, userid)
 
         profiles = Parallel.flatten(
-            Parallel.call(
+            Parallel.call_with_deadline(
                 [client.get_profiles for client in self.clients],
                 game,
                 version,
                 APIConstants.ID_TYPE_CARD,
                 [cardid],
+                deadline=self.REMOTE_DEADLINE,
+                default=[],
             )
         )
         for profile in profiles:
@@ -171,12 +173,14 @@ class GlobalUserData(BaseGlobalData):
                 [
                     lambda: self.user.get_any_profiles(game, version, local_ids),
                     lambda: Parallel.flatten(
-                        Parallel.call(
+                        Parallel.call_with_deadline(
                             [client.get_profiles for client in self.clients],
                             game,
                             version,
                             APIConstants.ID_TYPE_CARD,
                             [RemoteUser.userid_to_card(userid) for userid in remote_ids],
+                            deadline=self.REMOTE_DEADLINE,
+                            default=[],
                         )
                     ),
                 ]
@@ -228,12 +232,14 @@ class GlobalUserData(BaseGlobalData):
                 self.user.get_all_cards,
                 lambda: self.user.get_all_profiles(game, version),
                 lambda: Parallel.flatten(
-                    Parallel.call(
+                    Parallel.call_with_deadline(
                         [client.get_profiles for client in self.clients],
                         game,
                         version,
                         APIConstants.ID_TYPE_SERVER,
                         [],
+                        deadline=self.REMOTE_DEADLINE,
+                        default=[],
                     )
                 ),
             ]
@@ -1,7 +1,7 @@
 import copy
 import os
 from sqlalchemy.engine import Engine
-from typing import Any, Dict, Optional, Set
+from typing import Any, Dict, List, Optional, Set
 
 from bemani.common import GameConstants, RegionConstants
 from bemani.data.types import ArcadeID
@@ -40,6 +40,23 @@ class Database:
     def read_only(self) -> bool:
         return bool(self.__config.get("database", {}).get("read_only", False))
 
+    @property
+    def slow_query_threshold(self) -> float:
+        return float(self.__config.get("database", {}).get("slow_query_threshold", 0) or 0)
+
+    @property
+    def slow_query_log(self) -> Optional[str]:
+        slow_query_log = self.__config.get("database", {}).get("slow_query_log")
+        return os.path.abspath(str(slow_query_log)) if slow_query_log else None
+
+    @property
+    def query_budget(self) -> int:
+        return int(self.__config.get("database", {}).get("query_budget", 0) or 0)
+
+    @property
+    def query_budget_strict(self) -> bool:
+        return bool(self.__config.get("database", {}).get("query_budget_strict", False))
+
 
 class Server:
     def __init__(self, parent_config: "Config") -> None:
@@ -140,8 +157,26 @@ class PASELI:
 
 class WebHooks:
     def __init__(self, parent_config: "Config") -> None:
+        self.__config = parent_config
         self.discord = DiscordWebHooks(parent_config)
 
+    @property
+    def spool_dir(self) -> Optional[str]:
+        spool_dir = self.__config.get("webhooks", {}).get("spool_dir")
+        return os.path.abspath(str(spool_dir)) if spool_dir else None
+
+    @property
+    def max_attempts(self) -> int:
+        return int(self.__config.get("webhooks", {}).get("max_attempts", 5))
+
+    @property
+    def retry_backoff(self) -> float:
+        return float(self.__config.get("webhooks", {}).get("retry_backoff", 30))
+
+    @property
+    def min_interval(self) -> float:
+        return float(self.__config.get("webhooks", {}).get("min_interval", 1))
+
 
 class DiscordWebHooks:
     def __init__(self, parent_config: "Config") -> None:
@@ -167,6 +202,43 @@ class JubeatAssets:
         return str(directory) if directory else None
 
 
+class EventLog:
+    def __init__(self, parent_config: "Config") -> None:
+        self.__config = parent_config
+
+    @property
+    def spool_dir(self) -> Optional[str]:
+        spool_dir = self.__config.get("event_log", {}).get("spool_dir")
+        return os.path.abspath(str(spool_dir)) if spool_dir else None
+
+    @property
+    def flush_size(self) -> int:
+        return int(self.__config.get("event_log", {}).get("flush_size", 100))
+
+    @property
+    def flush_interval(self) -> int:
+        return int(self.__config.get("event_log", {}).get("flush_interval", 10))
+
+
+class Metrics:
+    def __init__(self, parent_config: "Config") -> None:
+        self.__config = parent_config
+
+    @property
+    def allow(self) -> List[str]:
+        allow = self.__config.get("metrics", {}).get("allow", ["127.0.0.1", "::1"])
+        return [str(address) for address in (allow or [])]
+
+    @property
+    def proxies(self) -> List[str]:
+        proxies = self.__config.get("metrics", {}).get("proxies", [])
+        return [str(address) for address in (proxies or [])]
+
+    @property
+    def log_interval(self) -> int:
+        return int(self.__config.get("metrics", {}).get("log_interval", 0) or 0)
+
+
 class Config(dict):
     def __init__(self, existing_contents: Dict[str, Any] = {}) -> None:
         super().__init__(existing_contents or {})
@@ -178,6 +250,8 @@ class Config(dict):
         self.webhooks = WebHooks(self)
         self.assets = Assets(self)
         self.machine = Machine(self)
+        self.event_log = EventLog(self)
+        self.metrics = Metrics(self)
 
     def clone(self) -> "Config":
         # Somehow its not possible to clone this object if an instantiated Engine is present,
@@ -240,6 +314,10 @@ class Config(dict):
     def theme(self) -> str:
         return str(self.get("theme", "default"))
 
+    @property
+    def snapshot_staleness(self) -> int:
+        return int(self.get("snapshot_staleness", 600) or 0)
+
     @property
     def event_log_duration(self) -> Optional[int]:
         duration = self.get("event_log_duration")
@@ -9,12 +9,14 @@ from sqlalchemy.orm import sessionmaker
 from sqlalchemy.engine import Engine
 from sqlalchemy.sql import text
 from sqlalchemy.exc import ProgrammingError
+from typing import List
 
+from bemani.common import GameConstants
 from bemani.data.api.user import GlobalUserData
 from bemani.data.api.game import GlobalGameData
 from bemani.data.api.music import GlobalMusicData
 from bemani.data.config import Config
-from bemani.data.mysql.base import metadata
+from bemani.data.mysql.base import QueryStats, metadata
 from bemani.data.mysql.user import UserData
 from bemani.data.mysql.music import MusicData
 from bemani.data.mysql.machine import MachineData
@@ -101,13 +103,15 @@ class Data:
         self.__config = config
         self.__session = scoped_session(session_factory)
         self.__url = Data.sqlalchemy_url(config)
-        self.__user = UserData(config, self.__session)
-        self.__music = MusicData(config, self.__session)
-        self.__machine = MachineData(config, self.__session)
-        self.__game = GameData(config, self.__session)
-        self.__network = NetworkData(config, self.__session)
-        self.__lobby = LobbyData(config, self.__session)
-        self.__api = APIData(config, self.__session)
+        # Shared by every DB singleton below, so it totals up all queries made through us.
+        self.stats = QueryStats()
+        self.__user = UserData(config, self.__session, self.stats)
+        self.__music = MusicData(config, self.__session, self.stats)
+        self.__machine = MachineData(config, self.__session, self.stats)
+        self.__game = GameData(config, self.__session, self.stats)
+        self.__network = NetworkData(config, self.__session, self.stats)
+        self.__lobby = LobbyData(config, self.__session, self.stats)
+        self.__api = APIData(config, self.__session, self.stats)
         self.local = LocalProvider(
             self.__user,
             self.__music,
@@ -120,6 +124,22 @@ class Data:
         self.remote = GlobalProvider(self.local)
         self.triggers = Triggers(config)
 
+    @classmethod
+    def register_indexed_attributes(cls, game: GameConstants, version: int, attributes: List[str]) -> None:
+        """
+        Register profile attributes that a game version looks users up by. See
+        UserData.register_indexed_attributes for details.
+        """
+        UserData.register_indexed_attributes(game, version, attributes)
+
+    @classmethod
+    def register_daily_points(cls, game: GameConstants, version: int) -> None:
+        """
+        Register a game version that looks up daily points. See
+        MusicData.register_daily_points for details.
+        """
+        MusicData.register_daily_points(game, version)
+
     @classmethod
     def sqlalchemy_url(cls, config: Config) -> str:
         return f"mysql://{config.database.user}:{config.database.password}@{config.database.address}/{config.database.database}?charset=utf8mb4"
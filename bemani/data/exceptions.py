@@ -1,2 +1,6 @@
 class ScoreSaveException(Exception):
     pass
+
+
+class QueryBudgetException(Exception):
+    pass
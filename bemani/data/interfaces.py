@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Any, Dict, List
 
+from bemani.common import GameConstants
 from bemani.data.types import Server
 
 
@@ -13,3 +14,37 @@ class APIProviderInterface(ABC):
         Returns:
             A list of Server objects sorted by add time.
         """
+
+    @abstractmethod
+    def get_remote_watermarks(self, game: GameConstants, version: int) -> Dict[int, int]:
+        """
+        Grab the timestamp that the next incremental sync of each server's mirrored
+        records should ask for records since.
+
+        Returns:
+            A dictionary keyed by server ID. Servers whose records have never been
+            mirrored are absent.
+        """
+
+    @abstractmethod
+    def put_remote_records(
+        self,
+        game: GameConstants,
+        version: int,
+        serverid: int,
+        records: List[Dict[str, Any]],
+        watermark: int,
+        replace: bool = False,
+    ) -> None:
+        """
+        Merge records fetched from a server into the local mirror and advance its watermark.
+        """
+
+    @abstractmethod
+    def get_remote_records(self, game: GameConstants, version: int, serverids: List[int]) -> List[Dict[str, Any]]:
+        """
+        Grab all mirrored records for a set of servers.
+
+        Returns:
+            A list of records as returned by the servers.
+        """
@@ -1,9 +1,9 @@
 import uuid
-from sqlalchemy import Table, Column
-from sqlalchemy.types import String, Integer
+from sqlalchemy import Table, Column, UniqueConstraint
+from sqlalchemy.types import String, Integer, JSON
 from typing import Any, Dict, List, Optional
 
-from bemani.common import Time
+from bemani.common import GameConstants, Time
 from bemani.data.mysql.base import BaseData, metadata
 from bemani.data.interfaces import APIProviderInterface
 from bemani.data.types import Client, Server
@@ -37,6 +37,40 @@ server = Table(
     mysql_charset="utf8mb4",
 )
 
+"""
+Table for mirroring network-wide records from remote servers, so that games can look
+up global records without talking to every remote server on every request. The data
+column holds the record exactly as the remote server sent it.
+"""
+remote_record = Table(
+    "remote_record",
+    metadata,
+    Column("game", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("serverid", Integer, nullable=False),
+    Column("songid", Integer, nullable=False),
+    Column("chart", Integer, nullable=False),
+    Column("updated", Integer, nullable=False),
+    Column("data", JSON, nullable=False),
+    UniqueConstraint("game", "version", "serverid", "songid", "chart", name="game_version_serverid_songid_chart"),
+    mysql_charset="utf8mb4",
+)
+
+"""
+Table for storing how far along the remote_record mirror is for each remote server,
+as the timestamp that the next incremental sync should ask for records since.
+"""
+remote_sync = Table(
+    "remote_sync",
+    metadata,
+    Column("game", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("serverid", Integer, nullable=False),
+    Column("watermark", Integer, nullable=False),
+    UniqueConstraint("game", "version", "serverid", name="game_version_serverid"),
+    mysql_charset="utf8mb4",
+)
+
 
 class APIData(APIProviderInterface, BaseData):
     def get_all_clients(self) -> List[Client]:
@@ -243,3 +277,103 @@ class APIData(APIProviderInterface, BaseData):
         """
         sql = "DELETE FROM server WHERE id = :id LIMIT 1"
         self.execute(sql, {"id": serverid})
+
+        # Also get rid of anything we mirrored from this server
+        sql = "DELETE FROM remote_record WHERE serverid = :id"
+        self.execute(sql, {"id": serverid})
+        sql = "DELETE FROM remote_sync WHERE serverid = :id"
+        self.execute(sql, {"id": serverid})
+
+    def get_remote_watermarks(self, game: GameConstants, version: int) -> Dict[int, int]:
+        """
+        Given a game/version, look up how far the record mirror for each remote server
+        has been synced.
+
+        Parameters:
+            game - Enum value identifying a game series.
+            version - Integer identifying the version of the game in the series.
+
+        Returns:
+            A dictionary keyed by server ID whose values are the unix timestamp that the next
+            sync should ask for records since. Servers that were never synced are absent.
+        """
+        sql = "SELECT serverid, watermark FROM remote_sync WHERE game = :game AND version = :version"
+        cursor = self.execute(sql, {"game": game.value, "version": version})
+        return {result["serverid"]: result["watermark"] for result in cursor.mappings()}
+
+    def put_remote_records(
+        self,
+        game: GameConstants,
+        version: int,
+        serverid: int,
+        records: List[Dict[str, Any]],
+        watermark: int,
+        replace: bool = False,
+    ) -> None:
+        """
+        Given a game/version, a server ID and a list of records as returned by that
+        server, merge the records into the mirror and advance the sync watermark.
+
+        Parameters:
+            game - Enum value identifying a game series.
+            version - Integer identifying the version of the game in the series.
+            serverid - Integer specifying server ID.
+            records - List of record dictionaries as returned by the remote server.
+            watermark - Unix timestamp that the next sync should ask for records since.
+            replace - If True, the records replace everything mirrored so far instead
+                      of being merged in.
+        """
+        if replace:
+            sql = "DELETE FROM remote_record WHERE game = :game AND version = :version AND serverid = :serverid"
+            self.execute(sql, {"game": game.value, "version": version, "serverid": serverid})
+
+        # Insert in chunks so that we stay well under the maximum packet size for full syncs.
+        chunk_size = 100
+        for offset in range(0, len(records), chunk_size):
+            chunk = records[offset : (offset + chunk_size)]
+            values = []
+            params: Dict[str, Any] = {"game": game.value, "version": version, "serverid": serverid}
+            for i, record in enumerate(chunk):
+                values.append(f"(:game, :version, :serverid, :songid{i}, :chart{i}, :updated{i}, :data{i})")
+                params[f"songid{i}"] = int(record["song"])
+                params[f"chart{i}"] = int(record["chart"])
+                params[f"updated{i}"] = max(int(record.get("timestamp", -1)), int(record.get("updated", -1)))
+                params[f"data{i}"] = self.serialize(record)
+
+            # Records only ever get replaced by newer records, but an incremental sync overlaps
+            # the previous one so make sure we never go backwards.
+            sql = f"""
+                INSERT INTO remote_record (game, version, serverid, songid, chart, updated, data)
+                VALUES {', '.join(values)}
+                ON DUPLICATE KEY UPDATE
+                    data = IF(VALUES(updated) >= updated, VALUES(data), data),
+                    updated = GREATEST(updated, VALUES(updated))
+            """
+            self.execute(sql, params)
+
+        sql = """
+            INSERT INTO remote_sync (game, version, serverid, watermark)
+            VALUES (:game, :version, :serverid, :watermark)
+            ON DUPLICATE KEY UPDATE watermark = VALUES(watermark)
+        """
+        self.execute(sql, {"game": game.value, "version": version, "serverid": serverid, "watermark": watermark})
+
+    def get_remote_records(self, game: GameConstants, version: int, serverids: List[int]) -> List[Dict[str, Any]]:
+        """
+        Given a game/version and a list of server IDs, look up every mirrored record
+        from those servers.
+
+        Parameters:
+            game - Enum value identifying a game series.
+            version - Integer identifying the version of the game in the series.
+            serverids - List of integer server IDs to return records for.
+
+        Returns:
+            A list of record dictionaries as returned by the remote servers.
+        """
+        if not serverids:
+            return []
+
+        sql = "SELECT data FROM remote_record WHERE game = :game AND version = :version AND serverid IN :serverids"
+        cursor = self.execute(sql, {"game": game.value, "version": version, "serverids": tuple(serverids)})
+        return [self.deserialize(result["data"]) for result in cursor.mappings()]
@@ -1,10 +1,16 @@
 import json
+import os
 import random
-from typing import Dict, Any, Optional
+import re
+import sys
+import time
+import traceback
+from typing import Dict, Any, List, Optional, Pattern, Tuple
 from typing_extensions import Final
 
 from bemani.common import Time
 from bemani.data.config import Config
+from bemani.data.exceptions import QueryBudgetException
 
 from sqlalchemy.engine import CursorResult
 from sqlalchemy.orm import scoped_session
@@ -37,10 +43,46 @@ class _BytesEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+class QueryStats:
+    """
+    Running totals for every query executed by a set of DB singletons, so that callers
+    can see how much of a request was spent waiting on the DB.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+
+        # Description of the game handler these queries are being made for, if any.
+        self.context: Optional[str] = None
+
+        # Number of queries allowed before we complain, or zero for no limit, and
+        # whether going over should raise instead of logging a warning.
+        self.budget = 0
+        self.strict_budget = False
+
+    def reset(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+
+
 class BaseData:
     SESSION_LENGTH: Final[int] = 32
 
-    def __init__(self, config: Config, conn: scoped_session) -> None:
+    __DATA_DIR: Final[str] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    __FINGERPRINT_SUBSTITUTIONS: Final[List[Tuple[Pattern[str], str]]] = [
+        (re.compile(r"\s+"), " "),
+        # Literal strings and numbers.
+        (re.compile(r"'(?:[^'\\]|\\.)*'"), "?"),
+        (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+        # Numbered parameters for multi-row inserts and the like.
+        (re.compile(r":([A-Za-z_]+?)\d+\b"), r":\1"),
+        # Lists of values and then repeated lists of values.
+        (re.compile(r"\(\s*(?:\?|:\w+)(?:\s*,\s*(?:\?|:\w+))*\s*\)"), "(...)"),
+        (re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+"), "(...)"),
+    ]
+
+    def __init__(self, config: Config, conn: scoped_session, stats: Optional[QueryStats] = None) -> None:
         """
         Initialize any DB singleton.
 
@@ -51,9 +93,60 @@ class BaseData:
                      needs to look up configuration.
             conn - An established connection to the DB which will be used for all
                    queries.
+            stats - Optional query totals shared with the other DB singletons.
         """
         self.__config = config
         self.__conn = conn
+        self.__stats = stats if stats is not None else QueryStats()
+
+    @staticmethod
+    def fingerprint(sql: str) -> str:
+        """
+        Given a SQL statement, return its shape with literals and lists of values
+        collapsed, so that queries that only differ by their values compare equal.
+        """
+        for regex, replacement in BaseData.__FINGERPRINT_SUBSTITUTIONS:
+            sql = regex.sub(replacement, sql)
+        return sql.strip()
+
+    def __caller(self) -> str:
+        """
+        Return the first bit of code outside of the data layer that led to a query.
+        """
+        frame = sys._getframe(1)
+        while frame.f_back is not None and frame.f_code.co_filename.startswith(BaseData.__DATA_DIR):
+            frame = frame.f_back
+        return f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+    def __log_slow_query(self, sql: str, seconds: float, rows: int) -> None:
+        entry = {
+            "timestamp": Time.now(),
+            "fingerprint": BaseData.fingerprint(sql),
+            "seconds": seconds,
+            "rows": rows,
+            "handler": self.__stats.context,
+            "caller": self.__caller(),
+        }
+        print(
+            f"Slow query took {seconds:.3f} seconds for {rows} rows in {entry['handler'] or 'no handler'} "
+            f"from {entry['caller']}: {entry['fingerprint']}"
+        )
+
+        slow_query_log = self.__config.database.slow_query_log
+        if slow_query_log is not None:
+            try:
+                with open(slow_query_log, "a") as fp:
+                    fp.write(json.dumps(entry) + "\n")
+            except OSError:
+                # We never want to fail a request because we couldn't log about it.
+                print(traceback.format_exc())
+
+    @property
+    def config(self) -> Config:
+        """
+        The config structure this DB singleton was initialized with.
+        """
+        return self.__config
 
     def execute(
         self,
@@ -82,11 +175,33 @@ class BaseData:
                 includes = all(s in lowered for s in write_statement_group)
                 if includes and not safe_write_operation:
                     raise Exception("Read-only mode is active!")
-        result = self.__conn.execute(
-            text(sql),
-            params if params is not None else {},
-        )
-        self.__conn.commit()
+        start = time.perf_counter()
+        try:
+            result = self.__conn.execute(
+                text(sql),
+                params if params is not None else {},
+            )
+            self.__conn.commit()
+        finally:
+            seconds = time.perf_counter() - start
+            self.__stats.count += 1
+            self.__stats.seconds += seconds
+
+        threshold = self.__config.database.slow_query_threshold
+        if threshold > 0 and seconds >= threshold:
+            self.__log_slow_query(sql, seconds, result.rowcount)
+
+        budget = self.__stats.budget
+        if budget > 0 and self.__stats.count > budget:
+            message = (
+                f"Went over the budget of {budget} queries in {self.__stats.context or 'no handler'} "
+                f"from {self.__caller()}: {BaseData.fingerprint(sql)}"
+            )
+            if self.__stats.strict_budget:
+                raise QueryBudgetException(message)
+            if self.__stats.count == budget + 1:
+                # Only warn once per request, it's going to be noisy enough as it is.
+                print(message)
         return result
 
     def serialize(self, data: Dict[str, Any]) -> str:
@@ -1,7 +1,7 @@
 from sqlalchemy import Table, Column, UniqueConstraint
 from sqlalchemy.types import String, Integer, JSON
 from sqlalchemy.dialects.mysql import BIGINT as BigInteger
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from bemani.common import GameConstants, ValidatedDict, Time
 from bemani.data.mysql.base import BaseData, metadata
@@ -71,6 +71,23 @@ time_sensitive_settings = Table(
     mysql_charset="utf8mb4",
 )
 
+"""
+Table for storing data that the scheduler aggregates ahead of time so that game
+requests don't have to, such as network-wide records. Each snapshot remembers
+when it was taken so that stale snapshots can be ignored.
+"""
+snapshot = Table(
+    "snapshot",
+    metadata,
+    Column("game", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("name", String(64), nullable=False),
+    Column("timestamp", Integer, nullable=False),
+    Column("data", JSON, nullable=False),
+    UniqueConstraint("game", "version", "name", name="game_version_name"),
+    mysql_charset="utf8mb4",
+)
+
 
 class GameData(BaseData):
     def get_settings(self, game: GameConstants, userid: UserID) -> Optional[ValidatedDict]:
@@ -412,3 +429,74 @@ class GameData(BaseData):
             )
             for result in cursor.mappings()
         ]
+
+    def get_snapshot(self, game: GameConstants, version: int, name: str) -> Optional[Tuple[int, ValidatedDict]]:
+        """
+        Given a game/version/name, look up the most recent snapshot stored under that name.
+
+        Parameters:
+            game - Enum value identifier of the game the snapshot is for.
+            version - Integer identifier of the version the snapshot is for.
+            name - The name of the snapshot.
+
+        Returns:
+            A tuple of the time the snapshot was taken and its contents, or None if there
+            is no snapshot by this name.
+        """
+        sql = "SELECT timestamp, data FROM snapshot WHERE game = :game AND version = :version AND name = :name"
+        cursor = self.execute(sql, {"game": game.value, "version": version, "name": name})
+        if cursor.rowcount != 1:
+            # snapshot doesn't exist
+            return None
+
+        result = cursor.mappings().fetchone()  # type: ignore
+        return (result["timestamp"], ValidatedDict(self.deserialize(result["data"])))
+
+    def get_snapshot_timestamp(self, game: GameConstants, version: int, name: str) -> Optional[int]:
+        """
+        Given a game/version/name, look up when the snapshot stored under that name was taken,
+        without loading the snapshot itself.
+
+        Parameters:
+            game - Enum value identifier of the game the snapshot is for.
+            version - Integer identifier of the version the snapshot is for.
+            name - The name of the snapshot.
+
+        Returns:
+            Seconds since the unix epoch (UTC) that the snapshot was taken at, or None if there
+            is no snapshot by this name.
+        """
+        sql = "SELECT timestamp FROM snapshot WHERE game = :game AND version = :version AND name = :name"
+        cursor = self.execute(sql, {"game": game.value, "version": version, "name": name})
+        if cursor.rowcount != 1:
+            # snapshot doesn't exist
+            return None
+
+        result = cursor.mappings().fetchone()  # type: ignore
+        return result["timestamp"]
+
+    def put_snapshot(self, game: GameConstants, version: int, name: str, data: Dict[str, Any]) -> None:
+        """
+        Given a game/version/name, store a snapshot, replacing any previous snapshot by that name.
+
+        Parameters:
+            game - Enum value identifier of the game the snapshot is for.
+            version - Integer identifier of the version the snapshot is for.
+            name - The name of the snapshot.
+            data - A dictionary of aggregated data that a game class will want to retrieve later.
+        """
+        sql = """
+            INSERT INTO snapshot (game, version, name, timestamp, data)
+            VALUES (:game, :version, :name, :timestamp, :data)
+            ON DUPLICATE KEY UPDATE timestamp=VALUES(timestamp), data=VALUES(data)
+        """
+        self.execute(
+            sql,
+            {
+                "game": game.value,
+                "version": version,
+                "name": name,
+                "timestamp": Time.now(),
+                "data": self.serialize(data),
+            },
+        )
@@ -2,7 +2,7 @@ from sqlalchemy import Table, Column, UniqueConstraint
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.types import String, Integer, JSON
 from sqlalchemy.dialects.mysql import BIGINT as BigInteger
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, List, Set, Tuple, Any
 
 from bemani.common import GameConstants, Time
 from bemani.data.exceptions import ScoreSaveException
@@ -79,8 +79,67 @@ music = Table(
     mysql_charset="utf8mb4",
 )
 
+"""
+Table for storing precomputed aggregates of the scores on a chart, keyed by the group
+of players (cohort) they were computed over, such as the top score at an arcade. These
+are rebuilt out of band by the scheduler so that games can look up a single row instead
+of loading every score on a chart. The data column holds whatever the game computed.
+"""
+score_cohort = Table(
+    "score_cohort",
+    metadata,
+    Column("game", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("songid", Integer, nullable=False),
+    Column("chart", Integer, nullable=False),
+    Column("cohort", String(64), nullable=False),
+    Column("updated", Integer, nullable=False),
+    Column("data", JSON, nullable=False),
+    UniqueConstraint("game", "version", "songid", "chart", "cohort", name="game_version_songid_chart_cohort"),
+    mysql_charset="utf8mb4",
+)
+
+"""
+Table for storing each user's best points on a chart per UTC day, maintained alongside
+score_history as attempts are written. Games that rank players by what they earned on
+a given day can sum this instead of replaying every attempt. Keyed by musicid like the
+score and score_history tables. This can be rebuilt from score_history at any time.
+"""
+score_daily = Table(
+    "score_daily",
+    metadata,
+    Column("day", Integer, nullable=False),
+    Column("userid", BigInteger(unsigned=True), nullable=False),
+    Column("musicid", Integer, nullable=False),
+    Column("points", Integer, nullable=False),
+    UniqueConstraint("day", "userid", "musicid", name="day_userid_musicid"),
+    mysql_charset="utf8mb4",
+)
+
 
 class MusicData(BaseData):
+    # Games and versions that asked for daily score aggregates to be kept.
+    __daily_points: Set[Tuple[GameConstants, int]] = set()
+
+    @classmethod
+    def register_daily_points(cls, game: GameConstants, version: int) -> None:
+        """
+        Register a game that looks up daily points, so that put_attempt keeps the
+        daily aggregates for it up to date. Other games don't pay for the extra write.
+
+        Parameters:
+            game - Enum value identifier of the game.
+            version - Integer version of the game.
+        """
+        cls.__daily_points.add((game, version))
+
+    @classmethod
+    def daily_points_games(cls) -> List[Tuple[GameConstants, int]]:
+        """
+        Return every game and version that keeps daily score aggregates.
+        """
+        return sorted(cls.__daily_points, key=lambda key: (key[0].value, key[1]))
+
     def __get_musicid(self, game: GameConstants, version: int, songid: int, songchart: int) -> int:
         """
         Given a game/version/songid/chart, look up the unique music ID for this song.
@@ -237,6 +296,24 @@ class MusicData(BaseData):
                 f"There is already an attempt by {userid if userid is not None else 0} for music id {musicid} at {ts}"
             )
 
+        # Keep the daily aggregate up to date for games that read it, anonymous plays
+        # don't count towards anyone
+        if userid is not None and (game, version) in MusicData.__daily_points:
+            sql = """
+                INSERT INTO `score_daily` (day, userid, musicid, points)
+                VALUES (:day, :userid, :musicid, :points)
+                ON DUPLICATE KEY UPDATE points = GREATEST(points, VALUES(points))
+            """
+            self.execute(
+                sql,
+                {
+                    "day": ts // Time.SECONDS_IN_DAY,
+                    "userid": userid,
+                    "musicid": musicid,
+                    "points": points,
+                },
+            )
+
     def get_score(
         self,
         game: GameConstants,
@@ -1021,3 +1098,169 @@ class MusicData(BaseData):
             )
             for result in cursor.mappings()
         ]
+
+    def get_daily_points(
+        self,
+        game: GameConstants,
+        version: int,
+        day: int,
+        userids: List[UserID],
+    ) -> Dict[UserID, int]:
+        """
+        Look up the points a set of users earned on a particular day. A user earns the best
+        points they got that day on each chart they played, summed over all charts.
+
+        Parameters:
+            game - Enum value representing a game series.
+            version - Integer representing which version of the game.
+            day - Day to look up, as a number of days since the unix epoch in UTC.
+            userids - List of users to look up.
+
+        Returns:
+            A dictionary keyed by UserID of points earned. Users who did not play that day
+            are left out.
+        """
+        if not userids:
+            return {}
+
+        sql = """
+            SELECT userid, SUM(points) AS points FROM score_daily
+            WHERE day = :day AND userid IN :userids
+            AND musicid IN (SELECT DISTINCT(id) FROM music WHERE game = :game AND version = :version)
+            GROUP BY userid
+        """
+        cursor = self.execute(
+            sql,
+            {
+                "game": game.value,
+                "version": version,
+                "day": day,
+                "userids": userids,
+            },
+        )
+        return {UserID(result["userid"]): int(result["points"]) for result in cursor.mappings()}
+
+    def rebuild_daily_points(self) -> int:
+        """
+        Regenerate the daily aggregates from score_history for every game registered with
+        register_daily_points, for attempts that were written before the aggregate table
+        existed or if it is otherwise out of sync.
+
+        Returns:
+            The number of aggregate rows written.
+        """
+        self.execute("DELETE FROM score_daily")
+        sql = f"""
+            INSERT INTO score_daily (day, userid, musicid, points)
+            SELECT FLOOR(timestamp / {Time.SECONDS_IN_DAY}) AS day, userid, musicid, MAX(points)
+            FROM score_history WHERE userid != 0
+            AND musicid IN (SELECT DISTINCT(id) FROM music WHERE game = :game AND version = :version)
+            GROUP BY day, userid, musicid
+        """
+        count = 0
+        for game, version in self.daily_points_games():
+            cursor = self.execute(sql, {"game": game.value, "version": version})
+            count += cursor.rowcount
+        return count
+
+    def get_score_cohorts(
+        self,
+        game: GameConstants,
+        version: int,
+        songid: int,
+        songchart: int,
+        cohorts: List[str],
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up precomputed cohort data for a chart.
+
+        Parameters:
+            game - Enum value representing a game series.
+            version - Integer representing which version of the game.
+            songid - ID of the song according to the game.
+            songchart - Chart number according to the game.
+            cohorts - List of cohort names to look up.
+
+        Returns:
+            A dictionary keyed by cohort name of the data stored for each cohort that exists.
+        """
+        if not cohorts:
+            return {}
+
+        sql = """
+            SELECT cohort, data FROM score_cohort
+            WHERE game = :game AND version = :version AND songid = :songid AND chart = :chart AND cohort IN :cohorts
+        """
+        cursor = self.execute(
+            sql,
+            {
+                "game": game.value,
+                "version": version,
+                "songid": songid,
+                "chart": songchart,
+                "cohorts": tuple(cohorts),
+            },
+        )
+        return {result["cohort"]: self.deserialize(result["data"]) for result in cursor.mappings()}
+
+    def put_score_cohorts(
+        self,
+        game: GameConstants,
+        version: int,
+        songid: int,
+        songchart: int,
+        cohorts: Dict[str, Dict[str, Any]],
+        updated: int,
+    ) -> None:
+        """
+        Replace all of the precomputed cohort data for a chart.
+
+        Parameters:
+            game - Enum value representing a game series.
+            version - Integer representing which version of the game.
+            songid - ID of the song according to the game.
+            songchart - Chart number according to the game.
+            cohorts - A dictionary keyed by cohort name of the data to store for each cohort.
+            updated - Unix timestamp of the newest scores the data was computed from.
+        """
+        params: Dict[str, Any] = {
+            "game": game.value,
+            "version": version,
+            "songid": songid,
+            "chart": songchart,
+            "updated": updated,
+        }
+        sql = "DELETE FROM score_cohort WHERE game = :game AND version = :version AND songid = :songid AND chart = :chart"
+        self.execute(sql, params)
+        if not cohorts:
+            return
+
+        values = []
+        for i, (cohort, data) in enumerate(cohorts.items()):
+            values.append(f"(:game, :version, :songid, :chart, :cohort{i}, :updated, :data{i})")
+            params[f"cohort{i}"] = cohort
+            params[f"data{i}"] = self.serialize(data)
+        sql = f"""
+            INSERT INTO score_cohort (game, version, songid, chart, cohort, updated, data)
+            VALUES {', '.join(values)}
+        """
+        self.execute(sql, params)
+
+    def get_score_cohort_watermark(self, game: GameConstants, version: int) -> Optional[int]:
+        """
+        Look up how up to date the precomputed cohort data for a game version is.
+
+        Parameters:
+            game - Enum value representing a game series.
+            version - Integer representing which version of the game.
+
+        Returns:
+            The newest updated timestamp passed to put_score_cohorts, or None if nothing
+            has been computed for this game version yet.
+        """
+        sql = "SELECT MAX(updated) AS updated FROM score_cohort WHERE game = :game AND version = :version"
+        cursor = self.execute(sql, {"game": game.value, "version": version})
+        result = cursor.mappings().fetchone()  # type: ignore
+        if result is None or result["updated"] is None:
+            return None
+        return int(result["updated"])
@@ -5,6 +5,7 @@ from typing import Optional, Dict, List, Tuple, Any
 
 from bemani.common import GameConstants, Time
 from bemani.data.mysql.base import BaseData, metadata
+from bemani.data.spool import Spool
 from bemani.data.types import News, Event, UserID, ArcadeID
 
 """
@@ -251,19 +252,98 @@ class NetworkData(BaseData):
         userid: Optional[UserID] = None,
         arcadeid: Optional[ArcadeID] = None,
     ) -> None:
-        if timestamp is None:
-            timestamp = Time.now()
-        sql = "INSERT INTO audit (timestamp, userid, arcadeid, type, data) VALUES (:ts, :uid, :aid, :type, :data)"
-        self.execute(
-            sql,
+        """
+        Record a single audit event. If an event log spool is configured, the event
+        is spooled locally and written to the DB in a later batch. Otherwise it is
+        written to the DB immediately.
+
+        Parameters:
+            event - String event type.
+            data - Dictionary of values for the event.
+            timestamp - Optional unix timestamp of the event, defaults to now.
+            userid - Optional user ID of the user the event related to.
+            arcadeid - Optional arcade ID of the arcade the event related to.
+        """
+        self.put_events(event, [(data, timestamp)], userid=userid, arcadeid=arcadeid)
+
+    def put_events(
+        self,
+        event: str,
+        entries: List[Tuple[Dict[str, Any], Optional[int]]],
+        userid: Optional[UserID] = None,
+        arcadeid: Optional[ArcadeID] = None,
+    ) -> None:
+        """
+        Record a batch of audit events of the same type. This behaves identically to
+        calling put_event for each entry, but spools or inserts them all at once.
+
+        Parameters:
+            event - String event type.
+            entries - List of tuples of event data dictionary and optional unix timestamp.
+            userid - Optional user ID of the user the events related to.
+            arcadeid - Optional arcade ID of the arcade the events related to.
+        """
+        now = Time.now()
+        rows = [
             {
-                "ts": timestamp,
+                "ts": timestamp if timestamp is not None else now,
                 "type": event,
                 "data": self.serialize(data),
                 "uid": userid,
                 "aid": arcadeid,
-            },
-        )
+            }
+            for data, timestamp in entries
+        ]
+
+        spool = self.__event_spool()
+        if spool is None:
+            self.__insert_events(rows)
+        else:
+            # Leave writing to the DB to flush_events, which services calls once the game
+            # handler is done and the scheduler calls for anything left behind.
+            spool.append(rows)
+
+    def flush_events(self, force: bool = False, everything: bool = False) -> int:
+        """
+        Write spooled audit events to the DB. By default this only does work when
+        this process has spooled enough events or has been holding events for long
+        enough, as governed by the event log flush size and flush interval settings.
+        Does nothing if no event log spool is configured.
+
+        Parameters:
+            force - Flush regardless of the flush size and interval thresholds.
+            everything - Flush events spooled by every process, not just this one.
+
+        Returns:
+            The number of events written to the DB.
+        """
+        spool = self.__event_spool()
+        if spool is None:
+            return 0
+        if not force and not everything:
+            if not spool.should_drain(self.config.event_log.flush_size, self.config.event_log.flush_interval):
+                return 0
+        return spool.drain(self.__insert_events, everything=everything)
+
+    def __event_spool(self) -> Optional[Spool]:
+        spool_dir = self.config.event_log.spool_dir
+        if spool_dir is None:
+            return None
+        return Spool.open(spool_dir, "events")
+
+    def __insert_events(self, rows: List[Dict[str, Any]]) -> None:
+        # Insert in chunks so that we stay well under the maximum packet size for huge backlogs.
+        chunk_size = 100
+        for offset in range(0, len(rows), chunk_size):
+            chunk = rows[offset : (offset + chunk_size)]
+            values = []
+            params: Dict[str, Any] = {}
+            for i, row in enumerate(chunk):
+                values.append(f"(:ts{i}, :uid{i}, :aid{i}, :type{i}, :data{i})")
+                for key, value in row.items():
+                    params[f"{key}{i}"] = value
+            sql = f"INSERT INTO audit (timestamp, userid, arcadeid, type, data) VALUES {', '.join(values)}"
+            self.execute(sql, params)
 
     def get_events(
         self,
@@ -3,7 +3,7 @@ from sqlalchemy import Table, Column, UniqueConstraint
 from sqlalchemy.types import String, Integer, JSON
 from sqlalchemy.dialects.mysql import BIGINT as BigInteger
 from sqlalchemy.exc import IntegrityError
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, Iterable, List, Set, Tuple, Any
 from typing_extensions import Final
 from passlib.hash import pbkdf2_sha512  # type: ignore
 
@@ -166,6 +166,24 @@ link = Table(
     mysql_charset="utf8mb4",
 )
 
+"""
+Table indexing profile attributes that games look up users by, such as the location
+a user last played at. Rows are kept in sync with the profile table by put_profile for
+any attributes a game registered with register_indexed_attributes.
+"""
+profile_attribute = Table(
+    "profile_attribute",
+    metadata,
+    Column("game", String(32), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("attribute", String(64), nullable=False),
+    Column("value", String(255), nullable=False),
+    Column("userid", BigInteger(unsigned=True), nullable=False),
+    UniqueConstraint("game", "version", "attribute", "value", "userid", name="game_version_attribute_value_userid"),
+    UniqueConstraint("game", "version", "attribute", "userid", name="game_version_attribute_userid"),
+    mysql_charset="utf8mb4",
+)
+
 
 class AccountCreationException(Exception):
     pass
@@ -174,6 +192,79 @@ class AccountCreationException(Exception):
 class UserData(BaseData):
     REF_ID_LENGTH: Final[int] = 16
 
+    # Profile attributes that each game and version asked to have indexed.
+    __indexed_attributes: Dict[Tuple[GameConstants, int], Set[str]] = {}
+
+    @classmethod
+    def register_indexed_attributes(cls, game: GameConstants, version: int, attributes: Iterable[str]) -> None:
+        """
+        Register top-level profile attributes that a game looks users up by, so that
+        put_profile keeps them indexed and get_profiles_by_attribute can find them.
+
+        Parameters:
+            game - Enum value identifier of the game.
+            version - Integer version of the game.
+            attributes - Names of top-level profile keys to index.
+        """
+        cls.__indexed_attributes.setdefault((game, version), set()).update(attributes)
+
+    @classmethod
+    def indexed_attributes(cls, game: GameConstants, version: int) -> List[str]:
+        """
+        Return the sorted list of attributes that are indexed for a game and version.
+        """
+        return sorted(cls.__indexed_attributes.get((game, version), set()))
+
+    @classmethod
+    def indexed_games(cls) -> List[Tuple[GameConstants, int]]:
+        """
+        Return every game and version that has at least one indexed attribute.
+        """
+        return sorted(
+            [key for key, attributes in cls.__indexed_attributes.items() if attributes],
+            key=lambda key: (key[0].value, key[1]),
+        )
+
+    @staticmethod
+    def __attribute_value(value: Any) -> Optional[str]:
+        # Only scalars can be indexed. Booleans are excluded since they would otherwise
+        # collide with the integers 0 and 1.
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            return None
+        value = str(value)
+        if len(value) > 255:
+            return None
+        return value
+
+    def __put_profile_attributes(self, game: GameConstants, version: int, userid: UserID, profile: Dict[str, Any]) -> None:
+        attributes = UserData.indexed_attributes(game, version)
+        if not attributes:
+            return
+
+        params: Dict[str, Any] = {"game": game.value, "version": version, "userid": userid, "attributes": tuple(attributes)}
+        sql = """
+            DELETE FROM profile_attribute
+            WHERE game = :game AND version = :version AND attribute IN :attributes AND userid = :userid
+        """
+        self.execute(sql, params)
+
+        values: List[str] = []
+        for i, attribute in enumerate(attributes):
+            value = UserData.__attribute_value(profile.get(attribute))
+            if value is None:
+                continue
+            values.append(f"(:game, :version, :attribute{i}, :value{i}, :userid)")
+            params[f"attribute{i}"] = attribute
+            params[f"value{i}"] = value
+        if not values:
+            return
+
+        sql = f"""
+            INSERT INTO profile_attribute (game, version, attribute, value, userid)
+            VALUES {', '.join(values)}
+        """
+        self.execute(sql, params)
+
     def from_cardid(self, cardid: str) -> Optional[UserID]:
         """
         Given a 16 digit card ID, look up a user ID.
@@ -665,6 +756,86 @@ class UserData(BaseData):
             for result in cursor.mappings()
         ]
 
+    def get_profiles_by_attribute(
+        self,
+        game: GameConstants,
+        version: int,
+        attribute: str,
+        values: List[Any],
+    ) -> List[Tuple[UserID, Profile]]:
+        """
+        Given a game/version, look up the profiles whose indexed attribute matches any of
+        the given values. Only attributes registered with register_indexed_attributes can
+        be looked up this way.
+
+        Parameters:
+            game - Enum value identifier of the game we want user profiles for.
+            version - Integer version of the game we want user profiles for.
+            attribute - Name of the top-level profile key to match on.
+            values - List of values that the attribute can have.
+
+        Returns:
+            A list of (UserID, dictionaries) previously stored by a game class for each
+            matching profile.
+        """
+        if attribute not in UserData.indexed_attributes(game, version):
+            raise Exception(f"Attribute {attribute} is not indexed for {game.value} version {version}!")
+
+        lookup = [value for value in [UserData.__attribute_value(v) for v in values] if value is not None]
+        if not lookup:
+            return []
+
+        sql = """
+            SELECT refid.userid AS userid, refid.refid AS refid, extid.extid AS extid, profile.data AS data
+            FROM profile_attribute, refid, profile, extid
+            WHERE
+                profile_attribute.game = :game AND
+                profile_attribute.version = :version AND
+                profile_attribute.attribute = :attribute AND
+                profile_attribute.value IN :values AND
+                refid.game = profile_attribute.game AND
+                refid.version = profile_attribute.version AND
+                refid.userid = profile_attribute.userid AND
+                refid.refid = profile.refid AND
+                extid.game = refid.game AND
+                extid.userid = refid.userid
+        """
+        cursor = self.execute(
+            sql,
+            {"game": game.value, "version": version, "attribute": attribute, "values": tuple(lookup)},
+        )
+
+        return [
+            (
+                UserID(result["userid"]),
+                Profile(
+                    game,
+                    version,
+                    result["refid"],
+                    result["extid"],
+                    self.deserialize(result["data"]),
+                ),
+            )
+            for result in cursor.mappings()
+        ]
+
+    def reindex_profile_attributes(self, game: GameConstants, version: int) -> int:
+        """
+        Rebuild the attribute index for every profile of a game/version, for use after
+        a game starts indexing a new attribute.
+
+        Parameters:
+            game - Enum value identifier of the game to reindex.
+            version - Integer version of the game to reindex.
+
+        Returns:
+            The number of profiles that were reindexed.
+        """
+        profiles = self.get_all_profiles(game, version)
+        for userid, profile in profiles:
+            self.__put_profile_attributes(game, version, userid, profile)
+        return len(profiles)
+
     def get_all_players(self, game: GameConstants, version: int) -> List[UserID]:
         """
         Given a game/version, look up all user IDs that played this game/version.
@@ -754,6 +925,7 @@ class UserData(BaseData):
             ON DUPLICATE KEY UPDATE data=VALUES(data)
         """
         self.execute(sql, {"refid": refid, "json": self.serialize(profile)})
+        self.__put_profile_attributes(game, version, userid, profile)
 
         # Update profile details just in case this was a new profile that was just saved.
         profile.game = game
@@ -777,6 +949,10 @@ class UserData(BaseData):
         sql = "DELETE FROM profile WHERE refid = :refid LIMIT 1"
         self.execute(sql, {"refid": refid})
 
+        # Drop any indexed attributes so this user stops showing up in lookups.
+        sql = "DELETE FROM profile_attribute WHERE game = :game AND version = :version AND userid = :userid"
+        self.execute(sql, {"game": game.value, "version": version, "userid": userid})
+
     def get_achievement(
         self,
         game: GameConstants,
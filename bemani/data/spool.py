@@ -0,0 +1,220 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class Spool:
+    """
+    A crash-safe, multi-process local spool of JSON records. Records are appended
+    to a per-process file in a spool directory and fsync'd before the append returns,
+    so that anything handed to the spool survives a crash of the process that wrote
+    it. Records are later drained in bulk by whatever process wishes to persist them
+    elsewhere, such as the DB. Draining is at-least-once: a crash after a drain
+    handler succeeds but before the drained file is removed will cause the records
+    in that file to be drained again.
+
+    Spools are identified by a directory and a name, so multiple unrelated queues
+    can share the same spool directory.
+    """
+
+    __instances: Dict[Tuple[str, str], "Spool"] = {}
+    __instances_lock = threading.Lock()
+
+    def __init__(self, directory: str, name: str) -> None:
+        self.directory = os.path.abspath(directory)
+        self.name = name
+        self.__lock = threading.Lock()
+        self.__pid = os.getpid()
+        self.__pending = 0
+        self.__oldest: Optional[float] = None
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def open(cls, directory: str, name: str) -> "Spool":
+        """
+        Return the spool for a directory and name, creating it if needed. Spools
+        track how many records this process has spooled since the last drain, so
+        callers should use this instead of constructing a new spool on every request.
+        """
+        key = (os.path.abspath(directory), name)
+        with cls.__instances_lock:
+            if key not in cls.__instances:
+                cls.__instances[key] = Spool(directory, name)
+            return cls.__instances[key]
+
+    def __spool_path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}.{os.getpid()}.spool")
+
+    def __check_pid(self) -> None:
+        # If we were forked after the spool was created, anything pending belongs to our parent.
+        pid = os.getpid()
+        if pid != self.__pid:
+            self.__pid = pid
+            self.__pending = 0
+            self.__oldest = None
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Append one or more records to this process's spool file. When this returns,
+        the records are durably on disk.
+
+        Parameters:
+            records - A list of JSON-serializable dictionaries.
+        """
+        if not records:
+            return
+
+        payload = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        path = self.__spool_path()
+
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+
+                # A drain may have claimed the file between our open and our lock, in
+                # which case we must write to the fresh spool file instead.
+                try:
+                    same = os.stat(path).st_ino == os.fstat(fd).st_ino
+                except FileNotFoundError:
+                    same = False
+                if not same:
+                    continue
+
+                # A process that crashed mid-append may have left a torn line behind in a file
+                # named after a PID we reused. Terminate it so our first record isn't merged
+                # into it and thrown away along with it when the file is drained.
+                size = os.fstat(fd).st_size
+                torn = size > 0 and os.pread(fd, 1, size - 1) != b"\n"
+
+                os.write(fd, (b"\n" if torn else b"") + payload)
+                os.fsync(fd)
+                break
+            finally:
+                os.close(fd)
+
+        with self.__lock:
+            self.__check_pid()
+            self.__pending += len(records)
+            if self.__oldest is None:
+                self.__oldest = time.time()
+
+    def should_drain(self, max_records: int, max_age: float) -> bool:
+        """
+        Return whether this process has spooled at least max_records records or has
+        had a record sitting in the spool for at least max_age seconds since the last
+        drain.
+        """
+        with self.__lock:
+            self.__check_pid()
+            if self.__pending == 0 or self.__oldest is None:
+                return False
+            return self.__pending >= max_records or (time.time() - self.__oldest) >= max_age
+
+    def __claim(self, path: str, fd: int) -> Optional[str]:
+        # Caller holds the lock on fd, make sure we still have the file found at path.
+        try:
+            if os.stat(path).st_ino != os.fstat(fd).st_ino:
+                return None
+        except FileNotFoundError:
+            return None
+
+        if path.endswith(".claimed"):
+            # Already claimed by a process which died or failed to drain it.
+            return path
+
+        claimed = os.path.join(self.directory, f"{self.name}.{os.getpid()}.{time.time_ns()}.claimed")
+        os.rename(path, claimed)
+        return claimed
+
+    def __read(self, fd: int) -> List[Dict[str, Any]]:
+        chunks = []
+        while True:
+            chunk = os.read(fd, 1024 * 1024)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+        records = []
+        for line in b"".join(chunks).split(b"\n"):
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A partial write from a crash mid-append, nothing to recover.
+                pass
+        return records
+
+    def drain(self, handler: Callable[[List[Dict[str, Any]]], None], everything: bool = False) -> int:
+        """
+        Drain spooled records, passing each spool file's worth of records to handler.
+        If the handler raises, the records are kept and will be retried on a later
+        drain. Spool files left behind by a crashed or failed drain are always picked
+        up. By default only this process's spool file is drained. If everything is
+        True, spool files belonging to every process are drained, which is what a
+        periodic job that cleans up after exited processes should use.
+
+        Parameters:
+            handler - Callable which persists a list of records.
+            everything - Whether to drain all processes' spool files.
+
+        Returns:
+            The number of records handed to handler successfully.
+        """
+        with self.__lock:
+            self.__check_pid()
+            self.__pending = 0
+            self.__oldest = None
+
+        # Orphaned claims are never waited on, since a live process holds the lock the
+        # whole time it is draining one.
+        candidates: List[Tuple[str, bool]] = [
+            (path, False) for path in sorted(glob.glob(os.path.join(self.directory, f"{self.name}.*.claimed")))
+        ]
+        if everything:
+            candidates.extend(
+                (path, True) for path in sorted(glob.glob(os.path.join(self.directory, f"{self.name}.*.spool")))
+            )
+        else:
+            candidates.append((self.__spool_path(), True))
+
+        drained = 0
+        for path, wait in candidates:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX if wait else (fcntl.LOCK_EX | fcntl.LOCK_NB))
+                except BlockingIOError:
+                    continue
+
+                claimed = self.__claim(path, fd)
+                if claimed is None:
+                    continue
+
+                records = self.__read(fd)
+                if records:
+                    handler(records)
+                    drained += len(records)
+                os.unlink(claimed)
+            except Exception:
+                if not everything:
+                    # Make sure we look again soon, instead of waiting for a new record.
+                    with self.__lock:
+                        self.__pending += 1
+                        if self.__oldest is None:
+                            self.__oldest = time.time()
+                raise
+            finally:
+                os.close(fd)
+
+        return drained
@@ -1,17 +1,32 @@
+import requests
+import time
 from datetime import datetime
 from discord_webhook import DiscordWebhook, DiscordEmbed
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple
+from typing_extensions import Final
 
 from bemani.common.constants import GameConstants, BroadcastConstants
 from bemani.data.config import Config
+from bemani.data.spool import Spool
 from bemani.data.types import Song
 
 
 class Triggers:
     """
-    Class for broadcasting data to some outside service
+    Class for broadcasting data to some outside service. If a webhook spool directory
+    is configured, broadcasts are queued and sent later by send_queued_broadcasts
+    instead of blocking the game request on the outside service.
     """
 
+    # Discord refuses webhook messages with more embeds than this.
+    DISCORD_MAX_EMBEDS: Final[int] = 10
+
+    # Seconds to wait for an outside service before considering a send failed.
+    SEND_TIMEOUT: Final[int] = 10
+
+    # Times at which we last sent something to a given webhook URL.
+    __last_sent: Dict[str, float] = {}
+
     def __init__(self, config: Config) -> None:
         self.config = config
 
@@ -69,4 +84,119 @@ class Triggers:
                     inline = False
                 scoreembed.add_embed_field(name=item.value, value=value, inline=inline)
             webhook.add_embed(scoreembed)
-            webhook.execute()
+
+            queue = self.__queue()
+            if queue is None:
+                webhook.execute()
+            else:
+                queue.append(
+                    [
+                        {
+                            "url": webhook.url,
+                            "embed": embed,
+                            "attempts": 0,
+                            "not_before": 0.0,
+                        }
+                        for embed in webhook.embeds
+                    ]
+                )
+
+    def __queue(self) -> Optional[Spool]:
+        spool_dir = self.config.webhooks.spool_dir
+        if spool_dir is None:
+            return None
+        return Spool.open(spool_dir, "webhooks")
+
+    def send_queued_broadcasts(self) -> int:
+        """
+        Send any broadcasts queued by any process. Broadcasts to the same webhook are
+        batched together, sends to the same webhook are spaced out by the configured
+        minimum interval and failed sends are requeued with exponential backoff until
+        they run out of attempts. Does nothing if no webhook spool is configured.
+
+        Returns:
+            The number of broadcasts successfully sent.
+        """
+        queue = self.__queue()
+        if queue is None:
+            return 0
+
+        sent = 0
+
+        def send(records: List[Dict[str, Any]]) -> None:
+            nonlocal sent
+            count, unsent = self.__send_discord(records)
+            sent += count
+
+            retries = []
+            for record in unsent:
+                if record["attempts"] < self.config.webhooks.max_attempts:
+                    retries.append(record)
+                else:
+                    print(f"Dropping broadcast to {record['url']} after {record['attempts']} failed attempts")
+            queue.append(retries)
+
+        queue.drain(send, everything=True)
+        return sent
+
+    def __send_discord(self, records: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        # Returns the number of records sent, and the records which were not sent either
+        # because they are being held off until later or because they failed to send.
+        now = time.time()
+        sent = 0
+        unsent: List[Dict[str, Any]] = []
+        destinations: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            if record["not_before"] > now:
+                unsent.append(record)
+            else:
+                destinations.setdefault(record["url"], []).append(record)
+
+        for url, pending in destinations.items():
+            while pending:
+                batch = pending[: self.DISCORD_MAX_EMBEDS]
+                pending = pending[self.DISCORD_MAX_EMBEDS :]
+
+                # Make sure we don't hammer a webhook that we just sent to.
+                wait = Triggers.__last_sent.get(url, 0.0) + self.config.webhooks.min_interval - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+
+                try:
+                    response: Optional[requests.Response] = requests.post(
+                        url,
+                        json={"embeds": [record["embed"] for record in batch]},
+                        timeout=self.SEND_TIMEOUT,
+                    )
+                except requests.RequestException:
+                    response = None
+                Triggers.__last_sent[url] = time.time()
+
+                if response is not None and response.status_code < 300:
+                    sent += len(batch)
+                    continue
+
+                if response is not None and response.status_code == 429:
+                    # Rate limited, hold off on everything for this webhook without penalty.
+                    try:
+                        retry_after = float(response.json().get("retry_after", 1.0))
+                    except ValueError:
+                        retry_after = float(response.headers.get("Retry-After", 1.0))
+                    for record in batch + pending:
+                        record["not_before"] = time.time() + retry_after
+                    unsent.extend(batch + pending)
+                    break
+
+                if response is not None and response.status_code < 500:
+                    # The service rejected the message itself, so trying again won't help.
+                    print(f"Dropping broadcast to {url} after status {response.status_code}: {response.text}")
+                    continue
+
+                for record in batch:
+                    record["attempts"] += 1
+                    record["not_before"] = time.time() + (
+                        self.config.webhooks.retry_backoff * (2 ** (record["attempts"] - 1))
+                    )
+                unsent.extend(batch)
+
+        return sent, unsent
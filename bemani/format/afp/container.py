@@ -459,7 +459,7 @@ class TXP2File(TrackedCoverage, VerboseOutput):
 
                             # This takes forever, so skip it if we're pretending.
                             lz77 = Lz77()
-                            raw_data = lz77.decompress(lz_data)
+                            raw_data = lz77.decompress(lz_data, size=inflated_size)
                         else:
                             inflated_size, deflated_size = struct.unpack(
                                 ">II",
@@ -1026,8 +1026,9 @@ class TXP2File(TrackedCoverage, VerboseOutput):
                         # We didn't change this texture, use the original compression.
                         compressed_texture = texture.compressed
                     else:
-                        # We need to compress the raw texture.
-                        lz77 = Lz77()
+                        # We need to compress the raw texture. This is done offline, so take
+                        # the time to compress it as small as possible.
+                        lz77 = Lz77(level=Lz77.LEVEL_MAX)
                         compressed_texture = lz77.compress(raw_texture)
 
                     # Construct the mini-header and the texture itself.
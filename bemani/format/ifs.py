@@ -321,7 +321,7 @@ class IFS:
             uncompressed_size, compressed_size = struct.unpack(">II", filedata[0:8])
             if len(filedata) == compressed_size + 8:
                 lz77 = Lz77()
-                filedata = lz77.decompress(filedata[8:])
+                filedata = lz77.decompress(memoryview(filedata)[8:], size=uncompressed_size)
             else:
                 filedata = filedata[8:] + filedata[0:8]
 
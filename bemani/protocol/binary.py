@@ -1,9 +1,46 @@
+import ctypes
+import os
 import struct
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from typing_extensions import Final
 
+from bemani import package_root
 from bemani.protocol.stream import InputStream, OutputStream
-from bemani.protocol.node import Node
+from bemani.protocol.node import Node, NodeException
+
+
+# Attempt to use the faster C++ codec if it's available
+try:
+    clib = None
+    clib_path = os.path.join(package_root, "protocol")
+    files = [f for f in os.listdir(clib_path) if f.startswith("binarycpp") and f.endswith(".so")]
+    if len(files) > 0:
+        clib = ctypes.cdll.LoadLibrary(os.path.join(clib_path, files[0]))
+        clib.decode.argtypes = (
+            ctypes.c_char_p,
+            ctypes.c_uint,
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_uint32),
+            ctypes.c_uint,
+            ctypes.c_char_p,
+            ctypes.c_uint,
+        )
+        clib.decode.restype = ctypes.c_int
+        clib.encode.argtypes = (
+            ctypes.c_char_p,
+            ctypes.c_uint,
+            ctypes.c_char_p,
+            ctypes.c_uint,
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_char_p,
+            ctypes.c_uint,
+        )
+        clib.encode.restype = ctypes.c_int
+except Exception:
+    clib = None
 
 
 class BinaryEncodingException(Exception):
@@ -48,23 +85,25 @@ class PackedOrdering:
         needed. If this is to be used for decoding a current packing, allow_expansion should be set
         to False to ensure we don't choose locations outside the buffer.
 
+        Since everything is allocated in order, every 4 byte chunk before the first completely
+        unused chunk is occupied. The only places a new item can go other than that first unused
+        chunk are the unused tail of the most recent byte chunk and the most recent short chunk,
+        so those are all we need to track instead of the state of every byte in the buffer.
+
         Parameters:
             size - Number of bytes to work with as an integer
             allow_expansion - Boolean describing whether to add to the end of the order when needed
         """
-        self.order: List[Optional[int]] = []
         self.expand = allow_expansion
+        self.__size = size
 
-        for _ in range(size):
-            self.order.append(None)
-        self.__orderlen = size
-        self.__lastbyte = 0
-        self.__lastshort = 0
-        self.__lastint = 0
+        # Offset of the first 4 byte chunk that nothing has been placed in.
+        self.__frontier = 0
 
-    def __append_empty(self) -> None:
-        self.order.append(None)
-        self.__orderlen = self.__orderlen + 1
+        # Offset of the next free location in the most recent byte and short chunks, or
+        # None if that chunk is full or there isn't one.
+        self.__nextbyte: Optional[int] = None
+        self.__nextshort: Optional[int] = None
 
     def mark_used(self, size: int, offset: int, round_to: int = 1) -> None:
         """
@@ -76,115 +115,107 @@ class PackedOrdering:
             round_to - Optional integer specifying how many bytes to round to. Valid values are 1, 2 and 4
         """
         # Round to nearest value if needed
-        while (size & (round_to - 1)) != 0:
-            size = size + 1
+        size = (size + (round_to - 1)) & ~(round_to - 1)
+        end = offset + size
 
         # Expand buffer if needed
-        if self.expand:
-            while self.__orderlen < (size + offset):
-                self.__append_empty()
+        if self.expand and self.__size < end:
+            self.__size = end
+
+        if offset == self.__nextbyte and size == 1:
+            # Packing another byte after the last one.
+            self.__nextbyte = None if ((offset + 1) & 3) == 0 else (offset + 1)
+        elif offset == self.__nextshort and size == 2:
+            # Packing a second short after the last one, which fills the chunk.
+            self.__nextshort = None
+        elif offset >= self.__frontier and (offset & 3) == 0:
+            # Starting a new chunk, which bytes and shorts can be packed after.
+            if size == 1:
+                self.__nextbyte = offset + 1
+            elif size == 2:
+                self.__nextshort = offset + 2
+        else:
+            # Overwriting something already placed, so nothing can be packed after it anymore.
+            if self.__nextbyte is not None and offset < ((self.__nextbyte + 3) & ~3) and end > (self.__nextbyte & ~3):
+                self.__nextbyte = None
+            if self.__nextshort is not None and offset < ((self.__nextshort + 3) & ~3) and end > (self.__nextshort & ~3):
+                self.__nextshort = None
+
+        self.__frontier = max(self.__frontier, (end + 3) & ~3)
+
+    @property
+    def has_open_slots(self) -> bool:
+        """
+        Returns whether a byte or short could still be packed into an already used chunk.
+        """
+        return self.__nextbyte is not None or self.__nextshort is not None
 
-        # Mark buffer as used
-        for i in range(size):
-            self.order[i + offset] = size
+    @property
+    def open_slots(self) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Returns the locations where the next byte and short would be packed into already
+        used chunks, or None for either if they would need a new chunk.
+        """
+        return (self.__nextbyte, self.__nextshort)
+
+    def splice(self, size: int, nextbyte: Optional[int], nextshort: Optional[int]) -> int:
+        """
+        Reserve room for data that was already packed with its own PackedOrdering starting
+        from an empty buffer, such as the body of a node encoded ahead of time. This is only
+        equivalent to packing the data in place when there are no open slots.
+
+        Parameters:
+            size - Number of bytes the packed data takes up, a multiple of 4.
+            nextbyte - The next byte location of the ordering the data was packed with.
+            nextshort - The next short location of the ordering the data was packed with.
+
+        Returns:
+            The location the packed data should be copied to.
+        """
+        if self.has_open_slots:
+            raise BinaryEncodingException("Logic error, cannot splice packed data after open slots!")
+
+        offset = self.__frontier
+        self.__frontier = offset + size
+        if self.expand and self.__size < self.__frontier:
+            self.__size = self.__frontier
+        self.__nextbyte = None if nextbyte is None else (offset + nextbyte)
+        self.__nextshort = None if nextshort is None else (offset + nextshort)
+        return offset
+
+    def __get_next_chunk(self) -> Optional[int]:
+        if self.expand:
+            # Make sure we've padded to a 4 byte boundary
+            self.__size = max(self.__size, self.__frontier)
+            return self.__frontier
+        if self.__frontier < self.__size:
+            return self.__frontier
+        return None
 
     def get_next_byte(self) -> Optional[int]:
         """
         Returns an integer location where the next byte will be found/stored, respecting Konami logic.
         Will return None if its not possible to find this integer a spot and we aren't expanding.
         """
-        # If we expand for additions, make sure we've padded to a 4 byte boundary
-        if self.expand:
-            while (self.__orderlen & 3) != 0:
-                self.__append_empty()
-
-        for i in range(self.__lastbyte, self.__orderlen, 4):
-            if self.order[i] is not None:
-                # See if this has room for a byte
-                for j in range(0, 4):
-                    if self.order[i + j] == 1:
-                        # This is okay, we can pack after this
-                        continue
-                    elif self.order[i + j] is None:
-                        # This is open, pack here
-                        self.__lastbyte = i
-                        return i + j
-                    else:
-                        # This is something else, can't pack here
-                        break
-            else:
-                # Couldn't find optimal packing, pack here
-                self.__lastbyte = i
-                return i
-
-        if self.expand:
-            self.__lastbyte = self.__orderlen
-            return self.__orderlen
-        else:
-            return None
+        if self.__nextbyte is not None and (self.expand or self.__nextbyte < self.__size):
+            return self.__nextbyte
+        return self.__get_next_chunk()
 
     def get_next_short(self) -> Optional[int]:
         """
         Returns an integer location where the next short will be found/stored, respecting Konami logic.
         Will return None if its not possible to find this integer a spot and we aren't expanding.
         """
-        # If we expand for additions, make sure we've padded to a 4 byte boundary
-        if self.expand:
-            while (self.__orderlen & 3) != 0:
-                self.__append_empty()
-
-        for i in range(self.__lastshort, self.__orderlen, 4):
-            if self.order[i] is not None:
-                for j in range(0, 4, 2):
-                    if self.order[i + j] == 2 and self.order[i + j + 1] == 2:
-                        # This is okay, we can pack after this
-                        continue
-                    elif self.order[i + j] is None and self.order[i + j + 1] is None:
-                        # This is open, pack here
-                        self.__lastshort = i
-                        return i + j
-                    else:
-                        # This is something else, can't pack here
-                        break
-            else:
-                # Couldn't find optimal packing, pack here
-                self.__lastshort = i
-                return i
-
-        if self.expand:
-            self.__lastshort = self.__orderlen
-            return self.__orderlen
-        else:
-            return None
+        if self.__nextshort is not None and (self.expand or self.__nextshort < self.__size):
+            return self.__nextshort
+        return self.__get_next_chunk()
 
     def get_next_int(self) -> Optional[int]:
         """
         Returns an integer location where the next integer will be found/stored, respecting Konami logic.
         Will return None if its not possible to find this integer a spot and we aren't expanding.
         """
-        # If we expand for additions, make sure we've padded to a 4 byte boundary
-        if self.expand:
-            while (self.__orderlen & 3) != 0:
-                self.__append_empty()
-
-        for i in range(self.__lastint, self.__orderlen, 4):
-            if self.order[i] is not None:
-                continue
-            if self.order[i + 1] is not None:
-                continue
-            if self.order[i + 2] is not None:
-                continue
-            if self.order[i + 3] is not None:
-                continue
-
-            self.__lastint = i
-            return i
-
-        if self.expand:
-            self.__lastint = self.__orderlen
-            return self.__orderlen
-        else:
-            return None
+        return self.__get_next_chunk()
 
     @staticmethod
     def node_to_body_ordering(
@@ -249,12 +280,150 @@ class PackedOrdering:
         return ordering
 
 
+class NativeBinaryCodec:
+    """
+    A wrapper around the C++ codec found in binarycpp.cxx, which takes care of the byte-level
+    work of decoding and encoding. That is, unpacking and packing node names and deducing or
+    creating the packing of the body. Converting values to and from Node objects stays in python
+    and is shared with the python codec, so both produce the same trees and the same bytes. The
+    C++ codec gives up on anything it doesn't expect, such as a malformed packet, in which case
+    callers should fall back to the python codec so errors are reported as they always were.
+    """
+
+    EVENT_NODE: Final[int] = 0
+    EVENT_ATTR: Final[int] = 1
+    EVENT_END: Final[int] = 2
+
+    RECORD_SIZE: Final[int] = 6
+    NO_DATA: Final[int] = 0xFFFFFFFF
+
+    OP_FRAGMENT: Final[int] = 0xFF
+
+    TYPE_VALID: Final[int] = 1
+    TYPE_ARRAY: Final[int] = 2
+    TYPE_COMPOSITE: Final[int] = 4
+    TYPE_VARIABLE: Final[int] = 8
+
+    NAME_CHARS: Final[bytes] = Node.NODE_NAME_CHARS.encode("ascii")
+
+    __types: Optional[bytes] = None
+
+    @staticmethod
+    def available() -> bool:
+        """
+        Returns whether the C++ codec was built and could be loaded.
+        """
+        return clib is not None
+
+    @staticmethod
+    def __get_types() -> bytes:
+        """
+        Build the table of node types that the C++ codec uses, two bytes for every possible
+        type byte. The first is the data length and the second is a set of flags.
+        """
+        if NativeBinaryCodec.__types is None:
+            types = bytearray(512)
+            for node_type in range(256):
+                try:
+                    node = Node(name="type", type=node_type)
+                except NodeException:
+                    continue
+
+                flags = NativeBinaryCodec.TYPE_VALID
+                if node.is_array:
+                    flags |= NativeBinaryCodec.TYPE_ARRAY
+                if node.is_composite:
+                    flags |= NativeBinaryCodec.TYPE_COMPOSITE
+                if node.data_length is None:
+                    flags |= NativeBinaryCodec.TYPE_VARIABLE
+                types[node_type * 2] = node.data_length or 0
+                types[node_type * 2 + 1] = flags
+            NativeBinaryCodec.__types = bytes(types)
+        return NativeBinaryCodec.__types
+
+    @staticmethod
+    def decode(data: bytes, compressed: bool) -> Optional[Tuple[List[int], bytes]]:
+        """
+        Decode the header of a packet and locate the data for every node and attribute.
+
+        Parameters:
+            data - A binary blob of data to be decoded, without the magic.
+            compressed - Whether node names are six-bit packed.
+
+        Returns:
+            None if the C++ codec gave up, or a tuple of a list of records and a buffer of
+            names. There are RECORD_SIZE integers per record, one record for every node,
+            attribute and end of node in the header, in order. These are the event, the
+            node type, the offset and length of the name in the names buffer and the offset
+            and length of the value in data, or NO_DATA if there is no value.
+        """
+        if clib is None:
+            return None
+
+        # Every record takes up at least a byte of the header, and six-bit packed names
+        # take up at least three quarters of a byte per character.
+        maxrecords = len(data) + 1
+        records = (ctypes.c_uint32 * (maxrecords * NativeBinaryCodec.RECORD_SIZE))()
+        names = ctypes.create_string_buffer(((len(data) * 4) // 3) + 4)
+
+        count = clib.decode(
+            data,
+            len(data),
+            1 if compressed else 0,
+            NativeBinaryCodec.__get_types(),
+            NativeBinaryCodec.NAME_CHARS,
+            records,
+            maxrecords,
+            names,
+            len(names),
+        )
+        if count < 0:
+            return None
+        return records[: (count * NativeBinaryCodec.RECORD_SIZE)], names.raw
+
+    @staticmethod
+    def encode(header: bytes, body: bytes, compressed: bool) -> Optional[bytes]:
+        """
+        Encode a tree given a flattened description of its header and body.
+
+        Parameters:
+            header - For every node and attribute, its type, a two byte name length and the
+                     name, for every end of node the END_OF_NODE type, and for every frozen
+                     node OP_FRAGMENT, a four byte length and its already encoded header.
+            body - For every value, its alignment, a four byte length and its packed data,
+                   and for every frozen node OP_FRAGMENT, a four byte length, the open byte
+                   and short slots or NO_DATA for either and its already packed body.
+            compressed - Whether node names should be six-bit packed.
+
+        Returns:
+            None if the C++ codec gave up, or the encoded header and body.
+        """
+        if clib is None:
+            return None
+
+        # Names never grow, and a value never takes up more room than its alignment and length do.
+        out = ctypes.create_string_buffer(len(header) + len(body) + 16)
+        length = clib.encode(
+            header,
+            len(header),
+            body,
+            len(body),
+            1 if compressed else 0,
+            NativeBinaryCodec.NAME_CHARS,
+            out,
+            len(out),
+        )
+        if length < 0:
+            return None
+        return ctypes.string_at(out, length)
+
+
 class BinaryDecoder:
     """
     A class capable of taking a binary blob and decoding it to a Node tree.
     """
 
-    def __init__(self, data: bytes, encoding: str, compressed: bool) -> None:
+    def __init__(self, data: bytes, encoding: str, compressed: bool, native: bool = True) -> None:
         """
         Initialize the object.
 
@@ -262,10 +431,13 @@ class BinaryDecoder:
             - data - A binary blob of data to be decoded
             - encoding - A string representing the text encoding for string elements. Should be either
                          'shift-jis', 'euc-jp' or 'utf-8'
+            - native - Whether to use the C++ codec when it is available.
         """
+        self.data = data
         self.stream = InputStream(data)
         self.encoding = encoding
         self.compressed = compressed
+        self.native = native
         self.executed = False
 
     def __read_node_name(self) -> str:
@@ -351,6 +523,79 @@ class BinaryDecoder:
                 child = self.__read_node(child_type)
                 node.add_child(child)
 
+    def __get_native_tree(self) -> Optional[Node]:
+        """
+        Decode the data using the C++ codec.
+
+        Returns:
+            Node object, or None if the python decoder should be used instead.
+        """
+        result = NativeBinaryCodec.decode(self.data, self.compressed)
+        if result is None:
+            return None
+        records, names = result
+
+        # Six-bit packed names are always plain ascii.
+        name_encoding = "ascii" if self.compressed else self.encoding
+        root: Optional[Node] = None
+        parents: List[Node] = []
+
+        try:
+            for i in range(0, len(records), NativeBinaryCodec.RECORD_SIZE):
+                event, node_type, name_off, name_len, data_off, data_len = records[i : (i + NativeBinaryCodec.RECORD_SIZE)]
+                if event == NativeBinaryCodec.EVENT_END:
+                    parents.pop()
+                    continue
+
+                name = names[name_off : (name_off + name_len)].decode(name_encoding)
+                if event == NativeBinaryCodec.EVENT_ATTR:
+                    if data_off == NativeBinaryCodec.NO_DATA:
+                        parents[-1].set_attribute(name)
+                    else:
+                        parents[-1].set_attribute(name, self.__unpack_string(data_off, data_len))
+                    continue
+
+                node = Node(name=name, type=node_type)
+                if data_off != NativeBinaryCodec.NO_DATA:
+                    node.set_value(self.__unpack_value(node, data_off, data_len))
+                if parents:
+                    parents[-1].add_child(node)
+                else:
+                    root = node
+                parents.append(node)
+        except Exception:
+            # Let the python decoder report whatever is wrong with this packet.
+            return None
+
+        return root
+
+    def __unpack_string(self, offset: int, length: int) -> str:
+        """
+        Given the location of a string's data, including its trailing null, decode it.
+        """
+        return self.data[offset : (offset + length)][:-1].decode(self.encoding, "replace")
+
+    def __unpack_value(self, node: Node, offset: int, length: int) -> Any:
+        """
+        Given the location of a node's data, decode it the same way the python decoder would.
+        """
+        enc = node.data_encoding
+        if node.is_array:
+            size = node.data_length
+            if size is None:
+                raise Exception("Logic error, array node has no size!")
+            return list(struct.unpack_from(f">{enc * (length // size)}", self.data, offset))
+
+        dtype = node.data_type
+        if dtype == "str":
+            return self.__unpack_string(offset, length)
+        if dtype == "bin":
+            return self.data[offset : (offset + length)]
+        val = struct.unpack_from(f">{enc}", self.data, offset)
+        if node.is_composite:
+            return list(val)
+        return val[0]
+
     def get_tree(self) -> Node:
         """
         Parse the header and body such that we can return a Node tree
@@ -363,6 +608,12 @@ class BinaryDecoder:
             raise BinaryEncodingException("Logic error, should only call this once per instance")
         self.executed = True
 
+        # Names sort the same as their bytes in these encodings, which the C++ codec relies on.
+        if self.native and NativeBinaryCodec.available() and (self.compressed or self.encoding in {"ascii", "utf-8"}):
+            tree = self.__get_native_tree()
+            if tree is not None:
+                return tree
+
         # Read the header first
         header_length = self.stream.read_int(4)
         if header_length is None:
@@ -379,7 +630,8 @@ class BinaryDecoder:
 
         # Skip by any padding
         while self.stream.pos < header_length + 4:
-            self.stream.read_byte()
+            if self.stream.read_byte() is None:
+                break
 
         # Read the body next
         body_length = self.stream.read_int(4)
@@ -421,7 +673,7 @@ class BinaryDecoder:
                         loc = ordering.get_next_byte()
                     elif alignment == 2:
                         loc = ordering.get_next_short()
-                    elif alignment == 4:
+                    else:
                         loc = ordering.get_next_int()
                     if loc is None:
                         raise BinaryEncodingException("Ran out of data when attempting to read node data location!")
@@ -476,6 +728,9 @@ class BinaryDecoder:
                     ordering.mark_used(length + 4, loc, round_to=4)
                     loc = loc + 4
                     decode_data = body[loc : (loc + length)]
+                    if len(decode_data) != elems * size:
+                        # Don't build a format string for however many elements a damaged length claims.
+                        raise BinaryEncodingException("Array data does not match its length!")
                     decode_value = f">{enc * elems}"
 
                     val = struct.unpack(decode_value, decode_data)
@@ -489,7 +744,7 @@ class BinaryEncoder:
     A class capable of taking a Node tree and encoding it into a binary format.
     """
 
-    def __init__(self, tree: Node, encoding: str, compressed: bool = True) -> None:
+    def __init__(self, tree: Node, encoding: str, compressed: bool = True, native: bool = True) -> None:
         """
         Initialize the object.
 
@@ -497,14 +752,15 @@ class BinaryEncoder:
             tree - A binary blob of data to be decoded
             encoding - A string representing the text encoding for string elements. Should be either
                        'shift-jis', 'euc-jp' or 'utf-8'
+            native - Whether to use the C++ codec when it is available.
         """
         self.stream = OutputStream()
         self.encoding = encoding
         self.tree = tree
-        self.__body: List[int] = []
-        self.__body_len = 0
+        self.__body = bytearray()
         self.executed = False
         self.compressed = compressed
+        self.native = native
 
         # Generate the characer LUT
         self.char_lut: Dict[str, int] = {}
@@ -561,7 +817,7 @@ class BinaryEncoder:
         for val in data_int:
             self.stream.write_int(val)
 
-    def __write_node(self, node: Node) -> None:
+    def __write_node(self, node: Node, cache: bool = True) -> None:
         """
         Given an integer node type, read the node's name, possible attributes
         and children. Will return a Node representing this node. Note
@@ -569,7 +825,12 @@ class BinaryEncoder:
 
         Parameters:
             node - A Node which should be encoded.
+            cache - Whether to use or create cached headers for frozen nodes.
         """
+        if cache and node.frozen:
+            self.stream.write_blob(self.__header_fragment(node))
+            return
+
         to_write = PackedOrdering.node_to_body_ordering(node, include_children=False, include_void=True)
         for thing in to_write:
             # First, write the type of this node out
@@ -582,11 +843,40 @@ class BinaryEncoder:
 
         # Now, write out the children
         for child in node.children:
-            self.__write_node(child)
+            self.__write_node(child, cache=cache)
 
         # Now, write out the end of node marker
         self.stream.write_int(Node.END_OF_NODE)
 
+    def __header_fragment(self, node: Node) -> bytes:
+        """
+        Given a frozen node, return its encoded header, encoding and caching it if needed.
+        The header for a node doesn't depend on anything around it.
+        """
+        key = ("binary-header", self.encoding, self.compressed)
+        header = node.fragment(key)
+        if header is None:
+            encoder = BinaryEncoder(node, self.encoding, self.compressed)
+            encoder.__write_node(node, cache=False)
+            header = encoder.stream.data
+            node.set_fragment(key, header)
+        return header
+
+    def __body_fragment(self, node: Node) -> Tuple[bytes, Optional[int], Optional[int]]:
+        """
+        Given a frozen node, return its body packed on its own along with the open byte and
+        short slots left afterwards, packing and caching it if needed.
+        """
+        key = ("binary-body", self.encoding)
+        fragment = node.fragment(key)
+        if fragment is None:
+            encoder = BinaryEncoder(node, self.encoding, self.compressed)
+            subordering = PackedOrdering(0, allow_expansion=True)
+            encoder.__write_body(subordering, node, cache=False)
+            fragment = (bytes(encoder.__body), *subordering.open_slots)
+            node.set_fragment(key, fragment)
+        return fragment
+
     def __add_data(self, data: bytes, length: int, offset: int) -> None:
         """
         Given some binary data, a length and an offset, add the data to the offset in the
@@ -599,158 +889,242 @@ class BinaryEncoder:
             length - Number of characters of data to copy
             offset - Offset into the body to start copying
         """
-        while self.__body_len < (length + offset):
-            self.__body.append(0)
-            self.__body_len = self.__body_len + 1
+        if len(data) < length:
+            raise BinaryEncodingException("Logic error, data is shorter than its length!")
 
-        # Make sure its padded to 4 bytes
-        while (self.__body_len & 0x3) != 0:
-            self.__body.append(0)
-            self.__body_len = self.__body_len + 1
+        # Grow the body with zeros, padded to 4 bytes.
+        end = (offset + length + 3) & ~3
+        if len(self.__body) < end:
+            self.__body.extend(bytes(end - len(self.__body)))
 
-        for i in range(length):
-            self.__body[offset + i] = data[i]
+        self.__body[offset : (offset + length)] = data[:length]
 
-    def get_data(self) -> bytes:
+    def __write_body(self, ordering: PackedOrdering, node: Node, cache: bool = True) -> None:
         """
-        Encode the header and body into binary formrt.
+        Given a node, write the data for it, its attributes and all of its children to the body.
+        Frozen nodes are packed once on their own and cached, and the result is copied into the
+        body whenever nothing can be packed into the space before it, since the packing of the
+        node is the same wherever in the body it starts in that case.
 
-        Returns:
-            Binary blob of data that can be decoded by a game.
+        Parameters:
+            ordering - The PackedOrdering used to place data in the body.
+            node - A Node whose data should be encoded.
+            cache - Whether to use or create cached bodies for frozen nodes.
         """
-        if self.executed:
-            raise Exception("Logic error, should only call this once per instance")
-        self.executed = True
+        if cache and node.frozen and not ordering.has_open_slots:
+            body, nextbyte, nextshort = self.__body_fragment(node)
+            offset = ordering.splice(len(body), nextbyte, nextshort)
+            self.__add_data(body, len(body), offset)
+            return
 
-        # Generate the header first
-        self.__write_node(self.tree)
-        self.stream.write_int(Node.END_OF_DOCUMENT)
-        self.stream.write_pad(4)
+        if node.data_length != 0:
+            self.__write_value(ordering, node, None)
+        for attr in sorted(node.attributes):
+            self.__write_value(ordering, node, attr)
+        for child in node.children:
+            self.__write_body(ordering, child, cache=cache)
 
-        header_length = len(self.stream.data)
-        header = self.stream.data[:]
+    def __write_value(self, ordering: PackedOrdering, node: Node, attribute: Optional[str]) -> None:
+        """
+        Given a node, or one of its attributes, place it in the body and write its data.
 
-        # Generate the body
-        values = PackedOrdering.node_to_body_ordering(self.tree)
-        if len(values) > 0:
-            ordering = PackedOrdering(0, allow_expansion=True)
+        Parameters:
+            ordering - The PackedOrdering used to place data in the body.
+            node - A Node whose value or attribute should be written.
+            attribute - The name of the attribute to write, or None to write the node's value.
+        """
+        alignment, data = self.__pack_value(node, attribute)
 
-            for value in values:
-                node = value["node"]
+        if alignment == 1:
+            loc = ordering.get_next_byte()
+        elif alignment == 2:
+            loc = ordering.get_next_short()
+        else:
+            loc = ordering.get_next_int()
+        if loc is None:
+            raise BinaryEncodingException("Ran out of data when attempting to allocate node location!")
 
-                if value["type"] == "attribute":
-                    size = None
-                    enc = "s"
-                    dtype = "str"
-                    array = False
-                    composite = False
-                    val = node.attribute(value["name"])
-                else:
-                    size = node.data_length
-                    enc = node.data_encoding
-                    dtype = node.data_type
-                    array = node.is_array
-                    composite = node.is_composite
-                    val = node.value
+        self.__add_data(data, len(data), loc)
+        ordering.mark_used(len(data), loc, round_to=4 if alignment == 4 else 1)
+
+    def __pack_value(self, node: Node, attribute: Optional[str]) -> Tuple[int, bytes]:
+        """
+        Given a node, or one of its attributes, pack its data for the body.
 
-                if val is None:
+        Parameters:
+            node - A Node whose value or attribute should be packed.
+            attribute - The name of the attribute to pack, or None to pack the node's value.
+
+        Returns:
+            A tuple of the alignment the data needs in the body, which is 1, 2 or 4, and the data.
+        """
+        val: Any
+        if attribute is not None:
+            name = attribute
+            size = None
+            enc = "s"
+            dtype = "str"
+            array = False
+            composite = False
+            val = node.attribute(attribute)
+        else:
+            name = node.name
+            size = node.data_length
+            enc = node.data_encoding
+            dtype = node.data_type
+            array = node.is_array
+            composite = node.is_composite
+            val = node.value
+
+        if val is None:
+            raise BinaryEncodingException(
+                f"Node '{name}' has invalid value None",
+            )
+
+        if not array:
+            # Scalar value
+            if dtype == "str":
+                # Need to convert this to encoding from standard string.
+                # Also, need to lob off the trailing null.
+                if not isinstance(val, str):
                     raise BinaryEncodingException(
-                        f'Node \'{value["name"]}\' has invalid value None',
+                        f"Node '{name}' has non-string value!",
                     )
 
-                if not array:
-                    # Scalar value
-                    alignment = value["alignment"]
+                try:
+                    valbytes = val.encode(self.encoding) + b"\0"
+                except UnicodeEncodeError:
+                    raise BinaryEncodingException(f"Node '{name}' has un-encodable string value '{val}'")
+                return 4, struct.pack(">I", len(valbytes)) + valbytes
+            elif dtype == "bin":
+                # Store raw binary
+                return 4, struct.pack(">I", len(val)) + val
+
+            if size is None:
+                raise Exception("Logic error, node size not set yet this is not an attribute!")
+
+            # Everything is aligned to its size, except that larger sizes are 4 byte aligned.
+            alignment = size if size <= 2 else 4
+            if composite:
+                # Array, but not, somewhat silly
+                return alignment, struct.pack(f">{enc}", *val)
+            elif dtype == "bool":
+                val = 1 if val else 0
+
+            # The size is built-in, emit it
+            return alignment, struct.pack(f">{enc}", val)
+        else:
+            # Array value
+            if size is None:
+                raise Exception("Logic error, node size not set yet this is not an attribute!")
 
-                    if alignment == 1:
-                        loc = ordering.get_next_byte()
-                    elif alignment == 2:
-                        loc = ordering.get_next_short()
-                    elif alignment == 4:
-                        loc = ordering.get_next_int()
-                    if loc is None:
-                        raise BinaryEncodingException("Ran out of data when attempting to allocate node location!")
+            # The raw size in bytes
+            elems = len(val)
+            length = elems * size
 
-                    if dtype == "str":
-                        # Need to convert this to encoding from standard string.
-                        # Also, need to lob off the trailing null.
-                        if not isinstance(val, str):
-                            raise BinaryEncodingException(
-                                f'Node \'{value["name"]}\' has non-string value!',
-                            )
+            # Write out the header (number of bytes taken up) and the data
+            if dtype == "bool":
+                val = [1 if v else 0 for v in val]
+            return 4, struct.pack(f">I{enc * elems}", length, *val)
 
-                        try:
-                            valbytes = val.encode(self.encoding) + b"\0"
-                        except UnicodeEncodeError:
-                            raise BinaryEncodingException(
-                                f'Node \'{value["name"]}\' has un-encodable string value \'{val}\''
-                            )
-                        size = len(valbytes)
-                        self.__add_data(struct.pack(">I", size) + valbytes, size + 4, loc)
-                        ordering.mark_used(size + 4, loc, round_to=4)
+    def __flatten(self, node: Node, header: bytearray, body: bytearray) -> None:
+        """
+        Given a node, describe its header and body, along with those of its attributes and all of
+        its children, in the form that NativeBinaryCodec.encode expects.
 
-                        # We took care of this one
-                        continue
-                    elif dtype == "bin":
-                        # Store raw binary
-                        size = len(val)
-                        self.__add_data(struct.pack(">I", size) + val, size + 4, loc)
-                        ordering.mark_used(size + 4, loc, round_to=4)
+        Parameters:
+            node - A Node which should be encoded.
+            header - A buffer to append the description of the header to.
+            body - A buffer to append the description of the body to.
+        """
+        if node.frozen:
+            fragment = self.__header_fragment(node)
+            header.append(NativeBinaryCodec.OP_FRAGMENT)
+            header += struct.pack(">I", len(fragment))
+            header += fragment
+
+            data, nextbyte, nextshort = self.__body_fragment(node)
+            body += struct.pack(
+                ">BIII",
+                NativeBinaryCodec.OP_FRAGMENT,
+                len(data),
+                NativeBinaryCodec.NO_DATA if nextbyte is None else nextbyte,
+                NativeBinaryCodec.NO_DATA if nextshort is None else nextshort,
+            )
+            body += data
+            return
 
-                        # We took care of this one
-                        continue
-                    elif composite:
-                        # Array, but not, somewhat silly
-                        if size is None:
-                            raise Exception("Logic error, node size not set yet this is not an attribute!")
+        name = node.name.encode("ascii" if self.compressed else self.encoding)
+        header += struct.pack(">BH", node.type, len(name))
+        header += name
 
-                        encode_value = f">{enc}"
-                        self.__add_data(struct.pack(encode_value, *val), size, loc)
-                        ordering.mark_used(size, loc)
+        if node.data_length != 0:
+            alignment, data = self.__pack_value(node, None)
+            body += struct.pack(">BI", alignment, len(data))
+            body += data
 
-                        # We took care of this one
-                        continue
-                    elif dtype == "bool":
-                        val = 1 if val else 0
+        for attr in sorted(node.attributes):
+            name = attr.encode("ascii" if self.compressed else self.encoding)
+            header += struct.pack(">BH", Node.ATTR_TYPE, len(name))
+            header += name
 
-                    # The size is built-in, emit it
-                    if size is None:
-                        raise Exception("Logic error, node size not set yet this is not an attribute!")
+            alignment, data = self.__pack_value(node, attr)
+            body += struct.pack(">BI", alignment, len(data))
+            body += data
 
-                    encode_value = f">{enc}"
-                    self.__add_data(struct.pack(encode_value, val), size, loc)
-                    ordering.mark_used(size, loc)
-                else:
-                    # Array value
-                    loc = ordering.get_next_int()
-                    if loc is None:
-                        raise BinaryEncodingException("Ran out of data when attempting allocate array location!")
-                    if size is None:
-                        raise Exception("Logic error, node size not set yet this is not an attribute!")
+        for child in node.children:
+            self.__flatten(child, header, body)
+        header.append(Node.END_OF_NODE)
 
-                    # The raw size in bytes
-                    elems = len(val)
-                    length = elems * size
+    def __get_native_data(self) -> Optional[bytes]:
+        """
+        Encode the header and body using the C++ codec.
 
-                    # Write out the header (number of bytes taken up)
-                    data = struct.pack(">I", length)
-                    encode_value = f">{enc}"
+        Returns:
+            Binary blob of data, or None if the python encoder should be used instead.
+        """
+        header = bytearray()
+        body = bytearray()
+        try:
+            self.__flatten(self.tree, header, body)
+        except Exception:
+            # Let the python encoder report whatever is wrong with this tree.
+            return None
 
-                    # Write out data one element at a time
-                    for v in val:
-                        if dtype == "bool":
-                            data = data + struct.pack(encode_value, 1 if v else 0)
-                        else:
-                            data = data + struct.pack(encode_value, v)
+        return NativeBinaryCodec.encode(bytes(header), bytes(body), self.compressed)
 
-                    self.__add_data(data, length + 4, loc)
-                    ordering.mark_used(length + 4, loc, round_to=4)
+    def get_data(self) -> bytes:
+        """
+        Encode the header and body into binary formrt.
+
+        Returns:
+            Binary blob of data that can be decoded by a game.
+        """
+        if self.executed:
+            raise Exception("Logic error, should only call this once per instance")
+        self.executed = True
+
+        if self.native and NativeBinaryCodec.available():
+            data = self.__get_native_data()
+            if data is not None:
+                return data
+
+        # Generate the header first
+        self.__write_node(self.tree)
+        self.stream.write_int(Node.END_OF_DOCUMENT)
+        self.stream.write_pad(4)
+
+        header_length = len(self.stream.data)
+        header = self.stream.data[:]
+
+        # Generate the body
+        self.__write_body(PackedOrdering(0, allow_expansion=True), self.tree)
 
         return b"".join(
             [
                 struct.pack(">I", header_length),
                 header,
-                struct.pack(">I", self.__body_len),
+                struct.pack(">I", len(self.__body)),
                 bytes(self.__body),
             ]
         )
@@ -0,0 +1,892 @@
+#include <stdint.h>
+#include <string.h>
+#include <algorithm>
+#include <vector>
+
+#define ATTR_TYPE 0x2E
+#define END_OF_NODE 0xFE
+#define END_OF_DOCUMENT 0xFF
+
+#define NAME_MAX_COMPRESSED 0x24
+#define NAME_MAX_DECOMPRESSED 0x1000
+
+// Deeper trees are left to the python implementation, so that we fail the same way it does.
+#define MAX_DEPTH 256
+
+// Flags for each entry in the type table handed to us by python.
+#define TYPE_VALID 1
+#define TYPE_ARRAY 2
+#define TYPE_COMPOSITE 4
+#define TYPE_VARIABLE 8
+
+// Events written to the record buffer when decoding, one per header entry.
+#define EVENT_NODE 0
+#define EVENT_ATTR 1
+#define EVENT_END 2
+
+#define RECORD_SIZE 6
+#define NO_DATA 0xFFFFFFFF
+
+// Opcodes in the header and body streams handed to us by python when encoding.
+#define OP_FRAGMENT 0xFF
+
+#define ERR_TRUNCATED -1
+#define ERR_INVALID -2
+#define ERR_SPACE -3
+#define ERR_FRAGMENT -4
+
+namespace
+{
+    uint32_t read_u32(const uint8_t *data)
+    {
+        return ((uint32_t)data[0] << 24) | ((uint32_t)data[1] << 16) | ((uint32_t)data[2] << 8) | (uint32_t)data[3];
+    }
+
+    void write_u32(uint8_t *data, uint32_t value)
+    {
+        data[0] = (value >> 24) & 0xFF;
+        data[1] = (value >> 16) & 0xFF;
+        data[2] = (value >> 8) & 0xFF;
+        data[3] = value & 0xFF;
+    }
+
+    // A straight port of PackedOrdering from binary.py, see there for the gory details.
+    class Ordering
+    {
+    public:
+        Ordering(int64_t size, bool expand) : size(size), expand(expand), frontier(0), nextbyte(-1), nextshort(-1) {}
+
+        void mark_used(int64_t length, int64_t offset, int64_t round_to)
+        {
+            length = (length + (round_to - 1)) & ~(round_to - 1);
+            int64_t end = offset + length;
+
+            if (expand && size < end)
+            {
+                size = end;
+            }
+
+            if (offset == nextbyte && length == 1)
+            {
+                nextbyte = ((offset + 1) & 3) == 0 ? -1 : (offset + 1);
+            }
+            else if (offset == nextshort && length == 2)
+            {
+                nextshort = -1;
+            }
+            else if (offset >= frontier && (offset & 3) == 0)
+            {
+                if (length == 1)
+                {
+                    nextbyte = offset + 1;
+                }
+                else if (length == 2)
+                {
+                    nextshort = offset + 2;
+                }
+            }
+            else
+            {
+                if (nextbyte >= 0 && offset < ((nextbyte + 3) & ~3) && end > (nextbyte & ~3))
+                {
+                    nextbyte = -1;
+                }
+                if (nextshort >= 0 && offset < ((nextshort + 3) & ~3) && end > (nextshort & ~3))
+                {
+                    nextshort = -1;
+                }
+            }
+
+            frontier = std::max(frontier, (end + 3) & ~((int64_t)3));
+        }
+
+        bool has_open_slots()
+        {
+            return nextbyte >= 0 || nextshort >= 0;
+        }
+
+        int64_t splice(int64_t length, int64_t byte, int64_t shrt)
+        {
+            int64_t offset = frontier;
+            frontier = offset + length;
+            if (expand && size < frontier)
+            {
+                size = frontier;
+            }
+            nextbyte = byte < 0 ? -1 : (offset + byte);
+            nextshort = shrt < 0 ? -1 : (offset + shrt);
+            return offset;
+        }
+
+        // Returns the next location for something with the given alignment, or -1 if there isn't one.
+        int64_t get_next(unsigned int alignment)
+        {
+            if (alignment == 1 && nextbyte >= 0 && (expand || nextbyte < size))
+            {
+                return nextbyte;
+            }
+            if (alignment == 2 && nextshort >= 0 && (expand || nextshort < size))
+            {
+                return nextshort;
+            }
+            if (expand)
+            {
+                size = std::max(size, frontier);
+                return frontier;
+            }
+            if (frontier < size)
+            {
+                return frontier;
+            }
+            return -1;
+        }
+
+    private:
+        int64_t size;
+        bool expand;
+        int64_t frontier;
+        int64_t nextbyte;
+        int64_t nextshort;
+    };
+
+    struct DecodedNode
+    {
+        uint32_t record;
+        std::vector<uint32_t> attrs;
+        std::vector<uint32_t> children;
+    };
+
+    class Decoder
+    {
+    public:
+        Decoder(
+            const uint8_t *data,
+            unsigned int datalen,
+            bool compressed,
+            const uint8_t *types,
+            const uint8_t *name_chars,
+            uint32_t *records,
+            unsigned int maxrecords,
+            uint8_t *names,
+            unsigned int nameslen
+        ) : data(data), datalen(datalen), compressed(compressed), types(types), name_chars(name_chars),
+            records(records), maxrecords(maxrecords), numrecords(0), names(names), nameslen(nameslen), namesloc(0), pos(0) {}
+
+        int decode()
+        {
+            int err = parse_header();
+            if (err < 0)
+            {
+                return err;
+            }
+            err = parse_body();
+            if (err < 0)
+            {
+                return err;
+            }
+            return (int)numrecords;
+        }
+
+    private:
+        const uint8_t *data;
+        uint64_t datalen;
+        bool compressed;
+        const uint8_t *types;
+        const uint8_t *name_chars;
+        uint32_t *records;
+        uint64_t maxrecords;
+        uint64_t numrecords;
+        uint8_t *names;
+        uint64_t nameslen;
+        uint64_t namesloc;
+        uint64_t pos;
+        std::vector<DecodedNode> nodes;
+
+        int add_record(uint32_t event, uint32_t type, uint32_t name_off, uint32_t name_len)
+        {
+            if (numrecords >= maxrecords)
+            {
+                return ERR_SPACE;
+            }
+
+            uint32_t *record = &records[numrecords * RECORD_SIZE];
+            record[0] = event;
+            record[1] = type;
+            record[2] = name_off;
+            record[3] = name_len;
+            record[4] = NO_DATA;
+            record[5] = 0;
+            return (int)(numrecords++);
+        }
+
+        // Reads a node name into the names buffer, returning the record index it was added as.
+        int read_name(uint32_t event, uint32_t type)
+        {
+            if (pos >= datalen)
+            {
+                return ERR_TRUNCATED;
+            }
+            uint64_t length = data[pos++];
+            uint64_t name_off = namesloc;
+
+            if (compressed)
+            {
+                if (length > NAME_MAX_COMPRESSED)
+                {
+                    return ERR_INVALID;
+                }
+
+                uint64_t binary_length = ((length * 6) + 7) / 8;
+                if (pos + binary_length > datalen)
+                {
+                    return ERR_TRUNCATED;
+                }
+                if (namesloc + length > nameslen)
+                {
+                    return ERR_SPACE;
+                }
+
+                // Unpack six bit characters, most significant bits first.
+                uint32_t bits = 0;
+                unsigned int numbits = 0;
+                uint64_t inloc = pos;
+                for (uint64_t i = 0; i < length; i++)
+                {
+                    if (numbits < 6)
+                    {
+                        bits = (bits << 8) | data[inloc++];
+                        numbits += 8;
+                    }
+                    names[namesloc++] = name_chars[(bits >> (numbits - 6)) & 0x3F];
+                    numbits -= 6;
+                }
+                pos += binary_length;
+            }
+            else
+            {
+                if (length < 0x40)
+                {
+                    return ERR_INVALID;
+                }
+                else if (length < 0x80)
+                {
+                    length -= 0x3F;
+                }
+                else
+                {
+                    if (pos >= datalen)
+                    {
+                        return ERR_TRUNCATED;
+                    }
+                    length = ((length << 8) | data[pos++]) - 0x7FBF;
+                }
+
+                if (length > NAME_MAX_DECOMPRESSED)
+                {
+                    return ERR_INVALID;
+                }
+                if (pos + length > datalen)
+                {
+                    return ERR_TRUNCATED;
+                }
+                if (namesloc + length > nameslen)
+                {
+                    return ERR_SPACE;
+                }
+
+                memcpy(&names[namesloc], &data[pos], length);
+                namesloc += length;
+                pos += length;
+            }
+
+            return add_record(event, type, (uint32_t)name_off, (uint32_t)length);
+        }
+
+        int read_node(uint32_t type)
+        {
+            if ((types[type * 2 + 1] & TYPE_VALID) == 0)
+            {
+                return ERR_INVALID;
+            }
+
+            int record = read_name(EVENT_NODE, type);
+            if (record < 0)
+            {
+                return record;
+            }
+
+            nodes.emplace_back();
+            nodes.back().record = (uint32_t)record;
+            return (int)(nodes.size() - 1);
+        }
+
+        int parse_header()
+        {
+            if (datalen < 5)
+            {
+                return ERR_TRUNCATED;
+            }
+            uint64_t header_length = read_u32(data);
+            pos = 4;
+
+            // Walk the header, keeping track of the nodes we're inside of.
+            std::vector<uint32_t> stack;
+            int root = read_node(data[pos++]);
+            if (root < 0)
+            {
+                return root;
+            }
+            stack.push_back(root);
+
+            while (!stack.empty())
+            {
+                if (pos >= datalen)
+                {
+                    return ERR_TRUNCATED;
+                }
+
+                uint32_t type = data[pos++];
+                if (type == END_OF_NODE)
+                {
+                    int err = add_record(EVENT_END, type, 0, 0);
+                    if (err < 0)
+                    {
+                        return err;
+                    }
+                    stack.pop_back();
+                }
+                else if (type == ATTR_TYPE)
+                {
+                    int record = read_name(EVENT_ATTR, type);
+                    if (record < 0)
+                    {
+                        return record;
+                    }
+                    nodes[stack.back()].attrs.push_back((uint32_t)record);
+                }
+                else
+                {
+                    if (stack.size() >= MAX_DEPTH)
+                    {
+                        return ERR_INVALID;
+                    }
+
+                    int child = read_node(type);
+                    if (child < 0)
+                    {
+                        return child;
+                    }
+                    nodes[stack.back()].children.push_back((uint32_t)child);
+                    stack.push_back((uint32_t)child);
+                }
+            }
+
+            if (pos >= datalen || data[pos++] != END_OF_DOCUMENT)
+            {
+                return ERR_INVALID;
+            }
+
+            // Skip any padding, the body starts wherever we are if the header overran its length.
+            pos = std::min(std::max(pos, header_length + 4), datalen);
+            return 0;
+        }
+
+        bool name_less(uint32_t left, uint32_t right)
+        {
+            uint32_t *lrec = &records[left * RECORD_SIZE];
+            uint32_t *rrec = &records[right * RECORD_SIZE];
+            int cmp = memcmp(&names[lrec[2]], &names[rrec[2]], std::min(lrec[3], rrec[3]));
+            if (cmp != 0)
+            {
+                return cmp < 0;
+            }
+            return lrec[3] < rrec[3];
+        }
+
+        bool name_equal(uint32_t left, uint32_t right)
+        {
+            return !name_less(left, right) && !name_less(right, left);
+        }
+
+        // Locates a length-prefixed value such as a string or binary blob.
+        int read_variable(Ordering &ordering, const uint8_t *body, uint64_t body_length, uint64_t body_off, uint32_t *record)
+        {
+            int64_t loc = ordering.get_next(4);
+            if (loc < 0 || (uint64_t)loc + 4 > body_length)
+            {
+                return ERR_TRUNCATED;
+            }
+
+            uint64_t length = read_u32(&body[loc]);
+            ordering.mark_used(length + 4, loc, 4);
+            if ((uint64_t)loc + 4 + length > body_length)
+            {
+                return ERR_TRUNCATED;
+            }
+
+            record[4] = (uint32_t)(body_off + loc + 4);
+            record[5] = (uint32_t)length;
+            return 0;
+        }
+
+        int read_value(Ordering &ordering, const uint8_t *body, uint64_t body_length, uint64_t body_off, uint32_t *record)
+        {
+            uint8_t size = types[record[1] * 2];
+            uint8_t flags = types[record[1] * 2 + 1];
+
+            if (flags & TYPE_ARRAY)
+            {
+                if (flags & (TYPE_COMPOSITE | TYPE_VARIABLE))
+                {
+                    return ERR_INVALID;
+                }
+
+                int64_t loc = ordering.get_next(4);
+                if (loc < 0 || (uint64_t)loc + 4 > body_length)
+                {
+                    return ERR_TRUNCATED;
+                }
+
+                uint64_t length = read_u32(&body[loc]);
+                ordering.mark_used(length + 4, loc, 4);
+
+                // The python implementation decodes as many whole elements as the length holds
+                // out of however much of that length is actually present in the body.
+                uint64_t available = std::min(length, body_length - (loc + 4));
+                if (available != (length / size) * size)
+                {
+                    return ERR_TRUNCATED;
+                }
+
+                record[4] = (uint32_t)(body_off + loc + 4);
+                record[5] = (uint32_t)available;
+                return 0;
+            }
+
+            if (flags & TYPE_VARIABLE)
+            {
+                return read_variable(ordering, body, body_length, body_off, record);
+            }
+
+            int64_t loc = ordering.get_next(std::min(size, (uint8_t)4));
+            if (loc < 0 || (uint64_t)loc + size > body_length)
+            {
+                return ERR_TRUNCATED;
+            }
+
+            ordering.mark_used(size, loc, 1);
+            record[4] = (uint32_t)(body_off + loc);
+            record[5] = size;
+            return 0;
+        }
+
+        int parse_body()
+        {
+            if (datalen - pos < 4)
+            {
+                // No body at all, so nothing has a value.
+                return 0;
+            }
+
+            uint64_t body_length = read_u32(&data[pos]);
+            uint64_t body_off = pos + 4;
+            if (body_length == 0)
+            {
+                return 0;
+            }
+            if (body_off + body_length > datalen)
+            {
+                return ERR_TRUNCATED;
+            }
+
+            const uint8_t *body = &data[body_off];
+            Ordering ordering(body_length, false);
+
+            // Walk the tree in order, each node's value comes first, then its attributes
+            // sorted by name and then its children.
+            std::vector<uint32_t> stack;
+            stack.push_back(0);
+            while (!stack.empty())
+            {
+                DecodedNode &node = nodes[stack.back()];
+                stack.pop_back();
+
+                uint32_t *record = &records[node.record * RECORD_SIZE];
+                uint8_t size = types[record[1] * 2];
+                uint8_t flags = types[record[1] * 2 + 1];
+                if (size != 0 || (flags & TYPE_VARIABLE))
+                {
+                    int err = read_value(ordering, body, body_length, body_off, record);
+                    if (err < 0)
+                    {
+                        return err;
+                    }
+                }
+
+                std::stable_sort(node.attrs.begin(), node.attrs.end(), [this](uint32_t l, uint32_t r) { return name_less(l, r); });
+                for (size_t i = 0; i < node.attrs.size(); i++)
+                {
+                    uint32_t *attr = &records[node.attrs[i] * RECORD_SIZE];
+                    if (i > 0 && name_equal(node.attrs[i - 1], node.attrs[i]))
+                    {
+                        // Setting the same attribute twice only leaves room for one value.
+                        uint32_t *previous = &records[node.attrs[i - 1] * RECORD_SIZE];
+                        attr[4] = previous[4];
+                        attr[5] = previous[5];
+                        continue;
+                    }
+
+                    int err = read_variable(ordering, body, body_length, body_off, attr);
+                    if (err < 0)
+                    {
+                        return err;
+                    }
+                }
+
+                for (auto it = node.children.rbegin(); it != node.children.rend(); it++)
+                {
+                    stack.push_back(*it);
+                }
+            }
+
+            return 0;
+        }
+    };
+
+    class Encoder
+    {
+    public:
+        Encoder(bool compressed, const uint8_t *name_chars, uint8_t *out, unsigned int outlen)
+            : compressed(compressed), out(out), outlen(outlen), outloc(0)
+        {
+            memset(char_lut, 0xFF, sizeof(char_lut));
+            for (unsigned int i = 0; i < 64; i++)
+            {
+                char_lut[name_chars[i]] = (uint8_t)i;
+            }
+        }
+
+        int encode(const uint8_t *header_ops, uint64_t header_len, const uint8_t *body_ops, uint64_t body_len)
+        {
+            // Leave room for the header length, we'll fill it in when we know it.
+            if (outlen < 4)
+            {
+                return ERR_SPACE;
+            }
+            outloc = 4;
+
+            int err = write_header(header_ops, header_len);
+            if (err < 0)
+            {
+                return err;
+            }
+            write_u32(out, (uint32_t)(outloc - 4));
+
+            // Same thing for the body length.
+            if (outloc + 4 > outlen)
+            {
+                return ERR_SPACE;
+            }
+            uint64_t body_loc = outloc + 4;
+            err = write_body(body_ops, body_len, body_loc);
+            if (err < 0)
+            {
+                return err;
+            }
+            write_u32(&out[body_loc - 4], (uint32_t)(outloc - body_loc));
+
+            return (int)outloc;
+        }
+
+    private:
+        bool compressed;
+        uint8_t char_lut[256];
+        uint8_t *out;
+        uint64_t outlen;
+        uint64_t outloc;
+
+        int write_byte(uint8_t byte)
+        {
+            if (outloc >= outlen)
+            {
+                return ERR_SPACE;
+            }
+            out[outloc++] = byte;
+            return 0;
+        }
+
+        int write_name(const uint8_t *name, uint64_t length)
+        {
+            if (compressed)
+            {
+                if (length > 0xFF)
+                {
+                    return ERR_INVALID;
+                }
+
+                uint64_t binary_length = ((length * 6) + 7) / 8;
+                if (outloc + 1 + binary_length > outlen)
+                {
+                    return ERR_SPACE;
+                }
+                out[outloc++] = (uint8_t)length;
+
+                // Pack six bit characters, most significant bits first.
+                uint32_t bits = 0;
+                unsigned int numbits = 0;
+                for (uint64_t i = 0; i < length; i++)
+                {
+                    uint8_t index = char_lut[name[i]];
+                    if (index == 0xFF)
+                    {
+                        return ERR_INVALID;
+                    }
+
+                    bits = (bits << 6) | index;
+                    numbits += 6;
+                    if (numbits >= 8)
+                    {
+                        out[outloc++] = (bits >> (numbits - 8)) & 0xFF;
+                        numbits -= 8;
+                    }
+                }
+                if (numbits > 0)
+                {
+                    out[outloc++] = (bits << (8 - numbits)) & 0xFF;
+                }
+                return 0;
+            }
+
+            if (length > NAME_MAX_DECOMPRESSED)
+            {
+                return ERR_INVALID;
+            }
+            if (outloc + 2 + length > outlen)
+            {
+                return ERR_SPACE;
+            }
+
+            if (length < 64)
+            {
+                out[outloc++] = (uint8_t)(length + 0x3F);
+            }
+            else
+            {
+                uint64_t encoded = length + 0x7FBF;
+                out[outloc++] = (encoded >> 8) & 0xFF;
+                out[outloc++] = encoded & 0xFF;
+            }
+            memcpy(&out[outloc], name, length);
+            outloc += length;
+            return 0;
+        }
+
+        int write_header(const uint8_t *ops, uint64_t len)
+        {
+            uint64_t loc = 0;
+            while (loc < len)
+            {
+                uint8_t op = ops[loc++];
+                int err;
+
+                if (op == END_OF_NODE)
+                {
+                    err = write_byte(op);
+                }
+                else if (op == OP_FRAGMENT)
+                {
+                    // An already encoded header for a frozen node, copied verbatim.
+                    if (loc + 4 > len)
+                    {
+                        return ERR_TRUNCATED;
+                    }
+                    uint64_t length = read_u32(&ops[loc]);
+                    loc += 4;
+                    if (loc + length > len)
+                    {
+                        return ERR_TRUNCATED;
+                    }
+                    if (outloc + length > outlen)
+                    {
+                        return ERR_SPACE;
+                    }
+                    memcpy(&out[outloc], &ops[loc], length);
+                    outloc += length;
+                    loc += length;
+                    err = 0;
+                }
+                else
+                {
+                    // A node or attribute type, followed by its name.
+                    if (loc + 2 > len)
+                    {
+                        return ERR_TRUNCATED;
+                    }
+                    uint64_t length = ((uint64_t)ops[loc] << 8) | ops[loc + 1];
+                    loc += 2;
+                    if (loc + length > len)
+                    {
+                        return ERR_TRUNCATED;
+                    }
+
+                    err = write_byte(op);
+                    if (err == 0)
+                    {
+                        err = write_name(&ops[loc], length);
+                    }
+                    loc += length;
+                }
+
+                if (err < 0)
+                {
+                    return err;
+                }
+            }
+
+            int err = write_byte(END_OF_DOCUMENT);
+            if (err < 0)
+            {
+                return err;
+            }
+            while (((outloc - 4) & 3) != 0)
+            {
+                err = write_byte(0);
+                if (err < 0)
+                {
+                    return err;
+                }
+            }
+            return 0;
+        }
+
+        int add_data(const uint8_t *data, uint64_t length, uint64_t offset, uint64_t body_loc)
+        {
+            // Grow the body with zeros, padded to 4 bytes.
+            uint64_t end = body_loc + ((offset + length + 3) & ~((uint64_t)3));
+            if (end > outlen)
+            {
+                return ERR_SPACE;
+            }
+            if (outloc < end)
+            {
+                memset(&out[outloc], 0, end - outloc);
+                outloc = end;
+            }
+
+            memcpy(&out[body_loc + offset], data, length);
+            return 0;
+        }
+
+        int write_body(const uint8_t *ops, uint64_t len, uint64_t body_loc)
+        {
+            Ordering ordering(0, true);
+            outloc = body_loc;
+
+            uint64_t loc = 0;
+            while (loc < len)
+            {
+                uint8_t op = ops[loc++];
+
+                if (op == OP_FRAGMENT)
+                {
+                    // An already packed body for a frozen node, along with where its open slots were.
+                    if (loc + 12 > len)
+                    {
+                        return ERR_TRUNCATED;
+                    }
+                    uint64_t length = read_u32(&ops[loc]);
+                    uint32_t nextbyte = read_u32(&ops[loc + 4]);
+                    uint32_t nextshort = read_u32(&ops[loc + 8]);
+                    loc += 12;
+                    if (loc + length > len)
+                    {
+                        return ERR_TRUNCATED;
+                    }
+
+                    if (ordering.has_open_slots())
+                    {
+                        // The python encoder will pack this node value by value instead.
+                        return ERR_FRAGMENT;
+                    }
+
+                    int64_t offset = ordering.splice(
+                        length,
+                        nextbyte == NO_DATA ? -1 : nextbyte,
+                        nextshort == NO_DATA ? -1 : nextshort
+                    );
+                    int err = add_data(&ops[loc], length, offset, body_loc);
+                    if (err < 0)
+                    {
+                        return err;
+                    }
+                    loc += length;
+                    continue;
+                }
+
+                // A value that needs placing, its alignment followed by its data.
+                if (loc + 4 > len)
+                {
+                    return ERR_TRUNCATED;
+                }
+                uint64_t length = read_u32(&ops[loc]);
+                loc += 4;
+                if (loc + length > len)
+                {
+                    return ERR_TRUNCATED;
+                }
+
+                int64_t offset = ordering.get_next(op);
+                int err = add_data(&ops[loc], length, offset, body_loc);
+                if (err < 0)
+                {
+                    return err;
+                }
+                ordering.mark_used(length, offset, (op == 1 || op == 2) ? 1 : 4);
+                loc += length;
+            }
+
+            return 0;
+        }
+    };
+}
+
+extern "C"
+{
+    int decode(
+        const uint8_t *data,
+        unsigned int datalen,
+        int compressed,
+        const uint8_t *types,
+        const uint8_t *name_chars,
+        uint32_t *records,
+        unsigned int maxrecords,
+        uint8_t *names,
+        unsigned int nameslen
+    )
+    {
+        // Decodes the header and locates every value in the body, writing a record of six
+        // integers per header entry: event, type, name offset and length in the names buffer,
+        // and value offset and length in the data, or NO_DATA if there is no value. Returns
+        // the number of records written, or a negative value if python should decode instead.
+        Decoder decoder(data, datalen, compressed != 0, types, name_chars, records, maxrecords, names, nameslen);
+        return decoder.decode();
+    }
+
+    int encode(
+        const uint8_t *header_ops,
+        unsigned int header_len,
+        const uint8_t *body_ops,
+        unsigned int body_len,
+        int compressed,
+        const uint8_t *name_chars,
+        uint8_t *out,
+        unsigned int outlen
+    )
+    {
+        // Packs node names into the header and lays values out in the body, given a flattened
+        // description of the tree. Returns the length of the encoded data, or a negative value
+        // if python should encode instead.
+        Encoder encoder(compressed != 0, name_chars, out, outlen);
+        return encoder.encode(header_ops, header_len, body_ops, body_len);
+    }
+}
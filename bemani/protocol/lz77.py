@@ -1,7 +1,6 @@
 import ctypes
 import os
-from collections import defaultdict
-from typing import Generator, List, MutableMapping, Optional, Set, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 from typing_extensions import Final
 
 from .. import package_root
@@ -14,20 +13,36 @@ try:
     files = [f for f in os.listdir(clib_path) if f.startswith("lz77cpp") and f.endswith(".so")]
     if len(files) > 0:
         clib = ctypes.cdll.LoadLibrary(os.path.join(clib_path, files[0]))
-        clib.decompress.argtypes = (
+        clib.decompressor_create.argtypes = ()
+        clib.decompressor_create.restype = ctypes.c_void_p
+        clib.decompressor_destroy.argtypes = (ctypes.c_void_p,)
+        clib.decompressor_destroy.restype = None
+        clib.decompressor_status.argtypes = (ctypes.c_void_p,)
+        clib.decompressor_status.restype = ctypes.c_int
+        clib.decompressor_feed.argtypes = (
+            ctypes.c_void_p,
+            ctypes.c_void_p,
+            ctypes.c_uint,
+            ctypes.POINTER(ctypes.c_uint),
             ctypes.c_char_p,
-            ctypes.c_int,
-            ctypes.c_char_p,
-            ctypes.c_int,
+            ctypes.c_uint,
         )
-        clib.decompress.restype = ctypes.c_int
-        clib.compress.argtypes = (
-            ctypes.c_char_p,
+        clib.decompressor_feed.restype = ctypes.c_int
+        clib.compressor_create.argtypes = (ctypes.c_int,)
+        clib.compressor_create.restype = ctypes.c_void_p
+        clib.compressor_destroy.argtypes = (ctypes.c_void_p,)
+        clib.compressor_destroy.restype = None
+        clib.compressor_bound.argtypes = (ctypes.c_void_p, ctypes.c_uint)
+        clib.compressor_bound.restype = ctypes.c_uint
+        clib.compressor_feed.argtypes = (
+            ctypes.c_void_p,
+            ctypes.c_void_p,
+            ctypes.c_uint,
             ctypes.c_int,
             ctypes.c_char_p,
-            ctypes.c_int,
+            ctypes.c_uint,
         )
-        clib.compress.restype = ctypes.c_int
+        clib.compressor_feed.restype = ctypes.c_int
 except Exception:
     clib = None
 
@@ -38,395 +53,589 @@ class LzException(Exception):
     """
 
 
-class Lz77Decompress:
+class Lz77Compress:
     """
-    A class that can decompress an Lz77 stream of data. Notably, this is a different
-    variant to the Lz77 found in firebeat executables and BIOS. This is used for
-    over-the-wire compression of XML data, as well as compression inside a decent
-    amount of file formats found in various Konami games.
+    A class that can compress arbitrary binary data using the Lz77 protocol.
+    Note that this does support overlapped backtracks, so for instance the
+    string "abcabcabc" will be compressed properly (see unit tests for examples).
+    Backrefs are found using hash chains of previous positions sharing the same
+    three byte prefix. The fast level checks a handful of candidates and takes the
+    longest backref it finds. The max level checks every candidate and then plans
+    a block at a time, picking the combination of copies and backrefs that makes
+    for the smallest output. This is kept identical to the C++ implementation so
+    that the output doesn't depend on whether the C++ library is available.
     """
 
     RING_LENGTH: Final[int] = 0x1000
 
+    MAX_BACKREF: Final[int] = 18
+    LOOKAHEAD: Final[int] = MAX_BACKREF
+
+    LEVEL_FAST: Final[str] = "fast"
+    LEVEL_MAX: Final[str] = "max"
+
+    FAST_MAX_CHAIN: Final[int] = 16
+    OPTIMAL_BLOCK: Final[int] = 0x4000
+
+    # Output cost in bits of a copied byte and a backref, including their flag bit.
+    COPY_COST: Final[int] = 9
+    BACKREF_COST: Final[int] = 17
+
     FLAG_COPY: Final[int] = 1
     FLAG_BACKREF: Final[int] = 0
 
-    def __init__(self, data: bytes, backref: Optional[int] = None) -> None:
+    def __init__(self, backref: Optional[int] = None, level: str = LEVEL_MAX) -> None:
         """
         Initialize the object.
 
         Parameters:
-            data - Binary blob representing the data to be decompressed.
+            backref - Optional size of the backref ring, defaulting to the standard 4KB.
+            level - Either LEVEL_FAST or LEVEL_MAX.
         """
-        self.eof: bool = False
-        self.data: bytes = data
-        self.read_pos: int = 0
-        self.left: int = len(self.data)
-        self.flags: int = 1
-        self.write_pos: int = 0
-        self.pending_copy_amount: int = 0
-        self.pending_copy_pos: int = 0
-        self.pending_copy_max: int = 0
+        if level not in {self.LEVEL_FAST, self.LEVEL_MAX}:
+            raise LzException(f"Unknown compression level {level}")
+
         self.ringlength: int = backref or self.RING_LENGTH
-        self.ring: bytes = b"\x00" * self.ringlength
+        self.max_distance: int = min(self.ringlength, self.RING_LENGTH) - 1
+        self.max_chain: int = self.ringlength if level == self.LEVEL_MAX else self.FAST_MAX_CHAIN
+        self.optimal: bool = level == self.LEVEL_MAX
+
+        # Input data starting at absolute position base, going back at least a ring's
+        # worth before the next byte to compress so that we can search for backrefs.
+        self.window: bytearray = bytearray()
+        self.base: int = 0
+        self.read_pos: int = 0
+        self.total: int = 0
+        self.eof: bool = False
 
-    def _ring_read(self, copy_pos: int, copy_len: int) -> Generator[bytes, None, None]:
+        # Most recent position for each three byte prefix, and a link from each position
+        # to the previous one with the same prefix.
+        self.head: Dict[bytes, int] = {}
+        self.prev: List[int] = [-1] * self.ringlength
+        self.inserted: int = 0
+
+        # The flag byte and chunks we haven't output yet.
+        self.flags: int = 0
+        self.flagpos: int = 0
+        self.chunks: List[bytes] = []
+
+    def _insert_upto(self, pos: int) -> None:
+        """
+        Add every position up to, but not including, the given one to the hash chains.
         """
-        Read the next bytes from the backref ring at the current copy position.
+        window = self.window
+        base = self.base
+        head = self.head
+        prev = self.prev
+        ringlength = self.ringlength
+        end = min(pos, self.total - 2)
+
+        for inserted in range(self.inserted, end):
+            key = bytes(window[(inserted - base) : (inserted - base + 3)])
+            prev[inserted % ringlength] = head.get(key, -1)
+            head[key] = inserted
+        self.inserted = max(self.inserted, end)
+
+    def _find_match(self, pos: int, amount: int) -> Tuple[int, int]:
+        """
+        Find the longest match of up to amount bytes for the data at pos, preferring the
+        closest when there's a tie.
 
         Returns:
-            a generator which yields bytes.
+            A tuple of the length and distance, with a length of 0 if there is no match.
+        """
+        if amount < 3:
+            return 0, 0
+
+        window = self.window
+        base = self.base
+        current = pos - base
+        chain = self.max_chain
+        best_length = 0
+        best_distance = 0
+        candidate = self.head.get(bytes(window[current : (current + 3)]), -1)
+
+        while candidate >= 0 and pos - candidate <= self.max_distance:
+            # We already know that the first three match so we don't need to check those.
+            # A match can run past pos in order to reference data that the backref itself
+            # is writing.
+            possible = candidate - base
+            length = 3
+            while length < amount and window[possible + length] == window[current + length]:
+                length += 1
+
+            if length > best_length:
+                best_length = length
+                best_distance = pos - candidate
+                if best_length == amount:
+                    # We found an ideal length, no need to keep searching.
+                    break
+
+            chain -= 1
+            if chain == 0:
+                break
+            candidate = self.prev[candidate % self.ringlength]
+
+        return best_length, best_distance
+
+    def _add(self, flag: int, chunk: bytes, output: List[bytes]) -> None:
+        """
+        Add a copied byte or a backref to the current flag byte, outputting it if it is full.
         """
-        while copy_len > 0:
-            if copy_pos + copy_len > self.ringlength:
-                # Copy first chunk, let subsequent loop handle the next chunks
-                amount = self.ringlength - copy_pos
+        self.flags |= flag << self.flagpos
+        self.chunks.append(chunk)
+        self.flagpos += 1
+        if self.flagpos == 8:
+            output.append(bytes([self.flags]) + b"".join(self.chunks))
+            self.flags = 0
+            self.flagpos = 0
+            self.chunks = []
+
+    def _add_copy(self, output: List[bytes]) -> None:
+        pos = self.read_pos - self.base
+        self.read_pos += 1
+        self._add(self.FLAG_COPY, bytes(self.window[pos : (pos + 1)]), output)
+
+    def _add_backref(self, distance: int, length: int, output: List[bytes]) -> None:
+        lo = ((length - 3) & 0xF) | ((distance & 0xF) << 4)
+        hi = (distance >> 4) & 0xFF
+        self.read_pos += length
+        self._add(self.FLAG_BACKREF, bytes([hi, lo]), output)
+
+    def _compress_block(self, block_end: int, output: List[bytes]) -> None:
+        """
+        Compress everything up to block_end, plus however far the last backref runs past it.
+        First find the longest backref at each position, then work backwards to figure out the
+        cheapest way to output the rest of the block from each position. A shorter backref is
+        always available wherever a longer one is, so we only need to consider lengths up to
+        the longest.
+        """
+        count = block_end - self.read_pos
+        matches: List[Tuple[int, int]] = []
+        for pos in range(self.read_pos, block_end):
+            self._insert_upto(pos)
+            matches.append(self._find_match(pos, min(self.total - pos, self.MAX_BACKREF)))
+
+        # Anything past the end of the block is the next block's problem.
+        costs = [0] * (count + self.MAX_BACKREF + 1)
+        choices = [0] * count
+        for i in range(count - 1, -1, -1):
+            best_cost = costs[i + 1] + self.COPY_COST
+            best_choice = 0
+            for length in range(3, matches[i][0] + 1):
+                cost = costs[i + length] + self.BACKREF_COST
+                if cost < best_cost:
+                    best_cost = cost
+                    best_choice = length
+            costs[i] = best_cost
+            choices[i] = best_choice
+
+        i = 0
+        while i < count:
+            if choices[i] == 0:
+                self._add_copy(output)
+                i += 1
             else:
-                # Copy the whole thing out, we have enough space to do so
-                amount = copy_len
-
-            ret = self.ring[copy_pos : (copy_pos + amount)]
-            self._ring_write(ret)
-            yield ret
+                self._add_backref(matches[i][1], choices[i], output)
+                i += choices[i]
 
-            copy_pos = (copy_pos + amount) % self.ringlength
-            copy_len -= amount
-
-    def _ring_write(self, bytedata: bytes) -> None:
+    def compress_bytes(self, data: bytes, final: bool) -> bytes:
         """
-        Write bytes into the backref ring.
+        Add data to be compressed and return every complete flag byte and its chunks that
+        we can. A byte is only compressed once we have enough data after it to decide what
+        to do with it or we know there is no more data coming, so that the output is the
+        same no matter how the input is split up.
 
         Parameters:
-            byte - A byte to be written at the current write offset
-        """
-        while True:
-            amount = len(bytedata)
-            if amount == 0:
-                return
-            if amount > (self.ringlength - self.write_pos):
-                amount = self.ringlength - self.write_pos
-
-            self.ring = self.ring[: self.write_pos] + bytedata[:amount] + self.ring[(self.write_pos + amount) :]
-            bytedata = bytedata[amount:]
-            self.write_pos = (self.write_pos + amount) % self.ringlength
-
-    def decompress_bytes(self) -> Generator[bytes, None, None]:
-        """
-        Yield the next byte from the decompressed output. If we are
-        in a backref copy, read the next byte from the backref. If
-        we aren't, read the next flag to see if we should decode
-        a byte directly or if we should start another backref read.
-        If we don't have any flags, exit reporting EOF (None). If
-        we hit the end of the stream, stop yielding to signify EOF.
-        In all cases, whatever byte we read should be added back to
-        the backref buffer.
+            data - The next chunk of raw binary data.
+            final - Whether this is the last chunk, in which case the end of stream marker
+                    is output along with the rest of the data.
 
         Returns:
-            a generator that yields bytes.
+            Lz77-compressed binary data.
         """
+        if self.eof:
+            raise LzException("Cannot compress more data after flushing!")
+
+        # Throw away data that's too old to backref to, but not every time since we have to move everything.
+        if self.read_pos > self.base + self.ringlength * 16:
+            discard = self.read_pos - self.ringlength - self.base
+            del self.window[:discard]
+            self.base += discard
+        self.window += data
+        self.total += len(data)
+
+        output: List[bytes] = []
         while not self.eof:
-            if self.pending_copy_amount > 0:
-                # We had a backref that would have copied more data than we had available
-                # in the ringbuffer (because every read, even a backref, adds to the
-                # ringbuffer). So, since we read that last time and wrote it to the backbuffer
-                # we are safe to read again.
-                amount = min(self.pending_copy_amount, self.pending_copy_max)
-                yield from self._ring_read(self.pending_copy_pos, amount)
-
-                # We read this many bytes and are about to write them to the ringbuffer,
-                # so bookkeep that.
-                self.pending_copy_amount -= amount
-                self.pending_copy_max = amount
+            left = self.total - self.read_pos
+            if left == 0:
+                if not final:
+                    break
+
+                # Output the end of stream marker, making sure that it gets flushed.
+                self.eof = True
+                self._add(self.FLAG_BACKREF, b"\x00\x00", output)
+                if self.flagpos > 0:
+                    output.append(bytes([self.flags]) + b"".join(self.chunks))
+            elif self.optimal:
+                # Blocks always start where the last one left off and are a fixed size unless we
+                # run out of data, so that the output doesn't depend on how the input was split up.
+                block_end = self.read_pos + self.OPTIMAL_BLOCK
+                if self.total < block_end + self.LOOKAHEAD:
+                    if not final:
+                        break
+                    block_end = min(block_end, self.total)
+                self._compress_block(block_end, output)
             else:
-                if self.flags == 1:
-                    # Load the next byte for processing
-                    if self.left == 0:
-                        # We have nothing left to read, so skip the
-                        # ringbuffer write below and exit early.
-                        return
-                    else:
-                        self.flags = 0x100 | self.data[self.read_pos]
-                        self.read_pos += 1
-                        self.left -= 1
-
-                # Shift the lowest bit out to be retrieved as a flag
-                flag = self.flags & 1
-                self.flags >>= 1
-
-                if flag == self.FLAG_COPY:
-                    # Figure out how much to pull at once
-                    amount = 1
-                    while self.flags != 1 and (self.flags & 1) == self.FLAG_COPY:
-                        # We would do a copy next time, so pop that flag and just add to our read amount
-                        self.flags >>= 1
-                        amount += 1
-
-                    # Grab chunk right out of the data source
-                    b = self.data[self.read_pos : (self.read_pos + amount)]
-                    self._ring_write(b)
-                    yield b
-
-                    self.read_pos += amount
-                    self.left -= amount
-                elif flag == self.FLAG_BACKREF:
-                    yield from self._read_backref()
+                if not final and left < self.LOOKAHEAD:
+                    # We don't know how long of a backref we could make here yet.
+                    break
+
+                # Positions right before the end of the data couldn't be hashed until we had more of it.
+                self._insert_upto(self.read_pos)
+                length, distance = self._find_match(self.read_pos, min(left, self.MAX_BACKREF))
+                if length == 0:
+                    # Output the data as a copy if we couldn't find a backref.
+                    self._add_copy(output)
                 else:
-                    raise Exception("Logic error!")
+                    self._add_backref(distance, length, output)
 
-    def _read_backref(self) -> Generator[bytes, None, None]:
-        """
-        Read a backref chunk. Grab the copy length and copy position
-        from the first two bytes and then read the first byte from
-        the backref. Sets up variables such that Lz77Decompress.__read()
-        can finish copying out of the backref on subsequent calls. Should
-        only be called by Lz77Decompress.__read(). If we discover the end
-        of stream, we don't generate any bytes and instead set the eof
-        flag which terminates the main decompression loop above.
+        return b"".join(output)
 
-        Returns:
-            a generator that yields bytes.
-        """
-        if self.left == 0:
-            self.eof = True
-            return
-        if self.left == 1:
-            raise LzException("Unexpected EOF mid-backref")
-
-        hi = self.data[self.read_pos]
-        lo = self.data[self.read_pos + 1]
-        self.read_pos += 2
-        self.left -= 2
-
-        copy_len = lo & 0xF
-        copy_pos = (hi << 4) | (lo >> 4)
-
-        if copy_pos > 0:
-            copy_len += 3
-            if copy_len > copy_pos:
-                # Remember what we have to do left, and the safe
-                # amount to copy next time (which is our length,
-                # since we are about to write that many butes to
-                # the ringbuffer right after reading them).
-                self.pending_copy_amount = copy_len - copy_pos
-                self.pending_copy_pos = self.write_pos
-                self.pending_copy_max = copy_pos
-
-                # Only copy the available bytes
-                copy_len = copy_pos
-
-            copy_pos = self.write_pos - copy_pos
-            while copy_pos < 0:
-                copy_pos += self.ringlength
-            copy_pos = copy_pos % self.ringlength
-            yield from self._ring_read(copy_pos, copy_len)
-        else:
-            self.eof = True
-            return
 
+def _address(data: bytes) -> Tuple[ctypes.c_char_p, int]:
+    """
+    Get the address of the contents of a bytes object so that we can hand the C++ code
+    a pointer partway into it without slicing. The first value returned must be kept
+    alive for as long as the address is in use.
+    """
+    ptr = ctypes.c_char_p(data)
+    return ptr, ctypes.cast(ptr, ctypes.c_void_p).value or 0
 
-class Lz77Compress:
+
+def _chunks(data: Union[bytes, bytearray, memoryview], size: int) -> Iterator[bytes]:
     """
-    A class that can compress arbitrary binary data using the Lz77 protocol.
-    Note that this does support overlapped backtracks, so for instance the
-    string "abcabcabc" will be compressed properly (see unit tests for examples).
-    Great care has been taken in optimizing this and then we further optimize
-    by using Cython to build, netting us another 40% speed-up. This is important
-    because for any given packet we are decompressing and compressing at least
-    once, and if we use a proxy to direct traffic, possibly a second time.
+    Split a bytes-like object into bytes chunks of at most the given size. A bytes object
+    is handed back as-is so that callers that already have one don't pay for a copy.
     """
+    if isinstance(data, bytes):
+        yield data
+        return
 
-    RING_LENGTH: Final[int] = 0x1000
+    view = memoryview(data).cast("B")
+    for offset in range(0, len(view), size):
+        yield bytes(view[offset : (offset + size)])
 
-    LOOSE_COMPRESS_THRESHOLD: Final[int] = 1024 * 512
+
+class Lz77Decompressor:
+    """
+    An incremental Lz77 decompressor, modeled after zlib's decompression objects. Compressed
+    data can be fed in arbitrary chunks and the decompressed data for each chunk is returned
+    as soon as it is available. The stream's end of file marker is honored, so any data that
+    comes after it is available in unused_data instead of being decompressed.
+    """
+
+    RING_LENGTH: Final[int] = 0x1000
 
     FLAG_COPY: Final[int] = 1
     FLAG_BACKREF: Final[int] = 0
 
-    def __init__(self, data: bytes, backref: Optional[int] = None) -> None:
+    # How much we hand to or take from the C++ code at once when we don't know better.
+    CHUNK_SIZE: Final[int] = 64 * 1024
+    MAX_CHUNK_SIZE: Final[int] = 1024 * 1024
+
+    STATUS_EOF: Final[int] = 1
+    STATUS_MID_GROUP: Final[int] = 2
+
+    def __init__(self, backref: Optional[int] = None) -> None:
         """
         Initialize the object.
 
         Parameters:
-            data - Binary blob representing the data to be decompressed.
+            backref - Optional size of the backref ring, defaulting to the standard 4KB.
         """
-        self.data: bytes = data
-        self.read_pos: int = 0
-        self.left: int = len(self.data)
-        self.eof: bool = False
-        self.bytes_written: int = 0
         self.ringlength: int = backref or self.RING_LENGTH
-        self.locations: MutableMapping[int, Set[int]] = defaultdict(set)
-        self.starts: MutableMapping[bytes, Set[int]] = defaultdict(set)
-        self.last_start: Tuple[int, int, int] = (0, 0, 0)
+        self.__state: Optional[int] = None
+        if clib is not None and self.ringlength == self.RING_LENGTH:
+            self.__state = clib.decompressor_create()
+
+        self.__eof: bool = False
+        self.__unused: bytes = b""
+
+        # State for the python implementation. The history starts with a full ring of zeros
+        # because backrefs before the start of the data are defined to read zeros.
+        self.__history: bytearray = bytearray(self.ringlength)
+        self.__flags: int = 1
+        self.__hi: Optional[int] = None
+
+    def __del__(self) -> None:
+        state = getattr(self, "_Lz77Decompressor__state", None)
+        if state is not None and clib is not None:
+            clib.decompressor_destroy(state)
+            self.__state = None
+
+    @property
+    def eof(self) -> bool:
+        """
+        Whether we have seen the end of stream marker.
+        """
+        return self.__eof
 
-        if len(data) > self.LOOSE_COMPRESS_THRESHOLD:
-            self._ring_write = self._ring_write_starts_only
-        else:
-            self._ring_write = self._ring_write_both
+    @property
+    def unused_data(self) -> bytes:
+        """
+        Any data that was passed to decompress after the end of stream marker.
+        """
+        return self.__unused
 
-    def _ring_write_starts_only(self, bytedata: bytes) -> None:
+    def decompress(self, data: Union[bytes, bytearray, memoryview], size: Optional[int] = None) -> bytes:
         """
-        Write bytes into the backref ring.
+        Decompress the next chunk of compressed data.
 
         Parameters:
-            byte - A byte to be written at the current write offset
+            data - The next chunk of Lz77-compressed binary data.
+            size - Optional expected size of the decompressed output for this chunk. When
+                   known, this lets us decompress directly into a buffer of the right size.
+
+        Returns:
+            Raw binary data decompressed from this chunk. This can be less than all of the
+            data represented by the chunk if a backref straddles the next chunk.
         """
-        for byte in bytedata:
-            # Update the start locations hashmap if we're past the beginning
-            self.last_start = (self.last_start[1], self.last_start[2], byte)
-            if self.bytes_written >= 2:
-                self.starts[bytes(self.last_start)].add(self.bytes_written - 2)
+        output: List[bytes] = []
+        written = 0
+        for chunk in _chunks(data, self.MAX_CHUNK_SIZE):
+            if self.__eof:
+                self.__unused += chunk
+            elif self.__state is not None:
+                remaining = (size - written) if size is not None and size > written else None
+                for piece in self.__decompress_native(chunk, remaining):
+                    output.append(piece)
+                    written += len(piece)
+            else:
+                output.append(self.__decompress_python(chunk))
+        if len(output) == 1:
+            return output[0]
+        return b"".join(output)
 
-            # Keep track of the fact that we wrote this byte.
-            self.bytes_written += 1
+    def flush(self) -> bytes:
+        """
+        Finish decompressing. Verifies that the stream didn't stop partway through a flag
+        byte's worth of data.
 
-    def _ring_write_both(self, bytedata: bytes) -> None:
+        Returns:
+            Any remaining raw binary data, which is always empty.
         """
-        Write bytes into the backref ring.
+        if self.__state is not None:
+            midgroup = (clib.decompressor_status(self.__state) & self.STATUS_MID_GROUP) != 0
+        else:
+            midgroup = self.__flags != 1 or self.__hi is not None
+        if not self.__eof and midgroup:
+            raise LzException("Unexpected EOF during decompression!")
+        return b""
+
+    def __decompress_native(self, data: bytes, size: Optional[int]) -> List[bytes]:
+        keepalive, address = _address(data)
+        consumed = ctypes.c_uint(0)
+        offset = 0
+        outlen = size if size else max(self.CHUNK_SIZE, len(data) * 2)
+        output: List[bytes] = []
+
+        while True:
+            outbuf = ctypes.create_string_buffer(outlen)
+            written = clib.decompressor_feed(
+                self.__state,
+                address + offset,
+                len(data) - offset,
+                ctypes.byref(consumed),
+                outbuf,
+                outlen,
+            )
+            offset += consumed.value
+            output.append(outbuf.raw if written == outlen else ctypes.string_at(outbuf, written))
+
+            if written < outlen:
+                # We ran out of input or hit the end of the stream.
+                break
+
+            # We ran out of room, so there might be more. Grow so huge outputs that we
+            # weren't told about ahead of time don't take forever.
+            outlen = min(max(outlen * 2, self.CHUNK_SIZE), self.MAX_CHUNK_SIZE)
+
+        del keepalive
+        if (clib.decompressor_status(self.__state) & self.STATUS_EOF) != 0:
+            self.__eof = True
+            self.__unused = data[offset:]
+        return output
+
+    def __decompress_python(self, data: bytes) -> bytes:
+        history = self.__history
+        start = len(history)
+        flags = self.__flags
+        hi = self.__hi
+        pos = 0
+        end = len(data)
+
+        while True:
+            if flags == 1:
+                # Load the next flag byte for processing.
+                if pos >= end:
+                    break
+                flags = 0x100 | data[pos]
+                pos += 1
+
+            if (flags & 1) == self.FLAG_COPY:
+                # Figure out how many copies are in a row so we can pull them at once.
+                amount = 0
+                while flags != 1 and (flags & 1) == self.FLAG_COPY:
+                    flags >>= 1
+                    amount += 1
+
+                available = min(amount, end - pos)
+                history += data[pos : (pos + available)]
+                pos += available
+                if available < amount:
+                    # Put back the flags for the bytes we didn't get yet.
+                    flags = (flags << (amount - available)) | ((1 << (amount - available)) - 1)
+                    break
+            else:
+                # Backref copy, which might be split across two chunks.
+                if hi is None:
+                    if pos >= end:
+                        break
+                    hi = data[pos]
+                    pos += 1
+                if pos >= end:
+                    break
+
+                lo = data[pos]
+                pos += 1
+                flags >>= 1
+
+                copy_pos = (hi << 4) | (lo >> 4)
+                hi = None
+                if copy_pos == 0:
+                    # This is the end of a file.
+                    self.__eof = True
+                    self.__unused = data[pos:]
+                    break
+
+                # The ring wraps, so a backref can't reach further than its length.
+                copy_pos = copy_pos % self.ringlength or self.ringlength
+                copy_len = (lo & 0xF) + 3
+                copy_start = len(history) - copy_pos
+                if copy_len <= copy_pos:
+                    history += history[copy_start : (copy_start + copy_len)]
+                else:
+                    # The backref overlaps the data it produces, so it repeats.
+                    pattern = history[copy_start:]
+                    history += (pattern * ((copy_len // copy_pos) + 1))[:copy_len]
+
+        self.__flags = flags
+        self.__hi = hi
+        output = bytes(history[start:])
+        del history[: -self.ringlength]
+        return output
+
+
+class Lz77Compressor:
+    """
+    An incremental Lz77 compressor, modeled after zlib's compression objects. Raw data can
+    be fed in arbitrary chunks and compressed data is returned as it becomes available,
+    with the rest (and the end of stream marker) returned by flush. The output does not
+    depend on how the input was chunked.
+    """
+
+    RING_LENGTH: Final[int] = 0x1000
+
+    # Trades speed for ratio. The fast level is meant for compressing packets on the fly,
+    # the max level for offline work such as repacking game files.
+    LEVEL_FAST: Final[str] = Lz77Compress.LEVEL_FAST
+    LEVEL_MAX: Final[str] = Lz77Compress.LEVEL_MAX
+
+    # How much we hand to the C++ code at once, which bounds how much it has to hold.
+    CHUNK_SIZE: Final[int] = 64 * 1024
+
+    def __init__(self, backref: Optional[int] = None, level: str = LEVEL_MAX) -> None:
+        """
+        Initialize the object.
 
         Parameters:
-            byte - A byte to be written at the current write offset
+            backref - Optional size of the backref ring, defaulting to the standard 4KB.
+            level - Either LEVEL_FAST or LEVEL_MAX.
         """
-        for byte in bytedata:
-            # Update the start locations hashmap if we're past the beginning
-            self.last_start = (self.last_start[1], self.last_start[2], byte)
-            if self.bytes_written >= 2:
-                self.starts[bytes(self.last_start)].add(self.bytes_written - 2)
+        self.ringlength: int = backref or self.RING_LENGTH
+        self.__state: Optional[int] = None
+        self.__python: Optional[Lz77Compress] = None
+        if clib is not None and self.ringlength == self.RING_LENGTH:
+            if level not in {self.LEVEL_FAST, self.LEVEL_MAX}:
+                raise LzException(f"Unknown compression level {level}")
+            self.__state = clib.compressor_create(1 if level == self.LEVEL_MAX else 0)
+        else:
+            self.__python = Lz77Compress(backref=self.ringlength, level=level)
 
-            # Update the rest of the location hashmaps
-            self.locations[byte].add(self.bytes_written)
+        self.__finished: bool = False
 
-            # Keep track of the fact that we wrote this byte.
-            self.bytes_written += 1
+    def __del__(self) -> None:
+        state = getattr(self, "_Lz77Compressor__state", None)
+        if state is not None and clib is not None:
+            clib.compressor_destroy(state)
+            self.__state = None
 
-    def compress_bytes(self) -> Generator[bytes, None, None]:
+    def compress(self, data: Union[bytes, bytearray, memoryview]) -> bytes:
         """
-        Given the current stream, go through and assemble the next flag byte
-        followed by the next chunk of compressed data.
+        Compress the next chunk of raw data.
+
+        Parameters:
+            data - The next chunk of raw binary data.
+
+        Returns:
+            Lz77-compressed binary data for as much of the input as could be compressed so far.
         """
-        while not self.eof:
-            if self.left == 0:
-                # Output a dummy flag and an end of stream marker.
-                self.eof = True
-                yield b"\x00\x00\x00"
-            else:
-                # Need to assemble and return the next chunk, which is a flag
-                # byte and then 8 instructions.
-                flags = 0x0
-                flagpos = -1
-                data: List[bytes] = [b""] * 8
-
-                for _ in range(8):
-                    # Track what flag we're generating data for
-                    flagpos += 1
-
-                    if self.left == 0:
-                        # Output the end of stream marker, set EOF since we've succeeded
-                        # in outputting all flags.
-                        flags |= self.FLAG_BACKREF << flagpos
-                        data[flagpos] = b"\x00\x00"
-                        self.eof = True
-                        break
-                    elif self.left < 3 or self.bytes_written < 3:
-                        # We either don't have enough data written to backref, or we
-                        # don't have enough data in the stream that could be made into
-                        # a backref.
-                        flags |= self.FLAG_COPY << flagpos
-
-                        chunk = self.data[self.read_pos : (self.read_pos + 1)]
-                        data[flagpos] = chunk
-                        self._ring_write(chunk)
-
-                        self.read_pos += 1
-                        self.left -= 1
-                        continue
-
-                    # Figure out the maximum backref we can attempt to find
-                    backref_amount = min(self.left, 18)
-
-                    # Iterate over all spots where the first byte equals, and is in range.
-                    earliest = max(0, self.bytes_written - (self.ringlength - 1))
-                    index = self.data[self.read_pos : (self.read_pos + 3)]
-                    updated_backref_locations: Set[int] = set(
-                        absolute_pos for absolute_pos in self.starts[index] if absolute_pos >= earliest
-                    )
-                    self.starts[index] = updated_backref_locations
-                    possible_backref_locations: List[int] = list(updated_backref_locations)
-
-                    # Output the data as a copy if we couldn't find a backref
-                    if not possible_backref_locations:
-                        flags |= self.FLAG_COPY << flagpos
-
-                        chunk = self.data[self.read_pos : (self.read_pos + 1)]
-                        data[flagpos] = chunk
-                        self._ring_write(chunk)
-
-                        self.read_pos += 1
-                        self.left -= 1
-                        continue
-
-                    # Now, find the longest actual backref of our possibilities. We know
-                    # we're going to write at least these three bytes, so append it to the
-                    # output buffer.
-                    start_write_size = self.bytes_written
-                    self._ring_write(index)
-                    copy_amount = 3
-                    while copy_amount < backref_amount:
-                        # First, let's see if we have any 3-wide chunks to consume.
-                        index = self.data[(self.read_pos + copy_amount) : (self.read_pos + copy_amount + 3)]
-                        locations = self.starts[index]
-                        new_backref_locations: List[int] = [
-                            absolute_pos
-                            for absolute_pos in possible_backref_locations
-                            if absolute_pos + copy_amount in locations
-                        ]
-
-                        if new_backref_locations:
-                            # Mark that we're copying an extra byte from the backref.
-                            self._ring_write(index)
-                            copy_amount += 3
-                            possible_backref_locations = new_backref_locations
-                        else:
-                            # Check our existing locations to figure out if we still have
-                            # longest prefixes of 1 or 2 left.
-                            while copy_amount < backref_amount:
-                                locations = self.locations[self.data[self.read_pos + copy_amount]]
-                                new_backref_locations = [
-                                    absolute_pos
-                                    for absolute_pos in possible_backref_locations
-                                    if absolute_pos + copy_amount in locations
-                                ]
-
-                                # If we have no longest prefixes, that means that any of the
-                                # previous prefixes are good enough.
-                                if not new_backref_locations:
-                                    break
-
-                                # Mark that we're copying an extra byte from the backref.
-                                self._ring_write(
-                                    self.data[(self.read_pos + copy_amount) : (self.read_pos + copy_amount + 1)]
-                                )
-                                copy_amount += 1
-                                possible_backref_locations = new_backref_locations
-
-                            # Either we looped above in the inner while, or we didn't. Either way,
-                            # we don't have any more to check since there were no more 3-long backref
-                            # locations.
-                            break
-
-                    # Now that we have a list of candidates, arbitrarily pick the
-                    # first one as our candidate and output it.
-                    absolute_pos = possible_backref_locations[0]
-                    backref_pos = start_write_size - absolute_pos
-
-                    lo = (copy_amount - 3) & 0xF | ((backref_pos & 0xF) << 4)
-                    hi = (backref_pos >> 4) & 0xFF
-                    flags |= self.FLAG_BACKREF << flagpos
-                    data[flagpos] = bytes([hi, lo])
-                    self.read_pos += copy_amount
-                    self.left -= copy_amount
-
-                yield bytes([flags]) + b"".join(data)
+        if self.__finished:
+            raise LzException("Cannot compress more data after flushing!")
+
+        if self.__python is not None:
+            return self.__python.compress_bytes(bytes(data), False)
+
+        output: List[bytes] = []
+        for chunk in _chunks(data, self.CHUNK_SIZE):
+            keepalive, address = _address(chunk)
+            for offset in range(0, len(chunk), self.CHUNK_SIZE):
+                length = min(self.CHUNK_SIZE, len(chunk) - offset)
+                output.append(self.__feed(address + offset, length, False))
+            del keepalive
+        return b"".join(output)
+
+    def flush(self) -> bytes:
+        """
+        Finish compressing.
+
+        Returns:
+            The rest of the Lz77-compressed binary data, including the end of stream marker.
+        """
+        if self.__finished:
+            raise LzException("Cannot flush a compressor twice!")
+        self.__finished = True
+
+        if self.__python is not None:
+            return self.__python.compress_bytes(b"", True)
+
+        return self.__feed(None, 0, True)
+
+    def __feed(self, address: Optional[int], length: int, final: bool) -> bytes:
+        outlen = clib.compressor_bound(self.__state, length)
+        outbuf = ctypes.create_string_buffer(outlen)
+        result = clib.compressor_feed(self.__state, address, length, 1 if final else 0, outbuf, outlen)
+        if result >= 0:
+            return ctypes.string_at(outbuf, result)
+        elif result == -1:
+            raise LzException("Cannot compress more data after flushing!")
+        elif result == -2:
+            raise LzException("Unexpected lack of backref during compression!")
+        elif result == -3:
+            raise LzException("Not enough room to write output byte!")
+        else:
+            raise LzException("Unknown exception in C++ code!")
 
 
 class Lz77:
@@ -434,44 +643,37 @@ class Lz77:
     A wrapper class encapsulating Lz77 encoding and decoding.
     """
 
-    def __init__(self, backref: Optional[int] = None) -> None:
+    LEVEL_FAST: Final[str] = Lz77Compressor.LEVEL_FAST
+    LEVEL_MAX: Final[str] = Lz77Compressor.LEVEL_MAX
+
+    def __init__(self, backref: Optional[int] = None, level: str = LEVEL_MAX) -> None:
         """
         Initialize the object.
+
+        Parameters:
+            backref - Optional size of the backref ring, defaulting to the standard 4KB.
+            level - Compression level, either LEVEL_FAST or LEVEL_MAX.
         """
         self.backref = backref
+        self.level = level
 
-    def decompress(self, data: bytes) -> bytes:
+    def decompress(self, data: Union[bytes, bytearray, memoryview], size: Optional[int] = None) -> bytes:
         """
         Given a binary blob, return a new binary blob representing the decompressed data.
 
         Parameters:
             data - Lz77-compressed binary data
+            size - Optional expected size of the decompressed data, used to size the output.
 
         Returns:
             Raw binary data.
         """
-        if clib is not None:
-            # Given a maximum backref length of 18, if we had a file that was
-            # only backrefs of maximum size. We would get a compression of around
-            # (18 * 8) / (2 * 8 + 1), or 8.47. So, allocate 9 times in the output
-            # buffer.
-            outbuf = b"\0" * (len(data) * 9)
-            result = clib.decompress(data, len(data), outbuf, len(outbuf))
-            if result >= 0:
-                return outbuf[:result]
-            elif result == -1:
-                raise LzException("Not enough room in output buffer!")
-            elif result == -2:
-                raise LzException("Unexpected EOF during decompression!")
-            elif result == -3:
-                raise LzException("Not enough room to write output byte!")
-            else:
-                raise LzException("Unknown exception in C++ code!")
-        else:
-            lz = Lz77Decompress(data, backref=self.backref)
-            return b"".join(lz.decompress_bytes())
+        lz = Lz77Decompressor(backref=self.backref)
+        data = lz.decompress(data, size)
+        lz.flush()
+        return data
 
-    def compress(self, data: bytes) -> bytes:
+    def compress(self, data: Union[bytes, bytearray, memoryview]) -> bytes:
         """
         Given a binary blob, return a new binary blob representing the compressed data.
 
@@ -481,22 +683,5 @@ class Lz77:
         Returns:
             L7zz-compressed binary data.
         """
-        if clib is not None:
-            # Given a worst case scenario where we end up copying every byte to
-            # the output, compression would actually inflate the file by 9/8 size.
-            # Leave enough room for a trailing EOF reference.
-            outbuf = b"\0" * (int((len(data) * 9) / 8) + 3)
-            result = clib.compress(data, len(data), outbuf, len(outbuf))
-            if result >= 0:
-                return outbuf[:result]
-            elif result == -1:
-                raise LzException("Not enough room in output buffer!")
-            elif result == -2:
-                raise LzException("Unexpected lack of backref during compression!")
-            elif result == -3:
-                raise LzException("Not enough room to write output byte!")
-            else:
-                raise LzException("Unknown exception in C++ code!")
-        else:
-            lz = Lz77Compress(data, backref=self.backref)
-            return b"".join(lz.compress_bytes())
+        lz = Lz77Compressor(backref=self.backref, level=self.level)
+        return lz.compress(data) + lz.flush()
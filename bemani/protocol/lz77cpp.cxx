@@ -1,270 +1,557 @@
 #include <stdio.h>
 #include <stdint.h>
+#include <string.h>
 #include <algorithm>
-#include <unordered_map>
-#include <list>
+#include <vector>
 
 #define FLAG_COPY 1
 #define FLAG_BACKREF 0
 
 #define MAX_BACKREF ((unsigned int)18)
 #define RING_LEN 0x1000
+#define MAX_DISTANCE (RING_LEN - 1)
 
-extern "C"
+// How many bytes past a position we need to see before we know the longest backref we can make there.
+#define LOOKAHEAD MAX_BACKREF
+
+#define HASH_BITS 13
+#define HASH_SIZE (1 << HASH_BITS)
+
+#define LEVEL_FAST 0
+#define LEVEL_MAX 1
+
+// How many candidate matches the fast level checks before settling for the best so far.
+#define FAST_MAX_CHAIN 16
+
+// How many positions the max level plans backrefs for at once.
+#define OPTIMAL_BLOCK 0x4000
+
+// Output cost in bits of a copied byte and a backref, including their flag bit.
+#define COPY_COST 9
+#define BACKREF_COST 17
+
+// How far the start of the compression window can fall behind before we discard old data.
+#define WINDOW_SLACK 0x10000
+
+#define STATUS_EOF 1
+#define STATUS_MID_GROUP 2
+
+namespace
 {
-    int decompress(uint8_t *indata, unsigned int inlen, uint8_t *outdata, unsigned int outlen)
+    struct Decompressor
     {
-        // First, let's assume a worst case compression which in theory is just a copy.
-        // The math is basically 9 bytes used for every 8 bytes. So, the minimum output
-        // buffer we need is (inlen * 8/9). If we have an outlen smaller than that, we
-        // are hosed.
-        if (outlen < ((inlen * 8) / 9))
+        // The last RING_LEN bytes of output, which backrefs copy out of.
+        uint8_t ring[RING_LEN];
+        unsigned int ringpos;
+
+        // Remaining flags in the current flag byte, with a sentinel bit above them.
+        unsigned int flags;
+
+        // The first byte of a backref whose second byte hasn't arrived yet.
+        bool have_hi;
+        uint8_t hi;
+
+        // A backref that didn't fit in the last output buffer.
+        unsigned int copy_len;
+        unsigned int copy_distance;
+
+        bool eof;
+    };
+
+    struct Compressor
+    {
+        // Input data starting at absolute position base, going back at least RING_LEN
+        // bytes before the next byte to compress so that we can search for backrefs.
+        std::vector<uint8_t> window;
+        uint64_t base;
+        uint64_t inloc;
+        uint64_t total;
+
+        // Hash chains of previous positions for each three byte prefix. The head holds the most
+        // recent position for each hash and prev links each position to the one before it with
+        // the same hash. Since we can't backref further than the ring, prev only needs the ring's
+        // worth of positions. Everything before inserted has been added to the chains.
+        int64_t head[HASH_SIZE];
+        int64_t prev[RING_LEN];
+        uint64_t inserted;
+
+        // How many candidates to check for a match, and whether to pick backrefs for a block
+        // at a time so that the block's output is as small as possible instead of always taking
+        // the longest backref available. The rest is scratch space for the latter.
+        unsigned int max_chain;
+        bool optimal;
+        std::vector<uint8_t> lengths;
+        std::vector<uint16_t> distances;
+        std::vector<uint32_t> costs;
+        std::vector<uint8_t> choices;
+
+        // The flag byte and up to 8 chunks that we haven't output yet.
+        uint8_t group[1 + (8 * 2)];
+        unsigned int grouplen;
+        unsigned int flagpos;
+
+        bool eof;
+    };
+
+    // Adds a copied byte or a backref to the current group, writing out the group once it is complete
+    // or we're told to. Returns false if there isn't room in the output for it.
+    inline bool emit(Compressor *state, unsigned int flag, const uint8_t *data, unsigned int length, bool flush, uint8_t *outdata, unsigned int *outloc, unsigned int outlen)
+    {
+        if (state->grouplen == 0)
         {
-            // We cannot decompress, we will run out of room!
-            return -1;
+            // Add a spot for the flag byte, we'll fill this in as we go.
+            state->group[0] = 0;
+            state->grouplen = 1;
+            state->flagpos = 0;
         }
 
-        // Now, let's enter a loop where we read control bytes and act on them.
-        unsigned int inloc = 0;
-        unsigned int outloc = 0;
-        bool eof = false;
-        while (inloc < inlen && !eof)
+        state->group[0] |= (flag << state->flagpos);
+        memcpy(&state->group[state->grouplen], data, length);
+        state->grouplen += length;
+        state->flagpos++;
+
+        if (state->flagpos == 8 || flush)
+        {
+            if (*outloc + state->grouplen > outlen)
+            {
+                // We overwrote our output buffer, we probably corrupted memory somewhere.
+                return false;
+            }
+            memcpy(&outdata[*outloc], state->group, state->grouplen);
+            *outloc += state->grouplen;
+            state->grouplen = 0;
+        }
+        return true;
+    }
+
+    inline bool emit_copy(Compressor *state, uint8_t *outdata, unsigned int *outloc, unsigned int outlen)
+    {
+        uint8_t byte = state->window[state->inloc - state->base];
+        state->inloc++;
+        return emit(state, FLAG_COPY, &byte, 1, false, outdata, outloc, outlen);
+    }
+
+    inline bool emit_backref(Compressor *state, unsigned int distance, unsigned int length, uint8_t *outdata, unsigned int *outloc, unsigned int outlen)
+    {
+        uint8_t backref[2] = {
+            (uint8_t)((distance >> 4) & 0xFF),
+            (uint8_t)(((distance & 0xF) << 4) | ((length - 3) & 0xF)),
+        };
+        state->inloc += length;
+        return emit(state, FLAG_BACKREF, backref, 2, false, outdata, outloc, outlen);
+    }
+
+    inline uint32_t hash_key(const uint8_t *data)
+    {
+        uint32_t key = (data[0] << 16) | (data[1] << 8) | data[2];
+        return (key * 2654435761U) >> (32 - HASH_BITS);
+    }
+
+    // Add every position up to, but not including, the given one to the hash chains.
+    inline void insert_upto(Compressor *state, uint64_t pos)
+    {
+        while (state->inserted < pos && state->inserted + 3 <= state->total)
         {
-            uint8_t flags = indata[inloc++];
-            for (unsigned int flagpos = 0; flagpos < 8; flagpos++)
+            uint32_t hash = hash_key(&state->window[state->inserted - state->base]);
+            state->prev[state->inserted & (RING_LEN - 1)] = state->head[hash];
+            state->head[hash] = (int64_t)state->inserted;
+            state->inserted++;
+        }
+    }
+
+    // Find the longest match of up to amount bytes for the data at pos, preferring the closest
+    // when there's a tie. Returns the length, or 0 if there is no match of at least three bytes.
+    unsigned int find_match(Compressor *state, uint64_t pos, unsigned int amount, unsigned int *distance)
+    {
+        if (amount < 3)
+        {
+            return 0;
+        }
+
+        const uint8_t *current = &state->window[pos - state->base];
+        unsigned int chain = state->max_chain;
+        unsigned int best_length = 0;
+        int64_t candidate = state->head[hash_key(current)];
+
+        while (candidate >= 0 && pos - (uint64_t)candidate <= MAX_DISTANCE)
+        {
+            const uint8_t *possible = &state->window[candidate - state->base];
+
+            // Different prefixes can share a hash, those don't count as a candidate.
+            if (possible[0] == current[0] && possible[1] == current[1] && possible[2] == current[2])
             {
-                if (((flags >> flagpos) & 1) == FLAG_COPY)
+                // We already know that the first three match so we don't need to check those. A match
+                // can run past pos in order to reference data that the backref itself is writing.
+                unsigned int length = 3;
+                while (length < amount && possible[length] == current[length])
                 {
-                    // Copy a byte, move on
-                    if (inloc >= inlen)
-                    {
-                        // We failed to decompress, we overran the input buffer.
-                        return -2;
-                    }
-                    if (outloc >= outlen)
-                    {
-                        // We overwrote our output buffer, we probably corrupted memory somewhere.
-                        return -3;
-                    }
-                    outdata[outloc++] = indata[inloc++];
+                    length++;
                 }
-                else
+
+                if (length > best_length)
                 {
-                    // Backref copy
-                    if (inloc >= (inlen - 1))
+                    best_length = length;
+                    *distance = (unsigned int)(pos - candidate);
+                    if (best_length == amount)
                     {
-                        // We failed to decompress, we overran the input buffer.
-                        return -2;
+                        // We found an ideal length, no need to keep searching.
+                        break;
                     }
+                }
 
-                    unsigned int hi = indata[inloc++];
-                    unsigned int lo = indata[inloc++];
+                if (--chain == 0)
+                {
+                    break;
+                }
+            }
 
-                    unsigned int copy_len = (lo & 0xF) + 3;
-                    unsigned int copy_pos = (hi << 4) | (lo >> 4);
+            candidate = state->prev[candidate & (RING_LEN - 1)];
+        }
 
-                    if (copy_pos == 0)
-                    {
-                        // This is the end of a file.
-                        eof = true;
-                        break;
-                    }
+        return best_length;
+    }
 
-                    // Copy backref a byte at a time. This is because a backref can stick
-                    // out into as-of-yet uncopied data in order to reference what we're
-                    // about to write.
-                    if (outloc + copy_len > outlen)
-                    {
-                        // We overwrote our output buffer, we probably corrupted memory somewhere.
-                        return -3;
-                    }
+    // Compress everything up to block_end, plus however far the last backref runs past it. First
+    // find the longest backref at each position, then work backwards to figure out the cheapest
+    // way to output the rest of the block from each position. A shorter backref is always available
+    // wherever a longer one is, so we only need to consider lengths up to the longest.
+    bool compress_block(Compressor *state, uint64_t block_end, uint8_t *outdata, unsigned int *outloc, unsigned int outlen)
+    {
+        unsigned int count = (unsigned int)(block_end - state->inloc);
 
-                    int backref_start_loc = (int)outloc - (int)copy_pos;
-                    for (int backref_copy_pos = backref_start_loc; backref_copy_pos < backref_start_loc + (int)copy_len; backref_copy_pos++)
-                    {
-                        if (backref_copy_pos < 0)
-                        {
-                            outdata[outloc++] = 0;
-                        }
-                        else
-                        {
-                            outdata[outloc++] = outdata[backref_copy_pos];
-                        }
-                    }
+        for (unsigned int i = 0; i < count; i++)
+        {
+            uint64_t pos = state->inloc + i;
+            unsigned int amount = (unsigned int)std::min(state->total - pos, (uint64_t)MAX_BACKREF);
+            unsigned int distance = 0;
+
+            insert_upto(state, pos);
+            state->lengths[i] = find_match(state, pos, amount, &distance);
+            state->distances[i] = distance;
+        }
+
+        // Anything past the end of the block is the next block's problem.
+        std::fill(state->costs.begin() + count, state->costs.end(), 0);
+        for (unsigned int i = count; i-- > 0;)
+        {
+            uint32_t best_cost = state->costs[i + 1] + COPY_COST;
+            unsigned int best_choice = 0;
+            for (unsigned int length = 3; length <= state->lengths[i]; length++)
+            {
+                uint32_t cost = state->costs[i + length] + BACKREF_COST;
+                if (cost < best_cost)
+                {
+                    best_cost = cost;
+                    best_choice = length;
                 }
             }
+            state->costs[i] = best_cost;
+            state->choices[i] = best_choice;
         }
 
-        // Update the outlen with the actual data length.
-        return outloc;
+        unsigned int i = 0;
+        while (i < count)
+        {
+            unsigned int choice = state->choices[i];
+            if (choice == 0)
+            {
+                if (!emit_copy(state, outdata, outloc, outlen))
+                {
+                    return false;
+                }
+                i++;
+            }
+            else
+            {
+                if (!emit_backref(state, state->distances[i], choice, outdata, outloc, outlen))
+                {
+                    return false;
+                }
+                i += choice;
+            }
+        }
+        return true;
     }
+}
 
-    int compress(uint8_t *indata, unsigned int inlen, uint8_t *outdata, unsigned int outlen)
+extern "C"
+{
+    void *decompressor_create()
     {
-        uint32_t key = 0;
-        std::unordered_map<uint32_t, std::list<unsigned int> > starts;
-        bool eof = false;
-        unsigned int outloc = 0;
+        Decompressor *state = new Decompressor;
+        memset(state->ring, 0, RING_LEN);
+        state->ringpos = 0;
+        state->flags = 1;
+        state->have_hi = false;
+        state->hi = 0;
+        state->copy_len = 0;
+        state->copy_distance = 0;
+        state->eof = false;
+        return state;
+    }
+
+    void decompressor_destroy(void *state)
+    {
+        delete (Decompressor *)state;
+    }
+
+    int decompressor_status(void *statep)
+    {
+        Decompressor *state = (Decompressor *)statep;
+        if (state->eof)
+        {
+            return STATUS_EOF;
+        }
+        if (state->flags != 1 || state->have_hi || state->copy_len > 0)
+        {
+            return STATUS_MID_GROUP;
+        }
+        return 0;
+    }
+
+    int decompressor_feed(void *statep, const uint8_t *indata, unsigned int inlen, unsigned int *consumed, uint8_t *outdata, unsigned int outlen)
+    {
+        // Decompress as much of the input as we can until either we run out of input, we run out
+        // of room in the output or we hit the end of the stream. Returns the number of bytes written
+        // and sets consumed to the amount of input used. Anything that was consumed but didn't fit
+        // in the output is remembered for next time, so call this again with the rest of the input
+        // or an empty input until it writes less than outlen bytes.
+        Decompressor *state = (Decompressor *)statep;
         unsigned int inloc = 0;
+        unsigned int outloc = 0;
 
-        while (!eof)
+        while (!state->eof)
         {
-            if (outloc >= outlen)
+            // Finish copying any backref that didn't fit last time. Copy a byte at a time
+            // because a backref can stick out into as-of-yet uncopied data in order to
+            // reference what we're about to write. Anything written during this call is
+            // read straight out of the output, anything older comes out of the ring.
+            while (state->copy_len > 0 && outloc < outlen)
             {
-                // We overwrote our output buffer, we probably corrupted memory somewhere.
-                return -3;
+                unsigned int distance = state->copy_distance;
+                if (distance <= outloc)
+                {
+                    outdata[outloc] = outdata[outloc - distance];
+                }
+                else
+                {
+                    outdata[outloc] = state->ring[(state->ringpos - (distance - outloc)) & (RING_LEN - 1)];
+                }
+                outloc++;
+                state->copy_len--;
+            }
+            if (state->copy_len > 0)
+            {
+                break;
+            }
+
+            if (state->flags == 1)
+            {
+                // Load the next flag byte.
+                if (inloc >= inlen)
+                {
+                    break;
+                }
+                state->flags = 0x100 | indata[inloc++];
             }
 
-            // Add a spot for the flag byte, we'll fill this in later.
-            unsigned int flagsloc = outloc;
-            outdata[outloc++] = 0;
+            if ((state->flags & 1) == FLAG_COPY)
+            {
+                // Copy a byte, move on
+                if (inloc >= inlen || outloc >= outlen)
+                {
+                    break;
+                }
 
-            for (unsigned int flagpos = 0; flagpos < 8; flagpos++)
+                outdata[outloc++] = indata[inloc++];
+                state->flags >>= 1;
+            }
+            else
             {
-                if (inloc == inlen)
+                // Backref copy, which might be split across two inputs.
+                if (!state->have_hi)
                 {
-                    if (outloc > (outlen - 2))
+                    if (inloc >= inlen)
                     {
-                        // We overwrote our output buffer, we probably corrupted memory somewhere.
-                        return -3;
+                        break;
                     }
+                    state->hi = indata[inloc++];
+                    state->have_hi = true;
+                }
+                if (inloc >= inlen)
+                {
+                    break;
+                }
 
-                    // We hit the end of compressable data and we are mid flag byte.
-                    // Set the particular flag bit to a backref and point at the current
-                    // byte to signify end of file.
-                    outdata[flagsloc] |= (FLAG_BACKREF << flagpos);
-
-                    // Add the backref itself.
-                    outdata[outloc++] = 0;
-                    outdata[outloc++] = 0;
+                unsigned int lo = indata[inloc++];
+                unsigned int copy_pos = (state->hi << 4) | (lo >> 4);
+                state->have_hi = false;
+                state->flags >>= 1;
 
-                    // Bail out of the loop, we're done!
-                    eof = true;
+                if (copy_pos == 0)
+                {
+                    // This is the end of a file.
+                    state->eof = true;
                     break;
                 }
-                else if (inloc < 3 || inloc >= (inlen - 3))
-                {
-                    if (outloc >= outlen)
-                    {
-                        // We overwrote our output buffer, we probably corrupted memory somewhere.
-                        return -3;
-                    }
 
-                    // We either don't have enough data written to backref, or we
-                    // don't have enough data in the stream that could be made into
-                    // a backref. Set the particular flag bit to a copy and then
-                    // output that byte to the compressed stream.
-                    outdata[flagsloc] |= (FLAG_COPY << flagpos);
+                // Positions before the start of the output read as zeros, since the ring starts out zeroed.
+                state->copy_len = (lo & 0xF) + 3;
+                state->copy_distance = copy_pos;
+            }
+        }
 
-                    // Update our key to reflect this byte coming out as long as we aren't
-                    // in the first two bytes (we wouldn't have a 3 byte prefix in the key yet).
-                    key = ((key << 8) | indata[inloc]) & 0xFFFFFF;
-                    if (inloc >= 2)
-                    {
-                        starts[key].push_back(inloc - 2);
-                    }
+        // Remember the tail end of what we wrote so that later backrefs can reach it.
+        unsigned int keep = std::min(outloc, (unsigned int)RING_LEN);
+        for (unsigned int i = outloc - keep; i < outloc; i++)
+        {
+            state->ring[state->ringpos] = outdata[i];
+            state->ringpos = (state->ringpos + 1) & (RING_LEN - 1);
+        }
 
-                    // Output this byte specifically
-                    outdata[outloc++] = indata[inloc++];
-                }
-                else
-                {
-                    // Figure out the maximum backref amount we can reference.
-                    unsigned int backref_amount = std::min(inlen - inloc, MAX_BACKREF);
-                    unsigned int earliest_backref = std::max(0, (int)inloc - (RING_LEN - 1));
-                    uint32_t search_key = (indata[inloc] << 16) | (indata[inloc + 1] << 8) | (indata[inloc + 2]);
+        *consumed = inloc;
+        return outloc;
+    }
 
-                    // Prune anything that we can't backref.
-                    starts[search_key].remove_if([earliest_backref](auto val)
-                    {
-                        return val < earliest_backref;
-                    });
+    void *compressor_create(int level)
+    {
+        Compressor *state = new Compressor;
+        state->base = 0;
+        state->inloc = 0;
+        state->total = 0;
+        state->inserted = 0;
+        std::fill(state->head, state->head + HASH_SIZE, -1);
+        if (level == LEVEL_MAX)
+        {
+            state->max_chain = RING_LEN;
+            state->optimal = true;
+            state->lengths.resize(OPTIMAL_BLOCK);
+            state->distances.resize(OPTIMAL_BLOCK);
+            state->costs.resize(OPTIMAL_BLOCK + MAX_BACKREF + 1);
+            state->choices.resize(OPTIMAL_BLOCK);
+        }
+        else
+        {
+            state->max_chain = FAST_MAX_CHAIN;
+            state->optimal = false;
+        }
+        state->grouplen = 0;
+        state->flagpos = 0;
+        state->eof = false;
+        return state;
+    }
 
-                    if (starts[search_key].size() == 0)
-                    {
-                        if (outloc >= outlen)
-                        {
-                            // We overwrote our output buffer, we probably corrupted memory somewhere.
-                            return -3;
-                        }
+    void compressor_destroy(void *state)
+    {
+        delete (Compressor *)state;
+    }
 
-                        // We couldn't find a previous data in range of a backref.
-                        outdata[flagsloc] |= (FLAG_COPY << flagpos);
+    unsigned int compressor_bound(void *statep, unsigned int inlen)
+    {
+        // The most output that the next call to compressor_feed could write. Given a worst case where
+        // we end up copying every byte we haven't compressed yet, that's 9/8 of the size plus the group
+        // we're holding on to and a trailing EOF reference.
+        Compressor *state = (Compressor *)statep;
+        uint64_t pending = (state->total - state->inloc) + inlen;
+        return (unsigned int)(((pending * 9) + 7) / 8) + sizeof(state->group) + 3;
+    }
 
-                        // Update our key to reflect this byte coming out.
-                        key = ((key << 8) | indata[inloc]) & 0xFFFFFF;
-                        starts[key].push_back(inloc - 2);
+    int compressor_feed(void *statep, const uint8_t *indata, unsigned int inlen, int final, uint8_t *outdata, unsigned int outlen)
+    {
+        // Add the input to the data to be compressed and output every complete flag byte and
+        // its chunks that we can. A byte is only compressed once we have LOOKAHEAD bytes after
+        // it or we know there are no more bytes coming, so that the output is the same no matter
+        // how the input is split up. Call this with final set once all input has been added to
+        // compress the rest and output an end of stream marker. Returns the number of bytes written.
+        Compressor *state = (Compressor *)statep;
+        unsigned int outloc = 0;
 
-                        // Output this byte specifically
-                        outdata[outloc++] = indata[inloc++];
-                    }
-                    else
+        if (state->eof)
+        {
+            // Can't add data after the end of the stream.
+            return inlen > 0 ? -1 : 0;
+        }
+
+        // Throw away data that's too old to backref to, but not every time since we have to move everything.
+        if (state->inloc > state->base + RING_LEN + WINDOW_SLACK)
+        {
+            uint64_t discard = state->inloc - RING_LEN - state->base;
+            state->window.erase(state->window.begin(), state->window.begin() + discard);
+            state->base += discard;
+        }
+        state->window.insert(state->window.end(), indata, indata + inlen);
+        state->total += inlen;
+
+        while (!state->eof)
+        {
+            if (state->inloc == state->total)
+            {
+                if (!final)
+                {
+                    break;
+                }
+
+                // We hit the end of compressable data. Set the particular flag bit to a backref
+                // and point at the current byte to signify end of file.
+                uint8_t backref[2] = {0, 0};
+                if (!emit(state, FLAG_BACKREF, backref, 2, true, outdata, &outloc, outlen))
+                {
+                    return -3;
+                }
+                state->eof = true;
+            }
+            else if (state->optimal)
+            {
+                // Blocks always start where the last one left off and are a fixed size unless we run out
+                // of data, so that the output doesn't depend on how the input was split up.
+                uint64_t block_end = state->inloc + OPTIMAL_BLOCK;
+                if (state->total < block_end + LOOKAHEAD)
+                {
+                    if (!final)
                     {
-                        int best_backref = -1;
-                        unsigned int best_length = 1;
-
-                        for (auto possible_backref = starts[search_key].begin(); possible_backref != starts[search_key].end(); possible_backref++)
-                        {
-                            // If the current best length isn't a match on this chunk, then we shouldn't even consider it
-                            // since the other chunk is already a better match.
-                            if (indata[(*possible_backref) + (best_length - 1)] != indata[inloc + (best_length - 1)])
-                            {
-                                continue;
-                            }
-
-                            // We already know that the first three match so we don't need to check those;
-                            unsigned int current_length;
-                            for (current_length = 3; current_length < backref_amount; current_length++)
-                            {
-                                if (indata[(*possible_backref) + current_length] != indata[inloc + current_length])
-                                {
-                                    // This value doesn't match, so the current length is the longest prefix
-                                    // for this possible backref.
-                                    break;
-                                }
-                            }
-
-                            // We found a better match
-                            if (best_length < current_length)
-                            {
-                                best_length = current_length;
-                                best_backref = (inloc - *possible_backref) & 0xFFF;
-                            }
-                            else if (best_length == backref_amount)
-                            {
-                                // We found an ideal length, no need to keep searching.
-                                break;
-                            }
-                        }
-
-                        if (best_backref <= 0)
-                        {
-                            // Double check, since we know we should have found a backref.
-                            return -2;
-                        }
-
-                        if (outloc > (outlen - 2))
-                        {
-                            // We overwrote our output buffer, we probably corrupted memory somewhere.
-                            return -3;
-                        }
-
-                        // We got a valid backref, so let's record it as well as the start positions
-                        // for each of the bytes we compressed.
-                        outdata[flagsloc] |= (FLAG_BACKREF << flagpos);
-
-                        // Add the backref itself.
-                        outdata[outloc++] = (best_backref >> 4) & 0xFF;
-                        outdata[outloc++] = ((best_backref & 0xF) << 4) | ((best_length - 3) & 0xF);
-
-                        // Record the keys for each byte;
-                        for (unsigned int i = 0; i < best_length; i++)
-                        {
-                            key = ((key << 8) | indata[inloc]) & 0xFFFFFF;
-                            starts[key].push_back(inloc - 2);
-                            inloc++;
-                        }
+                        break;
                     }
+                    block_end = std::min(block_end, state->total);
+                }
+
+                if (!compress_block(state, block_end, outdata, &outloc, outlen))
+                {
+                    return -3;
+                }
+            }
+            else
+            {
+                if (!final && state->total - state->inloc < LOOKAHEAD)
+                {
+                    // We don't know how long of a backref we could make here yet.
+                    break;
+                }
+
+                // Figure out the maximum backref amount we can reference, and take the longest
+                // backref we can find if there is one.
+                uint64_t inloc = state->inloc;
+                unsigned int backref_amount = (unsigned int)std::min(state->total - inloc, (uint64_t)MAX_BACKREF);
+                unsigned int distance = 0;
+
+                // Positions right before the end of the data couldn't be hashed until we had more of it.
+                insert_upto(state, inloc);
+                unsigned int length = find_match(state, inloc, backref_amount, &distance);
+
+                bool success;
+                if (length == 0)
+                {
+                    // We either don't have enough data in the stream that could be made into a backref
+                    // or we couldn't find a previous data in range of a backref. Set the particular flag
+                    // bit to a copy and then output that byte to the compressed stream.
+                    success = emit_copy(state, outdata, &outloc, outlen);
+                }
+                else
+                {
+                    success = emit_backref(state, distance, length, outdata, &outloc, outlen);
+                }
+                if (!success)
+                {
+                    return -3;
                 }
             }
         }
@@ -1,6 +1,5 @@
-import copy
 import struct
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Set, Union
 from typing_extensions import Final
 
 # Hack to get around mypy's lack of scoping on types.
@@ -20,8 +19,27 @@ class Node:
     string attributes, and either a value or zero or more children. Note that it is possible and
     supported for a node to not have a value or children. This also includes a decent amount of
     constructor helper classmethods to make constructing a tree from source code easier.
+
+    Responses can contain tens of thousands of nodes, so nodes are kept as small as possible.
+    Attributes, children and encoding caches are only allocated once something is stored in them.
     """
 
+    __slots__ = (
+        "__name",
+        "__array",
+        "__translated_type",
+        "__type",
+        "__attrs",
+        "__value",
+        "__children",
+        "__index",
+        "__frozen",
+        "__fragments",
+    )
+
+    # Nodes with at least this many children build an index to look children up by name.
+    INDEX_THRESHOLD: Final[int] = 16
+
     NODE_NAME_CHARS: Final[str] = "0123456789:ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
 
     NODE_TYPE_VOID: Final[int] = 1
@@ -358,25 +376,59 @@ class Node:
     END_OF_NODE: Final[int] = 0xFE
     END_OF_DOCUMENT: Final[int] = 0xFF
 
+    # Names that have already been validated, since handlers use the same few names over and over.
+    __valid_names: Set[str] = set()
+
+    @staticmethod
+    def __make(name: str, type: int, array: _renamed_bool, value: Any) -> "Node":
+        """
+        Construct a node from handler code without going through the setters, given a value
+        already in the form set_value would store it in. The helpers below validate their
+        values themselves, so there is no need to check everything a second time.
+        """
+        if name not in Node.__valid_names:
+            Node.__validate_name(name)
+
+        node = Node.__new__(Node)
+        node.__name = name
+        node.__array = array
+        node.__translated_type = Node.NODE_TYPES[type]
+        node.__type = (type | Node.ARRAY_BIT) if array else type
+        node.__attrs = None
+        node.__value = value
+        node.__children = None
+        node.__index = None
+        node.__frozen = False
+        node.__fragments = None
+        return node
+
+    @staticmethod
+    def __bool_to_str(value: Any) -> str:
+        if value is True:
+            return "true"
+        if value is False:
+            return "false"
+        return "true" if value != 0 else "false"
+
     @staticmethod
     def void(name: str) -> "Node":
-        return Node(name=name, type=Node.NODE_TYPE_VOID)
+        return Node.__make(name, Node.NODE_TYPE_VOID, False, None)
 
     @staticmethod
     def string(name: str, value: str) -> "Node":
-        return Node(name=name, type=Node.NODE_TYPE_STR, value=value)
+        return Node.__make(name, Node.NODE_TYPE_STR, False, value)
 
     @staticmethod
     def binary(name: str, value: bytes) -> "Node":
-        return Node(name=name, type=Node.NODE_TYPE_BIN, value=value)
+        return Node.__make(name, Node.NODE_TYPE_BIN, False, value)
 
     @staticmethod
     def float(name: str, value: _renamed_float) -> "Node":
-        return Node(name=name, type=Node.NODE_TYPE_FLOAT, value=value)
+        return Node.__make(name, Node.NODE_TYPE_FLOAT, False, str(value))
 
     @staticmethod
     def bool(name: str, value: _renamed_bool) -> "Node":
-        return Node(name=name, type=Node.NODE_TYPE_BOOL, value=value)
+        return Node.__make(name, Node.NODE_TYPE_BOOL, False, Node.__bool_to_str(value))
 
     @staticmethod
     def ipv4(name: str, value: str) -> "Node":
@@ -384,113 +436,115 @@ class Node:
 
     @staticmethod
     def time(name: str, value: int) -> "Node":
-        return Node(name=name, type=Node.NODE_TYPE_TIME, value=value)
+        return Node.__make(name, Node.NODE_TYPE_TIME, False, str(value))
 
     @staticmethod
     def u8(name: str, value: int) -> "Node":
         Node.__validate(Node.NODE_TYPE_U8, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_U8, value=value)
+        return Node.__make(name, Node.NODE_TYPE_U8, False, str(value))
 
     @staticmethod
     def s8(name: str, value: int) -> "Node":
         Node.__validate(Node.NODE_TYPE_S8, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_S8, value=value)
+        return Node.__make(name, Node.NODE_TYPE_S8, False, str(value))
 
     @staticmethod
     def u16(name: str, value: int) -> "Node":
         Node.__validate(Node.NODE_TYPE_U16, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_U16, value=value)
+        return Node.__make(name, Node.NODE_TYPE_U16, False, str(value))
 
     @staticmethod
     def s16(name: str, value: int) -> "Node":
         Node.__validate(Node.NODE_TYPE_S16, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_S16, value=value)
+        return Node.__make(name, Node.NODE_TYPE_S16, False, str(value))
 
     @staticmethod
     def u32(name: str, value: int) -> "Node":
         Node.__validate(Node.NODE_TYPE_U32, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_U32, value=value)
+        return Node.__make(name, Node.NODE_TYPE_U32, False, str(value))
 
     @staticmethod
     def s32(name: str, value: int) -> "Node":
         Node.__validate(Node.NODE_TYPE_S32, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_S32, value=value)
+        return Node.__make(name, Node.NODE_TYPE_S32, False, str(value))
 
     @staticmethod
     def u64(name: str, value: int) -> "Node":
         Node.__validate(Node.NODE_TYPE_U64, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_U64, value=value)
+        return Node.__make(name, Node.NODE_TYPE_U64, False, str(value))
 
     @staticmethod
     def s64(name: str, value: int) -> "Node":
         Node.__validate(Node.NODE_TYPE_S64, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_S64, value=value)
+        return Node.__make(name, Node.NODE_TYPE_S64, False, str(value))
 
     @staticmethod
     def time_array(name: str, values: List[int]) -> "Node":
-        return Node(name=name, type=Node.NODE_TYPE_TIME, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_TIME, True, [str(v) for v in values])
 
     @staticmethod
     def float_array(name: str, values: List[_renamed_float]) -> "Node":
-        return Node(name=name, type=Node.NODE_TYPE_FLOAT, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_FLOAT, True, [str(v) for v in values])
 
     @staticmethod
     def bool_array(name: str, values: List[_renamed_bool]) -> "Node":
-        return Node(name=name, type=Node.NODE_TYPE_BOOL, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_BOOL, True, [Node.__bool_to_str(v) for v in values])
 
     @staticmethod
     def u8_array(name: str, values: List[int]) -> "Node":
         for value in values:
             Node.__validate(Node.NODE_TYPE_U8, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_U8, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_U8, True, [str(v) for v in values])
 
     @staticmethod
     def s8_array(name: str, values: List[int]) -> "Node":
         for value in values:
             Node.__validate(Node.NODE_TYPE_S8, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_S8, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_S8, True, [str(v) for v in values])
 
     @staticmethod
     def u16_array(name: str, values: List[int]) -> "Node":
         for value in values:
             Node.__validate(Node.NODE_TYPE_U16, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_U16, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_U16, True, [str(v) for v in values])
 
     @staticmethod
     def s16_array(name: str, values: List[int]) -> "Node":
         for value in values:
             Node.__validate(Node.NODE_TYPE_S16, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_S16, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_S16, True, [str(v) for v in values])
 
     @staticmethod
     def u32_array(name: str, values: List[int]) -> "Node":
         for value in values:
             Node.__validate(Node.NODE_TYPE_U32, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_U32, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_U32, True, [str(v) for v in values])
 
     @staticmethod
     def s32_array(name: str, values: List[int]) -> "Node":
         for value in values:
             Node.__validate(Node.NODE_TYPE_S32, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_S32, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_S32, True, [str(v) for v in values])
 
     @staticmethod
     def u64_array(name: str, values: List[int]) -> "Node":
         for value in values:
             Node.__validate(Node.NODE_TYPE_U64, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_U64, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_U64, True, [str(v) for v in values])
 
     @staticmethod
     def s64_array(name: str, values: List[int]) -> "Node":
         for value in values:
             Node.__validate(Node.NODE_TYPE_S64, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_S64, array=True, value=values)
+        return Node.__make(name, Node.NODE_TYPE_S64, True, [str(v) for v in values])
 
     @staticmethod
     def fouru8(name: str, values: List[int]) -> "Node":
+        if len(values) != 4:
+            raise NodeException("Input array for 4u8 expected to be 4 elements!")
         for value in values:
             Node.__validate(Node.NODE_TYPE_U8, name, value)
-        return Node(name=name, type=Node.NODE_TYPE_4U8, value=values)
+        return Node.__make(name, Node.NODE_TYPE_4U8, False, [str(v) for v in values])
 
     @staticmethod
     def typename_to_type(typename: str) -> Optional[int]:
@@ -563,9 +617,12 @@ class Node:
         self.__array = False
         self.__translated_type: Optional[Dict[str, Any]] = None
         self.__type: Optional[int] = None
-        self.__attrs: Dict[str, str] = {}
+        self.__attrs: Optional[Dict[str, str]] = None
         self.__value: Any = None
-        self.__children: List[Node] = []
+        self.__children: Optional[List[Node]] = None
+        self.__index: Optional[Dict[str, Node]] = None
+        self.__frozen = False
+        self.__fragments: Optional[Dict[Any, Any]] = None
 
         if name is not None:
             self.set_name(name)
@@ -574,6 +631,62 @@ class Node:
         if value is not None:
             self.set_value(value)
 
+    def __check_mutable(self) -> None:
+        if self.__frozen:
+            raise NodeException(f"Cannot modify frozen node {self.__name}")
+
+    def freeze(self) -> "Node":
+        """
+        Mark this node and all of its children as never changing again. Encoders cache
+        the encoded form of frozen nodes, so a frozen subtree can be shared between any
+        number of trees and is only encoded once per encoding.
+
+        Returns:
+            This node, for convenience.
+        """
+        for child in self.__children or []:
+            child.freeze()
+        self.__frozen = True
+        return self
+
+    @property
+    def frozen(self) -> _renamed_bool:
+        """
+        Returns whether this node has been frozen.
+
+        Returns:
+            True if this node can no longer be modified, False otherwise.
+        """
+        return self.__frozen
+
+    def fragment(self, key: Any) -> Optional[Any]:
+        """
+        Look up a previously cached encoded form of this frozen node.
+
+        Parameters:
+            key - A hashable value identifying the encoding.
+
+        Returns:
+            Whatever the encoder cached, or None if nothing was cached.
+        """
+        if self.__fragments is None:
+            return None
+        return self.__fragments.get(key)
+
+    def set_fragment(self, key: Any, fragment: Any) -> None:
+        """
+        Cache an encoded form of this node. Only frozen nodes cache anything, since
+        any other node could change after being encoded.
+
+        Parameters:
+            key - A hashable value identifying the encoding.
+            fragment - The encoded form of this node.
+        """
+        if self.__frozen:
+            if self.__fragments is None:
+                self.__fragments = {}
+            self.__fragments[key] = fragment
+
     def set_name(self, name: str) -> None:
         """
         Set the name of the node to a new string.
@@ -582,12 +695,23 @@ class Node:
             name - A string specifying the node name. Should be made up of only
                 NODE_NAME_CHARS characters.
         """
+        self.__check_mutable()
+        if name not in Node.__valid_names:
+            Node.__validate_name(name)
+
+        self.__name = name
+
+    @staticmethod
+    def __validate_name(name: str) -> None:
         # Ensure it isn't a violation
         for char in name:
             if char not in Node.NODE_NAME_CHARS:
                 raise NodeException(f"Invalid node name {name}")
 
-        self.__name = name
+        # Handler code uses a bounded set of names, but decoded packets could contain
+        # anything, so don't let the cache grow without bound.
+        if len(Node.__valid_names) < 65536:
+            Node.__valid_names.add(name)
 
     @property
     def name(self) -> str:
@@ -610,6 +734,7 @@ class Node:
             array - A boolean specifying whether this node is an array or not. If not provided
                     this function will extract the array bit from the provided type integer.
         """
+        self.__check_mutable()
         if array is not None:
             if array:
                 type = type | Node.ARRAY_BIT
@@ -686,6 +811,9 @@ class Node:
             val - The string value to set the attribute value to. Defaults to empty string if
                   not provided.
         """
+        self.__check_mutable()
+        if self.__attrs is None:
+            self.__attrs = {}
         self.__attrs[attr] = val
 
     def attribute(self, attr: str, default: Optional[str] = None) -> Optional[str]:
@@ -698,6 +826,8 @@ class Node:
         Returns:
             The attribute value as a string.
         """
+        if self.__attrs is None:
+            return default
         return self.__attrs.get(attr, default)
 
     def add_child(self, child: "Node") -> None:
@@ -707,10 +837,15 @@ class Node:
         Parameters:
             child - A Node to set as a child to this node.
         """
+        self.__check_mutable()
         if not isinstance(child, Node):
             raise NodeException("Invalid child")
 
+        if self.__children is None:
+            self.__children = []
         self.__children.append(child)
+        if self.__index is not None:
+            self.__index.setdefault(child.name, child)
 
     def child(self, name: str) -> Optional["Node"]:
         """
@@ -724,15 +859,32 @@ class Node:
         Returns:
             A Node if a child was found by name, or None if not.
         """
-        tree = name.split("/", 1)
-        for child in self.__children:
-            if child.name == tree[0]:
-                if len(tree) == 1:
-                    # We don't have any more nodes to traverse.
-                    return child
-                else:
-                    # We have more nodes, try to get the next.
-                    return child.child(tree[1])
+        if "/" in name:
+            # We have more nodes, try to get the next.
+            name, rest = name.split("/", 1)
+            child = self.child(name)
+            if child is None:
+                return None
+            return child.child(rest)
+
+        children = self.__children
+        if children is None:
+            return None
+
+        if self.__index is None and len(children) >= Node.INDEX_THRESHOLD:
+            # Nodes with lots of children tend to get lots of lookups, so index them by name.
+            # Renaming a node after adding it as a child isn't supported by this index.
+            index: Dict[str, Node] = {}
+            for child in children:
+                index.setdefault(child.__name, child)
+            self.__index = index
+
+        if self.__index is not None:
+            return self.__index.get(name)
+
+        for child in children:
+            if child.__name == name:
+                return child
 
         # There was no child by this name, return None.
         return None
@@ -762,6 +914,11 @@ class Node:
         Returns:
             A list of Node instances which are children of this Node.
         """
+        if self.__children is None:
+            # Callers are allowed to modify this in place, so it has to be the real thing.
+            self.__children = []
+        # For the same reason, the name index can't be trusted after this.
+        self.__index = None
         return self.__children
 
     @property
@@ -772,6 +929,9 @@ class Node:
         Returns:
             A dictionary keyed by attribute name whose values are strings.
         """
+        if self.__attrs is None:
+            # Callers are allowed to modify this in place, so it has to be the real thing.
+            self.__attrs = {}
         return self.__attrs
 
     @property
@@ -805,6 +965,7 @@ class Node:
         Paramters:
             val - A mixed value to set the node to.
         """
+        self.__check_mutable()
         is_array = isinstance(val, (list, tuple))
 
         if self.__translated_type is None:
@@ -908,7 +1069,7 @@ class Node:
             raise Exception("Logic error, tried to get XML representation before setting type!")
         translated_type: Dict[str, Any] = self.__translated_type
 
-        attrs_dict = copy.deepcopy(self.__attrs)
+        attrs_dict = dict(self.__attrs or {})
         order = sorted(attrs_dict.keys())
         if self.data_length != 0:
             # Represent type and length
@@ -1027,19 +1188,10 @@ class Node:
                     if self.__value[i] != other.__value[i]:
                         return False
 
-            for attr in self.__attrs:
-                if other.attribute(attr) != self.attribute(attr):
-                    return False
-            for attr in other.__attrs:
-                if self.attribute(attr) != other.attribute(attr):
-                    return False
-
-            if len(self.__children) != len(other.__children):
+            if self.attributes != other.attributes:
+                return False
+            if self.children != other.children:
                 return False
-
-            for i in range(len(self.__children)):
-                if self.__children[i] != other.__children[i]:
-                    return False
 
             return True
         except Exception:
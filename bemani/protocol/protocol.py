@@ -1,6 +1,7 @@
 import binascii
 import hashlib
-from typing import Optional
+import time
+from typing import Dict, List, Optional
 from typing_extensions import Final
 
 from bemani.protocol.lz77 import Lz77
@@ -34,6 +35,9 @@ class EAmuseProtocol:
     UTF_8: Final[str] = "utf-8"
     ASCII: Final[str] = "ascii"
 
+    DECODE_STAGES: Final[List[str]] = ["decrypt", "decompress", "decode"]
+    ENCODE_STAGES: Final[List[str]] = ["encode", "compress", "encrypt"]
+
     def __init__(self) -> None:
         """
         Initialize the object.
@@ -41,6 +45,10 @@ class EAmuseProtocol:
         self.last_text_encoding: Optional[str] = None
         self.last_packet_encoding: Optional[int] = None
 
+        # Seconds spent in each stage of the last decode and encode, keyed by the
+        # names in DECODE_STAGES and ENCODE_STAGES.
+        self.timings: Dict[str, float] = {}
+
     def _rc4_crypt(self, data: bytes, key: bytes) -> bytes:
         """
         Given a data blob and a key blob, perform RC4 encryption/decryption.
@@ -158,8 +166,9 @@ class EAmuseProtocol:
             # This isn't compressed
             return data
         elif compression == "lz77":
-            # This is a compressed new-style packet
-            lz = Lz77()
+            # This is a compressed new-style packet. We compress every response we
+            # send, so favor speed over squeezing out the last few bytes.
+            lz = Lz77(level=Lz77.LEVEL_FAST)
             return lz.compress(data)
         else:
             raise EAmuseException(f"Unknown compression {compression}")
@@ -243,9 +252,21 @@ class EAmuseProtocol:
         Returns:
             A Node tree structure representing the parsed request, or None on failure.
         """
+        start = time.perf_counter()
         data = self.__decrypt(encryption, data)
+        decrypted = time.perf_counter()
         data = self.__decompress(compression, data)
-        return self.__decode(data)
+        decompressed = time.perf_counter()
+        tree = self.__decode(data)
+        decoded = time.perf_counter()
+
+        # A new request starts a new set of timings.
+        self.timings = {
+            "decrypt": decrypted - start,
+            "decompress": decompressed - decrypted,
+            "decode": decoded - decompressed,
+        }
+        return tree
 
     def encode(
         self,
@@ -287,6 +308,19 @@ class EAmuseProtocol:
         self.last_text_encoding = None
         self.last_packet_encoding = None
 
+        start = time.perf_counter()
         data = self.__encode(tree, text_encoding, packet_encoding)
+        encoded = time.perf_counter()
         data = self.__compress(compression, data)
-        return self.__encrypt(encryption, data)
+        compressed = time.perf_counter()
+        data = self.__encrypt(encryption, data)
+        encrypted = time.perf_counter()
+
+        self.timings.update(
+            {
+                "encode": encoded - start,
+                "compress": compressed - encoded,
+                "encrypt": encrypted - compressed,
+            }
+        )
+        return data
@@ -140,6 +140,7 @@ class OutputStream:
         """
         self.__data.append(blob)
         self.__data_len += len(blob)
+        self.__formatted_data = None
         return len(blob)
 
     def write_byte(self, byte: bytes) -> None:
@@ -1,7 +1,8 @@
 import copy
 import struct
-from typing import Any, Dict, Iterator, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from typing_extensions import Final
+from xml.parsers import expat
 
 from bemani.protocol.stream import InputStream
 from bemani.protocol.node import Node
@@ -13,12 +14,23 @@ class XmlEncodingException(Exception):
     """
 
 
+class _FallbackException(Exception):
+    """
+    An exception thrown when the expat parser finds something that it would interpret
+    differently from the games, so that we can use the fallback parser instead.
+    """
+
+
 class XmlDecoder:
     """
-    A hand-rolled XML parser, suitable for parsing old-style XML documents in
-    game data or from legacy game traffic. I did consider using lxml and other
-    data stores, but they insist on mangling data inside binary/string blobs
-    making them unsuitable for a protocol with exact specifications.
+    An XML parser, suitable for parsing old-style XML documents in game data or
+    from legacy game traffic. Documents are parsed in a single pass by expat, which
+    we ask to treat the document as latin-1 so that it hands us back the exact bytes
+    of every string blob to decode in the document's real encoding. Expat is strict
+    where games are not, so anything it rejects or would interpret differently from
+    the games is parsed by a hand-rolled fallback instead. I did consider using lxml
+    and other data stores, but they insist on mangling data inside binary/string
+    blobs making them unsuitable for a protocol with exact specifications.
     """
 
     def __init__(self, data: bytes, encoding: str) -> None:
@@ -34,7 +46,15 @@ class XmlDecoder:
         self.current: List[Node] = []
         self.encoding = encoding
 
-    def __start_element(self, tag: bytes, attributes: Dict[str, str]) -> None:
+        # State for the expat parser, the text seen since the last tag and whether that
+        # tag was an open tag, as well as the data expat is working on.
+        self.__default_encoding = encoding
+        self.__pending: List[str] = []
+        self.__opened = False
+        self.__data = b""
+        self.__parser: Optional[Any] = None
+
+    def __start_element(self, tag: str, attributes: Dict[str, str]) -> None:
         """
         Called when we encounter an element open tag. Also called when we encounter
         an empty element. Creates a new node with the specified name and attributes.
@@ -55,14 +75,14 @@ class XmlDecoder:
 
         if data_type is None:
             # Special case for nodes that don't have a type
-            node = Node(name=tag.decode("ascii"), type=Node.NODE_TYPE_VOID)
+            node = Node(name=tag, type=Node.NODE_TYPE_VOID)
         else:
             # Get the data value
             type_int = Node.typename_to_type(data_type)
             if type_int is None:
-                raise XmlEncodingException(f'Invalid node type {data_type} for node {tag.decode("ascii")}')
+                raise XmlEncodingException(f"Invalid node type {data_type} for node {tag}")
 
-            node = Node(name=tag.decode("ascii"), type=type_int, array=array)
+            node = Node(name=tag, type=type_int, array=array)
 
         # Now, do the attributes
         for attr in attributes:
@@ -74,7 +94,7 @@ class XmlDecoder:
 
         self.current.append(node)
 
-    def __end_element(self, tag: bytes) -> None:
+    def __end_element(self, tag: str) -> None:
         """
         Called when we encounter an element close tag. Also called when we encounter an empty element,
         after __start_element is called. Does bookkeeping related to element order.
@@ -84,8 +104,8 @@ class XmlDecoder:
         """
         node = self.current.pop()
 
-        if node.name != tag.decode("ascii"):
-            raise Exception(f'Logic error, expected {tag.decode("ascii")} but got {node.name}')
+        if node.name != tag:
+            raise Exception(f"Logic error, expected {tag} but got {node.name}")
 
         if len(self.current) == 0:
             self.root = node
@@ -93,20 +113,6 @@ class XmlDecoder:
             parent = self.current[-1]
             parent.add_child(node)
 
-    def __yield_values(self, text: str) -> Iterator[str]:
-        value = ""
-
-        for c in text:
-            if c.isspace():
-                if len(value) > 0:
-                    yield value
-                    value = ""
-            else:
-                value = value + c
-
-        if len(value) > 0:
-            yield value
-
     def __text(self, text: bytes) -> None:
         """
         Called when we finish parsing arbitrary non-element text. Note that the text passed in is in
@@ -120,6 +126,22 @@ class XmlDecoder:
         except UnicodeDecodeError:
             raise XmlEncodingException("Failed to decode text node with given encoding")
 
+        if len(self.current) > 0 and self.current[-1].data_type == "str":
+            # Ampersands go last so that we don't unescape anything twice.
+            value = value.replace("&lt;", "<")
+            value = value.replace("&gt;", ">")
+            value = value.replace("&apos;", "'")
+            value = value.replace("&quot;", '"')
+            value = value.replace("&amp;", "&")
+        self.__set_text(value)
+
+    def __set_text(self, value: str) -> None:
+        """
+        Set the value of the current node from its text, converting it to the node's type.
+
+        Parameters:
+            value - Decoded and unescaped string text value of the node.
+        """
         if len(self.current) > 0:
             data_type = self.current[-1].data_type
             composite = self.current[-1].is_composite
@@ -131,32 +153,24 @@ class XmlDecoder:
 
             if data_type == "str":
                 # Do nothing, already fine
-                value = value.replace("&amp;", "&")
-                value = value.replace("&lt;", "<")
-                value = value.replace("&gt;", ">")
-                value = value.replace("&apos;", "'")
-                value = value.replace("&quot;", '"')
                 if self.current[-1].value is None:
                     self.current[-1].set_value(value)
                 else:
                     self.current[-1].set_value(self.current[-1].value + value)
             elif data_type == "bin":
-                # Convert from a hex string
-                def hex_to_bin(hexval: str) -> bytes:
-                    intval = int(hexval, 16)
-                    return struct.pack(">B", intval)
-
-                # Remove any spaces first
-                value = "".join([c for c in value if not c.isspace()])
-                if self.current[-1].value is None:
-                    self.current[-1].set_value(
-                        b"".join([hex_to_bin(value[i : (i + 2)]) for i in range(0, len(value), 2)])
+                # Convert from a hex string, removing any spaces first
+                value = "".join(value.split())
+                try:
+                    binvalue = bytes.fromhex(value)
+                except ValueError:
+                    # Odd lengths and other oddities, convert the way we always have.
+                    binvalue = b"".join(
+                        [struct.pack(">B", int(value[i : (i + 2)], 16)) for i in range(0, len(value), 2)]
                     )
+                if self.current[-1].value is None:
+                    self.current[-1].set_value(binvalue)
                 else:
-                    self.current[-1].set_value(
-                        self.current[-1].value
-                        + b"".join([hex_to_bin(value[i : (i + 2)]) for i in range(0, len(value), 2)])
-                    )
+                    self.current[-1].set_value(self.current[-1].value + binvalue)
             elif data_type == "ip4":
                 # Do nothing, already fine
                 self.current[-1].set_value(value)
@@ -169,17 +183,17 @@ class XmlDecoder:
                         return True
 
                 if array or composite:
-                    self.current[-1].set_value([conv_bool(v) for v in self.__yield_values(value)])
+                    self.current[-1].set_value([conv_bool(v) for v in value.split()])
                 else:
                     self.current[-1].set_value(conv_bool(value))
             elif data_type == "float":
                 if array or composite:
-                    self.current[-1].set_value([float(v) for v in self.__yield_values(value)])
+                    self.current[-1].set_value(list(map(float, value.split())))
                 else:
                     self.current[-1].set_value(float(value))
             else:
                 if array or composite:
-                    self.current[-1].set_value([int(v) for v in self.__yield_values(value)])
+                    self.current[-1].set_value(list(map(int, value.split())))
                 else:
                     self.current[-1].set_value(int(value))
 
@@ -200,13 +214,13 @@ class XmlDecoder:
 
         def unescape(value: bytes) -> str:
             val = value.decode(self.encoding)
-            val = val.replace("&amp;", "&")
             val = val.replace("&lt;", "<")
             val = val.replace("&gt;", ">")
             val = val.replace("&apos;", "'")
             val = val.replace("&quot;", '"')
             val = val.replace("&#13;", "\r")
-            return val.replace("&#10;", "\n")
+            val = val.replace("&#10;", "\n")
+            return val.replace("&amp;", "&")
 
         while True:
             c = attr_stream.read_byte()
@@ -289,7 +303,7 @@ class XmlDecoder:
 
         if content[:1] == b"/":
             # We got an element end
-            self.__end_element(content[1:])
+            self.__end_element(content[1:].decode("ascii"))
         else:
             # We got a start element
             if content[-1:] == b"/":
@@ -301,13 +315,102 @@ class XmlDecoder:
                 empty = False
 
             tag, attributes = self.__split_node(content)
-            self.__start_element(tag, self.__parse_attributes(attributes))
+            self.__start_element(tag.decode("ascii"), self.__parse_attributes(attributes))
             if empty:
-                self.__end_element(tag)
+                self.__end_element(tag.decode("ascii"))
+
+    def __expat_xml_decl(self, version: Optional[str], encoding: Optional[str], standalone: int) -> None:
+        if encoding is not None:
+            self.encoding = encoding
+
+    def __expat_flush_text(self) -> None:
+        # Text between two tags belongs to whatever element is open, same as the fallback.
+        if self.current:
+            try:
+                value = "".join(self.__pending).encode("latin-1").decode(self.encoding)
+            except UnicodeDecodeError:
+                raise XmlEncodingException("Failed to decode text node with given encoding")
+            self.__set_text(value)
+        self.__pending = []
+
+    def __expat_start_element(self, tag: str, attributes: Dict[str, str]) -> None:
+        self.__expat_flush_text()
+
+        # Expat gave us latin-1, so every non-ascii character is really a byte.
+        if not tag.isascii():
+            tag = tag.encode("latin-1").decode("ascii")
+
+        decoded: Dict[str, str] = {}
+        respace = False
+        for attr, val in attributes.items():
+            if not attr.isascii():
+                attr = attr.encode("latin-1").decode("ascii")
+            if ">" in val:
+                # Games consider this the end of the tag.
+                raise _FallbackException()
+            if not val.isascii():
+                val = val.encode("latin-1").decode(self.encoding)
+            if " " in val:
+                respace = True
+            decoded[attr] = val
+
+        if respace and self.__parser is not None:
+            # Expat turns tabs and newlines inside attribute values into spaces, but we want
+            # them as-is. This should be rare, so only bother when it might have happened.
+            start = self.__parser.CurrentByteIndex
+            content = self.__data[(start + 1) : self.__data.find(b">", start)]
+            if b"\t" in content or b"\n" in content:
+                decoded = self.__parse_attributes(self.__split_node(content.rstrip(b"/"))[1])
+
+        self.__start_element(tag, decoded)
+        self.__opened = True
+
+    def __expat_end_element(self, tag: str) -> None:
+        # A self-closing element never had any text, not even an empty string.
+        selfclosing = False
+        if self.__opened and not self.__pending and self.__parser is not None:
+            end = self.__parser.CurrentByteIndex
+            selfclosing = self.__data[(end - 2) : end] == b"/>"
+        if not selfclosing:
+            self.__expat_flush_text()
+
+        self.__end_element(self.current[-1].name)
+        self.__opened = False
+
+    def __expat_text(self, text: str) -> None:
+        if self.current:
+            self.__pending.append(text)
+
+    def __get_tree_expat(self, data: bytes) -> Optional[Node]:
+        """
+        Parse the XML document with expat.
 
-    def get_tree(self) -> Optional[Node]:
+        Returns:
+            A Node object representing the root of the XML document.
         """
-        Walk the XML document and parse into nodes.
+        if b"\r" in data:
+            # Expat would turn carriage returns into newlines, so smuggle them past it.
+            data = data.replace(b"\r", b"&#13;")
+
+        parser = expat.ParserCreate("iso-8859-1")
+        parser.buffer_text = True
+        parser.XmlDeclHandler = self.__expat_xml_decl
+        parser.StartElementHandler = self.__expat_start_element
+        parser.EndElementHandler = self.__expat_end_element
+        parser.CharacterDataHandler = self.__expat_text
+
+        self.__data = data
+        self.__parser = parser
+        try:
+            parser.Parse(data, True)
+        finally:
+            self.__data = b""
+            self.__parser = None
+        return self.root
+
+    def __get_tree_fallback(self) -> Optional[Node]:
+        """
+        Walk the XML document and parse into nodes by hand.
 
         Returns:
             A Node object representing the root of the XML document.
@@ -336,6 +439,30 @@ class XmlDecoder:
                 else:
                     node = node + c
 
+    def get_tree(self) -> Optional[Node]:
+        """
+        Walk the XML document and parse into nodes.
+
+        Returns:
+            A Node object representing the root of the XML document.
+        """
+        data = self.stream.data
+
+        # Character references, comments, CDATA and DTDs mean different things to
+        # expat than they do to games, so leave those documents to the fallback.
+        if b"&#" not in data and b"<!" not in data:
+            try:
+                return self.__get_tree_expat(data)
+            except (expat.ExpatError, _FallbackException):
+                # Not well-formed, start over with the forgiving parser.
+                self.root = None
+                self.current = []
+                self.encoding = self.__default_encoding
+                self.__pending = []
+                self.__opened = False
+
+        return self.__get_tree_fallback()
+
 
 class XmlEncoder:
     def __init__(self, tree: Node, encoding: str) -> None:
@@ -366,6 +493,18 @@ class XmlEncoder:
         Returns:
             Bytes representing the XML-like data for this node and all children.
         """
+        if not node.frozen:
+            return self.__to_xml(node)
+
+        # Frozen nodes never change, so we only need to encode them once.
+        key = ("xml", self.encoding)
+        string = node.fragment(key)
+        if string is None:
+            string = self.__to_xml(node)
+            node.set_fragment(key, string)
+        return string
+
+    def __to_xml(self, node: Node) -> bytes:
         attrs_dict = copy.deepcopy(node.attributes)
         order = sorted(attrs_dict.keys())
         if node.data_length != 0:
@@ -413,7 +552,11 @@ class XmlEncoder:
 
         if node.children:
             # Has children nodes
-            children = [self.to_xml(child) for child in node.children]
+            # Children of a frozen node are part of its cached encoding already.
+            if node.frozen:
+                children = [self.__to_xml(child) for child in node.children]
+            else:
+                children = [self.to_xml(child) for child in node.children]
             string = b"".join(
                 [
                     b"<",
@@ -1,6 +1,10 @@
-from bemani.sniff.sniff import Sniffer
+from bemani.sniff.pcap import InvalidCaptureException, PcapReader
+from bemani.sniff.sniff import EndOfCaptureException, Sniffer
 
 
 __all__ = [
+    "EndOfCaptureException",
+    "InvalidCaptureException",
+    "PcapReader",
     "Sniffer",
 ]
@@ -0,0 +1,137 @@
+import struct
+from typing import BinaryIO, Iterator, List, Tuple
+from typing_extensions import Final
+
+
+class InvalidCaptureException(Exception):
+    """
+    Exception thrown when a capture file is not a pcap or pcapng file, or is corrupt.
+    """
+
+
+class PcapReader:
+    """
+    A minimal reader for the pcap and pcapng capture formats as written by tcpdump and Wireshark.
+    Only extracts the link type and raw bytes of each captured frame, which is all the sniffer
+    needs to parse them the same way it parses frames off of a live socket.
+    """
+
+    # Link types we know how to find an IP header in.
+    LINKTYPE_ETHERNET: Final[int] = 1
+    LINKTYPE_RAW: Final[int] = 101
+    LINKTYPE_LINUX_SLL: Final[int] = 113
+
+    # Magic numbers, as read in little-endian byte order.
+    PCAP_MAGIC_MICROSECONDS: Final[int] = 0xA1B2C3D4
+    PCAP_MAGIC_NANOSECONDS: Final[int] = 0xA1B23C4D
+    PCAPNG_SECTION_HEADER: Final[int] = 0x0A0D0D0A
+    PCAPNG_BYTE_ORDER_MAGIC: Final[int] = 0x1A2B3C4D
+
+    # pcapng block types that carry interface descriptions and frames.
+    PCAPNG_INTERFACE_DESCRIPTION: Final[int] = 0x00000001
+    PCAPNG_SIMPLE_PACKET: Final[int] = 0x00000003
+    PCAPNG_ENHANCED_PACKET: Final[int] = 0x00000006
+
+    def __init__(self, fp: BinaryIO) -> None:
+        """
+        Initialize the reader.
+
+        Parameters:
+            fp - A file opened in binary mode, positioned at the start of the capture.
+        """
+        self.fp = fp
+
+    def __read(self, length: int) -> bytes:
+        data = self.fp.read(length)
+        if len(data) != length:
+            raise InvalidCaptureException("Capture file is truncated!")
+        return data
+
+    def frames(self) -> Iterator[Tuple[int, bytes]]:
+        """
+        Iterate over every frame in the capture.
+
+        Returns:
+            An iterator of tuples of the integer link type of the frame and the raw bytes
+            captured for it, in the order they appear in the file.
+        """
+        magic = self.fp.read(4)
+        if len(magic) != 4:
+            raise InvalidCaptureException("Capture file is empty!")
+
+        if struct.unpack("<I", magic)[0] == PcapReader.PCAPNG_SECTION_HEADER:
+            yield from self.__pcapng_frames(magic)
+        else:
+            yield from self.__pcap_frames(magic)
+
+    def __pcap_frames(self, magic: bytes) -> Iterator[Tuple[int, bytes]]:
+        for endian in ["<", ">"]:
+            if struct.unpack(f"{endian}I", magic)[0] in {
+                PcapReader.PCAP_MAGIC_MICROSECONDS,
+                PcapReader.PCAP_MAGIC_NANOSECONDS,
+            }:
+                break
+        else:
+            raise InvalidCaptureException("Capture file is not a pcap or pcapng file!")
+
+        _, _, _, _, _, linktype = struct.unpack(f"{endian}HHiIII", self.__read(20))
+
+        while True:
+            header = self.fp.read(16)
+            if len(header) == 0:
+                return
+            if len(header) != 16:
+                raise InvalidCaptureException("Capture file is truncated!")
+            _, _, captured, _ = struct.unpack(f"{endian}IIII", header)
+            yield linktype & 0xFFFF, self.__read(captured)
+
+    def __pcapng_frames(self, magic: bytes) -> Iterator[Tuple[int, bytes]]:
+        endian = "<"
+        linktypes: List[int] = []
+
+        while True:
+            # We already read the block type of the first section header to identify the file.
+            blocktype = magic if magic else self.fp.read(4)
+            magic = b""
+            if len(blocktype) == 0:
+                return
+            if len(blocktype) != 4:
+                raise InvalidCaptureException("Capture file is truncated!")
+            rawlength = self.__read(4)
+
+            if struct.unpack("<I", blocktype)[0] == PcapReader.PCAPNG_SECTION_HEADER:
+                # Every section can have a different byte order and starts its own interfaces.
+                byteorder = self.__read(4)
+                if struct.unpack("<I", byteorder)[0] == PcapReader.PCAPNG_BYTE_ORDER_MAGIC:
+                    endian = "<"
+                elif struct.unpack(">I", byteorder)[0] == PcapReader.PCAPNG_BYTE_ORDER_MAGIC:
+                    endian = ">"
+                else:
+                    raise InvalidCaptureException("Capture file has an invalid section header!")
+                linktypes = []
+                length = struct.unpack(f"{endian}I", rawlength)[0]
+                if length < 28:
+                    raise InvalidCaptureException("Capture file has an invalid section header!")
+                body = byteorder + self.__read(length - 12)
+            else:
+                length = struct.unpack(f"{endian}I", rawlength)[0]
+                if length < 12:
+                    raise InvalidCaptureException("Capture file has an invalid block!")
+                body = self.__read(length - 8)
+
+            # The body ends with a second copy of the block length.
+            body = body[:-4]
+            blocktype_id = struct.unpack(f"{endian}I", blocktype)[0]
+
+            if blocktype_id == PcapReader.PCAPNG_INTERFACE_DESCRIPTION:
+                linktypes.append(struct.unpack(f"{endian}H", body[0:2])[0])
+            elif blocktype_id == PcapReader.PCAPNG_ENHANCED_PACKET:
+                interface, _, _, captured, _ = struct.unpack(f"{endian}IIIII", body[0:20])
+                if interface >= len(linktypes):
+                    raise InvalidCaptureException(f"Packet references unknown interface {interface}!")
+                yield linktypes[interface], body[20 : (20 + captured)]
+            elif blocktype_id == PcapReader.PCAPNG_SIMPLE_PACKET:
+                if not linktypes:
+                    raise InvalidCaptureException("Packet references unknown interface 0!")
+                (original,) = struct.unpack(f"{endian}I", body[0:4])
+                yield linktypes[0], body[4 : (4 + original)]
@@ -1,8 +1,10 @@
 import socket
 import struct
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
 from typing_extensions import Final
 
+from bemani.sniff.pcap import PcapReader
+
 
 class InvalidPacketException(Exception):
     """
@@ -18,6 +20,12 @@ class UnknownPacketException(Exception):
     """
 
 
+class EndOfCaptureException(Exception):
+    """
+    Exception thrown when a sniffer reading from a capture file has run out of packets.
+    """
+
+
 class TCPStream:
     """
     A very rudimentary TCP stream reassembler. Assumes well-formed TCP streams with a
@@ -40,6 +48,14 @@ class TCPStream:
 
         self.packets = [(TCPStream.INBOUND, packet)]
 
+    @property
+    def key(self) -> Tuple[str, int, str, int]:
+        """
+        The source address, source port, destination address and destination port of this
+        stream, as seen from the side that opened it.
+        """
+        return (self.source_address, self.source_port, self.destination_address, self.destination_port)
+
     def add_packet(self, packet: Dict[str, Any]) -> bool:
         """
         Add a packet that potentially belongs to this stream. Expects a packet dictionary as
@@ -194,16 +210,17 @@ class TCPStream:
 
 class Sniffer:
     """
-    A generic python sniffer. Listens to all raw traffic on the machine and parses packets
-    down to TCP chunks to be reassembled.
+    A generic python sniffer. Listens to all raw traffic on the machine, or reads it out of a
+    pcap or pcapng capture file, and parses packets down to TCP chunks to be reassembled.
     """
 
     RECEIVE_SIZE: Final[int] = 1048576
     ETH_HEADER_LENGTH: Final[int] = 14
+    SLL_HEADER_LENGTH: Final[int] = 16
     IP_HEADER_LENGTH: Final[int] = 20
     TCP_HEADER_LENGTH: Final[int] = 20
 
-    def __init__(self, address: Optional[str] = None, port: Optional[int] = None) -> None:
+    def __init__(self, address: Optional[str] = None, port: Optional[int] = None, pcap: Optional[str] = None) -> None:
         """
         Initialize the sniffer. Can be told to filter by address, port or both. If address or
         port is not provided, it defaults to all addresses or ports.
@@ -211,16 +228,33 @@ class Sniffer:
         Parameters:
             address - A string representing an IPv4 address to filter on.
             port - An integer representing a port to filter on.
+            pcap - A path to a pcap or pcapng file to read packets from instead of sniffing
+                   live traffic. Once every packet has been read, the file is closed and
+                   EndOfCaptureException is raised.
         """
         self.address = address
         self.port = port
-        self.streams: List[TCPStream] = []
+        self.streams: Dict[Tuple[str, int, str, int], TCPStream] = {}
+
+        self.__capture: Optional[BinaryIO] = None
+        self.__frames: Optional[Iterator[Tuple[int, bytes]]] = None
+        if pcap is not None:
+            self.__capture = open(pcap, "rb")
+            self.__frames = PcapReader(self.__capture).frames()
+        else:
+            self.sock = socket.socket(
+                socket.AF_PACKET,
+                socket.SOCK_RAW,
+                socket.ntohs(0x0003),
+            )
 
-        self.sock = socket.socket(
-            socket.AF_PACKET,
-            socket.SOCK_RAW,
-            socket.ntohs(0x0003),
-        )
+    def close(self) -> None:
+        """
+        Close the capture file being read from, if any. This happens on its own once the
+        end of the capture is reached.
+        """
+        if self.__capture is not None:
+            self.__capture.close()
 
     def __process_ethframe(self, eth_header: bytes) -> Dict[str, Any]:
         """
@@ -370,29 +404,54 @@ class Sniffer:
 
     def __recv_frame(self) -> Dict[str, Any]:
         """
-        Grab a packet from the kernel, parse it and return a dictionary representing the parsed
-        packet.
+        Grab a packet from the kernel or the capture file, parse it and return a dictionary
+        representing the parsed packet.
 
         Returns:
             Dictionary:
                 - ip_header - A dictionary defined by Sniffer.__process_ipframe()
                 - tcp_header - A dictionary defined by Sniffer.__process_tcipframe()
                 - data - Raw bytes representing payload of this packet
-                - address - A dictionary defined by Sniffer.__process_address()
+                - address - A dictionary defined by Sniffer.__process_address(), or None
+                            when reading from a capture file
         """
         # Grab a packet
-        packets = self.sock.recvfrom(Sniffer.RECEIVE_SIZE)
-        address = self.__process_address(packets[1])
-        packet = packets[0]
+        address: Optional[Dict[str, int]] = None
+        if self.__frames is not None:
+            try:
+                linktype, packet = next(self.__frames)
+            except StopIteration:
+                self.close()
+                raise EndOfCaptureException("Reached the end of the capture file")
+            except Exception:
+                # Nothing more can be read out of a broken capture either.
+                self.close()
+                raise
+        else:
+            packets = self.sock.recvfrom(Sniffer.RECEIVE_SIZE)
+            address = self.__process_address(packets[1])
+            linktype = PcapReader.LINKTYPE_ETHERNET
+            packet = packets[0]
         offset = 0
 
         # Make sure its a valid packet
-        eth_header = self.__process_ethframe(packet[offset : (offset + Sniffer.ETH_HEADER_LENGTH)])
-        offset = offset + eth_header["header_length"]
-
-        if eth_header["protocol"] != 8:
-            # Not IP
-            raise UnknownPacketException(f'Unknown frame {eth_header["protocol"]}')
+        if linktype == PcapReader.LINKTYPE_ETHERNET:
+            eth_header = self.__process_ethframe(packet[offset : (offset + Sniffer.ETH_HEADER_LENGTH)])
+            offset = offset + eth_header["header_length"]
+
+            if eth_header["protocol"] != 8:
+                # Not IP
+                raise UnknownPacketException(f'Unknown frame {eth_header["protocol"]}')
+        elif linktype == PcapReader.LINKTYPE_LINUX_SLL:
+            # Captures on the "any" interface, the protocol is the last field of the header.
+            protocol = struct.unpack("!H", packet[(offset + 14) : (offset + Sniffer.SLL_HEADER_LENGTH)])[0]
+            offset = offset + Sniffer.SLL_HEADER_LENGTH
+
+            if protocol != 0x0800:
+                # Not IP
+                raise UnknownPacketException(f"Unknown frame {protocol}")
+        elif linktype != PcapReader.LINKTYPE_RAW:
+            raise UnknownPacketException(f"Unknown link type {linktype}")
 
         # Get the IP header
         ip_header = self.__process_ipframe(packet[offset : (offset + Sniffer.IP_HEADER_LENGTH)])
@@ -435,7 +494,11 @@ class Sniffer:
                 continue
 
             # Hack for sniffing on localhost
-            if packet["address"]["interface"] == "lo" and packet["address"]["type"] != 4:
+            if (
+                packet["address"] is not None
+                and packet["address"]["interface"] == "lo"
+                and packet["address"]["type"] != 4
+            ):
                 continue
 
             if self.address and self.port:
@@ -472,24 +535,27 @@ class Sniffer:
             Dictionary defined by TCPStream.reassemble()
         """
         while True:
-            # Try to reassemble and return a stream
-            for i in range(len(self.streams)):
-                tcp = self.streams[i].reassemble()
-
-                if tcp:
-                    del self.streams[i]
-                    return tcp
-
             # Receive the next packet
             packet = self.recv_raw()
 
-            # Add to the correct stream
-            new = True
-            for stream in self.streams:
-                if stream.add_packet(packet):
-                    new = False
-                    break
+            # Find the stream this belongs to, in either direction.
+            key = (
+                packet["ip_header"]["source_address"],
+                packet["tcp_header"]["source_port"],
+                packet["ip_header"]["destination_address"],
+                packet["tcp_header"]["destination_port"],
+            )
+            stream = self.streams.get(key) or self.streams.get((key[2], key[3], key[0], key[1]))
 
-            # See if this is a new TCP stream
-            if new:
-                self.streams.append(TCPStream(packet))
+            if stream is None:
+                # This is a new TCP stream
+                self.streams[key] = TCPStream(packet)
+                continue
+            stream.add_packet(packet)
+
+            # A stream can only be finished by the packet that was just added to it, so
+            # there is no need to check any of the others.
+            tcp = stream.reassemble()
+            if tcp:
+                del self.streams[stream.key]
+                return tcp
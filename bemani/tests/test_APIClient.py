@@ -1,10 +1,82 @@
 # vim: set fileencoding=utf-8
+import json
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, Set
+from contextlib import contextmanager
+from freezegun import freeze_time
 
+from bemani.api.app import jsonify_response
+from bemani.common import APIConstants, GameConstants, VersionConstants, Parallel, Time, cache
 from bemani.data.api.client import APIClient
+from bemani.utils.services import render_remote_metrics
+
+
+class _StandInAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), _StandInAPIHandler)
+        self.delay = delay
+        self.connections: Set[int] = set()
+        self.generation = 0
+
+    @property
+    def uri(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+
+class _StandInAPIHandler(BaseHTTPRequestHandler):
+    server: _StandInAPIServer
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.server.connections.add(self.client_address[1])
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.server.delay)
+
+        # Respond exactly as the real API server's endpoints do.
+        if "objects" in request:
+            self.server.generation += 1
+            response = jsonify_response({obj: [{"generation": self.server.generation}] for obj in request["objects"]})
+        else:
+            response = jsonify_response({"versions": ["v1"], "name": "Stand-In", "email": "nobody@nowhere.com"})
+        body = response.get_data()
+        self.send_response(response.status_code)
+        self.send_header("Content-Type", response.headers["Content-Type"])
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@contextmanager
+def _stand_in_server(delay: float = 0.0) -> Iterator[_StandInAPIServer]:
+    server = _StandInAPIServer(delay)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
 
 
 class TestAPIClient(unittest.TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def wait_for_refresh(self) -> None:
+        for _ in range(100):
+            if not any(t.name == "APIClient refresh" for t in threading.enumerate()):
+                return
+            time.sleep(0.05)
+
     def test_content_type(self) -> None:
         client = APIClient("https://127.0.0.1", "token", False, False)
         self.assertFalse(client._content_type_valid("application/text"))
@@ -18,3 +90,116 @@ class TestAPIClient(unittest.TestCase):
         self.assertTrue(client._content_type_valid("application/json;charset=UTF-8"))
         self.assertTrue(client._content_type_valid("application/json;charset = UTF-8"))
         self.assertTrue(client._content_type_valid("application/json; charset = UTF-8"))
+
+    def test_connection_reuse(self) -> None:
+        with _stand_in_server() as server:
+            client = APIClient(server.uri, "token", False, False)
+            for _ in range(5):
+                self.assertEqual(client.get_server_info()["name"], "Stand-In")
+
+            # A second client to the same server should share the same connection pool.
+            client = APIClient(server.uri, "token", False, False)
+            self.assertEqual(client.get_server_info()["name"], "Stand-In")
+            self.assertEqual(len(server.connections), 1)
+
+            stats = APIClient.get_statistics_by_server()[server.uri]
+            self.assertEqual(stats["requests"], 6)
+            self.assertEqual(stats["errors"], 0)
+
+    def test_slow_server_deadline(self) -> None:
+        with _stand_in_server() as fast, _stand_in_server(delay=2.0) as slow:
+            clients = [
+                APIClient(fast.uri, "token", False, False),
+                APIClient(slow.uri, "token", False, False),
+            ]
+
+            start = time.time()
+            results = Parallel.call_with_deadline(
+                [client.get_server_info for client in clients],
+                deadline=0.5,
+                default=None,
+            )
+            self.assertLess(time.time() - start, 1.5)
+            self.assertEqual(results[0]["name"], "Stand-In")
+            self.assertIsNone(results[1])
+
+    def test_dead_server_statistics(self) -> None:
+        # Grab a port that nothing is listening on.
+        with _stand_in_server() as server:
+            uri = server.uri
+
+        client = APIClient(uri, "token", False, False)
+        with self.assertRaises(Exception):
+            client.get_server_info()
+        stats = APIClient.get_statistics_by_server()[uri]
+        self.assertEqual(stats["requests"], 1)
+        self.assertEqual(stats["errors"], 1)
+
+        # Operators see the same counters on the services /metrics endpoint.
+        rendered = render_remote_metrics().splitlines()
+        self.assertIn(f'bemani_remote_requests_total{{server="{uri}"}} 1.0', rendered)
+        self.assertIn(f'bemani_remote_errors_total{{server="{uri}"}} 1.0', rendered)
+
+    def test_stale_while_revalidate(self) -> None:
+        with _stand_in_server() as server, freeze_time("2022-01-01 00:00:00") as frozen:
+            client = APIClient(server.uri, "token", True, True)
+
+            def records() -> int:
+                return client.get_records(
+                    GameConstants.IIDX,
+                    VersionConstants.IIDX_PENDUAL,
+                    APIConstants.ID_TYPE_SERVER,
+                    [],
+                )[0]["generation"]
+
+            # First request has to wait, the next is served from the cache.
+            self.assertEqual(records(), 1)
+            self.assertEqual(records(), 1)
+            self.assertEqual(server.generation, 1)
+
+            # Once stale, we get the old value immediately while it refreshes.
+            frozen.tick(120)
+            self.assertEqual(records(), 1)
+            self.wait_for_refresh()
+            self.assertEqual(server.generation, 2)
+            self.assertEqual(records(), 2)
+
+            # Warming refreshes regardless of staleness, and remembers what was asked for.
+            self.assertEqual(APIClient.get_hot_versions(), [(GameConstants.IIDX, VersionConstants.IIDX_PENDUAL)])
+            client.warm(GameConstants.IIDX, VersionConstants.IIDX_PENDUAL)
+            self.assertEqual(records(), 3)
+
+    def test_hot_versions(self) -> None:
+        # Marks are throttled per process, so stay well clear of the times other tests use.
+        with freeze_time("2021-01-01 00:00:00") as frozen:
+            APIClient.mark_hot(GameConstants.IIDX, VersionConstants.IIDX_PENDUAL)
+            APIClient.mark_hot(GameConstants.DDR, VersionConstants.DDR_ACE)
+            self.assertEqual(
+                APIClient.get_hot_versions(),
+                [(GameConstants.IIDX, VersionConstants.IIDX_PENDUAL), (GameConstants.DDR, VersionConstants.DDR_ACE)],
+            )
+
+            # Simulate another process racing us and dropping our addition to the index. We
+            # put ourselves back the next time we mark the version.
+            cache.set("APIClient.hot", [f"{GameConstants.DDR.value}:{VersionConstants.DDR_ACE}"])
+            frozen.tick(Time.SECONDS_IN_MINUTE + 1)
+            APIClient.mark_hot(GameConstants.IIDX, VersionConstants.IIDX_PENDUAL)
+            self.assertEqual(
+                APIClient.get_hot_versions(),
+                [(GameConstants.DDR, VersionConstants.DDR_ACE), (GameConstants.IIDX, VersionConstants.IIDX_PENDUAL)],
+            )
+
+            # Refreshing one version leaves the other to expire on its own.
+            frozen.tick(APIClient.HOT_TIMEOUT - Time.SECONDS_IN_MINUTE)
+            self.assertEqual(APIClient.get_hot_versions(), [(GameConstants.IIDX, VersionConstants.IIDX_PENDUAL)])
+
+    def test_down_server(self) -> None:
+        with _stand_in_server() as server:
+            uri = server.uri
+
+        client = APIClient(uri, "token", True, True)
+        self.assertEqual(client.get_statistics(GameConstants.IIDX, VersionConstants.IIDX_SPADA, APIConstants.ID_TYPE_SONG, ["1000"]), [])
+        self.assertEqual(client.get_records(GameConstants.IIDX, VersionConstants.IIDX_SPADA, APIConstants.ID_TYPE_SONG, ["1000"]), [])
+
+        # We shouldn't have bothered trying a second time.
+        self.assertEqual(APIClient.get_statistics_by_server()[uri]["requests"], 1)
@@ -1,8 +1,13 @@
 # vim: set fileencoding=utf-8
+import json
+import os
+import tempfile
 import unittest
+from typing import Optional
 from unittest.mock import Mock
 
-from bemani.data.mysql.base import BaseData
+from bemani.data import QueryBudgetException
+from bemani.data.mysql.base import BaseData, QueryStats
 
 
 class TestBaseData(unittest.TestCase):
@@ -46,3 +51,73 @@ class TestBaseData(unittest.TestCase):
         }
 
         self.assertEqual(data.deserialize(data.serialize(testdict)), testdict)
+
+    def __config(self, slow_query_threshold: float = 0.0, slow_query_log: Optional[str] = None) -> Mock:
+        config = Mock()
+        config.database.read_only = False
+        config.database.slow_query_threshold = slow_query_threshold
+        config.database.slow_query_log = slow_query_log
+        return config
+
+    def test_query_stats(self) -> None:
+        config = self.__config()
+        stats = QueryStats()
+        first = BaseData(config, Mock(), stats)
+        second = BaseData(config, Mock(), stats)
+
+        first.execute("SELECT 1")
+        second.execute("SELECT 2")
+        self.assertEqual(stats.count, 2)
+        self.assertGreaterEqual(stats.seconds, 0.0)
+
+        stats.reset()
+        self.assertEqual(stats.count, 0)
+        self.assertEqual(stats.seconds, 0.0)
+
+    def test_fingerprint(self) -> None:
+        self.assertEqual(
+            BaseData.fingerprint("SELECT id FROM session\n    WHERE session = :session AND type = 'user' AND id > 15"),
+            "SELECT id FROM session WHERE session = :session AND type = ? AND id > ?",
+        )
+        self.assertEqual(
+            BaseData.fingerprint("INSERT INTO audit (timestamp, userid) VALUES (:ts0, :uid0), (:ts1, :uid1)"),
+            BaseData.fingerprint("INSERT INTO audit (timestamp, userid) VALUES (:ts0, :uid0)"),
+        )
+        self.assertEqual(
+            BaseData.fingerprint("SELECT * FROM score WHERE musicid IN (1, 2, 3) AND userid IN :userids"),
+            "SELECT * FROM score WHERE musicid IN (...) AND userid IN :userids",
+        )
+
+    def test_slow_query_log(self) -> None:
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, "slow.log")
+            conn = Mock()
+            conn.execute.return_value.rowcount = 3
+            stats = QueryStats()
+            stats.context = "LDJ 29 IIDX29pc.get"
+            data = BaseData(self.__config(0.000001, filename), conn, stats)
+
+            data.execute("SELECT * FROM score WHERE userid = 5")
+            with open(filename) as fp:
+                entries = [json.loads(line) for line in fp]
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(entries[0]["fingerprint"], "SELECT * FROM score WHERE userid = ?")
+            self.assertEqual(entries[0]["rows"], 3)
+            self.assertEqual(entries[0]["handler"], "LDJ 29 IIDX29pc.get")
+            self.assertIn("test_BaseData.py", entries[0]["caller"])
+
+    def test_query_budget(self) -> None:
+        stats = QueryStats()
+        stats.budget = 2
+        data = BaseData(self.__config(), Mock(), stats)
+
+        # Going over the budget only warns unless we're strict about it.
+        for _ in range(3):
+            data.execute("SELECT 1")
+
+        stats.reset()
+        stats.strict_budget = True
+        data.execute("SELECT 1")
+        data.execute("SELECT 1")
+        with self.assertRaises(QueryBudgetException):
+            data.execute("SELECT 1")
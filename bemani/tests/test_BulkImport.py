@@ -0,0 +1,139 @@
+# vim: set fileencoding=utf-8
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from typing import Any, List, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.sql import text
+
+from bemani.common import GameConstants
+from bemani.data import Config
+from bemani.utils.read import ImportBase
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self) -> None:
+        handle, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        engine = create_engine(f"sqlite:///{self.path}")
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "CREATE TABLE music (id INTEGER NOT NULL, songid INTEGER NOT NULL, chart INTEGER NOT NULL, "
+                    + "game VARCHAR(32) NOT NULL, version INTEGER NOT NULL, name VARCHAR(255), artist VARCHAR(255), "
+                    + "genre VARCHAR(255), data TEXT, UNIQUE (songid, chart, game, version))"
+                )
+            )
+            conn.execute(
+                text(
+                    "CREATE TABLE catalog (game VARCHAR(32) NOT NULL, version INTEGER NOT NULL, id INTEGER NOT NULL, "
+                    + "type VARCHAR(64) NOT NULL, data TEXT NOT NULL, UNIQUE (game, version, id, type))"
+                )
+            )
+            conn.execute(
+                text(
+                    "INSERT INTO music (id, songid, chart, game, version, name, artist, genre, data) VALUES "
+                    + "(1, 100, 0, 'pnm', 21, 'Old', 'Artist', 'Genre', '{}'), "
+                    + "(2, 101, 0, 'pnm', 22, 'Existing', 'Artist', 'Genre', '{}'), "
+                    + "(7, 500, 0, 'iidx', 25, 'Other', 'Artist', 'Genre', '{}')"
+                )
+            )
+            conn.execute(text("INSERT INTO catalog (game, version, id, type, data) VALUES ('pnm', 22, 1, 'item', '{}')"))
+        engine.dispose()
+
+    def tearDown(self) -> None:
+        os.unlink(self.path)
+
+    def __importer(self, update: bool = False) -> ImportBase:
+        return ImportBase(
+            Config({"database": {"engine": create_engine(f"sqlite:///{self.path}")}}),
+            GameConstants.POPN_MUSIC,
+            22,
+            False,
+            update,
+        )
+
+    def __music(self) -> List[Tuple[Any, ...]]:
+        engine = create_engine(f"sqlite:///{self.path}")
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT id, songid, chart, version, name FROM music ORDER BY id, version"))
+            music = [tuple(row) for row in rows]
+        engine.dispose()
+        return music
+
+    def __import(self, importer: ImportBase) -> None:
+        importer.start_batch()
+        old_id = importer.get_music_id_for_song(100, 0)
+        self.assertEqual(old_id, 1)
+        importer.insert_music_id_for_song(1, 100, 0, "Revived", "Artist", "Genre")
+
+        self.assertIsNone(importer.get_music_id_for_song(102, 0))
+        self.assertEqual(importer.get_next_music_id(), 8)
+        importer.insert_music_id_for_song(8, 102, 0, "New", "Artist", "Genre")
+        self.assertEqual(importer.get_next_music_id(), 9)
+        self.assertEqual(importer.get_music_id_for_song(102, 0, version=22), 8)
+
+        importer.insert_music_id_for_song(9, 101, 0, "Changed", "Artist", "Genre")
+        importer.insert_catalog_entry("item", 1, {"changed": True})
+        importer.insert_catalog_entry("item", 2)
+        importer.finish_batch()
+
+    def test_bulk(self) -> None:
+        importer = self.__importer()
+        importer.use_bulk()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.__import(importer)
+
+            # Nothing is written until the importer is closed.
+            self.assertEqual(len(self.__music()), 3)
+            importer.close()
+
+        self.assertEqual(
+            self.__music(),
+            [
+                (1, 100, 0, 21, "Old"),
+                (1, 100, 0, 22, "Revived"),
+                (2, 101, 0, 22, "Existing"),
+                (7, 500, 0, 25, "Other"),
+                (8, 102, 0, 22, "New"),
+            ],
+        )
+
+    def test_bulk_update(self) -> None:
+        importer = self.__importer(update=True)
+        importer.use_bulk()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.__import(importer)
+            importer.start_batch()
+            importer.update_metadata_for_song(102, 0, "Renamed")
+            importer.finish_batch()
+            importer.close()
+
+        self.assertEqual(
+            self.__music(),
+            [
+                (1, 100, 0, 21, "Old"),
+                (1, 100, 0, 22, "Revived"),
+                (2, 101, 0, 22, "Changed"),
+                (7, 500, 0, 25, "Other"),
+                (8, 102, 0, 22, "Renamed"),
+            ],
+        )
+
+    def test_dry_run(self) -> None:
+        importer = self.__importer(update=True)
+        importer.use_bulk(dry_run=True)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.__import(importer)
+            importer.close()
+
+        self.assertEqual(len(self.__music()), 3)
+        lines = output.getvalue().splitlines()
+        self.assertIn("Would update name, artist, genre for song 101 chart 0 version 22", lines)
+        self.assertIn("Would insert music ID 8 for Artist New (song 102 chart 0 version 22)", lines)
+        self.assertIn("Would update catalog entry item 1", lines)
+        self.assertIn("Would insert catalog entry item 2", lines)
@@ -0,0 +1,93 @@
+# vim: set fileencoding=utf-8
+import unittest
+from unittest.mock import Mock, patch
+from freezegun import freeze_time
+
+from bemani.common import APIConstants, GameConstants, VersionConstants, Time, cache
+from bemani.data.api.client import APIClient, UnreachableAPIException
+from bemani.data.api.music import GlobalMusicData
+from bemani.data.types import Server
+
+
+class TestGlobalMusicData(unittest.TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def __data(self, watermarks: dict) -> GlobalMusicData:
+        api = Mock()
+        api.get_all_servers.return_value = [
+            Server(1, 0, "https://one.example.com/", "token", True, True),
+            Server(2, 0, "https://two.example.com/", "token", True, True),
+            Server(3, 0, "https://three.example.com/", "token", True, False),
+        ]
+        api.get_remote_watermarks.return_value = watermarks
+        api.get_remote_records.return_value = []
+        user = Mock()
+        user.get_all_cards.return_value = []
+        music = Mock()
+        music.get_all_records.return_value = []
+        return GlobalMusicData(api, user, music)
+
+    def test_sync_remote_records(self) -> None:
+        with freeze_time("2026-10-19 12:00:00"):
+            now = Time.now()
+            data = self.__data({1: now - 600})
+
+            with patch.object(APIClient, "get_records_since", autospec=True) as fetch:
+                fetch.return_value = [{"song": "1", "chart": "0"}]
+                data.sync_remote_records(GameConstants.IIDX, VersionConstants.IIDX_PENDUAL)
+
+            # Servers that don't allow scores are never asked.
+            sinces = sorted((call.args[0].base_uri, call.args[3]) for call in fetch.call_args_list)
+            self.assertEqual(
+                sinces,
+                [
+                    ("https://one.example.com/", now - 600 - GlobalMusicData.SYNC_OVERLAP),
+                    ("https://two.example.com/", None),
+                ],
+            )
+
+            # A server we never synced before gets a full sync, the other gets merged into.
+            puts = sorted(
+                (call.args[2], call.args[4], call.kwargs["replace"])
+                for call in data.localapi.put_remote_records.call_args_list  # type: ignore
+            )
+            self.assertEqual(puts, [(1, now, False), (2, now, True)])
+
+            # A full sync ignores watermarks entirely.
+            data.localapi.put_remote_records.reset_mock()  # type: ignore
+            with patch.object(APIClient, "get_records_since", autospec=True) as fetch:
+                fetch.return_value = []
+                data.sync_remote_records(GameConstants.IIDX, VersionConstants.IIDX_PENDUAL, full=True)
+            self.assertEqual([call.args[3] for call in fetch.call_args_list], [None, None])
+            self.assertTrue(
+                all(call.kwargs["replace"] for call in data.localapi.put_remote_records.call_args_list)  # type: ignore
+            )
+
+    def test_sync_failure_keeps_watermark(self) -> None:
+        data = self.__data({1: Time.now(), 2: Time.now()})
+
+        with patch.object(APIClient, "get_records_since", autospec=True) as fetch:
+            fetch.side_effect = UnreachableAPIException("down")
+            data.sync_remote_records(GameConstants.IIDX, VersionConstants.IIDX_PENDUAL)
+
+        data.localapi.put_remote_records.assert_not_called()  # type: ignore
+
+    def test_get_all_records_uses_mirror(self) -> None:
+        # Server one was synced recently, server two not for a long time.
+        data = self.__data({1: Time.now() - 60, 2: Time.now() - Time.SECONDS_IN_DAY})
+
+        with patch.object(APIClient, "get_records", autospec=True) as fetch:
+            fetch.return_value = []
+            data.get_all_records(GameConstants.IIDX, VersionConstants.IIDX_SINOBUZ)
+
+        data.localapi.get_remote_records.assert_called_once_with(  # type: ignore
+            GameConstants.IIDX, VersionConstants.IIDX_SINOBUZ, [1]
+        )
+        self.assertEqual(
+            [(call.args[0].base_uri, call.args[3]) for call in fetch.call_args_list],
+            [("https://two.example.com/", APIConstants.ID_TYPE_SERVER)],
+        )
+
+        # Even though we didn't ask every server, the scheduler should keep this version synced.
+        self.assertEqual(APIClient.get_hot_versions(), [(GameConstants.IIDX, VersionConstants.IIDX_SINOBUZ)])
@@ -6,7 +6,8 @@ from unittest.mock import Mock
 from typing import List
 
 from bemani.backend.iidx.pendual import IIDXPendual
-from bemani.data import Score
+from bemani.common import GameConstants, Profile
+from bemani.data import ArcadeID, Score, UserID
 
 
 class TestIIDXPendual(unittest.TestCase):
@@ -81,3 +82,57 @@ class TestIIDXPendual(unittest.TestCase):
             64,
         )
         self.assertEqual(sum(struct.unpack("b" * 64, ghost)), 0)
+
+    def test_average_short_ghost(self) -> None:
+        base = IIDXPendual(Mock(), Mock(), Mock())
+        self.assertEqual(
+            base.delta_score(
+                [
+                    self.__make_score([10, 20]),
+                    self.__make_score([20, 30, 40]),
+                ],
+                3,
+            ),
+            (60, struct.pack("bbb", *[-5, 5, 0])),
+        )
+
+    def test_compute_ghost_cohorts(self) -> None:
+        def profile(extid: int, name: str, sgrade: int) -> Profile:
+            return Profile(
+                GameConstants.IIDX, IIDXPendual.version, "", extid, {"name": name, "pid": 1, "sgrade": sgrade}
+            )
+
+        scores = [
+            (UserID(1), self.__make_score([10, 10, 10])),
+            (UserID(2), self.__make_score([20, 20, 20])),
+            (UserID(3), self.__make_score([30, 30, 30])),
+        ]
+        profiles = {
+            UserID(1): profile(11111111, "ONE", 5),
+            UserID(2): profile(22222222, "TWO", 5),
+            UserID(3): profile(33333333, "THREE", 7),
+        }
+        cohorts = IIDXPendual.compute_ghost_cohorts(
+            IIDXPendual.CHART_TYPE_A7,
+            scores,
+            scores + [(UserID(4), self.__make_score([40, 40, 40]))],
+            {UserID(1): ArcadeID(1), UserID(2): ArcadeID(1), UserID(3): None},
+            profiles,
+            profiles,
+            3,
+        )
+
+        # The remote top has no profile we know about, so the next best score is used.
+        self.assertEqual(cohorts["global_top"]["score"], 90)
+        self.assertEqual(cohorts["global_top"]["name"], "THREE")
+        self.assertEqual(cohorts["global_average"], {"score": 75, "ghost": bytes(3)})
+
+        self.assertEqual(cohorts["arcade_top:1"]["name"], "TWO")
+        self.assertEqual(cohorts["arcade_top:1"]["extid"], 22222222)
+        self.assertEqual(cohorts["arcade_average:1"]["score"], 45)
+        self.assertEqual(cohorts["arcade_top:none"]["name"], "THREE")
+
+        self.assertEqual(cohorts["dan_top:sgrade:5"]["score"], 60)
+        self.assertEqual(cohorts["dan_average:sgrade:5"]["score"], 45)
+        self.assertEqual(cohorts["dan_top:sgrade:7"]["name"], "THREE")
+        self.assertNotIn("dan_top:dgrade:5", cohorts)
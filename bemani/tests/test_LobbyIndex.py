@@ -0,0 +1,117 @@
+# vim: set fileencoding=utf-8
+import unittest
+from unittest.mock import Mock
+
+from bemani.backend.lobby import LobbyIndex
+from bemani.common import GameConstants, Profile, Time, ValidatedDict, cache
+from bemani.data import UserID
+
+
+class TestLobbyIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def __lobby(self, lobbyid: int, ver: int, age: int = 0) -> ValidatedDict:
+        return ValidatedDict({"id": lobbyid, "time": Time.now() - age, "mid": 5, "ver": ver})
+
+    def test_rebuild_joins_profiles_and_sessions(self) -> None:
+        data = Mock()
+        data.local.lobby.get_all_lobbies = Mock(
+            return_value=[
+                (UserID(1), self.__lobby(10, 1)),
+                (UserID(2), self.__lobby(11, 2)),
+                (UserID(3), self.__lobby(12, 1)),
+            ]
+        )
+        data.local.lobby.get_all_play_session_infos = Mock(
+            return_value=[(UserID(1), ValidatedDict({"id": 100, "time": Time.now(), "ip": "1.2.3.4"}))]
+        )
+        data.remote.user.get_any_profiles = Mock(
+            return_value=[
+                (UserID(1), Profile(GameConstants.REFLEC_BEAT, 1, "", 11111111, {"name": "ONE", "secret": 1})),
+                (UserID(2), Profile(GameConstants.REFLEC_BEAT, 1, "", 22222222, {"name": "TWO"})),
+                (UserID(3), None),
+            ]
+        )
+        index = LobbyIndex(data, GameConstants.REFLEC_BEAT, 1, key="ver", profile_keys=["name"], session_keys=["ip"])
+
+        lobbies = index.lookup(1)
+        self.assertEqual(len(lobbies), 1)
+        userid, lobby, profile, session = lobbies[0]
+        self.assertEqual(userid, UserID(1))
+        self.assertEqual(lobby.get_int("id"), 10)
+        self.assertEqual(profile.extid, 11111111)
+        self.assertEqual(profile, {"name": "ONE"})
+        self.assertEqual(session.get_int("id"), 100)
+        self.assertEqual(session.get_str("ip"), "1.2.3.4")
+
+        _, _, profile, session = index.lookup(2)[0]
+        self.assertEqual(profile.get_str("name"), "TWO")
+        self.assertIsNone(session)
+        self.assertEqual(index.lookup(3), [])
+
+        # Further lookups come out of the index without touching the DB.
+        index.lookup(1)
+        index.lookup(2)
+        self.assertEqual(data.local.lobby.get_all_lobbies.call_count, 1)
+        self.assertEqual(data.remote.user.get_any_profiles.call_count, 1)
+
+    def test_put_and_destroy(self) -> None:
+        data = Mock()
+        data.local.lobby.get_all_lobbies = Mock(return_value=[(UserID(1), self.__lobby(10, 1))])
+        data.local.lobby.get_all_play_session_infos = Mock(
+            return_value=[(UserID(1), ValidatedDict({"id": 7, "time": 0, "ip": "5.6.7.8", "other": 1}))]
+        )
+        index = LobbyIndex(data, GameConstants.MGA, 1, session_keys=["ip"])
+        self.assertEqual([lobby.get_int("id") for _, lobby, _, _ in index.lookup()], [10])
+        self.assertEqual(data.local.lobby.get_all_lobbies.call_count, 1)
+
+        # Writes go to the DB and drop the index instead of editing it, so a second process
+        # sharing the cache can't overwrite them with its own stale copy.
+        other = LobbyIndex(data, GameConstants.MGA, 1, session_keys=["ip"])
+        data.local.lobby.get_lobby = Mock(return_value=self.__lobby(13, 1))
+        lobby = index.put(UserID(1), {"mid": 5})
+        self.assertEqual(lobby.get_int("id"), 13)
+        data.local.lobby.put_lobby.assert_called_once_with(GameConstants.MGA, 1, UserID(1), {"mid": 5})
+
+        data.local.lobby.get_all_lobbies = Mock(
+            return_value=[(UserID(1), self.__lobby(13, 1)), (UserID(2), self.__lobby(14, 1))]
+        )
+        other.put(UserID(2), {"mid": 6})
+        lobbies = index.lookup()
+        self.assertEqual([lobby.get_int("id") for _, lobby, _, _ in lobbies], [13, 14])
+        self.assertEqual(lobbies[0][3], {"id": 7, "time": 0, "ip": "5.6.7.8"})
+        self.assertIsNone(lobbies[0][2])
+        self.assertEqual(data.local.lobby.get_all_lobbies.call_count, 1)
+
+        data.local.lobby.get_all_lobbies = Mock(return_value=[(UserID(2), self.__lobby(14, 1))])
+        other.destroy(13)
+        data.local.lobby.destroy_lobby.assert_called_once_with(13)
+        self.assertEqual([userid for userid, _, _, _ in index.lookup()], [UserID(2)])
+        self.assertEqual(data.local.lobby.get_all_lobbies.call_count, 1)
+
+    def test_max_age(self) -> None:
+        data = Mock()
+        data.local.lobby.get_all_lobbies = Mock(
+            return_value=[(UserID(1), self.__lobby(10, 1, age=120)), (UserID(2), self.__lobby(11, 1, age=10))]
+        )
+        data.local.lobby.get_all_play_session_infos = Mock(return_value=[])
+        index = LobbyIndex(data, GameConstants.MGA, 2)
+
+        self.assertEqual([userid for userid, _, _, _ in index.lookup()], [UserID(1), UserID(2)])
+        self.assertEqual([userid for userid, _, _, _ in index.lookup(max_age=60)], [UserID(2)])
+
+    def test_expiry_rebuilds(self) -> None:
+        data = Mock()
+        data.local.lobby.get_all_lobbies = Mock(return_value=[])
+        index = LobbyIndex(data, GameConstants.MGA, 3)
+
+        self.assertEqual(index.lookup(), [])
+        data.local.lobby.get_all_play_session_infos.assert_not_called()
+
+        # Another process created a lobby that we only find out about on rebuild.
+        data.local.lobby.get_all_lobbies = Mock(return_value=[(UserID(1), self.__lobby(10, 1))])
+        data.local.lobby.get_all_play_session_infos = Mock(return_value=[])
+        self.assertEqual(index.lookup(), [])
+        index.refresh()
+        self.assertEqual([userid for userid, _, _, _ in index.lookup()], [UserID(1)])
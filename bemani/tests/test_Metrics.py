@@ -0,0 +1,157 @@
+# vim: set fileencoding=utf-8
+import unittest
+from typing import Dict, List, Optional, Type
+from unittest.mock import Mock
+
+from bemani.backend.base import Base, Factory
+from bemani.backend.dispatch import Dispatch
+from bemani.common import GameConstants, Histogram, MetricsRegistry, Model
+from bemani.data import Config, Data
+from bemani.protocol import Node
+from bemani.utils import services
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram(self) -> None:
+        histogram = Histogram([1.0, 2.0, 4.0])
+        self.assertEqual(histogram.quantile(0.5), 0.0)
+
+        for value in [0.5, 1.0, 1.5, 3.0, 10.0]:
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 16.0)
+
+        # The median lands halfway through the only observation in the second bucket.
+        self.assertAlmostEqual(histogram.quantile(0.5), 1.5)
+        self.assertAlmostEqual(histogram.quantile(0.2), 0.5)
+        # The top observation is past the last bucket, so we can only cap it.
+        self.assertEqual(histogram.quantile(0.99), 4.0)
+
+    def test_render(self) -> None:
+        metrics = MetricsRegistry()
+        metrics.register("test_seconds", "Seconds spent testing.", [0.1, 1.0])
+        metrics.observe("test_seconds", 0.05, game="LDJ", method="get")
+        metrics.observe("test_seconds", 0.5, game="LDJ", method="get")
+        metrics.observe("test_seconds", 5.0, method="get", game="KFC")
+
+        self.assertEqual(
+            metrics.render(),
+            "\n".join(
+                [
+                    "# HELP test_seconds Seconds spent testing.",
+                    "# TYPE test_seconds histogram",
+                    'test_seconds_bucket{game="KFC",method="get",le="0.1"} 0',
+                    'test_seconds_bucket{game="KFC",method="get",le="1.0"} 0',
+                    'test_seconds_bucket{game="KFC",method="get",le="+Inf"} 1',
+                    'test_seconds_sum{game="KFC",method="get"} 5.0',
+                    'test_seconds_count{game="KFC",method="get"} 1',
+                    'test_seconds_bucket{game="LDJ",method="get",le="0.1"} 1',
+                    'test_seconds_bucket{game="LDJ",method="get",le="1.0"} 2',
+                    'test_seconds_bucket{game="LDJ",method="get",le="+Inf"} 2',
+                    'test_seconds_sum{game="LDJ",method="get"} 0.55',
+                    'test_seconds_count{game="LDJ",method="get"} 2',
+                ]
+            )
+            + "\n",
+        )
+
+        # The summary puts the slowest labels first.
+        summary = metrics.summary().split("\n")
+        self.assertEqual(len(summary), 2)
+        self.assertTrue(summary[0].startswith('test_seconds{game="KFC",method="get"} count=1'))
+        self.assertTrue(summary[1].startswith('test_seconds{game="LDJ",method="get"} count=2'))
+
+    def test_render_samples(self) -> None:
+        self.assertEqual(
+            MetricsRegistry.render_samples(
+                "test_total",
+                "counter",
+                "Things tested.",
+                [({"server": 'http://a"b'}, 3.0), ({}, 1.5)],
+            ),
+            "\n".join(
+                [
+                    "# HELP test_total Things tested.",
+                    "# TYPE test_total counter",
+                    'test_total{server="http://a\\"b"} 3.0',
+                    "test_total 1.5",
+                ]
+            )
+            + "\n",
+        )
+
+    def test_unregistered(self) -> None:
+        metrics = MetricsRegistry()
+        with self.assertRaises(KeyError):
+            metrics.observe("missing_seconds", 1.0)
+
+
+class MetricsGame(Base):
+    game = GameConstants.IIDX
+    version = 1
+
+    def handle_test_get_request(self, request: Node) -> Node:
+        return Node.void("test")
+
+
+class MetricsFactory(Factory):
+    MANAGED_CLASSES: List[Type[Base]] = []
+
+    @classmethod
+    def register_all(cls) -> None:
+        Base.register("ZZZ", cls)
+
+    @classmethod
+    def create(cls, data: Data, config: Config, model: Model, parentmodel: Optional[Model] = None) -> Base:
+        return MetricsGame(data, config, model)
+
+
+class TestDispatchLabels(unittest.TestCase):
+    def __labels(self, modelstring: str, method: str) -> Dict[str, str]:
+        MetricsFactory.register_all()
+        data = Mock()
+        data.local.machine.get_machine = Mock(return_value=Mock(arcade=None, game=None))
+        dispatch = Dispatch(Config({"server": {"enforce_pcbid": False}}), data, False)
+
+        tree = Node.void("call")
+        tree.set_attribute("model", modelstring)
+        tree.set_attribute("srcid", "0101020304050607080A")
+        request = Node.void("test")
+        request.set_attribute("method", method)
+        tree.add_child(request)
+        dispatch.handle(tree)
+        return dispatch.labels
+
+    def test_labels(self) -> None:
+        self.assertEqual(
+            self.__labels("ZZZ:J:A:A:2010010100", "get"),
+            {"game": "ZZZ", "version": "1", "service": "test", "method": "get"},
+        )
+
+    def test_unhandled_labels(self) -> None:
+        # Whatever a client makes up can't grow the set of labels we keep histograms for.
+        self.assertEqual(
+            self.__labels("ZZZ:J:A:A:2010010100", "madeup"),
+            {"game": "ZZZ", "version": "1", "service": "unknown", "method": "unknown"},
+        )
+        self.assertEqual(
+            self.__labels("QQQ:J:A:A:2010010100", "get"),
+            {"game": "unknown", "version": "unknown", "service": "unknown", "method": "unknown"},
+        )
+
+    def test_metrics_access(self) -> None:
+        self.addCleanup(setattr, services, "config", services.config)
+        services.config = Config({"metrics": {"allow": ["127.0.0.1"], "proxies": ["10.0.0.1"]}})
+        client = services.app.test_client()
+
+        def status(remote: str, header: Optional[str] = None) -> int:
+            headers = {"X-Remote-Address": header} if header is not None else {}
+            return client.get("/metrics", headers=headers, environ_base={"REMOTE_ADDR": remote}).status_code
+
+        self.assertEqual(status("127.0.0.1"), 200)
+        self.assertEqual(status("10.0.0.5"), 403)
+        # Only a trusted proxy can vouch for the client's address.
+        self.assertEqual(status("10.0.0.5", "127.0.0.1"), 403)
+        self.assertEqual(status("10.0.0.1", "127.0.0.1"), 200)
+        self.assertEqual(status("10.0.0.1", "10.0.0.5"), 403)
@@ -0,0 +1,75 @@
+# vim: set fileencoding=utf-8
+import unittest
+from unittest.mock import Mock
+
+from bemani.common import GameConstants
+from bemani.data import UserID
+from bemani.data.mysql.music import MusicData
+from bemani.tests.helpers import FakeCursor
+
+
+class TestMusicData(unittest.TestCase):
+    def setUp(self) -> None:
+        MusicData.register_daily_points(GameConstants.REFLEC_BEAT, 5)
+
+    def test_put_attempt_aggregates_daily(self) -> None:
+        music = MusicData(Mock(), None)
+        music._MusicData__get_musicid = Mock(return_value=1234)  # type: ignore
+        music.execute = Mock(return_value=FakeCursor([]))  # type: ignore
+
+        music.put_attempt(
+            GameConstants.REFLEC_BEAT, 5, UserID(1), 100, 2, 7, 750, {}, True, timestamp=86400 * 3 + 500
+        )
+
+        # The attempt itself, then the daily best for the chart.
+        self.assertEqual(music.execute.call_count, 2)
+        sql, params = music.execute.call_args_list[1][0]
+        self.assertIn("INSERT INTO `score_daily`", sql)
+        self.assertIn("GREATEST", sql)
+        self.assertEqual(params, {"day": 3, "userid": UserID(1), "musicid": 1234, "points": 750})
+
+    def test_put_attempt_anonymous(self) -> None:
+        music = MusicData(Mock(), None)
+        music._MusicData__get_musicid = Mock(return_value=1234)  # type: ignore
+        music.execute = Mock(return_value=FakeCursor([]))  # type: ignore
+
+        music.put_attempt(GameConstants.REFLEC_BEAT, 5, None, 100, 2, 7, 750, {}, True, timestamp=86400 * 3 + 500)
+        self.assertEqual(music.execute.call_count, 1)
+
+    def test_put_attempt_unregistered(self) -> None:
+        # Games that never read daily points don't pay for keeping them.
+        music = MusicData(Mock(), None)
+        music._MusicData__get_musicid = Mock(return_value=1234)  # type: ignore
+        music.execute = Mock(return_value=FakeCursor([]))  # type: ignore
+
+        music.put_attempt(GameConstants.IIDX, 5, UserID(1), 100, 2, 7, 750, {}, True, timestamp=86400 * 3 + 500)
+        self.assertEqual(music.execute.call_count, 1)
+        self.assertNotIn("score_daily", music.execute.call_args[0][0])
+
+    def test_rebuild_daily_points(self) -> None:
+        music = MusicData(Mock(), None)
+        cursor = FakeCursor([])
+        cursor.rowcount = 4
+        music.execute = Mock(return_value=cursor)  # type: ignore
+
+        self.assertEqual(music.rebuild_daily_points(), 4 * len(MusicData.daily_points_games()))
+        self.assertEqual(music.execute.call_args_list[0][0], ("DELETE FROM score_daily",))
+        rebuilt = [call[0][1] for call in music.execute.call_args_list[1:]]
+        self.assertIn({"game": GameConstants.REFLEC_BEAT.value, "version": 5}, rebuilt)
+        self.assertNotIn(GameConstants.IIDX.value, [params["game"] for params in rebuilt])
+
+    def test_get_daily_points(self) -> None:
+        music = MusicData(Mock(), None)
+        music.execute = Mock(  # type: ignore
+            return_value=FakeCursor([{"userid": 1, "points": 1500}, {"userid": 3, "points": 20}])
+        )
+
+        self.assertEqual(music.get_daily_points(GameConstants.REFLEC_BEAT, 5, 3, []), {})
+        music.execute.assert_not_called()
+
+        points = music.get_daily_points(GameConstants.REFLEC_BEAT, 5, 3, [UserID(1), UserID(2), UserID(3)])
+        self.assertEqual(points, {UserID(1): 1500, UserID(3): 20})
+        sql, params = music.execute.call_args[0]
+        self.assertIn("FROM score_daily", sql)
+        self.assertEqual(params["day"], 3)
+        self.assertEqual(params["userids"], [UserID(1), UserID(2), UserID(3)])
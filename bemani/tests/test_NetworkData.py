@@ -1,9 +1,11 @@
 # vim: set fileencoding=utf-8
+import tempfile
 import unittest
 from unittest.mock import Mock
 from freezegun import freeze_time
 
 from bemani.common import GameConstants
+from bemani.data.config import Config
 from bemani.data.mysql.network import NetworkData
 from bemani.tests.helpers import FakeCursor
 
@@ -49,3 +51,44 @@ class TestNetworkData(unittest.TestCase):
 
             network.execute = Mock(return_value=FakeCursor([{"year": None, "day": 16790}]))  # type: ignore
             self.assertTrue(network.should_schedule(GameConstants.BISHI_BASHI, 1, "work", "weekly"))
+
+    def test_put_events_multirow(self) -> None:
+        network = NetworkData(Config({}), None)
+        network.execute = Mock(return_value=FakeCursor([]))  # type: ignore
+
+        with freeze_time("2016-01-01"):
+            network.put_events("pcbevent", [({"name": "a"}, 12345), ({"name": "b"}, None)])
+
+        network.execute.assert_called_once()  # type: ignore
+        sql, params = network.execute.call_args[0]  # type: ignore
+        self.assertIn("VALUES (:ts0, :uid0, :aid0, :type0, :data0), (:ts1, :uid1, :aid1, :type1, :data1)", sql)
+        self.assertEqual(params["ts0"], 12345)
+        self.assertEqual(params["ts1"], 1451606400)
+        self.assertEqual(params["data1"], '{"name": "b"}')
+
+    def test_put_events_spooled(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            network = NetworkData(
+                Config({"event_log": {"spool_dir": directory, "flush_size": 3, "flush_interval": 3600}}),
+                None,
+            )
+            network.execute = Mock(return_value=FakeCursor([]))  # type: ignore
+
+            # Below the flush size, nothing should hit the DB.
+            network.put_event("test", {"a": 1})
+            network.put_events("test", [({"b": 2}, None)])
+            network.execute.assert_not_called()  # type: ignore
+
+            # Hitting the flush size still only spools, the caller flushes once it is done.
+            network.put_event("test", {"c": 3})
+            network.execute.assert_not_called()  # type: ignore
+
+            # Flushing then writes everything in one statement.
+            self.assertEqual(network.flush_events(), 3)
+            network.execute.assert_called_once()  # type: ignore
+            sql, params = network.execute.call_args[0]  # type: ignore
+            self.assertEqual(
+                [params["data0"], params["data1"], params["data2"]],
+                ['{"a": 1}', '{"b": 2}', '{"c": 3}'],
+            )
+            self.assertEqual(network.flush_events(force=True), 0)
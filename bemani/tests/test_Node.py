@@ -0,0 +1,75 @@
+# vim: set fileencoding=utf-8
+import unittest
+
+from bemani.protocol.node import Node, NodeException
+
+
+class TestNode(unittest.TestCase):
+    def test_helpers_match_setters(self) -> None:
+        # The helpers skip the setters, so make sure they end up with exactly what the setters store.
+        for helper, name, value, nodetype, array in [
+            (Node.string, "str_node", "value", Node.NODE_TYPE_STR, False),
+            (Node.binary, "bin_node", b"DEADBEEF", Node.NODE_TYPE_BIN, False),
+            (Node.float, "float_node", 2.5, Node.NODE_TYPE_FLOAT, False),
+            (Node.bool, "bool_node", True, Node.NODE_TYPE_BOOL, False),
+            (Node.bool, "bool_node", 0, Node.NODE_TYPE_BOOL, False),
+            (Node.time, "time_node", 1234567890, Node.NODE_TYPE_TIME, False),
+            (Node.u8, "u8_node", 245, Node.NODE_TYPE_U8, False),
+            (Node.s64, "s64_node", -1234567890000, Node.NODE_TYPE_S64, False),
+            (Node.fouru8, "4u8_node", [0x20, 0x21, 0x22, 0x23], Node.NODE_TYPE_4U8, False),
+            (Node.u16_array, "u16_array_node", [65000, 1, 2, 65535], Node.NODE_TYPE_U16, True),
+            (Node.bool_array, "bool_array_node", [False, True, 1], Node.NODE_TYPE_BOOL, True),
+            (Node.float_array, "float_array_node", [2.5, 0.0], Node.NODE_TYPE_FLOAT, True),
+        ]:
+            node = helper(name, value)  # type: ignore
+            expected = Node(name=name, type=nodetype, array=array, value=value)
+            self.assertEqual(node, expected)
+            self.assertEqual(node.type, expected.type)
+            self.assertEqual(node.value, expected.value)
+            self.assertEqual(str(node), str(expected))
+
+        self.assertEqual(Node.void("void_node"), Node(name="void_node", type=Node.NODE_TYPE_VOID))
+
+    def test_validation(self) -> None:
+        with self.assertRaises(NodeException):
+            Node.u8("u8_node", 256)
+        with self.assertRaises(NodeException):
+            Node.s16_array("s16_array_node", [1, -32769])
+        with self.assertRaises(NodeException):
+            Node.fouru8("4u8_node", [1, 2, 3])
+        with self.assertRaises(NodeException):
+            Node.void("invalid/name")
+
+        # A name that failed validation isn't remembered as valid.
+        with self.assertRaises(NodeException):
+            Node.void("invalid/name")
+
+    def test_child_lookup(self) -> None:
+        # Enough children to be indexed, with duplicate names to make sure the first one wins.
+        root = Node.void("root")
+        for i in range(Node.INDEX_THRESHOLD * 2):
+            root.add_child(Node.s32(f"child{i % Node.INDEX_THRESHOLD}", i))
+        self.assertEqual(root.child_value("child3"), 3)
+        self.assertIsNone(root.child("missing"))
+
+        # Children added after the index was built are found as well.
+        late = Node.void("late")
+        late.add_child(Node.string("leaf", "value"))
+        root.add_child(late)
+        self.assertEqual(root.child_value("late/leaf"), "value")
+        self.assertIsNone(root.child("late/missing"))
+        self.assertIsNone(root.child("missing/leaf"))
+
+        # Leaf nodes have no children or attributes until something is added.
+        leaf = Node.u8("leaf", 1)
+        self.assertEqual(leaf.children, [])
+        self.assertEqual(leaf.attributes, {})
+        self.assertIsNone(leaf.child("anything"))
+
+        # Changes made through the children and attributes properties stick.
+        leaf.children.append(Node.s32("added", 5))
+        leaf.attributes["key"] = "value"
+        self.assertEqual(leaf.child_value("added"), 5)
+        self.assertEqual(leaf.attribute("key"), "value")
+        root.children.append(Node.s32("appended", 6))
+        self.assertEqual(root.child_value("appended"), 6)
@@ -0,0 +1,132 @@
+# vim: set fileencoding=utf-8
+import struct
+import unittest
+
+from bemani.common.pe import Memory, PEFile
+
+
+class TestMemory(unittest.TestCase):
+    def test_regions(self) -> None:
+        memory = Memory()
+        memory.add_region(0x2000, b"\x10\x11\x12\x13")
+        memory.add_region(0x1000, b"\x00\x01\x02\x03")
+
+        self.assertEqual(memory.load(0x1001, 2), b"\x01\x02")
+        self.assertEqual(memory.load(0x2002, 2), b"\x12\x13")
+        self.assertEqual(memory.regions(), [])
+
+        memory.store(0x2001, b"\xAA\xBB")
+        self.assertEqual(memory.load(0x2000, 4), b"\x10\xAA\xBB\x13")
+        self.assertEqual(memory.regions(), [(0x2000, b"\x10\xAA\xBB\x13")])
+        self.assertEqual(memory.written(), [])
+
+    def test_unmapped(self) -> None:
+        memory = Memory()
+        memory.add_region(0x1000, b"\x00\x01\x02\x03")
+
+        # Spanning the end of a region into unmapped memory.
+        self.assertEqual(memory.load(0x1002, 4), b"\x02\x03\x00\x00")
+        memory.store(0x1003, b"\xAA\xBB\xCC")
+        self.assertEqual(memory.load(0x1002, 4), b"\x02\xAA\xBB\xCC")
+        self.assertEqual(memory.regions(), [(0x1000, b"\x00\x01\x02\xAA")])
+        self.assertEqual(memory.written(), [(0x1004, 0xBB), (0x1005, 0xCC)])
+
+        # Spanning a page boundary, and making sure written zeros are tracked.
+        memory.store(Memory.PAGE_SIZE * 3 - 1, b"\x01\x00")
+        memory.init(0x8000, 0x8002)
+        self.assertEqual(
+            memory.written(),
+            [
+                (0x1004, 0xBB),
+                (0x1005, 0xCC),
+                (Memory.PAGE_SIZE * 3 - 1, 0x01),
+                (Memory.PAGE_SIZE * 3, 0x00),
+                (0x8001, 0x00),
+                (0x8002, 0x00),
+            ],
+        )
+
+
+class TestPEFile(unittest.TestCase):
+    # mov dword ptr [0x402010], 0x12345678
+    # sub esp, 0x10
+    # mov eax, 0xaabbccdd
+    # mov [esp+4], eax
+    # push eax
+    # mov byte ptr [0x500000], 7
+    # mov eax, [0x402010]
+    # mov [0x500000], eax
+    # ret
+    STORES = "C7051020400078563412" "83EC10" "B8DDCCBBAA" "89442404" "50" "C6050000500007" "A110204000" "A300005000" "C3"
+
+    # mov esi, 0x402100
+    # mov eax, 0x10
+    # loop: mov [esi], eax
+    # add esi, 4
+    # sub eax, 1
+    # test eax, eax
+    # jne loop
+    # ret
+    LOOP = "BE00214000" "B810000000" "8906" "83C604" "83E801" "85C0" "75F4" "C3"
+
+    def __build(self, code: str) -> bytes:
+        # A minimal 32-bit PE with a .text section at 0x401000 and a .data section at 0x402000.
+        dos = bytearray(0x40)
+        dos[0:2] = b"MZ"
+        struct.pack_into("<I", dos, 0x3C, 0x40)
+        coff = struct.pack("<HHIIIHH", 0x14C, 2, 0, 0, 0, 0xE0, 0x102)
+        opt = bytearray(0xE0)
+        struct.pack_into("<H", opt, 0, 0x10B)
+        struct.pack_into("<I", opt, 16, 0x1000)
+        struct.pack_into("<I", opt, 28, 0x400000)
+        struct.pack_into("<I", opt, 32, 0x1000)
+        struct.pack_into("<I", opt, 36, 0x200)
+        struct.pack_into("<H", opt, 40, 4)
+        struct.pack_into("<H", opt, 48, 4)
+        struct.pack_into("<I", opt, 56, 0x3000)
+        struct.pack_into("<I", opt, 60, 0x200)
+        struct.pack_into("<H", opt, 68, 3)
+        struct.pack_into("<I", opt, 92, 16)
+        sections = b"".join(
+            struct.pack("<8sIIIIIIHHI", name, 0x200, virtual, 0x200, physical, 0, 0, 0, 0, 0x60000020)
+            for name, virtual, physical in [(b".text", 0x1000, 0x200), (b".data", 0x2000, 0x400)]
+        )
+        headers = (bytes(dos) + b"PE\0\0" + coff + bytes(opt) + sections).ljust(0x200, b"\0")
+        return headers + bytes.fromhex(code).ljust(0x200, b"\x90") + bytes(range(256)) * 2
+
+    def test_emulate_function(self) -> None:
+        original = self.__build(self.STORES)
+        pe = PEFile(original)
+        pe.emulate_function(0x401000)
+
+        # Writes to sections land in place, the rest of the file is untouched.
+        self.assertEqual(pe.data[0x410:0x414], b"\x78\x56\x34\x12")
+        self.assertEqual(pe.data[:0x410], original[:0x410])
+        self.assertEqual(pe.data[0x414:0x600], original[0x414:0x600])
+
+        # Writes outside of sections are tacked on the end in address order.
+        self.assertEqual(pe.virtual_to_physical(0x500000), 0x600)
+        self.assertEqual(pe.data[0x600:0x604], b"\x78\x56\x34\x12")
+        stack = pe.virtual_to_physical(0xFFFFFFFF - 0x10 - 4)
+        self.assertEqual(pe.data[stack : (stack + 4)], b"\xDD\xCC\xBB\xAA")
+        self.assertEqual(pe.physical_to_virtual(len(pe.data) - 1), 0xFFFFFFFF)
+
+        # Running again reuses the existing mappings rather than growing the file.
+        length = len(pe.data)
+        pe.emulate_function(0x401000)
+        self.assertEqual(len(pe.data), length)
+
+    def test_emulate_loop(self) -> None:
+        original = self.__build(self.LOOP)
+        expected = b"".join(struct.pack("<I", i) for i in range(16, 0, -1))
+
+        pe = PEFile(original)
+        pe.emulate_function(0x401000)
+        self.assertEqual(pe.data[0x500:0x540], expected)
+        self.assertEqual(pe.data[:0x500], original[:0x500])
+        self.assertEqual(pe.data[0x540:], original[0x540:])
+
+        # The same loop run as a chunk of code, where the jump lands inside of the chunk.
+        pe = PEFile(original)
+        pe.emulate_code(0x401000, 0x401000 + 22)
+        self.assertEqual(pe.data[0x500:0x540], expected)
@@ -1,5 +1,6 @@
 # vim: set fileencoding=utf-8
 from abc import ABC
+import time
 import unittest
 
 from bemani.common import Parallel
@@ -100,3 +101,20 @@ class TestParallel(unittest.TestCase):
     def test_flatten(self) -> None:
         results = Parallel.flatten([[1, 2, 3], [4, 5, 6], [7, 8, 9], []])
         self.assertEqual(results, [1, 2, 3, 4, 5, 6, 7, 8, 9])
+
+    def test_call_with_deadline(self) -> None:
+        def fast(x: int) -> int:
+            return x
+
+        def slow(x: int) -> int:
+            time.sleep(2.0)
+            return x * 2
+
+        start = time.time()
+        results = Parallel.call_with_deadline([fast, slow, fast], 5, deadline=0.25, default=-1)
+        self.assertEqual(results, [5, -1, 5])
+        self.assertLess(time.time() - start, 1.0)
+
+        results = Parallel.call_with_deadline([fast, fast], 5, deadline=1.0, default=-1)
+        self.assertEqual(results, [5, 5])
+        self.assertEqual(Parallel.call_with_deadline([], deadline=1.0, default=-1), [])
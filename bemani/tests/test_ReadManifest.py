@@ -0,0 +1,70 @@
+# vim: set fileencoding=utf-8
+import argparse
+import os
+import tempfile
+import unittest
+
+from bemani.utils.read import CLIException, load_manifest
+
+
+class TestReadManifest(unittest.TestCase):
+    def __args(self, manifest: str) -> argparse.Namespace:
+        handle, path = tempfile.mkstemp(suffix=".yaml")
+        with os.fdopen(handle, "w") as fp:
+            fp.write(manifest)
+        self.addCleanup(os.unlink, path)
+
+        return argparse.Namespace(
+            series=None,
+            version=None,
+            csv=None,
+            tsv=None,
+            xml=None,
+            bin=None,
+            assets=None,
+            folder=None,
+            server=None,
+            token=None,
+            no_combine=False,
+            update=True,
+            bulk=True,
+            dry_run=False,
+            config="config.yaml",
+            manifest=path,
+            jobs=2,
+        )
+
+    def test_load_manifest(self) -> None:
+        jobs = load_manifest(
+            self.__args(
+                "- series: pnm\n"
+                + "  version: 22\n"
+                + "  bin: popn22.dll\n"
+                + "- series: iidx\n"
+                + "  version: '25'\n"
+                + "  server: https://example.com\n"
+                + "  token: abc\n"
+            )
+        )
+
+        self.assertEqual([(job.series, job.version) for job in jobs], [("pnm", "22"), ("iidx", "25")])
+        self.assertEqual(jobs[0].bin, "popn22.dll")
+        self.assertIsNone(jobs[0].server)
+        self.assertEqual(jobs[1].server, "https://example.com")
+        self.assertIsNone(jobs[1].bin)
+
+        # Options that aren't per import carry over from the command line.
+        for job in jobs:
+            self.assertTrue(job.update)
+            self.assertTrue(job.bulk)
+            self.assertEqual(job.config, "config.yaml")
+
+    def test_invalid_manifest(self) -> None:
+        with self.assertRaises(CLIException):
+            load_manifest(self.__args("series: pnm\n"))
+        with self.assertRaises(CLIException):
+            load_manifest(self.__args("- series: pnm\n"))
+        with self.assertRaises(CLIException):
+            load_manifest(self.__args("- series: pnm\n  version: 22\n  update: true\n"))
+        with self.assertRaises(CLIException):
+            load_manifest(self.__args("- series: pnm\n  version: 22\n  bin: popn22.dll\n  server: https://example.com\n"))
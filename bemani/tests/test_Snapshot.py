@@ -0,0 +1,144 @@
+# vim: set fileencoding=utf-8
+import unittest
+from unittest.mock import Mock
+
+from bemani.backend.ddr.ddr2014 import DDR2014
+from bemani.backend.ddr.ddrace import DDRAce
+from bemani.backend.sdvx.heavenlyhaven import SoundVoltexHeavenlyHaven
+from bemani.common import Profile, Time
+from bemani.data import ArcadeID, Machine, Score, UserID
+from bemani.tests.helpers import FakeCursor
+
+
+class TestSnapshot(unittest.TestCase):
+    def __config(self, staleness: int = 600) -> Mock:
+        config = Mock()
+        config.snapshot_staleness = staleness
+        return config
+
+    def test_records_round_trip(self) -> None:
+        base = SoundVoltexHeavenlyHaven(Mock(), self.__config(), Mock())
+        records = [
+            (UserID(1), Score(5, 100, 2, 9900000, 1234567890, 1234567891, 7, 3, {"grade": 8, "stats": {"a": 1}})),
+            (UserID(2), Score(6, 101, 0, 9800000, 1234567892, 1234567893, 8, 1, {"grade": 7})),
+        ]
+        profiles = {
+            UserID(1): Profile(base.game, base.version, "", 12345678, {"name": "ONE", "secret": "x"}),
+            UserID(2): Profile(base.game, base.version, "", 87654321, {"name": "TWO"}),
+            UserID(3): Profile(base.game, base.version, "", 11111111, {"name": "UNUSED"}),
+        }
+
+        snapshot = base.snapshot_records(records, profiles, ["grade"])
+        thawed_records, thawed_profiles = base.records_from_snapshot(snapshot)
+
+        self.assertEqual(len(thawed_records), 2)
+        userid, score = thawed_records[0]
+        self.assertEqual(userid, UserID(1))
+        self.assertEqual((score.key, score.id, score.chart, score.points), (5, 100, 2, 9900000))
+        self.assertEqual((score.timestamp, score.update, score.location, score.plays), (1234567890, 1234567891, 7, 3))
+        self.assertEqual(score.data, {"grade": 8})
+
+        # Only profiles of record holders are kept, and only the keys asked for.
+        self.assertEqual(set(thawed_profiles.keys()), {UserID(1), UserID(2)})
+        self.assertEqual(thawed_profiles[UserID(1)].extid, 12345678)
+        self.assertEqual(thawed_profiles[UserID(1)], {"name": "ONE"})
+
+    def test_chart_stats_round_trip(self) -> None:
+        stats = {100: {0: {"total": 5, "clears": 3, "average": 9000000}, 1: {"total": 1, "clears": 0, "average": 0}}}
+        snapshot = SoundVoltexHeavenlyHaven.snapshot_chart_stats(stats)
+        self.assertEqual(SoundVoltexHeavenlyHaven.chart_stats_from_snapshot(snapshot), stats)
+
+    def test_get_snapshot_staleness(self) -> None:
+        data = Mock()
+        base = SoundVoltexHeavenlyHaven(data, self.__config(), Mock())
+
+        data.local.game.get_snapshot = Mock(return_value=None)
+        self.assertIsNone(base.get_snapshot(base.version, "hiscore"))
+
+        data.local.game.get_snapshot = Mock(return_value=(Time.now() - 60, {"records": []}))
+        self.assertEqual(base.get_snapshot(base.version, "hiscore"), {"records": []})
+
+        data.local.game.get_snapshot = Mock(return_value=(Time.now() - 601, {"records": []}))
+        self.assertIsNone(base.get_snapshot(base.version, "hiscore"))
+
+        # Disabling snapshots ignores them entirely.
+        data.local.game.get_snapshot = Mock(return_value=(Time.now(), {"records": []}))
+        base = SoundVoltexHeavenlyHaven(data, self.__config(0), Mock())
+        self.assertIsNone(base.get_snapshot(base.version, "hiscore"))
+
+    def test_snapshot_due(self) -> None:
+        data = Mock()
+        data.local.game.get_snapshot_timestamp = Mock(return_value=None)
+        self.assertTrue(SoundVoltexHeavenlyHaven.snapshot_due(data, self.__config(), 4, "hiscore"))
+        self.assertFalse(SoundVoltexHeavenlyHaven.snapshot_due(data, self.__config(0), 4, "hiscore"))
+
+        data.local.game.get_snapshot_timestamp = Mock(return_value=Time.now() - 200)
+        self.assertFalse(SoundVoltexHeavenlyHaven.snapshot_due(data, self.__config(), 4, "hiscore"))
+        data.local.game.get_snapshot_timestamp = Mock(return_value=Time.now() - 300)
+        self.assertTrue(SoundVoltexHeavenlyHaven.snapshot_due(data, self.__config(), 4, "hiscore"))
+
+    def test_ddr_area_hiscores_from_snapshot(self) -> None:
+        data = Mock()
+        model = Mock()
+        model.rev = "A"
+        base = DDR2014(data, self.__config(), model)
+        base.get_machine_region = Mock(return_value=30)  # type: ignore
+
+        area_snapshot = base.snapshot_records(
+            [(UserID(1), Score(0, 100, 1, 900000, 0, 0, 0, 1, {}))],
+            {UserID(1): Profile(base.game, base.version, "", 11111111, {"name": "ONE", "area": 30})},
+        )
+        none_snapshot = base.snapshot_records(
+            [
+                (UserID(2), Score(0, 100, 1, 950000, 0, 0, 0, 1, {})),
+                (UserID(2), Score(0, 101, 1, 800000, 0, 0, 0, 1, {})),
+            ],
+            {UserID(2): Profile(base.game, base.version, "", 22222222, {"name": "TWO"})},
+        )
+        snapshots = {"area_hiscore:30": area_snapshot, "area_hiscore:none": none_snapshot}
+        data.local.game.get_snapshot_timestamp = Mock(return_value=Time.now())
+        data.local.game.get_snapshot = Mock(
+            side_effect=lambda game, version, name: (Time.now(), snapshots[name]) if name in snapshots else None
+        )
+        data.local.music.get_all_records = Mock(return_value=FakeCursor([]))
+
+        # Users without an area count towards the area of this machine, and the best
+        # record across both groups wins.
+        records, users = base.get_area_hiscores(30)
+        self.assertEqual(
+            sorted((score.id, score.points, userid) for (userid, score) in records),
+            [(100, 950000, UserID(2)), (101, 800000, UserID(2))],
+        )
+        self.assertEqual(set(users.keys()), {UserID(1), UserID(2)})
+
+        # Elsewhere, only users who picked that area count.
+        records, users = base.get_area_hiscores(31)
+        self.assertEqual(records, [])
+        data.local.music.get_all_records.assert_not_called()
+
+    def test_ddrace_rival_areas(self) -> None:
+        data = Mock()
+        machines = {
+            "ARCADE1": Machine(1, "ARCADE1", "", "", ArcadeID(5), 10000, None, None, {}),
+            "ARCADE2": Machine(2, "ARCADE2", "", "", ArcadeID(5), 10000, None, None, {}),
+            "HOME": Machine(3, "HOME", "", "", None, 10000, None, None, {}),
+        }
+        data.local.machine.from_machine_id = Mock(
+            side_effect=lambda lid: {1: "ARCADE1", 2: "ARCADE2", 3: "HOME"}.get(lid)
+        )
+        data.local.machine.get_machine = Mock(side_effect=lambda pcbid: machines.get(pcbid))
+        data.local.user.get_all_profiles = Mock(
+            return_value=[
+                (UserID(1), Profile(DDRAce.game, DDRAce.version, "", 11111111, {"lid": 1})),
+                (UserID(2), Profile(DDRAce.game, DDRAce.version, "", 22222222, {"lid": 2})),
+                (UserID(3), Profile(DDRAce.game, DDRAce.version, "", 33333333, {"lid": 3})),
+                (UserID(4), Profile(DDRAce.game, DDRAce.version, "", 44444444, {"lid": 4})),
+            ]
+        )
+
+        # Users are grouped by the arcade of their last machine, or by the machine itself
+        # when it isn't in an arcade, and users on unknown machines are in no area.
+        groups = DDRAce.hiscore_groups(data)
+        self.assertEqual(groups, {"arcade_hiscore:5": [UserID(1), UserID(2)], "machine_hiscore:3": [UserID(3)]})
+        self.assertEqual(DDRAce.rival_area(machines["ARCADE2"]), "arcade_hiscore:5")
+        self.assertEqual(DDRAce.rival_area(machines["HOME"]), "machine_hiscore:3")
@@ -0,0 +1,190 @@
+# vim: set fileencoding=utf-8
+import contextlib
+import io
+import os
+import socket
+import struct
+import tempfile
+import unittest
+from typing import Any, Dict, List, Tuple
+from unittest.mock import Mock, patch
+
+from bemani.protocol import EAmuseProtocol
+from bemani.protocol.node import Node
+from bemani.sniff import EndOfCaptureException, PcapReader, Sniffer
+from bemani.utils.bemanishark import decode, mainloop
+
+
+class TestSniffer(unittest.TestCase):
+    def __segment(
+        self,
+        source: Tuple[str, int],
+        destination: Tuple[str, int],
+        sequence: int,
+        flags: int,
+        data: bytes = b"",
+    ) -> bytes:
+        # A raw IPv4 packet wrapping a single TCP segment.
+        tcp = struct.pack("!HHLLBBHHH", source[1], destination[1], sequence, 0, 5 << 4, flags, 65535, 0, 0) + data
+        ip = struct.pack(
+            "!BBHHHBBH4s4s",
+            0x45,
+            0,
+            20 + len(tcp),
+            0,
+            0,
+            64,
+            6,
+            0,
+            socket.inet_aton(source[0]),
+            socket.inet_aton(destination[0]),
+        )
+        return ip + tcp
+
+    def __stream(
+        self, client: Tuple[str, int], server: Tuple[str, int], request: bytes, response: bytes
+    ) -> List[bytes]:
+        syn, ack, fin = 0x02, 0x10, 0x01
+        return [
+            self.__segment(client, server, 1000, syn),
+            self.__segment(server, client, 5000, syn | ack),
+            self.__segment(client, server, 1001, ack),
+            self.__segment(client, server, 1001, ack, request),
+            self.__segment(server, client, 5001, ack, response),
+            self.__segment(client, server, 1001 + len(request), fin | ack),
+            self.__segment(server, client, 5001 + len(response), fin | ack),
+            self.__segment(client, server, 1002 + len(request), ack),
+        ]
+
+    def __interleaved(self) -> List[bytes]:
+        first = self.__stream(("10.0.0.2", 40000), ("10.0.0.1", 80), b"first request", b"first response")
+        second = self.__stream(("10.0.0.3", 40000), ("10.0.0.1", 80), b"second request", b"second response")
+
+        # The second stream finishes first, and a stream on another port should be filtered out.
+        other = self.__stream(("10.0.0.4", 40000), ("10.0.0.1", 8080), b"other request", b"other response")
+        return first[:4] + second + other + first[4:]
+
+    def __capture(self, data: bytes) -> str:
+        handle, path = tempfile.mkstemp(suffix=".pcap")
+        with os.fdopen(handle, "wb") as fp:
+            fp.write(data)
+        self.addCleanup(os.unlink, path)
+        return path
+
+    def __pcap(self, frames: List[bytes]) -> str:
+        # Big-endian, to make sure we honor the byte order of the file.
+        data = struct.pack(">IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, PcapReader.LINKTYPE_ETHERNET)
+        for i, frame in enumerate(frames):
+            frame = b"\0" * 12 + b"\x08\x00" + frame
+            data += struct.pack(">IIII", i, 0, len(frame), len(frame)) + frame
+        return self.__capture(data)
+
+    def __pcapng(self, frames: List[bytes]) -> str:
+        def block(blocktype: int, body: bytes) -> bytes:
+            body = body + b"\0" * (-len(body) % 4)
+            return struct.pack("<II", blocktype, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+
+        data = block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+        data += block(0x00000001, struct.pack("<HHI", PcapReader.LINKTYPE_RAW, 0, 65535))
+        for i, frame in enumerate(frames):
+            data += block(0x00000006, struct.pack("<IIIII", 0, 0, i, len(frame), len(frame)) + frame)
+        return self.__capture(data)
+
+    def __verify(self, sniffer: Sniffer) -> None:
+        stream = sniffer.recv_stream()
+        self.assertEqual(stream["source_address"], "10.0.0.3")
+        self.assertEqual(stream["inbound"], b"second request")
+        self.assertEqual(stream["outbound"], b"second response")
+
+        stream = sniffer.recv_stream()
+        self.assertEqual(stream["source_address"], "10.0.0.2")
+        self.assertEqual(stream["source_port"], 40000)
+        self.assertEqual(stream["destination_address"], "10.0.0.1")
+        self.assertEqual(stream["destination_port"], 80)
+        self.assertEqual(stream["inbound"], b"first request")
+        self.assertEqual(stream["outbound"], b"first response")
+
+        with self.assertRaises(EndOfCaptureException):
+            sniffer.recv_stream()
+        self.assertEqual(sniffer.streams, {})
+
+    def test_pcap(self) -> None:
+        self.__verify(Sniffer(port=80, pcap=self.__pcap(self.__interleaved())))
+
+    def test_pcapng(self) -> None:
+        self.__verify(Sniffer(port=80, pcap=self.__pcapng(self.__interleaved())))
+
+    def test_capture_closed(self) -> None:
+        path = self.__pcap(self.__interleaved())
+        opened: List[Any] = []
+
+        def tracking_open(*args: Any, **kwargs: Any) -> Any:
+            fp = io.open(*args, **kwargs)
+            opened.append(fp)
+            return fp
+
+        with patch("builtins.open", side_effect=tracking_open):
+            sniffer = Sniffer(port=80, pcap=path)
+        self.assertEqual(len(opened), 1)
+        self.assertFalse(opened[0].closed)
+
+        # Reading to the end of the capture closes the file behind it.
+        self.__verify(sniffer)
+        self.assertTrue(opened[0].closed)
+
+    def __request(self) -> bytes:
+        tree = Node.void("call")
+        tree.set_attribute("model", "LDJ:J:A:A:2022082400")
+        packet = EAmuseProtocol().encode(
+            "none", None, tree, text_encoding=EAmuseProtocol.SHIFT_JIS, packet_encoding=EAmuseProtocol.XML
+        )
+        return (
+            b"POST /core HTTP/1.1\r\nX-Compress: none\r\nContent-Length: "
+            + str(len(packet)).encode("ascii")
+            + b"\r\n\r\n"
+            + packet
+        )
+
+    def __packets(self, source: str, request: bytes) -> Dict[str, Any]:
+        return {
+            "source_address": source,
+            "source_port": 40000,
+            "destination_address": "10.0.0.1",
+            "destination_port": 80,
+            "inbound": request,
+            "outbound": b"",
+        }
+
+    def test_decode(self) -> None:
+        output = decode(self.__packets("10.0.0.2", self.__request()))
+        lines = output.splitlines()
+        self.assertEqual(lines[0], "Inbound request (from 10.0.0.2:40000 to 10.0.0.1:80):")
+        self.assertIn('model="LDJ:J:A:A:2022082400"', output)
+
+    def test_decode_failure(self) -> None:
+        # A stream that blows up while decoding shouldn't stop the streams after it from printing.
+        bad = self.__packets("10.0.0.2", self.__request())
+        del bad["outbound"]
+        sniffer = Mock()
+        sniffer.recv_stream = Mock(
+            side_effect=[
+                bad,
+                self.__packets("10.0.0.3", self.__request()),
+                self.__packets("10.0.0.4", self.__request()),
+                EndOfCaptureException(),
+            ]
+        )
+
+        output = io.StringIO()
+        with patch("bemani.utils.bemanishark.Sniffer", return_value=sniffer), contextlib.redirect_stdout(output):
+            mainloop(workers=1)
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], "Failed to decode stream (from 10.0.0.2:40000 to 10.0.0.1:80): KeyError('outbound')")
+        self.assertEqual(
+            [line for line in lines if line.startswith("Inbound request")],
+            [
+                "Inbound request (from 10.0.0.3:40000 to 10.0.0.1:80):",
+                "Inbound request (from 10.0.0.4:40000 to 10.0.0.1:80):",
+            ],
+        )
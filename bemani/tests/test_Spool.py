@@ -0,0 +1,85 @@
+# vim: set fileencoding=utf-8
+import os
+import tempfile
+import unittest
+from typing import Any, Dict, List
+
+from bemani.data.spool import Spool
+
+
+class TestSpool(unittest.TestCase):
+    def test_append_drain(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            spool = Spool(directory, "test")
+            spool.append([{"a": 1}, {"b": "2"}])
+            spool.append([{"c": [3]}])
+
+            drained: List[Dict[str, Any]] = []
+            self.assertEqual(spool.drain(drained.extend), 3)
+            self.assertEqual(drained, [{"a": 1}, {"b": "2"}, {"c": [3]}])
+
+            # Nothing left afterwards.
+            self.assertEqual(spool.drain(drained.extend), 0)
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_should_drain(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            spool = Spool(directory, "test")
+            self.assertFalse(spool.should_drain(2, 60))
+
+            spool.append([{"a": 1}])
+            self.assertFalse(spool.should_drain(2, 60))
+            self.assertTrue(spool.should_drain(2, 0))
+
+            spool.append([{"b": 2}])
+            self.assertTrue(spool.should_drain(2, 60))
+
+            spool.drain(lambda records: None)
+            self.assertFalse(spool.should_drain(2, 0))
+
+    def test_failed_drain_retries(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            spool = Spool(directory, "test")
+            spool.append([{"a": 1}])
+
+            def fail(records: List[Dict[str, Any]]) -> None:
+                raise Exception("DB is down!")
+
+            with self.assertRaises(Exception):
+                spool.drain(fail)
+            self.assertTrue(spool.should_drain(100, 0))
+
+            # The records should still be around for the next drain.
+            spool.append([{"b": 2}])
+            drained: List[Dict[str, Any]] = []
+            self.assertEqual(spool.drain(drained.extend), 2)
+            self.assertEqual(sorted(drained, key=lambda r: list(r.keys())), [{"a": 1}, {"b": 2}])
+
+    def test_drain_everything(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            # Simulate a spool file left behind by another process, including a torn write.
+            with open(os.path.join(directory, "test.1.spool"), "w") as fp:
+                fp.write('{"a": 1}\n{"b": ')
+            with open(os.path.join(directory, "other.1.spool"), "w") as fp:
+                fp.write('{"c": 3}\n')
+
+            spool = Spool(directory, "test")
+            drained: List[Dict[str, Any]] = []
+            self.assertEqual(spool.drain(drained.extend), 0)
+            self.assertEqual(spool.drain(drained.extend, everything=True), 1)
+            self.assertEqual(drained, [{"a": 1}])
+
+            # Unrelated spools in the same directory are untouched.
+            self.assertEqual(os.listdir(directory), ["other.1.spool"])
+
+    def test_reused_pid_after_torn_write(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            # A previous process with our PID crashed partway through an append.
+            with open(os.path.join(directory, f"test.{os.getpid()}.spool"), "w") as fp:
+                fp.write('{"a": 1}\n{"b": ')
+
+            spool = Spool(directory, "test")
+            spool.append([{"c": 3}])
+            drained: List[Dict[str, Any]] = []
+            self.assertEqual(spool.drain(drained.extend), 2)
+            self.assertEqual(drained, [{"a": 1}, {"c": 3}])
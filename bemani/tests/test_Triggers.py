@@ -0,0 +1,115 @@
+# vim: set fileencoding=utf-8
+import json
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List, Tuple
+
+from bemani.common import GameConstants, BroadcastConstants
+from bemani.data.config import Config
+from bemani.data.triggers import Triggers
+from bemani.data.types import Song
+
+
+class _FakeDiscord(HTTPServer):
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _FakeDiscordHandler)
+        self.received: List[Dict[str, Any]] = []
+        self.responses: List[Tuple[int, Dict[str, Any]]] = []
+
+
+class _FakeDiscordHandler(BaseHTTPRequestHandler):
+    server: _FakeDiscord
+
+    def do_POST(self) -> None:
+        length = int(self.headers["Content-Length"])
+        self.server.received.append(json.loads(self.rfile.read(length)))
+        status, body = self.server.responses.pop(0) if self.server.responses else (200, {})
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class TestTriggers(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server = _FakeDiscord()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.spool = tempfile.TemporaryDirectory()
+        self.triggers = Triggers(
+            Config(
+                {
+                    "webhooks": {
+                        "spool_dir": self.spool.name,
+                        "max_attempts": 2,
+                        "retry_backoff": 0,
+                        "min_interval": 0,
+                        "discord": {
+                            "iidx": f"http://127.0.0.1:{self.server.server_address[1]}/webhook",
+                        },
+                    },
+                }
+            )
+        )
+        self.song = Song(GameConstants.IIDX, 1, 1000, 0, "Song", "Artist", "Genre", {})
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.spool.cleanup()
+
+    def broadcast(self, name: str) -> None:
+        self.triggers.broadcast_score({BroadcastConstants.DJ_NAME: name}, GameConstants.IIDX, self.song)
+
+    def test_queued_and_batched(self) -> None:
+        for i in range(12):
+            self.broadcast(f"DJ {i}")
+
+        # Nothing should go out during the request itself.
+        self.assertEqual(self.server.received, [])
+
+        self.assertEqual(self.triggers.send_queued_broadcasts(), 12)
+        self.assertEqual([len(message["embeds"]) for message in self.server.received], [10, 2])
+        self.assertEqual(self.server.received[0]["embeds"][0]["fields"][0]["value"], "DJ 0")
+        self.assertEqual(self.server.received[1]["embeds"][1]["fields"][0]["value"], "DJ 11")
+
+        # Everything was sent, so nothing should be sent again.
+        self.assertEqual(self.triggers.send_queued_broadcasts(), 0)
+        self.assertEqual(len(self.server.received), 2)
+
+    def test_retry_and_give_up(self) -> None:
+        self.broadcast("DJ")
+        self.server.responses = [(500, {}), (503, {})]
+
+        self.assertEqual(self.triggers.send_queued_broadcasts(), 0)
+        self.assertEqual(self.triggers.send_queued_broadcasts(), 0)
+
+        # We ran out of attempts, so it should be dropped.
+        self.assertEqual(self.triggers.send_queued_broadcasts(), 0)
+        self.assertEqual(len(self.server.received), 2)
+
+    def test_rate_limited(self) -> None:
+        self.broadcast("DJ")
+        self.server.responses = [(429, {"retry_after": 3600})]
+
+        self.assertEqual(self.triggers.send_queued_broadcasts(), 0)
+
+        # Should be held off until the rate limit expires.
+        self.assertEqual(self.triggers.send_queued_broadcasts(), 0)
+        self.assertEqual(len(self.server.received), 1)
+
+    def test_rejected(self) -> None:
+        self.broadcast("DJ")
+        self.server.responses = [(400, {"message": "Invalid Form Body"})]
+
+        self.assertEqual(self.triggers.send_queued_broadcasts(), 0)
+        self.assertEqual(self.triggers.send_queued_broadcasts(), 0)
+        self.assertEqual(len(self.server.received), 1)
@@ -0,0 +1,70 @@
+# vim: set fileencoding=utf-8
+import unittest
+from unittest.mock import Mock
+
+from bemani.common import GameConstants, Profile
+from bemani.data import UserID
+from bemani.data.mysql.user import UserData
+from bemani.tests.helpers import FakeCursor
+
+
+class TestUserData(unittest.TestCase):
+    def test_indexed_attributes(self) -> None:
+        UserData.register_indexed_attributes(GameConstants.BISHI_BASHI, 99, ["loc"])
+        UserData.register_indexed_attributes(GameConstants.BISHI_BASHI, 99, ["area", "loc"])
+        self.assertEqual(UserData.indexed_attributes(GameConstants.BISHI_BASHI, 99), ["area", "loc"])
+        self.assertEqual(UserData.indexed_attributes(GameConstants.BISHI_BASHI, 98), [])
+        self.assertIn((GameConstants.BISHI_BASHI, 99), UserData.indexed_games())
+
+    def test_put_profile_indexes_attributes(self) -> None:
+        UserData.register_indexed_attributes(GameConstants.BISHI_BASHI, 97, ["loc", "name", "flags"])
+        user = UserData(Mock(), None)
+        user.get_refid = Mock(return_value="ABCDEF0123456789")  # type: ignore
+        user.execute = Mock(return_value=FakeCursor([]))  # type: ignore
+
+        profile = Profile(GameConstants.BISHI_BASHI, 97, "", 12345678, {"loc": 5, "name": "AAA", "flags": [1, 2]})
+        user.put_profile(GameConstants.BISHI_BASHI, 97, UserID(1), profile)
+
+        # The profile itself, then clearing out and inserting the indexed attributes.
+        self.assertEqual(user.execute.call_count, 3)
+        sql, params = user.execute.call_args_list[1][0]
+        self.assertIn("DELETE FROM profile_attribute", sql)
+        self.assertEqual(params["attributes"], ("flags", "loc", "name"))
+        sql, params = user.execute.call_args_list[2][0]
+        self.assertIn("INSERT INTO profile_attribute", sql)
+
+        # Lists can't be indexed, so only the scalars were inserted.
+        indexed = {
+            params[f"attribute{i}"]: params[f"value{i}"] for i in range(3) if f"attribute{i}" in params
+        }
+        self.assertEqual(indexed, {"loc": "5", "name": "AAA"})
+
+    def test_put_profile_no_indexed_attributes(self) -> None:
+        user = UserData(Mock(), None)
+        user.get_refid = Mock(return_value="ABCDEF0123456789")  # type: ignore
+        user.execute = Mock(return_value=FakeCursor([]))  # type: ignore
+
+        profile = Profile(GameConstants.BISHI_BASHI, 96, "", 12345678, {"loc": 5})
+        user.put_profile(GameConstants.BISHI_BASHI, 96, UserID(1), profile)
+        self.assertEqual(user.execute.call_count, 1)
+
+    def test_get_profiles_by_attribute(self) -> None:
+        UserData.register_indexed_attributes(GameConstants.BISHI_BASHI, 95, ["loc"])
+        user = UserData(Mock(), None)
+        user.execute = Mock(  # type: ignore
+            return_value=FakeCursor([{"userid": 1, "refid": "ABCDEF0123456789", "extid": 12345678, "data": '{"loc": 5}'}])
+        )
+
+        with self.assertRaises(Exception) as context:
+            user.get_profiles_by_attribute(GameConstants.BISHI_BASHI, 95, "area", [5])
+        self.assertTrue("Attribute area is not indexed" in str(context.exception))
+
+        self.assertEqual(user.get_profiles_by_attribute(GameConstants.BISHI_BASHI, 95, "loc", []), [])
+        user.execute.assert_not_called()
+
+        profiles = user.get_profiles_by_attribute(GameConstants.BISHI_BASHI, 95, "loc", [5, 6])
+        self.assertEqual(user.execute.call_args[0][1]["values"], ("5", "6"))
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0][0], UserID(1))
+        self.assertEqual(profiles[0][1].extid, 12345678)
+        self.assertEqual(profiles[0][1].get_int("loc"), 5)
@@ -111,3 +111,46 @@ class TestXmlDecoder(unittest.TestCase):
         self.assertEqual(tree.attributes, {})
         self.assertEqual(tree.data_type, "u32")
         self.assertEqual(tree.value, [1, 2, 3, 4])
+
+    def test_decode_string(self) -> None:
+        xml = XmlDecoder(b'<node __type="str">a &amp;lt; b\r\nc</node>', "ascii")
+        tree = xml.get_tree()
+
+        self.assertEqual(tree.data_type, "str")
+        self.assertEqual(tree.value, "a &lt; b\r\nc")
+
+        xml = XmlDecoder(b'<node __type="str"></node>', "ascii")
+        tree = xml.get_tree()
+
+        self.assertEqual(tree.value, "")
+
+        xml = XmlDecoder(b'<node __type="str" />', "ascii")
+        tree = xml.get_tree()
+
+        self.assertEqual(tree.value, None)
+
+        xml = XmlDecoder('<?xml version="1.0" encoding="shift-jis"?><node __type="str">テスト</node>'.encode("shift-jis"), "ascii")
+        tree = xml.get_tree()
+
+        self.assertEqual(tree.value, "テスト")
+
+    def test_decode_malformed(self) -> None:
+        # Unescaped ampersands aren't valid XML, but we should still take them.
+        xml = XmlDecoder(b'<node attr="a & b"><child __type="str">c & d</child></node>', "ascii")
+        tree = xml.get_tree()
+
+        self.assertEqual(tree.attributes, {"attr": "a & b"})
+        self.assertEqual(tree.child_value("child"), "c & d")
+
+        # Whitespace inside attribute values should be left alone.
+        xml = XmlDecoder(b'<node attr="a\tb\nc" other="d e"/>', "ascii")
+        tree = xml.get_tree()
+
+        self.assertEqual(tree.attributes, {"attr": "a\tb\nc", "other": "d e"})
+
+        # Multiple roots end up with the last one.
+        xml = XmlDecoder(b'<first/><second __type="u8">5</second>', "ascii")
+        tree = xml.get_tree()
+
+        self.assertEqual(tree.name, "second")
+        self.assertEqual(tree.value, 5)
@@ -3,28 +3,42 @@ import os
 import random
 import unittest
 
-from bemani.protocol.lz77 import Lz77, Lz77Decompress
+from bemani.protocol import lz77 as lz77module
+from bemani.protocol.lz77 import Lz77, Lz77Compressor, Lz77Decompressor, LzException
 from bemani.tests.helpers import get_fixture
 
 
 class TestLZ77Decompressor(unittest.TestCase):
     def test_ringbuffer_fuzz(self) -> None:
-        dec = Lz77Decompress(b"")
-
+        # Repeat random chunks so that backrefs reach back across the whole ring, including
+        # overlapping ones and ones that wrap around the start of the ring.
+        data = b""
         for _ in range(100):
-            amount = random.randint(1, Lz77Decompress.RING_LENGTH)
-            data = os.urandom(amount)
-
-            # Save our ring position, write a chunk of data
-            readpos = dec.write_pos
-            dec._ring_write(data)
-
-            # Read a chunk of data back from that buffer, see its the same
-            newdata = b"".join(dec._ring_read(readpos, amount))
-            self.assertEqual(data, newdata)
-
-            # Verify integrity of ringbuffer
-            self.assertEqual(len(dec.ring), Lz77Decompress.RING_LENGTH)
+            amount = random.randint(1, Lz77Decompressor.RING_LENGTH)
+            if data and random.randint(0, 1) == 1:
+                start = random.randint(max(0, len(data) - Lz77Decompressor.RING_LENGTH), len(data) - 1)
+                data += (data[start:] * (amount // (len(data) - start) + 1))[:amount]
+            else:
+                data += os.urandom(amount)
+        compresseddata = Lz77().compress(data)
+
+        # The python implementation has to get the same data back however the input is split.
+        clib = lz77module.clib
+        lz77module.clib = None
+        try:
+            lz = Lz77Decompressor()
+            offset = 0
+            output = []
+            while offset < len(compresseddata):
+                amount = random.randint(1, Lz77Decompressor.RING_LENGTH)
+                output.append(lz.decompress(compresseddata[offset : (offset + amount)]))
+                offset += amount
+            output.append(lz.flush())
+        finally:
+            lz77module.clib = clib
+
+        self.assertEqual(data, b"".join(output))
+        self.assertTrue(lz.eof)
 
 
 class TestLz77RealCompressor(unittest.TestCase):
@@ -103,3 +117,75 @@ class TestLz77RealCompressor(unittest.TestCase):
 
         decompresseddata = lz77.decompress(compresseddata)
         self.assertEqual(data, decompresseddata)
+
+
+class TestLz77Streaming(unittest.TestCase):
+    def test_chunked_compression(self) -> None:
+        data = get_fixture("rawdata") + os.urandom(10 * 1024)
+        expected = Lz77().compress(data)
+
+        # However we split up the input, we should get the same output.
+        for chunksize in [1, 17, 4096, 100000]:
+            lz = Lz77Compressor()
+            compresseddata = b"".join(
+                lz.compress(data[offset : (offset + chunksize)]) for offset in range(0, len(data), chunksize)
+            )
+            compresseddata += lz.flush()
+            self.assertEqual(expected, compresseddata)
+
+    def test_chunked_decompression(self) -> None:
+        data = get_fixture("lorem.txt") + os.urandom(1024)
+        compresseddata = Lz77().compress(data)
+
+        for chunksize in [1, 2, 7, 4096]:
+            lz = Lz77Decompressor()
+            decompresseddata = b"".join(
+                lz.decompress(compresseddata[offset : (offset + chunksize)])
+                for offset in range(0, len(compresseddata), chunksize)
+            )
+            decompresseddata += lz.flush()
+            self.assertEqual(data, decompresseddata)
+            self.assertTrue(lz.eof)
+
+    def test_size_hint(self) -> None:
+        data = get_fixture("rawdata")
+        compresseddata = Lz77().compress(data)
+
+        # Whether the hint is right, too small or too big, we should get the same data back.
+        for size in [len(data), 1, len(data) * 2]:
+            self.assertEqual(data, Lz77().decompress(memoryview(compresseddata), size=size))
+
+    def test_unused_data(self) -> None:
+        compresseddata = Lz77().compress(b"abcabcabcabc")
+
+        lz = Lz77Decompressor()
+        self.assertEqual(b"abcabcabcabc", lz.decompress(compresseddata + b"trailing"))
+        self.assertTrue(lz.eof)
+        self.assertEqual(b"trailing", lz.unused_data)
+
+    def test_truncated(self) -> None:
+        compresseddata = Lz77().compress(get_fixture("lorem.txt"))
+
+        with self.assertRaises(LzException):
+            Lz77().decompress(compresseddata[:-1])
+
+    def test_levels(self) -> None:
+        data = get_fixture("lorem.txt") + get_fixture("declaration.txt")
+
+        sizes = {}
+        for level in [Lz77.LEVEL_FAST, Lz77.LEVEL_MAX]:
+            lz77 = Lz77(level=level)
+            compresseddata = lz77.compress(data)
+            self.assertEqual(data, lz77.decompress(compresseddata))
+            sizes[level] = len(compresseddata)
+
+            # The python and C++ implementations should make identical choices.
+            if lz77module.clib is not None:
+                clib = lz77module.clib
+                lz77module.clib = None
+                try:
+                    self.assertEqual(compresseddata, Lz77(level=level).compress(data))
+                finally:
+                    lz77module.clib = clib
+
+        self.assertLess(sizes[Lz77.LEVEL_MAX], sizes[Lz77.LEVEL_FAST])
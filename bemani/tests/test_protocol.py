@@ -2,6 +2,7 @@
 import unittest
 
 from bemani.protocol import EAmuseProtocol, Node
+from bemani.protocol.node import NodeException
 
 
 class TestProtocol(unittest.TestCase):
@@ -426,3 +427,53 @@ class TestProtocol(unittest.TestCase):
         root.add_child(unicode_node)
 
         self.assertLoopback(root)
+
+    def test_frozen_packet(self) -> None:
+        # A shared, frozen subtree should encode exactly like a regular one wherever it ends
+        # up, including after a byte that leaves room for packing more bytes.
+        shared = Node.void("shared")
+        shared.set_attribute("attr", "value")
+        shared.add_child(Node.u8("u8_node", 1))
+        shared.add_child(Node.s16("s16_node", -2))
+        shared.add_child(Node.string("str_node", "frozen"))
+        shared.add_child(Node.bool_array("bool_array_node", [True, False]))
+        shared.freeze()
+
+        with self.assertRaises(NodeException):
+            shared.add_child(Node.void("new_node"))
+        with self.assertRaises(NodeException):
+            shared.children[0].set_value(2)
+
+        first = Node.void("test")
+        first.add_child(shared)
+        second = Node.void("test")
+        second.add_child(Node.u8("u8_node", 2))
+        second.add_child(shared)
+
+        for root in [first, second, first]:
+            self.assertLoopback(root)
+
+    def test_timings(self) -> None:
+        root = Node.void("call")
+        root.add_child(Node.string("str_node", "timed"))
+
+        proto = EAmuseProtocol()
+        data = proto.encode(
+            "lz77",
+            "1-abcdef-0123",
+            root,
+            text_encoding=EAmuseProtocol.SHIFT_JIS,
+            packet_encoding=EAmuseProtocol.BINARY,
+        )
+        self.assertEqual(sorted(proto.timings), sorted(EAmuseProtocol.ENCODE_STAGES))
+
+        # Decoding a new request starts over, and encoding the response adds to that.
+        proto.decode("lz77", "1-abcdef-0123", data)
+        self.assertEqual(sorted(proto.timings), sorted(EAmuseProtocol.DECODE_STAGES))
+        proto.encode("lz77", "1-abcdef-0123", root)
+        self.assertEqual(
+            sorted(proto.timings),
+            sorted(EAmuseProtocol.DECODE_STAGES + EAmuseProtocol.ENCODE_STAGES),
+        )
+        for stage, seconds in proto.timings.items():
+            self.assertGreaterEqual(seconds, 0.0, f"Stage {stage} has a negative time!")
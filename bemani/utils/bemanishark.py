@@ -1,78 +1,135 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 import argparse
+import concurrent.futures
+import queue
+import threading
 
-from bemani.sniff import Sniffer
+from bemani.sniff import EndOfCaptureException, Sniffer
 from bemani.protocol import EAmuseProtocol, EAmuseException
 from bemani.common import HTTP
 
 
-def mainloop(address: Optional[str] = None, port: int = 80, verbose: bool = False) -> None:
+def decode(packets: Dict[str, Any], verbose: bool = False) -> str:
     """
-    Main loop of BEMANIShark. Starts an instance of Sniffer and EAmuseProtocol and does a
-    lazy job of banging them together with the above HTTP.parse. Will loop trying to decode
-    packets forever.
+    Decode a reassembled TCP stream as an eAmuse request and response, returning the text
+    that should be printed for it. This runs on the decode worker pool, away from capture.
 
     Arguments:
-        address - A string representing an IP of interest
-        port - An integer representing a port of interest
+        packets - A dictionary as returned by Sniffer.recv_stream()
+        verbose - Whether to include HTTP details of the request and response
     """
-    sniffer = Sniffer(address=address, port=port)
     parser = EAmuseProtocol()
+    lines: List[str] = []
 
-    while True:
-        packets = sniffer.recv_stream()
+    inbound = HTTP.parse(packets["inbound"], request=True)
+    outbound = HTTP.parse(packets["outbound"], response=True)
 
-        inbound = HTTP.parse(packets["inbound"], request=True)
-        outbound = HTTP.parse(packets["outbound"], response=True)
-
-        if inbound is not None:
-            if inbound["data"] is None:
+    if inbound is not None:
+        if inbound["data"] is None:
+            in_req = None
+        else:
+            try:
+                in_req = parser.decode(
+                    inbound["headers"].get("x-compress"),
+                    inbound["headers"].get("x-eamuse-info"),
+                    inbound["data"],
+                )
+            except EAmuseException:
                 in_req = None
-            else:
-                try:
-                    in_req = parser.decode(
-                        inbound["headers"].get("x-compress"),
-                        inbound["headers"].get("x-eamuse-info"),
-                        inbound["data"],
-                    )
-                except EAmuseException:
-                    in_req = None
-
-            print(
-                f"Inbound request (from {packets['source_address']}:{packets['source_port']} to {packets['destination_address']}:{packets['destination_port']}):"
-            )
-            if verbose:
-                print(f"HTTP {inbound['method']} request for URI {inbound['uri']}")
-                print(f"Compression is {inbound['headers'].get('x-compress', 'none')}")
-                print(f"Encryption key is {inbound['headers'].get('x-eamuse-info', 'none')}")
-            if in_req is None:
-                print("Inbound request was not parseable")
-            else:
-                print(in_req)
-
-        if outbound is not None:
-            if outbound["data"] is None:
+
+        lines.append(
+            f"Inbound request (from {packets['source_address']}:{packets['source_port']} to {packets['destination_address']}:{packets['destination_port']}):"
+        )
+        if verbose:
+            lines.append(f"HTTP {inbound['method']} request for URI {inbound['uri']}")
+            lines.append(f"Compression is {inbound['headers'].get('x-compress', 'none')}")
+            lines.append(f"Encryption key is {inbound['headers'].get('x-eamuse-info', 'none')}")
+        if in_req is None:
+            lines.append("Inbound request was not parseable")
+        else:
+            lines.append(str(in_req))
+
+    if outbound is not None:
+        if outbound["data"] is None:
+            out_req = None
+        else:
+            try:
+                out_req = parser.decode(
+                    outbound["headers"].get("x-compress"),
+                    outbound["headers"].get("x-eamuse-info"),
+                    outbound["data"],
+                )
+            except EAmuseException:
                 out_req = None
-            else:
+
+        lines.append(
+            f"Outbound response (from {packets['destination_address']}:{packets['destination_port']} to {packets['source_address']}:{packets['source_port']}):"
+        )
+        if verbose:
+            lines.append(f"Compression is {outbound['headers'].get('x-compress', 'none')}")
+            lines.append(f"Encryption key is {outbound['headers'].get('x-eamuse-info', 'none')}")
+        if out_req is None:
+            lines.append("Outbound response was not parseable")
+        else:
+            lines.append(str(out_req))
+
+    return "".join(f"{line}\n" for line in lines)
+
+
+def mainloop(
+    address: Optional[str] = None,
+    port: int = 80,
+    verbose: bool = False,
+    pcap: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> None:
+    """
+    Main loop of BEMANIShark. Starts an instance of Sniffer and a pool of workers running
+    decode() on every TCP stream it reassembles, so that capture never waits on decryption
+    and decompression. Output is printed in the order streams were captured. Will loop trying
+    to decode packets forever, or until the end of the capture file when given one.
+
+    Arguments:
+        address - A string representing an IP of interest
+        port - An integer representing a port of interest
+        verbose - Whether to include HTTP details of every request and response
+        pcap - A path to a pcap or pcapng file to read instead of sniffing live traffic
+        workers - Number of decode worker processes, defaulting to the number of CPUs
+    """
+    sniffer = Sniffer(address=address, port=port, pcap=pcap)
+    pending: "queue.Queue[Optional[Tuple[str, concurrent.futures.Future[str]]]]" = queue.Queue()
+
+    def output() -> None:
+        while True:
+            entry = pending.get()
+            if entry is None:
+                return
+            stream, future = entry
+            try:
+                text = future.result()
+            except Exception as e:
+                # Don't let one bad stream stop us from printing every stream after it.
+                text = f"Failed to decode stream ({stream}): {e!r}\n"
+            print(text, end="", flush=True)
+
+    printer = threading.Thread(target=output)
+    printer.start()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
                 try:
-                    out_req = parser.decode(
-                        outbound["headers"].get("x-compress"),
-                        outbound["headers"].get("x-eamuse-info"),
-                        outbound["data"],
-                    )
-                except EAmuseException:
-                    out_req = None
-
-            print(
-                f"Outbound response (from {packets['destination_address']}:{packets['destination_port']} to {packets['source_address']}:{packets['source_port']}):"
-            )
-            if verbose:
-                print(f"Compression is {outbound['headers'].get('x-compress', 'none')}")
-                print(f"Encryption key is {outbound['headers'].get('x-eamuse-info', 'none')}")
-            if out_req is None:
-                print("Outbound response was not parseable")
-            else:
-                print(out_req)
+                    packets = sniffer.recv_stream()
+                except EndOfCaptureException:
+                    break
+                stream = (
+                    f"from {packets['source_address']}:{packets['source_port']} "
+                    + f"to {packets['destination_address']}:{packets['destination_port']}"
+                )
+                pending.put((stream, executor.submit(decode, packets, verbose)))
+        finally:
+            pending.put(None)
+            printer.join()
 
 
 def main() -> None:
@@ -88,9 +145,23 @@ def main() -> None:
         default=None,
     )
     parser.add_argument("-v", "--verbose", help="Show extra packet information", action="store_true")
+    parser.add_argument(
+        "-r",
+        "--read",
+        help="Read packets from a pcap or pcapng file instead of sniffing live traffic",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of processes decoding packets. Defaults to the number of CPUs",
+        type=int,
+        default=None,
+    )
     args = parser.parse_args()
 
-    mainloop(address=args.address, port=args.port, verbose=args.verbose)
+    mainloop(address=args.address, port=args.port, verbose=args.verbose, pcap=args.read, workers=args.workers)
 
 
 if __name__ == "__main__":
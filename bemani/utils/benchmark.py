@@ -0,0 +1,600 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bemani import package_root
+from bemani.common.pe import PEFile
+from bemani.protocol import EAmuseProtocol, lz77
+from bemani.protocol.binary import BinaryDecoder, BinaryEncoder, NativeBinaryCodec
+from bemani.protocol.node import Node
+
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(package_root, "tests", name), "rb") as fp:
+        return fp.read()
+
+
+def load_rawdata() -> bytes:
+    return load_fixture("rawdata")
+
+
+def build_tree(rawdata: bytes, entries: int) -> Node:
+    """
+    Build a response-like tree with the given number of entries, taking every value from the
+    raw data fixture so that the packets are the same from run to run.
+    """
+    root = Node.void("response")
+    game = Node.void("game")
+    game.set_attribute("status", "0")
+    root.add_child(game)
+
+    for i in range(entries):
+        chunk = rawdata[(i * 32) % (len(rawdata) - 32) :][:32]
+        entry = Node.void("music")
+        entry.set_attribute("id", str(chunk[0] | (chunk[1] << 8)))
+        entry.add_child(Node.s32("music_id", chunk[2] | (chunk[3] << 8)))
+        entry.add_child(Node.u8("chart", chunk[4] % 4))
+        entry.add_child(Node.u16("points", chunk[5] | (chunk[6] << 8)))
+        entry.add_child(Node.s8("flag", chunk[7] - 128))
+        entry.add_child(Node.bool("cleared", chunk[8] & 1 != 0))
+        entry.add_child(Node.u32("score", int.from_bytes(chunk[9:13], "big")))
+        entry.add_child(Node.s16_array("history", [b - 128 for b in chunk[13:21]]))
+        entry.add_child(Node.string("name", chunk[21:29].hex()))
+        entry.add_child(Node.binary("ghost", chunk))
+        game.add_child(entry)
+
+    return root
+
+
+def build_services_request() -> Node:
+    """
+    Build a services.get request the way a cabinet sends it when it boots.
+    """
+    root = Node.void("call")
+    root.set_attribute("model", "LDJ:J:A:A:2022082400")
+    root.set_attribute("srcid", "01201000000000000000")
+    root.set_attribute("tag", "b4a3dc12")
+    services = Node.void("services")
+    services.set_attribute("method", "get")
+    services.set_attribute("model", "LDJ:J:A:A:2022082400")
+    root.add_child(services)
+
+    info = Node.void("info")
+    info.add_child(Node.string("AVS2", "2.17.3 r8311"))
+    services.add_child(info)
+    net = Node.void("net")
+    for i in range(2):
+        iface = Node.void("if")
+        iface.add_child(Node.u8("id", i))
+        iface.add_child(Node.bool("valid", i == 0))
+        iface.add_child(Node.u8("type", 1))
+        iface.add_child(Node.u8_array("mac", [0x00, 0x0B, 0xAB, 0x12, 0x34, 0x50 + i]))
+        iface.add_child(Node.ipv4("addr", "192.168.1.100"))
+        iface.add_child(Node.ipv4("bcast", "192.168.1.255"))
+        iface.add_child(Node.ipv4("netmask", "255.255.255.0"))
+        iface.add_child(Node.ipv4("gateway", "192.168.1.1"))
+        iface.add_child(Node.ipv4("dhcp", "192.168.1.1"))
+        net.add_child(iface)
+    services.add_child(net)
+    return root
+
+
+def handle_services_request(request: Node) -> Node:
+    """
+    Answer a services.get request with the full list of services, like the real handler does.
+    """
+    root = Node.void("response")
+    services = Node.void("services")
+    services.set_attribute("expire", "10800")
+    services.set_attribute("mode", "operation")
+    services.set_attribute("product_domain", "1")
+    root.add_child(services)
+
+    for name in [
+        "cardmng",
+        "facility",
+        "message",
+        "numbering",
+        "package",
+        "pcbevent",
+        "pcbtracker",
+        "pkglist",
+        "posevent",
+        "userdata",
+        "userid",
+        "eacoin",
+        "local",
+        "local2",
+        "lobby",
+        "lobby2",
+        "dlstatus",
+        "netlog",
+        "sidmgr",
+        "globby",
+    ]:
+        item = Node.void("item")
+        item.set_attribute("name", name)
+        item.set_attribute("url", f"http://eamuse.example.com:80/{request.attribute('model')}")
+        services.add_child(item)
+    return root
+
+
+def build_alive_request() -> Node:
+    """
+    Build the tiny pcbtracker.alive request that every cabinet sends periodically.
+    """
+    root = Node.void("call")
+    root.set_attribute("model", "KFC:J:F:A:2022083000")
+    root.set_attribute("srcid", "01201000000000000000")
+    root.set_attribute("tag", "0e0b1f2a")
+    tracker = Node.void("pcbtracker")
+    tracker.set_attribute("method", "alive")
+    tracker.set_attribute("accountid", "01201000000000000000")
+    tracker.set_attribute("ecflag", "1")
+    tracker.set_attribute("hardid", "0100000BAB123450")
+    tracker.set_attribute("softid", "012010000000000000000")
+    root.add_child(tracker)
+    return root
+
+
+def handle_alive_request(request: Node) -> Node:
+    root = Node.void("response")
+    tracker = Node.void("pcbtracker")
+    tracker.set_attribute("ecenable", "1")
+    tracker.set_attribute("eclimit", "0")
+    tracker.set_attribute("limit", "0")
+    tracker.set_attribute("status", "0")
+    tracker.set_attribute("time", "1666137600")
+    root.add_child(tracker)
+    return root
+
+
+def build_score_request(rawdata: bytes) -> Node:
+    """
+    Build a score save request carrying a single play, including a ghost.
+    """
+    root = Node.void("call")
+    root.set_attribute("model", "KFC:J:F:A:2022083000")
+    root.set_attribute("srcid", "01201000000000000000")
+    root.set_attribute("tag", "7d1c9e40")
+    game = Node.void("game")
+    game.set_attribute("method", "sv6_save_m")
+    game.set_attribute("ver", "0")
+    root.add_child(game)
+
+    game.add_child(Node.string("refid", "F0A1B2C3D4E5F607"))
+    game.add_child(Node.string("dataid", "F0A1B2C3D4E5F607"))
+    game.add_child(Node.u32("music_id", 1234))
+    game.add_child(Node.u32("music_type", 3))
+    game.add_child(Node.u32("score", 9876543))
+    game.add_child(Node.u32("clear_type", 4))
+    game.add_child(Node.u32("score_grade", 8))
+    game.add_child(Node.u32("max_chain", 2048))
+    game.add_child(Node.u32("critical", 1900))
+    game.add_child(Node.u32("near", 40))
+    game.add_child(Node.u32("error", 2))
+    game.add_child(Node.binary("ghost", rawdata[:4096]))
+    return root
+
+
+def build_load_request() -> Node:
+    """
+    Build a score load request, whose response is a response-like tree from build_tree().
+    """
+    root = Node.void("call")
+    root.set_attribute("model", "KFC:J:F:A:2022083000")
+    root.set_attribute("srcid", "01201000000000000000")
+    root.set_attribute("tag", "3a9f0c55")
+    game = Node.void("game")
+    game.set_attribute("method", "sv6_load_m")
+    game.set_attribute("ver", "0")
+    game.add_child(Node.string("refid", "F0A1B2C3D4E5F607"))
+    root.add_child(game)
+    return root
+
+
+def handle_score_request(request: Node) -> Node:
+    root = Node.void("response")
+    game = Node.void("game")
+    root.add_child(game)
+    return root
+
+
+def benchmark(func: Callable[[], object], seconds: float) -> float:
+    """
+    Run func repeatedly for roughly the given number of seconds, returning calls per second.
+    """
+    calls = 0
+    start = time.perf_counter()
+    end = start + seconds
+    now = start
+    while now < end or calls == 0:
+        func()
+        calls += 1
+        now = time.perf_counter()
+    return calls / (now - start)
+
+
+def binary(seconds: float) -> int:
+    rawdata = load_rawdata()
+    codecs = ["python"]
+    if NativeBinaryCodec.available():
+        codecs.append("native")
+    else:
+        print("The C++ codec isn't built, only benchmarking the python codec.", file=sys.stderr)
+
+    results: List[Tuple[str, int, str, float, float]] = []
+    for name, entries in [("small", 1), ("medium", 50), ("large", 1000)]:
+        tree = build_tree(rawdata, entries)
+        for compressed in [True, False]:
+            packet = BinaryEncoder(tree, "shift-jis", compressed, native=False).get_data()
+            label = f"{name}{'' if compressed else ' (uncompressed names)'}"
+
+            for codec in codecs:
+                native = codec == "native"
+                decode = benchmark(
+                    lambda: BinaryDecoder(packet, "shift-jis", compressed, native=native).get_tree(),
+                    seconds,
+                )
+                encode = benchmark(
+                    lambda: BinaryEncoder(tree, "shift-jis", compressed, native=native).get_data(),
+                    seconds,
+                )
+                results.append((label, len(packet), codec, decode, encode))
+
+    print(f"{'packet':<32} {'bytes':>8} {'codec':<8} {'decode/sec':>12} {'encode/sec':>12}")
+    for label, length, codec, decode, encode in results:
+        print(f"{label:<32} {length:>8} {codec:<8} {decode:>12.1f} {encode:>12.1f}")
+    return 0
+
+
+def lz77_levels(seconds: float) -> int:
+    rawdata = load_rawdata()
+    implementations = ["python"]
+    if lz77.clib is not None:
+        implementations.append("native")
+    else:
+        print("The C++ library isn't built, only benchmarking the python implementation.", file=sys.stderr)
+
+    corpus = [
+        ("small packet", BinaryEncoder(build_tree(rawdata, 1), "shift-jis", native=False).get_data()),
+        ("medium packet", BinaryEncoder(build_tree(rawdata, 50), "shift-jis", native=False).get_data()),
+        ("large packet", BinaryEncoder(build_tree(rawdata, 1000), "shift-jis", native=False).get_data()),
+        ("text", load_fixture("lorem.txt") + load_fixture("declaration.txt")),
+        ("texture", rawdata),
+    ]
+
+    results: List[Tuple[str, int, str, str, float, float, float]] = []
+    for name, data in corpus:
+        for implementation in implementations:
+            clib = lz77.clib
+            if implementation == "python":
+                # Both implementations produce the same output, so we can just hide the C++ one.
+                lz77.clib = None
+            try:
+                for level in [lz77.Lz77.LEVEL_FAST, lz77.Lz77.LEVEL_MAX]:
+                    compressor = lz77.Lz77(level=level)
+                    compressed = compressor.compress(data)
+                    compress = benchmark(lambda: compressor.compress(data), seconds)
+                    decompress = benchmark(lambda: compressor.decompress(compressed), seconds)
+                    results.append(
+                        (
+                            name,
+                            len(data),
+                            implementation,
+                            level,
+                            len(compressed) / len(data),
+                            (compress * len(data)) / (1024 * 1024),
+                            (decompress * len(data)) / (1024 * 1024),
+                        )
+                    )
+            finally:
+                lz77.clib = clib
+
+    print(f"{'data':<16} {'bytes':>8} {'impl':<8} {'level':<6} {'ratio':>6} {'compress MB/s':>14} {'decompress MB/s':>16}")
+    for name, length, implementation, level, ratio, compress, decompress in results:
+        print(
+            f"{name:<16} {length:>8} {implementation:<8} {level:<6} {ratio:>6.3f} {compress:>14.2f} {decompress:>16.2f}"
+        )
+    return 0
+
+
+def build_music_db_pe(songs: int) -> bytes:
+    """
+    Build a minimal 32-bit PE whose only function walks a table of 16-byte song records in
+    its .data section, copying a 16-bit field out of each record into a packed array, the
+    same shape of loop that music DB extraction emulates over a game's song table.
+    """
+    table = 0x402000
+    output = table + songs * 16
+    code = (
+        # mov esi, table
+        b"\xBE"
+        + struct.pack("<I", table)
+        # mov edi, output
+        + b"\xBF"
+        + struct.pack("<I", output)
+        # mov eax, songs
+        + b"\xB8"
+        + struct.pack("<I", songs)
+        # movzx edx, word [esi+4]
+        + b"\x0F\xB7\x56\x04"
+        # mov [edi], edx
+        + b"\x89\x17"
+        # add esi, 0x10
+        + b"\x83\xC6\x10"
+        # add edi, 4
+        + b"\x83\xC7\x04"
+        # sub eax, 1
+        + b"\x83\xE8\x01"
+        # test eax, eax
+        + b"\x85\xC0"
+        # jne to the movzx
+        + b"\x75\xED"
+        # ret
+        + b"\xC3"
+    )
+    data = b"".join(struct.pack("<IHHII", i, 1000 + i, 0, 0, 0) for i in range(songs))
+    datasize = (songs * 20 + 0x1FF) & ~0x1FF
+
+    dos = bytearray(0x40)
+    dos[0:2] = b"MZ"
+    struct.pack_into("<I", dos, 0x3C, 0x40)
+    coff = struct.pack("<HHIIIHH", 0x14C, 2, 0, 0, 0, 0xE0, 0x102)
+    opt = bytearray(0xE0)
+    struct.pack_into("<H", opt, 0, 0x10B)
+    struct.pack_into("<I", opt, 16, 0x1000)
+    struct.pack_into("<I", opt, 28, 0x400000)
+    struct.pack_into("<I", opt, 32, 0x1000)
+    struct.pack_into("<I", opt, 36, 0x200)
+    struct.pack_into("<H", opt, 40, 4)
+    struct.pack_into("<H", opt, 48, 4)
+    struct.pack_into("<I", opt, 56, 0x2000 + ((datasize + 0xFFF) & ~0xFFF))
+    struct.pack_into("<I", opt, 60, 0x200)
+    struct.pack_into("<H", opt, 68, 3)
+    struct.pack_into("<I", opt, 92, 16)
+    sections = b"".join(
+        struct.pack("<8sIIIIIIHHI", name, size, virtual, size, physical, 0, 0, 0, 0, 0x60000020)
+        for name, virtual, physical, size in [(b".text", 0x1000, 0x200, 0x200), (b".data", 0x2000, 0x400, datasize)]
+    )
+    headers = (bytes(dos) + b"PE\0\0" + coff + bytes(opt) + sections).ljust(0x200, b"\0")
+    return headers + code.ljust(0x200, b"\x90") + data.ljust(datasize, b"\0")
+
+
+PROTOCOL_MIN_COMPARE_USEC: float = 50.0
+
+
+def protocol_stages(
+    packet: bytes,
+    compression: Optional[str],
+    encryption: Optional[str],
+    handler: Callable[[Node], Node],
+    seconds: float,
+) -> Dict[str, float]:
+    """
+    Push a request packet through the whole server-side pipeline repeatedly for roughly
+    the given number of seconds, returning the fastest time in microseconds seen for each
+    stage. The fastest time is far less sensitive to whatever else the machine is doing than
+    the mean or median, which keeps comparisons against a saved baseline meaningful.
+    """
+    stages = [*EAmuseProtocol.DECODE_STAGES, "handle", *EAmuseProtocol.ENCODE_STAGES]
+    samples: Dict[str, List[float]] = {stage: [] for stage in stages}
+
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end or len(samples["handle"]) < 3:
+        proto = EAmuseProtocol()
+        request = proto.decode(compression, encryption, packet)
+        start = time.perf_counter()
+        response = handler(request)
+        handled = time.perf_counter()
+        proto.encode(compression, encryption, response)
+
+        proto.timings["handle"] = handled - start
+        for stage in stages:
+            samples[stage].append(proto.timings[stage] * 1000000)
+
+    results = {stage: min(samples[stage]) for stage in stages}
+    results["total"] = sum(results[stage] for stage in stages)
+    return results
+
+
+def protocol_regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[Tuple[str, str, float, float]]:
+    """
+    Return every label and stage that got more than threshold percent slower than the baseline.
+    """
+    regressions: List[Tuple[str, str, float, float]] = []
+    for label, timings in results.items():
+        for stage, usec in timings.items():
+            old = baseline.get(label, {}).get(stage)
+            if old is None or old < PROTOCOL_MIN_COMPARE_USEC:
+                # Stages this quick are mostly timer noise, so don't flag them.
+                continue
+            if usec > old * (1 + threshold / 100):
+                regressions.append((label, stage, old, usec))
+    return regressions
+
+
+def protocol(seconds: float, save: Optional[str], compare: Optional[str], threshold: float) -> int:
+    rawdata = load_rawdata()
+    corpus: List[Tuple[str, Node, Callable[[Node], Node]]] = [
+        ("alive", build_alive_request(), handle_alive_request),
+        ("services", build_services_request(), handle_services_request),
+        ("score save", build_score_request(rawdata), handle_score_request),
+        ("score load", build_load_request(), lambda request: build_tree(rawdata, 50)),
+        ("score load large", build_load_request(), lambda request: build_tree(rawdata, 1000)),
+    ]
+    encodings = [
+        ("xml", EAmuseProtocol.XML),
+        ("binary", EAmuseProtocol.BINARY),
+        ("binary-nc", EAmuseProtocol.BINARY_DECOMPRESSED),
+    ]
+
+    cases: Dict[str, Tuple[bytes, Optional[str], Optional[str], Callable[[Node], Node]]] = {}
+    for name, request, handler in corpus:
+        for encoding, packet_encoding in encodings:
+            for compression in [None, "lz77"]:
+                for encryption in [None, "1-5f4e3d2c-1a2b"]:
+                    label = f"{name} {encoding}{' lz77' if compression else ''}{' rc4' if encryption else ''}"
+                    packet = EAmuseProtocol().encode(
+                        compression,
+                        encryption,
+                        request,
+                        text_encoding=EAmuseProtocol.SHIFT_JIS,
+                        packet_encoding=packet_encoding,
+                    )
+                    cases[label] = (packet, compression, encryption, handler)
+
+    results = {label: protocol_stages(*case, seconds) for label, case in cases.items()}
+
+    regressions: List[Tuple[str, str, float, float]] = []
+    if compare is not None:
+        with open(compare, "r") as fp:
+            baseline: Dict[str, Dict[str, float]] = json.load(fp)["results"]
+
+        # A busy machine can make a whole packet look slow, so measure anything that looks
+        # like a regression a second time and only report it if it is still slow.
+        for label in {label for label, _, _, _ in protocol_regressions(results, baseline, threshold)}:
+            retry = protocol_stages(*cases[label], seconds)
+            results[label] = {stage: min(usec, retry[stage]) for stage, usec in results[label].items()}
+        regressions = protocol_regressions(results, baseline, threshold)
+
+    stages = [*EAmuseProtocol.DECODE_STAGES, "handle", *EAmuseProtocol.ENCODE_STAGES, "total"]
+    print(f"{'packet':<36} {'bytes':>6} " + " ".join(f"{stage:>10}" for stage in stages))
+    for label, timings in results.items():
+        print(f"{label:<36} {len(cases[label][0]):>6} " + " ".join(f"{timings[stage]:>10.1f}" for stage in stages))
+    print("Bytes are the request size on the wire, timings are the fastest microseconds per packet.")
+
+    if save is not None:
+        with open(save, "w") as fp:
+            json.dump({"results": results}, fp, indent=2, sort_keys=True)
+        print(f"Saved baseline to {save}.")
+
+    if compare is not None:
+        for label, stage, old, usec in regressions:
+            change = ((usec - old) / old) * 100
+            print(f"REGRESSION: {label} {stage} went from {old:.1f} to {usec:.1f} usec (+{change:.1f}%)")
+        if regressions:
+            print(f"{len(regressions)} stages regressed more than {threshold}% against {compare}.", file=sys.stderr)
+            return 1
+        print(f"No stages regressed more than {threshold}% against {compare}.")
+
+    return 0
+
+
+def pe(seconds: float) -> int:
+    results: List[Tuple[int, float, float]] = []
+    for songs in [16, 256, 1024]:
+        pefile = PEFile(build_music_db_pe(songs))
+        calls = benchmark(lambda: pefile.emulate_function(0x401000), seconds)
+        # Three instructions of setup, seven per song and the final ret.
+        instructions = 3 + songs * 7 + 1
+        results.append((songs, calls, calls * instructions))
+
+    print(f"{'songs':>8} {'calls/sec':>12} {'instructions/sec':>18}")
+    for songs, calls, rate in results:
+        print(f"{songs:>8} {calls:>12.1f} {rate:>18.1f}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks for the packet codecs and the PE emulator.")
+    subparsers = parser.add_subparsers(help="Benchmark to run", dest="benchmark")
+
+    binary_parser = subparsers.add_parser(
+        "binary",
+        help="Benchmark the binary node codecs",
+        description="Report packets per second decoded and encoded by the python and C++ binary node codecs.",
+    )
+    binary_parser.add_argument(
+        "-s",
+        "--seconds",
+        help="Seconds to spend on each measurement. Defaults to 1.",
+        type=float,
+        default=1.0,
+    )
+
+    lz77_parser = subparsers.add_parser(
+        "lz77",
+        help="Benchmark the lz77 compression levels",
+        description="Report compression ratio and MB/s compressed and decompressed for each lz77 compression level.",
+    )
+    lz77_parser.add_argument(
+        "-s",
+        "--seconds",
+        help="Seconds to spend on each measurement. Defaults to 1.",
+        type=float,
+        default=1.0,
+    )
+
+    protocol_parser = subparsers.add_parser(
+        "protocol",
+        help="Benchmark the full protocol pipeline",
+        description=(
+            "Report the fastest microseconds spent in each stage of handling a corpus of request and "
+            "response packets, optionally saving a baseline or comparing against one to catch regressions."
+        ),
+    )
+    protocol_parser.add_argument(
+        "-s",
+        "--seconds",
+        help="Seconds to spend on each packet. Defaults to 0.25.",
+        type=float,
+        default=0.25,
+    )
+    protocol_parser.add_argument(
+        "--save-baseline",
+        help="Save the results as a JSON baseline to this file.",
+        type=str,
+        default=None,
+    )
+    protocol_parser.add_argument(
+        "--compare",
+        help="Compare the results against a JSON baseline saved earlier, exiting non-zero on regressions.",
+        type=str,
+        default=None,
+    )
+    protocol_parser.add_argument(
+        "-t",
+        "--threshold",
+        help="Percent slower than the baseline a stage must be to count as a regression. Defaults to 25.",
+        type=float,
+        default=25.0,
+    )
+
+    pe_parser = subparsers.add_parser(
+        "pe",
+        help="Benchmark the PE emulator",
+        description="Report instructions per second emulated when walking a music DB table of a few different sizes.",
+    )
+    pe_parser.add_argument(
+        "-s",
+        "--seconds",
+        help="Seconds to spend on each measurement. Defaults to 1.",
+        type=float,
+        default=1.0,
+    )
+
+    args = parser.parse_args()
+    if args.benchmark == "binary":
+        return binary(args.seconds)
+    if args.benchmark == "lz77":
+        return lz77_levels(args.seconds)
+    if args.benchmark == "protocol":
+        return protocol(args.seconds, args.save_baseline, args.compare, args.threshold)
+    if args.benchmark == "pe":
+        return pe(args.seconds)
+
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,11 @@
 import argparse
 import getpass
+import json
 import sys
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from bemani.data import Config, Data, DBCreateException
-from bemani.utils.config import load_config
+from bemani.utils.config import load_config, register_games
 
 
 def create(config: Config) -> None:
@@ -68,11 +69,68 @@ def remove_admin(config: Config, username: Optional[str]) -> None:
     print(f"User {username} lost admin rights.")
 
 
+def slow_queries(config: Config, filename: Optional[str], limit: int) -> None:
+    if filename is None:
+        filename = config.database.slow_query_log
+    if filename is None:
+        raise Exception("Please provide a slow query log, or configure one!")
+
+    shapes: Dict[str, Dict[str, Any]] = {}
+    with open(filename, "r") as fp:
+        for line in fp:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            shape = shapes.setdefault(
+                entry["fingerprint"],
+                {"count": 0, "seconds": 0.0, "max": 0.0, "rows": 0, "handlers": {}},
+            )
+            shape["count"] += 1
+            shape["seconds"] += entry["seconds"]
+            shape["max"] = max(shape["max"], entry["seconds"])
+            shape["rows"] += max(entry["rows"], 0)
+            handler = entry["handler"] or entry["caller"]
+            shape["handlers"][handler] = shape["handlers"].get(handler, 0) + 1
+
+    # Worst offenders are the ones that cost us the most time overall.
+    worst = sorted(shapes.items(), key=lambda item: item[1]["seconds"], reverse=True)[:limit]
+    for fingerprint, shape in worst:
+        print(
+            f"{shape['count']} queries, {shape['seconds']:.3f} seconds total, "
+            f"{shape['seconds'] / shape['count']:.3f} mean, {shape['max']:.3f} max, "
+            f"{shape['rows'] / shape['count']:.1f} rows mean"
+        )
+        print(f"    {fingerprint}")
+        for handler, count in sorted(shape["handlers"].items(), key=lambda item: item[1], reverse=True)[:3]:
+            print(f"    {count} from {handler}")
+    print(f"{len(shapes)} query shapes, showing the worst {len(worst)}.")
+
+
+def reindex_profiles(config: Config) -> None:
+    # Games register the profile attributes they look users up by when they are registered.
+    register_games(config)
+    data = Data(config)
+    for game, version in data.local.user.indexed_games():
+        count = data.local.user.reindex_profile_attributes(game, version)
+        attributes = ", ".join(data.local.user.indexed_attributes(game, version))
+        print(f"Reindexed {attributes} for {count} {game.value} version {version} profiles.")
+    data.close()
+
+
+def rebuild_daily_scores(config: Config) -> None:
+    # Games register whether they read daily scores when they are registered.
+    register_games(config)
+    data = Data(config)
+    count = data.local.music.rebuild_daily_points()
+    print(f"Rebuilt {count} daily score aggregates from score history.")
+    data.close()
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="A utility for working with databases created with this codebase.")
     parser.add_argument(
         "operation",
-        help="Operation to perform, options include 'create', 'generate', 'upgrade', 'change-password', 'add-admin' and 'remove-admin'.",
+        help="Operation to perform, options include 'create', 'generate', 'upgrade', 'change-password', 'add-admin', 'remove-admin', 'slow-queries', 'reindex-profiles' and 'rebuild-daily-scores'.",
         type=str,
     )
     parser.add_argument(
@@ -93,6 +151,19 @@ def main() -> None:
         help="Allow empty migration script to be generated. Useful for data-only migrations.",
         action="store_true",
     )
+    parser.add_argument(
+        "-f",
+        "--file",
+        help="Slow query log to report on. Defaults to the slow query log in the config.",
+        type=str,
+    )
+    parser.add_argument(
+        "-l",
+        "--limit",
+        help="Number of query shapes to report on. Defaults to 20.",
+        type=int,
+        default=20,
+    )
     parser.add_argument(
         "-c",
         "--config",
@@ -118,6 +189,12 @@ def main() -> None:
             remove_admin(config, args.username)
         elif args.operation == "change-password":
             change_password(config, args.username)
+        elif args.operation == "slow-queries":
+            slow_queries(config, args.file, args.limit)
+        elif args.operation == "reindex-profiles":
+            reindex_profiles(config)
+        elif args.operation == "rebuild-daily-scores":
+            rebuild_daily_scores(config)
         else:
             raise Exception(f"Unknown operation '{args.operation}'")
     except DBCreateException as e:
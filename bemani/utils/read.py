@@ -2,6 +2,7 @@
 
 import csv
 import argparse
+import concurrent.futures
 import copy
 import io
 import jaconv
@@ -9,12 +10,14 @@ import json
 import os
 import struct
 import xml.etree.ElementTree as ET
+import yaml
 from pathlib import Path
 from sqlalchemy.engine import CursorResult
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.sql import text
 from sqlalchemy.exc import IntegrityError
 from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing_extensions import Final
 
 from bemani.common import (
     GameConstants,
@@ -34,6 +37,10 @@ from bemani.data.mysql.user import UserData
 from bemani.utils.config import load_config
 
 
+# Options that can be given per import in a manifest.
+MANIFEST_KEYS: Final[List[str]] = ["series", "version", "csv", "tsv", "xml", "bin", "assets", "folder", "server", "token"]
+
+
 class CLIException(Exception):
     pass
 
@@ -55,6 +62,96 @@ class ReadAPI(APIProviderInterface):
             )
         ]
 
+    def get_remote_watermarks(self, game: GameConstants, version: int) -> Dict[int, int]:
+        # Importing always talks to the remote server directly.
+        return {}
+
+    def put_remote_records(
+        self,
+        game: GameConstants,
+        version: int,
+        serverid: int,
+        records: List[Dict[str, Any]],
+        watermark: int,
+        replace: bool = False,
+    ) -> None:
+        pass
+
+    def get_remote_records(self, game: GameConstants, version: int, serverids: List[int]) -> List[Dict[str, Any]]:
+        return []
+
+
+class BulkImport:
+    """
+    Staging area for an importer running in bulk mode. The existing music and catalog entries
+    for the game are loaded into memory once, so that looking up music IDs from other versions
+    and deciding whether a row already exists doesn't need a round trip to the DB. New and
+    changed rows are staged here and written out all at once with multi-row inserts.
+    """
+
+    # Number of rows to write per multi-row insert.
+    INSERT_CHUNK_SIZE: Final[int] = 500
+
+    def __init__(self) -> None:
+        self.music: Dict[Tuple[int, int, int], Dict[str, Any]] = {}
+        self.music_by_song: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        self.music_by_id: Dict[int, List[Dict[str, Any]]] = {}
+        self.music_by_chart: Dict[int, List[Dict[str, Any]]] = {}
+        self.catalog: Dict[Tuple[int, str, int], Dict[str, Any]] = {}
+        self.next_music_id = 1
+
+        # Writes to perform, in the order they should happen.
+        self.music_updates: List[Tuple[str, Dict[str, Any]]] = []
+        self.music_inserts: List[Dict[str, Any]] = []
+        self.catalog_updates: List[Dict[str, Any]] = []
+        self.catalog_inserts: List[Dict[str, Any]] = []
+
+    def add_music(self, row: Dict[str, Any]) -> None:
+        self.music[(row["songid"], row["chart"], row["version"])] = row
+        self.music_by_song.setdefault((row["songid"], row["chart"]), []).append(row)
+        self.music_by_id.setdefault(row["id"], []).append(row)
+        self.music_by_chart.setdefault(row["chart"], []).append(row)
+        if row["id"] >= self.next_music_id:
+            self.next_music_id = row["id"] + 1
+
+    def stage_music(self, row: Dict[str, Any]) -> None:
+        row["staged"] = True
+        self.add_music(row)
+        self.music_inserts.append(row)
+
+    def update_music(
+        self,
+        rows: List[Dict[str, Any]],
+        updates: Dict[str, Any],
+        sql: str,
+        params: Dict[str, Any],
+    ) -> None:
+        existing = False
+        for row in rows:
+            row.update(updates)
+            if not row.get("staged"):
+                existing = True
+        if existing:
+            # Rows that were only staged in this import already picked up the update above,
+            # and aren't in the DB yet for the update to touch, so updates go out first.
+            self.music_updates.append((sql, params))
+
+    def stage_catalog(self, row: Dict[str, Any]) -> None:
+        row["staged"] = True
+        self.catalog[(row["version"], row["type"], row["id"])] = row
+        self.catalog_inserts.append(row)
+
+    def update_catalog(self, row: Dict[str, Any], data: str) -> None:
+        row["data"] = data
+        if not row.get("staged"):
+            self.catalog_updates.append(
+                {"game": row["game"], "version": row["version"], "type": row["type"], "id": row["id"], "data": data}
+            )
+
+    @property
+    def empty(self) -> bool:
+        return not (self.music_updates or self.music_inserts or self.catalog_updates or self.catalog_inserts)
+
 
 class ImportBase:
     def __init__(
@@ -71,17 +168,31 @@ class ImportBase:
         self.no_combine = no_combine
         self.__config = config
         self.__batch = False
+        self.__bulk = False
+        self.__dry_run = False
+        self.__staged: Optional[BulkImport] = None
 
         # Set up DB connection stuff.
         self.__engine = self.__config.database.engine
         session_factory = sessionmaker(self.__engine)
         self.__conn = scoped_session(session_factory)
 
+    def use_bulk(self, dry_run: bool = False) -> None:
+        """
+        Switch to bulk mode. Rather than looking up and writing each entry as it is imported,
+        existing entries are loaded once and new or changed entries are staged in memory, then
+        written in one transaction when the importer is closed. With dry_run, the staged
+        changes are printed instead of written.
+        """
+        self.__bulk = True
+        self.__dry_run = dry_run
+
     def start_batch(self) -> None:
         self.__batch = True
 
     def finish_batch(self) -> None:
-        self.__conn.commit()
+        if not self.__bulk:
+            self.__conn.commit()
         self.__batch = False
 
     def execute(self, sql: str, params: Optional[Dict[str, Any]] = None) -> CursorResult:
@@ -109,7 +220,38 @@ class ImportBase:
         api = ReadAPI(server, token)
         return GlobalGameData(api)
 
+    def __get_staged(self) -> BulkImport:
+        if self.__staged is None:
+            staged = BulkImport()
+
+            # Music IDs are shared across games, so we need the highest one out of everything.
+            cursor = self.execute("SELECT MAX(id) AS next_id FROM `music`")
+            result = cursor.mappings().fetchone()  # type: ignore
+            if result is not None and result["next_id"] is not None:
+                staged.next_music_id = result["next_id"] + 1
+
+            cursor = self.execute(
+                "SELECT id, songid, chart, version, name, artist, genre FROM `music` WHERE game = :game "
+                + "ORDER BY version ASC",
+                {"game": self.game.value},
+            )
+            for row in cursor.mappings():
+                staged.add_music(dict(row))
+
+            cursor = self.execute(
+                "SELECT version, type, id FROM `catalog` WHERE game = :game",
+                {"game": self.game.value},
+            )
+            for row in cursor.mappings():
+                staged.catalog[(row["version"], row["type"], row["id"])] = {"game": self.game.value, **row}
+
+            self.__staged = staged
+        return self.__staged
+
     def get_next_music_id(self) -> int:
+        if self.__bulk:
+            return self.__get_staged().next_music_id
+
         cursor = self.execute("SELECT MAX(id) AS next_id FROM `music`")
         result = cursor.mappings().fetchone()  # type: ignore
         try:
@@ -119,6 +261,7 @@ class ImportBase:
             return 1
 
     def get_music_id_for_song(self, songid: int, chart: int, version: Optional[int] = None) -> Optional[int]:
+        exact = version is not None
         if version is None:
             # Normal lookup
             if self.version is None:
@@ -129,6 +272,13 @@ class ImportBase:
             # Specific version lookup
             sql = "SELECT id FROM `music` WHERE songid = :songid AND chart = :chart AND game = :game AND version = :version"
 
+        if self.__bulk:
+            rows = self.__get_staged().music_by_song.get((songid, chart), [])
+            for row in sorted(rows, key=lambda row: row["version"]):
+                if (row["version"] == version) == exact:
+                    return row["id"]
+            return None
+
         cursor = self.execute(
             sql,
             {
@@ -162,6 +312,7 @@ class ImportBase:
         frags.append("chart = :chart")
         frags.append("game = :game")
 
+        exact = version is not None
         if version is None:
             # Normal lookup
             if self.version is None:
@@ -171,6 +322,17 @@ class ImportBase:
         else:
             frags.append("version = :version")
 
+        if self.__bulk:
+            for row in self.__get_staged().music_by_chart.get(chart, []):
+                if (
+                    (title is None or row["name"] == title)
+                    and (artist is None or row["artist"] == artist)
+                    and (genre is None or row["genre"] == genre)
+                    and (row["version"] == version) == exact
+                ):
+                    return row["id"]
+            return None
+
         sql = "SELECT id FROM `music` WHERE " + " AND ".join(frags)
         cursor = self.execute(
             sql,
@@ -207,6 +369,30 @@ class ImportBase:
             jsondata = "{}"
         else:
             jsondata = json.dumps(data)
+
+        if self.__bulk:
+            staged = self.__get_staged()
+            if (songid, chart, version) not in staged.music:
+                staged.stage_music(
+                    {
+                        "id": musicid,
+                        "songid": songid,
+                        "chart": chart,
+                        "game": self.game.value,
+                        "version": version,
+                        "name": name,
+                        "artist": artist,
+                        "genre": genre,
+                        "data": jsondata,
+                    }
+                )
+            elif self.update:
+                print("Entry already existed, so updating information!")
+                self.update_metadata_for_song(songid, chart, name, artist, genre, data, version)
+            else:
+                print("Entry already existed, so skip creating a second one!")
+            return
+
         try:
             sql = (
                 "INSERT INTO `music` (id, songid, chart, game, version, name, artist, genre, data) "
@@ -263,19 +449,32 @@ class ImportBase:
         sql = f"UPDATE `music` SET {', '.join(updates)} WHERE songid = :songid AND chart = :chart AND game = :game"
         if version is not None:
             sql = sql + " AND version = :version"
-        self.execute(
-            sql,
-            {
-                "songid": songid,
-                "chart": chart,
-                "game": self.game.value,
-                "version": version,
-                "name": name,
-                "artist": artist,
-                "genre": genre,
-                "data": jsondata,
-            },
-        )
+        params = {
+            "songid": songid,
+            "chart": chart,
+            "game": self.game.value,
+            "version": version,
+            "name": name,
+            "artist": artist,
+            "genre": genre,
+            "data": jsondata,
+        }
+
+        if self.__bulk:
+            staged = self.__get_staged()
+            staged.update_music(
+                [
+                    row
+                    for row in staged.music_by_song.get((songid, chart), [])
+                    if version is None or row["version"] == version
+                ],
+                self.__changes(name, artist, genre, jsondata),
+                sql,
+                params,
+            )
+            return
+
+        self.execute(sql, params)
 
     def update_metadata_for_music_id(
         self,
@@ -306,18 +505,37 @@ class ImportBase:
         sql = f"UPDATE `music` SET {', '.join(updates)} WHERE id = :musicid AND game = :game"
         if version is not None:
             sql = sql + " AND version = :version"
-        self.execute(
-            sql,
-            {
-                "musicid": musicid,
-                "game": self.game.value,
-                "version": version,
-                "name": name,
-                "artist": artist,
-                "genre": genre,
-                "data": jsondata,
-            },
-        )
+        params = {
+            "musicid": musicid,
+            "game": self.game.value,
+            "version": version,
+            "name": name,
+            "artist": artist,
+            "genre": genre,
+            "data": jsondata,
+        }
+
+        if self.__bulk:
+            staged = self.__get_staged()
+            staged.update_music(
+                [row for row in staged.music_by_id.get(musicid, []) if version is None or row["version"] == version],
+                self.__changes(name, artist, genre, jsondata),
+                sql,
+                params,
+            )
+            return
+
+        self.execute(sql, params)
+
+    def __changes(
+        self,
+        name: Optional[str],
+        artist: Optional[str],
+        genre: Optional[str],
+        jsondata: Optional[str],
+    ) -> Dict[str, Any]:
+        changes = {"name": name, "artist": artist, "genre": genre, "data": jsondata}
+        return {key: value for key, value in changes.items() if value is not None}
 
     def insert_catalog_entry(
         self,
@@ -329,6 +547,21 @@ class ImportBase:
             jsondata = "{}"
         else:
             jsondata = json.dumps(data)
+
+        if self.__bulk:
+            staged = self.__get_staged()
+            row = staged.catalog.get((self.version, cattype, catid))
+            if row is None:
+                staged.stage_catalog(
+                    {"game": self.game.value, "version": self.version, "type": cattype, "id": catid, "data": jsondata}
+                )
+            elif self.update:
+                print("Entry already existed, so updating information!")
+                staged.update_catalog(row, jsondata)
+            else:
+                print("Entry already existed, so skip creating a second one!")
+            return
+
         try:
             sql = (
                 "INSERT INTO `catalog` (game, version, type, id, data) " + "VALUES (:game, :version, :type, :id, :data)"
@@ -363,13 +596,79 @@ class ImportBase:
             else:
                 print("Entry already existed, so skip creating a second one!")
 
+    def __insert_rows(self, table: str, columns: List[str], rows: List[Dict[str, Any]]) -> None:
+        for start in range(0, len(rows), BulkImport.INSERT_CHUNK_SIZE):
+            chunk = rows[start : (start + BulkImport.INSERT_CHUNK_SIZE)]
+            values = []
+            params = {}
+            for i, row in enumerate(chunk):
+                values.append("(" + ", ".join(f":{column}_{i}" for column in columns) + ")")
+                params.update({f"{column}_{i}": row[column] for column in columns})
+            self.execute(f"INSERT INTO `{table}` ({', '.join(columns)}) VALUES {', '.join(values)}", params)
+            print(f"Wrote {start + len(chunk)} of {len(rows)} new {table} entries")
+
+    def __flush(self) -> None:
+        staged = self.__staged
+        if staged is None or staged.empty:
+            print("Nothing to write!")
+            return
+
+        print(
+            f"Staged {len(staged.music_inserts)} new and {len(staged.music_updates)} updated music entries, "
+            + f"{len(staged.catalog_inserts)} new and {len(staged.catalog_updates)} updated catalog entries"
+        )
+
+        if self.__dry_run:
+            for _, params in staged.music_updates:
+                if "musicid" in params:
+                    target = f"music ID {params['musicid']}"
+                else:
+                    target = f"song {params['songid']} chart {params['chart']}"
+                if params["version"] is not None:
+                    target = f"{target} version {params['version']}"
+                changes = [key for key in ["name", "artist", "genre", "data"] if params[key] is not None]
+                print(f"Would update {', '.join(changes)} for {target}")
+            for row in staged.music_inserts:
+                print(
+                    f"Would insert music ID {row['id']} for {row['artist']} {row['name']} "
+                    + f"(song {row['songid']} chart {row['chart']} version {row['version']})"
+                )
+            for row in staged.catalog_updates:
+                print(f"Would update catalog entry {row['type']} {row['id']}")
+            for row in staged.catalog_inserts:
+                print(f"Would insert catalog entry {row['type']} {row['id']}")
+            print("Dry run, nothing was written!")
+            return
+
+        # Everything goes out in one transaction. Updates go first, since they only ever
+        # target rows that existed before this import started.
+        self.start_batch()
+        for sql, params in staged.music_updates:
+            self.execute(sql, params)
+        for row in staged.catalog_updates:
+            self.execute(
+                "UPDATE `catalog` SET data = :data WHERE game = :game AND version = :version AND type = :type AND id = :id",
+                row,
+            )
+        self.__insert_rows(
+            "music",
+            ["id", "songid", "chart", "game", "version", "name", "artist", "genre", "data"],
+            staged.music_inserts,
+        )
+        self.__insert_rows("catalog", ["game", "version", "type", "id", "data"], staged.catalog_inserts)
+        self.__conn.commit()
+        self.__batch = False
+
     def close(self) -> None:
         """
-        Close any open data connection.
+        Write out anything staged in bulk mode, then close any open data connection.
         """
         # Make sure we don't leak connections after finising insertion.
         if self.__batch:
             raise Exception("Logic error, opened a batch without closing!")
+        if self.__bulk:
+            self.__flush()
+            self.__staged = None
         if self.__conn is not None:
             self.__conn.close()
             self.__conn = None
@@ -4199,9 +4498,7 @@ class ImportSDVX(ImportBase):
             entries.append(entry)
         return entries
 
-    def import_catalog(self, dllfile: str) -> None:
-        entries = self.scrape(dllfile)
-
+    def import_catalog(self, entries: List[Dict[str, Any]]) -> None:
         for entry in entries:
             self.start_batch()
             print(f"New catalog entry for {entry['musicid']} chart {entry['chart']}")
@@ -5308,13 +5605,313 @@ class ImportGitadora(ImportBase):
                     self.update_metadata_for_song(songid, chart, name, artist)
                 self.finish_batch()
 
+def validate_args(args: argparse.Namespace) -> None:
+    if (args.token and not args.server) or (args.server and not args.token):
+        raise CLIException("Must specify both --server and --token together!")
+    if (args.csv or args.tsv or args.xml or args.bin or args.assets) and (args.server or args.token):
+        raise CLIException("Cannot specify both a remote server and a local file to read from!")
+
+
+def get_importer(config: Config, args: argparse.Namespace) -> ImportBase:
+    series = None
+    try:
+        series = GameConstants(args.series)
+    except ValueError:
+        pass
+
+    if series == GameConstants.POPN_MUSIC:
+        return ImportPopn(config, args.version, args.no_combine, args.update)
+    elif series == GameConstants.JUBEAT:
+        return ImportJubeat(config, args.version, args.no_combine, args.update)
+    elif series == GameConstants.IIDX:
+        return ImportIIDX(config, args.version, args.no_combine, args.update)
+    elif series == GameConstants.DDR:
+        return ImportDDR(config, args.version, args.no_combine, args.update)
+    elif series == GameConstants.SDVX:
+        return ImportSDVX(config, args.version, args.no_combine, args.update)
+    elif series == GameConstants.MUSECA:
+        return ImportMuseca(config, args.version, args.no_combine, args.update)
+    elif series == GameConstants.REFLEC_BEAT:
+        return ImportReflecBeat(config, args.version, args.no_combine, args.update)
+    elif series == GameConstants.DANCE_EVOLUTION:
+        return ImportDanceEvolution(config, args.version, args.no_combine, args.update)
+    elif series == GameConstants.GITADORA:
+        return ImportGitadora(config, args.version, args.no_combine, args.update)
+    else:
+        raise CLIException("Unsupported game series!")
+
+
+def scrape(importer: ImportBase, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Read everything out of the game files or remote server that can be read without
+    touching the DB, so that it can be done in parallel with other imports.
+    """
+    if isinstance(importer, ImportPopn):
+        if args.bin:
+            songs = importer.scrape(args.bin)
+            if args.xml:
+                songs = importer.scrape_xml(args.xml, songs)
+            elif args.folder:
+                files = Path(args.folder).glob("*xml")
+                for filename in files:
+                    try:
+                        songs = importer.scrape_xml(filename, songs)
+                    except Exception:
+                        # We should really be just catching invalid XML but I didn't write this
+                        # nor do I have omnimix so I can't really test what it should do.
+                        raise CLIException(f"Invalid XML ({filename})")
+        elif args.server and args.token:
+            songs = importer.lookup(args.server, args.token)
+        else:
+            raise CLIException(
+                "No game DLL provided and no remote server specified! Please "
+                + "provide either a --bin or a --server and --token option!"
+            )
+        return {"songs": songs}
+
+    elif isinstance(importer, ImportJubeat):
+        if args.tsv is not None:
+            # Metadata is read and written in one go.
+            return {}
+
+        # Normal case, doing a music DB or emblem import.
+        if args.xml is not None:
+            songs, emblems = importer.scrape(args.xml)
+        elif args.server and args.token:
+            songs, emblems = importer.lookup(args.server, args.token)
+        else:
+            raise CLIException(
+                "No music_info.xml or TSV provided and no remote server specified! Please "
+                + "provide either a --xml, --tsv or a --server and --token option!"
+            )
+        return {"songs": songs, "emblems": emblems}
+
+    elif isinstance(importer, ImportIIDX):
+        if args.tsv is not None:
+            # Metadata is read and written in one go.
+            return {}
+
+        # Normal case, doing a music DB import.
+        if args.bin is not None:
+            songs, qpros = importer.scrape(args.bin, args.assets)
+        elif args.server and args.token:
+            songs, qpros = importer.lookup(args.server, args.token)
+        else:
+            raise CLIException(
+                "No music_data.bin or TSV provided and no remote server specified! Please "
+                + "provide either a --bin, --tsv or a --server and --token option!"
+            )
+        return {"songs": songs, "qpros": qpros}
+
+    elif isinstance(importer, ImportDDR):
+        if args.server and args.token:
+            songs = importer.lookup(args.server, args.token)
+        else:
+            if args.version == "16":
+                if args.bin is None:
+                    raise CLIException("No startup.arc provided!")
+                # DDR Ace has a different format altogether
+                songs = importer.parse_xml(args.bin)
+            else:
+                if args.bin is None:
+                    raise CLIException("No game DLL provided!")
+                if args.xml is None:
+                    raise CLIException("No game music XML provided!")
+                # DDR splits the music DB between the DLL and external XML
+                # (Why??), so we must first scrape then hydrate with extra
+                # data to get the full DB.
+                songs = importer.scrape(args.bin)
+                songs = importer.hydrate(songs, args.xml)
+        return {"songs": songs}
+
+    elif isinstance(importer, ImportSDVX):
+        if args.server and args.token:
+            # Remote imports are read and written in one go.
+            return {}
+
+        if args.xml is None and args.bin is None and args.csv is None:
+            raise CLIException(
+                "No XML file or game DLL or appeal card CSV provided and "
+                + "no remote server specified! Please provide either a --xml, "
+                + "--bin, --csv or a --server and --token option!"
+            )
+        return {"catalog": importer.scrape(args.bin) if args.bin is not None else None}
+
+    elif isinstance(importer, ImportMuseca):
+        if not (args.server and args.token) and args.xml is None:
+            raise CLIException(
+                "No music-info.xml provided and no remote server specified! "
+                + "Please provide either a --xml or a --server and --token option!"
+            )
+        return {}
+
+    elif isinstance(importer, ImportReflecBeat):
+        if args.bin is not None:
+            songs = importer.scrape(args.bin)
+        elif args.server and args.token:
+            songs = importer.lookup(args.server, args.token)
+        else:
+            raise CLIException(
+                "No game DLL provided and no remote server specified! "
+                + "Please provide either a --bin or a --server and --token option!"
+            )
+        return {"songs": songs}
+
+    elif isinstance(importer, ImportDanceEvolution):
+        if args.server and args.token:
+            songs = importer.lookup(args.server, args.token)
+        elif args.bin is not None:
+            songs = importer.scrape(args.bin)
+        else:
+            raise CLIException(
+                "No resource_lists.arc provided and no remote server "
+                + "specified! Please provide either a --bin or a "
+                + "--server and --token option!",
+            )
+        return {"songs": songs}
+
+    elif isinstance(importer, ImportGitadora):
+        if args.tsv is None and not (args.server and args.token) and args.xml is None:
+            raise CLIException(
+                "No music-info.xml provided and no remote server specified! "
+                + "Please provide either a --xml or a --server and --token option!"
+            )
+        return {}
+
+    else:
+        raise CLIException("Unsupported game series!")
+
+
+def store(importer: ImportBase, args: argparse.Namespace, scraped: Dict[str, Any]) -> None:
+    """
+    Write what scrape() read out to the DB, along with anything that is read and written
+    in one go.
+    """
+    if isinstance(importer, ImportPopn):
+        importer.import_music_db(scraped["songs"])
+
+    elif isinstance(importer, ImportJubeat):
+        if args.tsv is not None:
+            # Special case for Jubeat, grab the title/artist metadata that was
+            # hand-populated since its not in the music DB.
+            importer.import_metadata(args.tsv)
+        else:
+            importer.import_music_db(scraped["songs"])
+            importer.import_emblems(scraped["emblems"])
+
+    elif isinstance(importer, ImportIIDX):
+        if args.tsv is not None:
+            # Special case for IIDX, grab the title/artist metadata that was
+            # wrong in the music DB, and correct it.
+            importer.import_metadata(args.tsv)
+        else:
+            importer.import_music_db(scraped["songs"])
+            importer.import_qpros(scraped["qpros"])
+
+    elif isinstance(importer, ImportDDR):
+        importer.import_music_db(scraped["songs"])
+
+    elif isinstance(importer, ImportSDVX):
+        if args.server and args.token:
+            importer.import_from_server(args.server, args.token)
+        else:
+            if args.xml is not None:
+                importer.import_music_db_or_appeal_cards(args.xml)
+            if scraped["catalog"] is not None:
+                importer.import_catalog(scraped["catalog"])
+            if args.csv is not None:
+                importer.import_appeal_cards(args.csv)
+
+    elif isinstance(importer, ImportMuseca):
+        if args.server and args.token:
+            importer.import_from_server(args.server, args.token)
+        else:
+            importer.import_music_db(args.xml)
+
+    elif isinstance(importer, ImportReflecBeat):
+        importer.import_music_db(scraped["songs"])
+
+    elif isinstance(importer, ImportDanceEvolution):
+        importer.import_music_db(scraped["songs"])
+
+    elif isinstance(importer, ImportGitadora):
+        if args.tsv is not None:
+            # Special case for Gitadora, grab the title/artist metadata that was
+            # hand-populated since its not in the music DB.
+            importer.import_metadata(args.tsv)
+        elif args.server and args.token:
+            importer.import_from_server(args.server, args.token)
+        else:
+            importer.import_music_db(args.xml)
+            importer.import_trbitem_db(args.xml)
+
+
+def scrape_job(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Scrape a single import out of a manifest in a worker process, which loads its own config.
+    """
+    config = Config()
+    load_config(args.config, config)
+    importer = get_importer(config, args)
+    try:
+        return scrape(importer, args)
+    finally:
+        importer.close()
+
+
+def load_manifest(args: argparse.Namespace) -> List[argparse.Namespace]:
+    with open(args.manifest, "r") as fp:
+        entries = yaml.safe_load(fp)
+    if not isinstance(entries, list):
+        raise CLIException("Manifest should be a list of imports!")
+
+    jobs = []
+    for entry in entries:
+        if not isinstance(entry, dict) or "series" not in entry or "version" not in entry:
+            raise CLIException("Every import in the manifest needs at least a series and a version!")
+        unknown = set(entry.keys()) - set(MANIFEST_KEYS)
+        if unknown:
+            raise CLIException(f"Unknown options {', '.join(sorted(unknown))} in manifest!")
+
+        job = argparse.Namespace(**vars(args))
+        for key in MANIFEST_KEYS:
+            setattr(job, key, str(entry[key]) if entry.get(key) is not None else None)
+        validate_args(job)
+        jobs.append(job)
+    return jobs
+
+
+def import_manifest(config: Config, args: argparse.Namespace) -> None:
+    """
+    Run every import in a manifest. Game files are read in parallel worker processes, but
+    every import is written to the DB one at a time in the order listed, since music IDs
+    are allocated out of one sequence shared by every series. That way the DB ends up
+    exactly as it would after running each import one after another.
+    """
+    jobs = load_manifest(args)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(scrape_job, job) for job in jobs]
+        try:
+            for job, future in zip(jobs, futures):
+                scraped = future.result()
+                print(f"Importing {job.series} version {job.version}")
+                importer = get_importer(config, job)
+                if job.bulk or job.dry_run:
+                    importer.use_bulk(job.dry_run)
+                store(importer, job, scraped)
+                importer.close()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Import Game Music DB")
     parser.add_argument(
         "--series",
         action="store",
         type=str,
-        required=True,
         help="The game series we are importing.",
     )
     parser.add_argument(
@@ -5322,7 +5919,6 @@ def main() -> None:
         dest="version",
         action="store",
         type=str,
-        required=True,
         help="The game version we are importing.",
     )
     parser.add_argument(
@@ -5374,6 +5970,20 @@ def main() -> None:
         default=False,
         help="Overwrite data with updated values when it already exists.",
     )
+    parser.add_argument(
+        "--bulk",
+        dest="bulk",
+        action="store_true",
+        default=False,
+        help="Load existing entries once and write everything in one transaction at the end.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        dest="dry_run",
+        action="store_true",
+        default=False,
+        help="Show the entries that would be inserted or updated without writing anything. Implies --bulk.",
+    )
     parser.add_argument(
         "--config",
         type=str,
@@ -5397,197 +6007,47 @@ def main() -> None:
         type=str,
         help="The path were a folder of files are stored.",
     )
+    parser.add_argument(
+        "--manifest",
+        dest="manifest",
+        action="store",
+        type=str,
+        help=(
+            "A YAML file listing several imports to run instead of --series and --version. Each entry takes "
+            + "a series and version along with any of csv, tsv, xml, bin, assets, folder, server and token."
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        dest="jobs",
+        action="store",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="The number of imports in a --manifest to read game files for at once. Defaults to the number of CPUs.",
+    )
 
     # Parse args, validate invariants.
     args = parser.parse_args()
-    if (args.token and not args.server) or (args.server and not args.token):
-        raise CLIException("Must specify both --server and --token together!")
-    if (args.csv or args.tsv or args.xml or args.bin or args.assets) and (args.server or args.token):
-        raise CLIException("Cannot specify both a remote server and a local file to read from!")
+    if args.manifest is None:
+        if args.series is None or args.version is None:
+            raise CLIException("Must specify --series and --version, or a --manifest of imports!")
+        validate_args(args)
+    elif any(getattr(args, key) is not None for key in MANIFEST_KEYS):
+        raise CLIException("Specify series, versions and files to read from in the --manifest instead!")
 
     # Load the config so we can talk to the server
     config = Config()
     load_config(args.config, config)
 
-    series = None
-    try:
-        series = GameConstants(args.series)
-    except ValueError:
-        pass
+    if args.manifest is not None:
+        import_manifest(config, args)
+        return
 
-    if series == GameConstants.POPN_MUSIC:
-        popn = ImportPopn(config, args.version, args.no_combine, args.update)
-        if args.bin:
-            songs = popn.scrape(args.bin)
-            if args.xml:
-                songs = popn.scrape_xml(args.xml, songs)
-            elif args.folder:
-                files = Path(args.folder).glob("*xml")
-                for filename in files:
-                    try:
-                        songs = popn.scrape_xml(filename, songs)
-                    except Exception:
-                        # We should really be just catching invalid XML but I didn't write this
-                        # nor do I have omnimix so I can't really test what it should do.
-                        raise CLIException(f"Invalid XML ({filename})")
-        elif args.server and args.token:
-            songs = popn.lookup(args.server, args.token)
-        else:
-            raise CLIException(
-                "No game DLL provided and no remote server specified! Please "
-                + "provide either a --bin or a --server and --token option!"
-            )
-        popn.import_music_db(songs)
-        popn.close()
-
-    elif series == GameConstants.JUBEAT:
-        jubeat = ImportJubeat(config, args.version, args.no_combine, args.update)
-        if args.tsv is not None:
-            # Special case for Jubeat, grab the title/artist metadata that was
-            # hand-populated since its not in the music DB.
-            jubeat.import_metadata(args.tsv)
-        else:
-            # Normal case, doing a music DB or emblem import.
-            if args.xml is not None:
-                songs, emblems = jubeat.scrape(args.xml)
-            elif args.server and args.token:
-                songs, emblems = jubeat.lookup(args.server, args.token)
-            else:
-                raise CLIException(
-                    "No music_info.xml or TSV provided and no remote server specified! Please "
-                    + "provide either a --xml, --tsv or a --server and --token option!"
-                )
-            jubeat.import_music_db(songs)
-            jubeat.import_emblems(emblems)
-        jubeat.close()
-
-    elif series == GameConstants.IIDX:
-        iidx = ImportIIDX(config, args.version, args.no_combine, args.update)
-        if args.tsv is not None:
-            # Special case for IIDX, grab the title/artist metadata that was
-            # wrong in the music DB, and correct it.
-            iidx.import_metadata(args.tsv)
-        else:
-            # Normal case, doing a music DB import.
-            if args.bin is not None:
-                songs, qpros = iidx.scrape(args.bin, args.assets)
-            elif args.server and args.token:
-                songs, qpros = iidx.lookup(args.server, args.token)
-            else:
-                raise CLIException(
-                    "No music_data.bin or TSV provided and no remote server specified! Please "
-                    + "provide either a --bin, --tsv or a --server and --token option!"
-                )
-            iidx.import_music_db(songs)
-            iidx.import_qpros(qpros)
-        iidx.close()
-
-    elif series == GameConstants.DDR:
-        ddr = ImportDDR(config, args.version, args.no_combine, args.update)
-        if args.server and args.token:
-            songs = ddr.lookup(args.server, args.token)
-        else:
-            if args.version == "16":
-                if args.bin is None:
-                    raise CLIException("No startup.arc provided!")
-                # DDR Ace has a different format altogether
-                songs = ddr.parse_xml(args.bin)
-            else:
-                if args.bin is None:
-                    raise CLIException("No game DLL provided!")
-                if args.xml is None:
-                    raise CLIException("No game music XML provided!")
-                # DDR splits the music DB between the DLL and external XML
-                # (Why??), so we must first scrape then hydrate with extra
-                # data to get the full DB.
-                songs = ddr.scrape(args.bin)
-                songs = ddr.hydrate(songs, args.xml)
-        ddr.import_music_db(songs)
-        ddr.close()
-
-    elif series == GameConstants.SDVX:
-        sdvx = ImportSDVX(config, args.version, args.no_combine, args.update)
-        if args.server and args.token:
-            sdvx.import_from_server(args.server, args.token)
-        else:
-            if args.xml is None and args.bin is None and args.csv is None:
-                raise CLIException(
-                    "No XML file or game DLL or appeal card CSV provided and "
-                    + "no remote server specified! Please provide either a --xml, "
-                    + "--bin, --csv or a --server and --token option!"
-                )
-            if args.xml is not None:
-                sdvx.import_music_db_or_appeal_cards(args.xml)
-            if args.bin is not None:
-                sdvx.import_catalog(args.bin)
-            if args.csv is not None:
-                sdvx.import_appeal_cards(args.csv)
-        sdvx.close()
-
-    elif series == GameConstants.MUSECA:
-        museca = ImportMuseca(config, args.version, args.no_combine, args.update)
-        if args.server and args.token:
-            museca.import_from_server(args.server, args.token)
-        elif args.xml is not None:
-            museca.import_music_db(args.xml)
-        else:
-            raise CLIException(
-                "No music-info.xml provided and no remote server specified! "
-                + "Please provide either a --xml or a --server and --token option!"
-            )
-        museca.close()
-
-    elif series == GameConstants.REFLEC_BEAT:
-        reflec = ImportReflecBeat(config, args.version, args.no_combine, args.update)
-        if args.bin is not None:
-            songs = reflec.scrape(args.bin)
-        elif args.server and args.token:
-            songs = reflec.lookup(args.server, args.token)
-        else:
-            raise CLIException(
-                "No game DLL provided and no remote server specified! "
-                + "Please provide either a --bin or a --server and --token option!"
-            )
-        reflec.import_music_db(songs)
-        reflec.close()
-
-    elif series == GameConstants.DANCE_EVOLUTION:
-        danevo = ImportDanceEvolution(config, args.version, args.no_combine, args.update)
-        if args.server and args.token:
-            songs = danevo.lookup(args.server, args.token)
-        elif args.bin is not None:
-            songs = danevo.scrape(args.bin)
-        else:
-            raise CLIException(
-                "No resource_lists.arc provided and no remote server "
-                + "specified! Please provide either a --bin or a "
-                + "--server and --token option!",
-            )
-        danevo.import_music_db(songs)
-        danevo.close()
-
-    elif series == GameConstants.GITADORA:
-        gitadora = ImportGitadora(config, args.version, args.no_combine, args.update)
-        if args.tsv is not None:
-            # Special case for Gitadora, grab the title/artist metadata that was
-            # hand-populated since its not in the music DB.
-            gitadora.import_metadata(args.tsv)
-        else:
-            if args.server and args.token:
-                gitadora.import_from_server(args.server, args.token)
-            elif args.xml is not None:
-                gitadora.import_music_db(args.xml)
-                gitadora.import_trbitem_db(args.xml)
-
-            else:
-                raise CLIException(
-                    "No music-info.xml provided and no remote server specified! "
-                    + "Please provide either a --xml or a --server and --token option!"
-                )
-        gitadora.close()
-
-    else:
-        raise CLIException("Unsupported game series!")
+    importer = get_importer(config, args)
+    if args.bulk or args.dry_run:
+        importer.use_bulk(args.dry_run)
+    store(importer, args, scrape(importer, args))
+    importer.close()
 
 
 if __name__ == "__main__":
@@ -23,6 +23,7 @@ from bemani.frontend.reflec import ReflecBeatCache
 from bemani.frontend.museca import MusecaCache
 from bemani.common import GameConstants, Time
 from bemani.data import Config, Data
+from bemani.data.api.client import APIClient
 from bemani.utils.config import load_config, instantiate_cache
 
 
@@ -71,6 +72,22 @@ def run_scheduled_work(config: Config) -> None:
     for cache in enabled_caches:
         cache.preload(data, config)
 
+    # Now, occasionally replace the local mirror of remote network records wholesale, so
+    # that records removed on remote servers eventually disappear from ours
+    for game, version in APIClient.get_hot_versions():
+        if data.local.network.should_schedule(game, version, "remote_record_resync", "weekly"):
+            data.remote.music.sync_remote_records(game, version, full=True)
+            data.local.network.mark_scheduled(game, version, "remote_record_resync", "weekly")
+
+    # Now, warm the caches of remote network data that games have been asking for
+    data.remote.music.warm_remote_caches()
+
+    # Now, send any broadcasts that were queued up by services
+    data.triggers.send_queued_broadcasts()
+
+    # Now, write out any spooled events left behind by services processes
+    data.local.network.flush_events(everything=True)
+
     # Now, possibly delete old log entries
     keep_duration = config.get("event_log_duration", 0)
     if keep_duration > 0:
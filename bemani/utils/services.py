@@ -1,12 +1,15 @@
 import argparse
+import time
 import traceback
 from flask import Flask, request, redirect, Response, make_response
-from typing import Any
+from typing import Any, Dict, Optional
 
 
+from bemani.common import MetricsRegistry
 from bemani.protocol import EAmuseProtocol
 from bemani.backend import Dispatch, UnrecognizedPCBIDException
 from bemani.data import Config, Data
+from bemani.data.api.client import APIClient
 from bemani.utils.config import (
     load_config as base_load_config,
     instantiate_cache as base_instantiate_cache,
@@ -17,6 +20,89 @@ from bemani.utils.config import (
 app = Flask(__name__)
 config = Config()
 
+metrics = MetricsRegistry()
+metrics.register("bemani_stage_seconds", "Seconds spent in each stage of handling a request.")
+metrics.register("bemani_handler_seconds", "Seconds spent in the game handler for a request.")
+metrics.register("bemani_db_seconds", "Seconds spent waiting on the DB while handling a request.")
+metrics.register("bemani_db_queries", "DB queries executed while handling a request.", MetricsRegistry.COUNT_BUCKETS)
+metrics.register("bemani_request_seconds", "Seconds spent handling a request from start to finish.")
+last_metrics_log = time.monotonic()
+
+
+def record_metrics(start: float, proto: EAmuseProtocol, dispatch: Optional[Dispatch], data: Data) -> None:
+    global last_metrics_log
+
+    labels: Dict[str, str] = {"game": "unknown", "version": "unknown", "service": "unknown", "method": "unknown"}
+    if dispatch is not None:
+        labels.update(dispatch.labels)
+        if "pcbid" in dispatch.timings:
+            metrics.observe("bemani_stage_seconds", dispatch.timings["pcbid"], stage="pcbid")
+        if "handler" in dispatch.timings:
+            metrics.observe("bemani_handler_seconds", dispatch.timings["handler"], **labels)
+    for stage, seconds in proto.timings.items():
+        metrics.observe("bemani_stage_seconds", seconds, stage=stage)
+    metrics.observe("bemani_db_seconds", data.stats.seconds, **labels)
+    metrics.observe("bemani_db_queries", data.stats.count, **labels)
+    metrics.observe("bemani_request_seconds", time.perf_counter() - start, **labels)
+
+    interval = config.metrics.log_interval
+    if interval > 0 and time.monotonic() - last_metrics_log >= interval:
+        last_metrics_log = time.monotonic()
+        print("\n".join(summary for summary in [metrics.summary(), remote_summary()] if summary))
+
+
+def render_remote_metrics() -> str:
+    """
+    Render the request counters this process keeps for every remote server it has pulled
+    records or statistics from, in the Prometheus text exposition format.
+    """
+    statistics = sorted(APIClient.get_statistics_by_server().items())
+    families = [
+        ("bemani_remote_requests_total", "counter", "Requests made to a remote server.", "requests"),
+        ("bemani_remote_errors_total", "counter", "Requests to a remote server that failed.", "errors"),
+        (
+            "bemani_remote_latency_seconds_total",
+            "counter",
+            "Seconds spent waiting on requests to a remote server.",
+            "total_latency",
+        ),
+        (
+            "bemani_remote_latency_seconds_max",
+            "gauge",
+            "Seconds spent on the slowest request to a remote server.",
+            "max_latency",
+        ),
+    ]
+    return "".join(
+        MetricsRegistry.render_samples(
+            name, kind, description, [({"server": uri}, float(stats[key])) for uri, stats in statistics]
+        )
+        for name, kind, description, key in families
+    )
+
+
+def remote_summary() -> str:
+    """
+    Render the request counters for every remote server as one line each, for logging.
+    """
+    return "\n".join(
+        f"bemani_remote{{server=\"{uri}\"}} requests={stats['requests']} errors={stats['errors']} "
+        f"mean={stats['total_latency'] / max(stats['requests'], 1):.4f} max={stats['max_latency']:.4f}"
+        for uri, stats in sorted(APIClient.get_statistics_by_server().items())
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def receive_metrics() -> Response:
+    global config
+    # Only a proxy we trust gets to tell us who the client really is.
+    address = request.remote_addr
+    if address in config.metrics.proxies:
+        address = request.headers.get("x-remote-address", None) or address
+    if address not in config.metrics.allow:
+        return Response("Unauthorized client", 403)
+    return Response(metrics.render() + render_remote_metrics(), mimetype="text/plain; version=0.0.4")
+
 
 @app.route("/", defaults={"path": ""}, methods=["GET"])
 @app.route("/<path:path>", methods=["GET"])
@@ -34,6 +120,7 @@ def receive_healthcheck(path: str) -> Response:
 @app.route("/", defaults={"path": ""}, methods=["POST"])
 @app.route("/<path:path>", methods=["POST"])
 def receive_request(path: str) -> Response:
+    start = time.perf_counter()
     proto = EAmuseProtocol()
     remote_address = request.headers.get("x-remote-address", None)
     compression = request.headers.get("x-compress", None)
@@ -60,6 +147,9 @@ def receive_request(path: str) -> Response:
     }
 
     dataprovider = Data(requestconfig)
+    dataprovider.stats.budget = requestconfig.database.query_budget
+    dataprovider.stats.strict_budget = requestconfig.database.query_budget_strict
+    dispatch: Optional[Dispatch] = None
     try:
         dispatch = Dispatch(requestconfig, dataprovider, config["verbose"])
         resp = dispatch.handle(req)
@@ -115,6 +205,15 @@ def receive_request(path: str) -> Response:
         )
         return Response("Crash when handling packet!", 500)
     finally:
+        try:
+            # Write out any spooled events that are due. This still runs before Flask sends the
+            # response, so the request that crosses the flush size or interval waits on one
+            # batched insert. Every other request only pays for the append to the spool.
+            dataprovider.local.network.flush_events()
+        except Exception:
+            # They stay spooled, so we will try again on a later request.
+            print(traceback.format_exc())
+        record_metrics(start, proto, dispatch, dataprovider)
         dataprovider.close()
 
 
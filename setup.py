@@ -30,6 +30,17 @@ def extensions():
             extra_compile_args=["-std=c++14"],
             extra_link_args=["-std=c++14"],
         ),
+        # Alternative, faster, memory-unsafe version of the byte-level work in
+        # decoding and encoding binary packets, such as node name and body packing.
+        Extension(
+            "bemani.protocol.binarycpp",
+            [
+                "bemani/protocol/binarycpp.cxx",
+            ],
+            language="c++",
+            extra_compile_args=["-std=c++14"],
+            extra_link_args=["-std=c++14"],
+        ),
         # This is a memory-unsafe, orders of magnitude faster threaded implementation
         # of the pure python blend code which takes rendering rough animations down
         # from over an hour to around a minute.